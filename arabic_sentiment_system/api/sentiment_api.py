@@ -13,7 +13,6 @@ import asyncio
 import logging
 import time
 import hashlib
-import json
 from contextlib import asynccontextmanager
 import uvicorn
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -32,6 +31,7 @@ from models.arabic_bert_sentiment import ArabicSentimentAnalyzer, SentimentModel
 from services.analytics_service import SentimentAnalyticsService
 from services.trend_analysis import TrendAnalysisService
 from services.public_opinion import PublicOpinionAnalyzer
+from utils.micro_batcher import MicroBatcher
 
 # إعداد التسجيل
 logging.basicConfig(level=getattr(logging, settings.log_level))
@@ -42,6 +42,11 @@ REQUEST_COUNT = Counter('sentiment_requests_total', 'Total sentiment analysis re
 REQUEST_DURATION = Histogram('sentiment_request_duration_seconds', 'Request duration', ['endpoint'])
 ACTIVE_CONNECTIONS = Gauge('sentiment_active_connections', 'Active connections')
 ERROR_COUNT = Counter('sentiment_errors_total', 'Total errors', ['type'])
+BATCH_QUEUE_DEPTH = Gauge('sentiment_batch_queue_depth', 'Texts waiting for the inference micro-batcher')
+BATCH_SIZE = Histogram('sentiment_batch_size', 'Texts per micro-batch',
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_WAIT = Histogram('sentiment_batch_wait_seconds', 'Time a text waits in the micro-batch queue',
+                       buckets=(0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
 
 # إعداد Rate Limiting
 limiter = Limiter(key_func=get_remote_address)
@@ -158,6 +163,7 @@ class SentimentSystemManager:
         self.trend_service = None
         self.opinion_analyzer = None
         self.redis_client = None
+        self.batcher = None
         
         # إحصائيات النظام
         self.request_count = 0
@@ -208,19 +214,84 @@ class SentimentSystemManager:
         config = SentimentModelConfig(
             model_name=settings.arabic_bert_model,
             max_length=settings.max_sequence_length,
-            batch_size=settings.batch_size
+            batch_size=settings.batch_size,
+            inference_backend=settings.inference_backend,
+            intra_op_threads=settings.torch_intra_op_threads,
+            inter_op_threads=settings.torch_inter_op_threads,
+            quantization_validation_file=settings.quantization_validation_file,
+            max_quantization_accuracy_drop=settings.max_quantization_accuracy_drop
         )
         
         self.analyzer = ArabicSentimentAnalyzer(config)
         self.analyzer.load_models()
         
+        # طبقة Redis للتخزين الموحد (مفتاح: النص المطبّع + إصدار النموذج + نوع التحليل)
+        self.analyzer.cache.redis = self.redis_client
+        
+        # تجميع الطلبات الفردية المتزامنة في دفعات على خيط استدلال مخصص
+        self.batcher = MicroBatcher(
+            self._analyze_batch,
+            max_batch_size=settings.micro_batch_max_size,
+            max_wait_ms=settings.micro_batch_max_wait_ms,
+            queue_depth=BATCH_QUEUE_DEPTH,
+            batch_sizes=BATCH_SIZE,
+            wait_seconds=BATCH_WAIT,
+            name='sentiment_inference'
+        )
+        await self.batcher.start()
+        
         logger.info("✅ تم تهيئة محلل المشاعر")
     
+    def _analyze_batch(self, items: List[tuple]) -> List[Any]:
+        """
+        تحليل دفعة من الطلبات الفردية (على خيط الاستدلال)
+        Items are ``(text, analysis_type, use_cache)``; each analysis type and
+        cache flag runs as one ``batch_analyze`` call. Results are copied so that per-request fields
+        never leak between requests or into the cache.
+        """
+        results: List[Any] = [None] * len(items)
+        groups: Dict[tuple, List[int]] = {}
+        for i, (_, analysis_type, use_cache) in enumerate(items):
+            groups.setdefault((analysis_type, use_cache), []).append(i)
+        
+        for (analysis_type, use_cache), indices in groups.items():
+            try:
+                group_results = self.analyzer.batch_analyze(
+                    [items[i][0] for i in indices], analysis_type=analysis_type, use_cache=use_cache
+                )
+            except Exception as e:
+                for i in indices:
+                    results[i] = e
+                continue
+            
+            for i, result in zip(indices, group_results):
+                results[i] = dict(result)
+        
+        return results
+    
+    async def analyze_text(self, text: str, analysis_type: str = 'comprehensive',
+                           use_cache: bool = True) -> Dict[str, Any]:
+        """تحليل نص واحد: التخزين المؤقت أولاً ثم طابور التجميع"""
+        if use_cache:
+            cached = (await self.analyzer.cache.get_many([text], analysis_type))[0]
+            if cached is not None:
+                return cached
+        
+        result = await self.batcher.submit((text, analysis_type, use_cache))
+        if use_cache:
+            await self.analyzer.cache.set_many([text], analysis_type, [result])
+        return dict(result)
+    
     async def _initialize_services(self):
         """تهيئة الخدمات الإضافية"""
         try:
-            self.analytics_service = SentimentAnalyticsService(self.redis_client)
+            self.analytics_service = SentimentAnalyticsService(
+                self.redis_client, flush_interval=settings.analytics_flush_interval,
+                max_pending=settings.analytics_max_pending
+            )
+            await self.analytics_service.start()
             self.trend_service = TrendAnalysisService(self.redis_client)
+            await self.trend_service.initialize()
             self.opinion_analyzer = PublicOpinionAnalyzer(self.redis_client)
             
             logger.info("✅ تم تهيئة الخدمات الإضافية")
@@ -233,35 +304,22 @@ class SentimentSystemManager:
         start_time = time.time()
         
         try:
-            # التحقق من التخزين المؤقت
-            if request.cache_result and self.redis_client:
-                cached_result = await self._get_cached_result(request.text)
-                if cached_result:
-                    logger.info(f"📦 إرجاع نتيجة محفوظة للطلب {request_id}")
-                    return cached_result
-            
-            # تحليل النص
-            if request.analysis_type == "sentiment":
-                result = self.analyzer.analyze_sentiment(
-                    request.text, 
-                    include_confidence=request.include_confidence
-                )
-            elif request.analysis_type == "emotion":
-                result = self.analyzer.analyze_emotions(request.text)
-            else:
-                result = self.analyzer.comprehensive_analysis(request.text)
+            # تحليل النص (من التخزين المؤقت أو مجمّعاً مع الطلبات المتزامنة الأخرى)
+            result = await self.analyze_text(
+                request.text,
+                analysis_type=request.analysis_type,
+                use_cache=request.cache_result
+            )
+            if request.analysis_type == 'sentiment' and not request.include_confidence:
+                result['confidence'] = 1.0
             
             # إضافة معلومات إضافية
             result['request_id'] = request_id
             result['processing_time_ms'] = (time.time() - start_time) * 1000
             
-            # حفظ في التخزين المؤقت
-            if request.cache_result and self.redis_client:
-                await self._cache_result(request.text, result)
-            
-            # تسجيل في التحليلات
+            # تسجيل في التحليلات (يُكتب مجمّعاً مع نبضة التفريغ التالية)
             if self.analytics_service:
-                await self.analytics_service.record_analysis(result)
+                self.analytics_service.enqueue_analysis(result)
             
             self.request_count += 1
             return result
@@ -279,20 +337,33 @@ class SentimentSystemManager:
         start_time = time.time()
         
         try:
-            results = self.analyzer.batch_analyze(
-                request.texts,
-                analysis_type=request.analysis_type
-            )
+            # جلب المخزن مسبقاً بطلب MGET واحد
+            cache = self.analyzer.cache
+            results = await cache.get_many(request.texts, request.analysis_type)
+            missing = [i for i, result in enumerate(results) if result is None]
+            
+            if missing:
+                # على خيط الاستدلال حتى لا تُحجب حلقة الأحداث
+                missing_texts = [request.texts[i] for i in missing]
+                computed = await self.batcher.run(
+                    self.analyzer.batch_analyze,
+                    missing_texts,
+                    request.analysis_type
+                )
+                await cache.set_many(missing_texts, request.analysis_type, computed)
+                for i, result in zip(missing, computed):
+                    results[i] = result
             
             # إحصائيات المعالجة
             successful = sum(1 for r in results if 'error' not in r.get('analysis_metadata', {}))
             failed = len(results) - successful
             
-            # تسجيل في التحليلات
+            # تسجيل في التحليلات (خط أنابيب واحد للدفعة)
             if self.analytics_service:
-                for result in results:
-                    if 'error' not in result.get('analysis_metadata', {}):
-                        await self.analytics_service.record_analysis(result)
+                await self.analytics_service.record_analyses_bulk([
+                    result for result in results
+                    if 'error' not in result.get('analysis_metadata', {})
+                ])
             
             response_data = {
                 'results': results,
@@ -317,41 +388,6 @@ class SentimentSystemManager:
                 detail=f"فشل في التحليل المجمع: {str(e)}"
             )
     
-    async def _get_cached_result(self, text: str) -> Optional[Dict[str, Any]]:
-        """جلب نتيجة من التخزين المؤقت"""
-        if not self.redis_client:
-            return None
-        
-        try:
-            cache_key = f"{settings.redis_key_prefix}text:{hashlib.md5(text.encode()).hexdigest()}"
-            cached_data = await self.redis_client.get(cache_key)
-            
-            if cached_data:
-                return json.loads(cached_data)
-                
-        except Exception as e:
-            logger.warning(f"⚠️ خطأ في جلب البيانات المخزنة مؤقتاً: {str(e)}")
-        
-        return None
-    
-    async def _cache_result(self, text: str, result: Dict[str, Any]) -> bool:
-        """حفظ نتيجة في التخزين المؤقت"""
-        if not self.redis_client:
-            return False
-        
-        try:
-            cache_key = f"{settings.redis_key_prefix}text:{hashlib.md5(text.encode()).hexdigest()}"
-            await self.redis_client.setex(
-                cache_key,
-                settings.cache_ttl,
-                json.dumps(result, default=str)
-            )
-            return True
-            
-        except Exception as e:
-            logger.warning(f"⚠️ خطأ في حفظ البيانات في التخزين المؤقت: {str(e)}")
-            return False
-    
     async def get_system_health(self) -> Dict[str, Any]:
         """حالة صحة النظام"""
         uptime = datetime.now() - self.system_start_time
@@ -362,6 +398,8 @@ class SentimentSystemManager:
             'total_requests': self.request_count,
             'active_requests': self.active_requests,
             'analyzer_loaded': self.analyzer is not None,
+            'micro_batching': self.batcher.stats() if self.batcher else None,
+            'result_cache': self.analyzer.cache.stats() if self.analyzer else None,
             'redis_connected': self.redis_client is not None,
             'services_status': {
                 'analytics': self.analytics_service is not None,
@@ -375,6 +413,15 @@ class SentimentSystemManager:
         """إغلاق النظام"""
         logger.info("🔚 بدء إغلاق نظام تحليل المشاعر...")
         
+        if self.batcher:
+            await self.batcher.stop()
+        
+        if self.analytics_service:
+            await self.analytics_service.stop()
+        
+        if self.trend_service:
+            await self.trend_service.persist_state()
+        
         if self.redis_client:
             await self.redis_client.close()
         
@@ -667,7 +714,7 @@ async def classify_content_mood(
     
     try:
         # تحليل شامل للمحتوى
-        analysis = system_manager.analyzer.comprehensive_analysis(mood_request.content)
+        analysis = await system_manager.analyze_text(mood_request.content)
         
         # تصنيف المزاج بناءً على التحليل
         mood_classification = _classify_content_mood(
@@ -85,6 +85,13 @@ class SentimentConfig(BaseSettings):
     batch_size: int = Field(default=32, env="BATCH_SIZE")
     max_text_length: int = Field(default=5000, env="MAX_TEXT_LENGTH")
     
+    # إعدادات الاستدلال على المعالج
+    inference_backend: str = Field(default="fp32", env="INFERENCE_BACKEND")  # fp32 | int8
+    torch_intra_op_threads: int = Field(default=0, env="TORCH_INTRA_OP_THREADS")  # 0 = افتراضي PyTorch
+    torch_inter_op_threads: int = Field(default=0, env="TORCH_INTER_OP_THREADS")
+    quantization_validation_file: Optional[str] = Field(default=None, env="QUANTIZATION_VALIDATION_FILE")
+    max_quantization_accuracy_drop: float = Field(default=0.02, env="MAX_QUANTIZATION_ACCURACY_DROP")
+    
     # إعدادات التحليل
     sentiment_threshold: float = Field(default=0.6, env="SENTIMENT_THRESHOLD")
     emotion_threshold: float = Field(default=0.5, env="EMOTION_THRESHOLD")
@@ -117,7 +124,11 @@ class SentimentConfig(BaseSettings):
     # إعدادات الأداء
     enable_caching: bool = Field(default=True, env="ENABLE_CACHING")
     cache_ttl: int = Field(default=3600, env="CACHE_TTL")  # ثواني
+    cache_max_entries: int = Field(default=10000, env="CACHE_MAX_ENTRIES")
+    cache_max_bytes: int = Field(default=64 * 1024 * 1024, env="CACHE_MAX_BYTES")
     max_concurrent_requests: int = Field(default=100, env="MAX_CONCURRENT_REQUESTS")
+    micro_batch_max_size: int = Field(default=32, env="MICRO_BATCH_MAX_SIZE")
+    micro_batch_max_wait_ms: float = Field(default=5.0, env="MICRO_BATCH_MAX_WAIT_MS")
     request_timeout: int = Field(default=30, env="REQUEST_TIMEOUT")  # ثواني
     
     # إعدادات التحليل المجمع
@@ -127,6 +138,8 @@ class SentimentConfig(BaseSettings):
     # إعدادات مراقبة الأداء
     enable_metrics: bool = Field(default=True, env="ENABLE_METRICS")
     metrics_retention_days: int = Field(default=30, env="METRICS_RETENTION_DAYS")
+    analytics_flush_interval: float = Field(default=1.0, env="ANALYTICS_FLUSH_INTERVAL")  # ثواني
+    analytics_max_pending: int = Field(default=10000, env="ANALYTICS_MAX_PENDING")  # أقصى نتائج معلقة
     
     # إعدادات التدريب والتحديث
     model_update_frequency: int = Field(default=7, env="MODEL_UPDATE_FREQUENCY")  # أيام
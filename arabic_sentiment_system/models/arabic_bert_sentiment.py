@@ -18,11 +18,15 @@ import logging
 from dataclasses import dataclass
 import json
 import os
+import io
+import time
+import hashlib
 from datetime import datetime
 import pickle
 
 from ..config.settings import settings
 from ..utils.arabic_text_processor import ArabicTextProcessor, TextProcessingConfig
+from ..utils.result_cache import SentimentResultCache, file_digest, model_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +45,45 @@ class SentimentModelConfig:
     weight_decay: float = 0.01
     fp16: bool = True  # استخدام precision مختلط
     gradient_accumulation_steps: int = 2
+    # إعدادات الاستدلال المجمع
+    max_batch_tokens: int = 8192  # حد (عدد النصوص × أطول نص) لكل دفعة
+    max_inference_batch_size: int = 64
+    # تمرير واحد عبر المشفر لرأسي المشاعر والعواطف عند تطابق أوزانهما
+    shared_encoder: bool = True
+    # النوافذ المنزلقة للنصوص الأطول من max_length
+    sliding_window: bool = False
+    window_stride: int = 128  # عدد الرموز المتداخلة بين نافذتين متتاليتين
+    # الاستدلال على المعالج
+    inference_backend: str = 'fp32'  # fp32 | int8 (تكميم ديناميكي للطبقات الخطية)
+    intra_op_threads: int = 0  # 0 = افتراضي PyTorch
+    inter_op_threads: int = 0
+    quantization_validation_file: Optional[str] = None  # CSV/JSONL بعمودي text و label
+    max_quantization_accuracy_drop: float = 0.02
+
+def configure_torch_threads(intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """ضبط عدد خيوط PyTorch (0 يبقي القيمة الافتراضية)"""
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # لا يمكن تغييره بعد بدء أي عمل متوازٍ في العملية
+            logger.warning(f"⚠️ تعذر ضبط عدد خيوط inter-op: {str(e)}")
+
+def state_dict_digest(model: nn.Module) -> str:
+    """بصمة أوزان نموذج في الذاكرة (للنماذج غير المحملة من ملف)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+def model_size_mb(model: nn.Module) -> float:
+    """حجم أوزان النموذج المسلسلة بالميغابايت"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / (1024 * 1024)
 
 class ArabicBertSentimentClassifier(nn.Module):
     """نموذج BERT العربي لتصنيف المشاعر"""
@@ -90,45 +133,48 @@ class ArabicBertSentimentClassifier(nn.Module):
             return_dict=True
         )
         
-        # الحصول على جميع الطبقات المخفية
-        hidden_states = outputs.hidden_states  # (batch_size, seq_len, hidden_size)
+        cls_output = self.pool(outputs.hidden_states)
+        logits, confidence_scores = self.classify(cls_output)
+        
+        # حساب الخسارة إذا توفرت التسميات
+        loss = None
+        if labels is not None:
+            loss_fct = nn.CrossEntropyLoss()
+            loss = loss_fct(logits.view(-1, self.config.num_labels), labels.view(-1))
         
-        # دمج الطبقات المخفية باستخدام الأوزان المتعلمة
+        return SequenceClassifierOutput(
+            loss=loss,
+            logits=logits,
+            hidden_states=outputs.hidden_states,
+            attentions=outputs.attentions,
+        ), confidence_scores
+    
+    def pool(self, hidden_states: Tuple[torch.Tensor, ...]) -> torch.Tensor:
+        """دمج الطبقات المخفية واستخراج [CLS]"""
+        # دمج الطبقات المخفية باستخدام الأوزان المتعلمة؛ hidden_states تبدأ بطبقة
+        # التضمين، فالأوزان تقابل مخرجات طبقات المشفر فقط
         weights = F.softmax(self.layer_weights, dim=0)
-        weighted_hidden_states = torch.zeros_like(hidden_states[-1])
+        layer_states = hidden_states[-len(weights):]
+        weighted_hidden_states = torch.zeros_like(layer_states[-1])
         
-        for i, hidden_state in enumerate(hidden_states):
+        for i, hidden_state in enumerate(layer_states):
             weighted_hidden_states += weights[i] * hidden_state
         
         # استخدام [CLS] token من الطبقة المدمجة
-        cls_output = weighted_hidden_states[:, 0, :]  # [CLS] token
-        
+        return weighted_hidden_states[:, 0, :]  # [CLS] token
+    
+    def classify(self, cls_output: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """تطبيق رأس التصنيف ورأس الثقة على تمثيل [CLS]"""
         # تطبيق طبقات التصنيف
         x = self.dropout(cls_output)
         
         for layer in self.classifier_layers:
-            if isinstance(layer, nn.Linear):
-                x = layer(x)
-            else:
-                x = layer(x)
-        
-        logits = x
+            x = layer(x)
         
         # حساب مستوى الثقة
         confidence_scores = torch.sigmoid(self.confidence_layer(cls_output))
         
-        # حساب الخسارة إذا توفرت التسميات
-        loss = None
-        if labels is not None:
-            loss_fct = nn.CrossEntropyLoss()
-            loss = loss_fct(logits.view(-1, self.config.num_labels), labels.view(-1))
-        
-        return SequenceClassifierOutput(
-            loss=loss,
-            logits=logits,
-            hidden_states=outputs.hidden_states,
-            attentions=outputs.attentions,
-        ), confidence_scores
+        return x, confidence_scores
 
 class MultiDimensionalEmotionClassifier(nn.Module):
     """نموذج تحليل المشاعر متعدد الأبعاد"""
@@ -170,21 +216,9 @@ class MultiDimensionalEmotionClassifier(nn.Module):
         outputs = self.bert(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
         cls_output = outputs.last_hidden_state[:, 0, :]  # [CLS] token
         
-        # تصنيف العواطف
-        emotion_logits = {}
-        emotion_probs = {}
-        
-        for emotion in self.emotions:
-            logits = self.emotion_classifiers[emotion](cls_output)
-            emotion_logits[emotion] = logits
-            emotion_probs[emotion] = F.softmax(logits, dim=-1)
-        
-        # تصنيف المشاعر العام
-        sentiment_logits = self.general_classifier(cls_output)
-        
-        # دمج معلومات العواطف
-        emotion_features = torch.cat([emotion_probs[emotion] for emotion in self.emotions], dim=-1)
-        fused_emotions = self.emotion_fusion(emotion_features)
+        heads = self.classify(cls_output)
+        emotion_logits = heads['emotion_logits']
+        sentiment_logits = heads['sentiment_logits']
         
         # حساب الخسائر
         total_loss = 0
@@ -208,6 +242,28 @@ class MultiDimensionalEmotionClassifier(nn.Module):
         return {
             'total_loss': total_loss,
             'losses': losses,
+            **heads
+        }
+    
+    def classify(self, cls_output: torch.Tensor) -> Dict[str, Any]:
+        """تطبيق رؤوس العواطف والمشاعر على تمثيل [CLS]"""
+        # تصنيف العواطف
+        emotion_logits = {}
+        emotion_probs = {}
+        
+        for emotion in self.emotions:
+            logits = self.emotion_classifiers[emotion](cls_output)
+            emotion_logits[emotion] = logits
+            emotion_probs[emotion] = F.softmax(logits, dim=-1)
+        
+        # تصنيف المشاعر العام
+        sentiment_logits = self.general_classifier(cls_output)
+        
+        # دمج معلومات العواطف
+        emotion_features = torch.cat([emotion_probs[emotion] for emotion in self.emotions], dim=-1)
+        fused_emotions = self.emotion_fusion(emotion_features)
+        
+        return {
             'emotion_logits': emotion_logits,
             'emotion_probs': emotion_probs,
             'sentiment_logits': sentiment_logits,
@@ -221,6 +277,7 @@ class ArabicSentimentAnalyzer:
     def __init__(self, config: SentimentModelConfig = None):
         self.config = config or SentimentModelConfig()
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        configure_torch_threads(self.config.intra_op_threads, self.config.inter_op_threads)
         
         # تحميل المعالج النصي
         text_config = TextProcessingConfig(
@@ -236,6 +293,10 @@ class ArabicSentimentAnalyzer:
         # النماذج
         self.sentiment_model = None
         self.emotion_model = None
+        self.shared_encoder = False
+        self.inference_backend = 'fp32'
+        self.quantization_report: Optional[Dict[str, Any]] = None
+        self.model_version = None
         
         # قاموس التسميات
         self.sentiment_labels = ['negative', 'neutral', 'positive']
@@ -243,7 +304,14 @@ class ArabicSentimentAnalyzer:
         
         # إحصائيات
         self.analysis_count = 0
-        self.cache = {}
+        # تخزين موحد حسب النص المطبّع؛ يربطه مدير النظام بـ Redis
+        self.cache = SentimentResultCache(
+            self.text_processor.normalize_text,
+            key_prefix=settings.redis_key_prefix,
+            ttl=settings.cache_ttl,
+            max_entries=settings.cache_max_entries,
+            max_bytes=settings.cache_max_bytes
+        )
         
     def load_models(self, sentiment_model_path: str = None, emotion_model_path: str = None):
         """تحميل النماذج المدربة"""
@@ -273,13 +341,172 @@ class ArabicSentimentAnalyzer:
                 self.emotion_model = MultiDimensionalEmotionClassifier(self.config)
                 self.emotion_model.to(self.device)
                 logger.info("✅ تم تحميل النموذج الأساسي للعواطف")
+            
+            self._setup_shared_encoder()
+            
+            # بصمة أوزان fp32 قبل التكميم
+            weight_digests = [
+                file_digest(path) if path and os.path.exists(path) else state_dict_digest(model)
+                for path, model in ((sentiment_model_path, self.sentiment_model),
+                                    (emotion_model_path, self.emotion_model))
+            ]
+            
+            if self.config.inference_backend == 'int8':
+                self.quantize_models(self.config.quantization_validation_file)
+            
+            self._update_model_version(weight_digests)
                 
         except Exception as e:
             logger.error(f"❌ فشل في تحميل النماذج: {str(e)}")
             raise
     
+    def _update_model_version(self, weight_digests: List[str]):
+        """
+        إصدار النموذج المستخدم في مفاتيح التخزين المؤقت
+        Derived from the weights and every setting that changes results, so
+        new weights (or a different backend) invalidate cached results in all
+        processes, while identical deployments share them.
+        """
+        self.model_version = model_fingerprint(
+            self.config.model_name, weight_digests, self.inference_backend,
+            self.config.max_length, self.config.sliding_window, self.config.window_stride
+        )
+        self.cache.set_model_version(self.model_version)
+    
+    def _setup_shared_encoder(self):
+        """
+        مشاركة مشفر BERT بين النموذجين إذا كانت أوزانهما متطابقة
+        When both checkpoints carry the same encoder weights, the emotion
+        model is pointed at the sentiment model's encoder (one copy in memory)
+        and combined analyses run a single encoder pass feeding both heads.
+        Fine-tuned encoders that differ keep separate passes.
+        """
+        self.shared_encoder = False
+        if not self.config.shared_encoder:
+            return
+        
+        sentiment_state = self.sentiment_model.bert.state_dict()
+        emotion_state = self.emotion_model.bert.state_dict()
+        if sentiment_state.keys() != emotion_state.keys() or not all(
+                torch.equal(sentiment_state[name], emotion_state[name]) for name in sentiment_state):
+            logger.info("ℹ️ أوزان مشفري المشاعر والعواطف مختلفة - سيتم استخدام تمريرين منفصلين")
+            return
+        
+        self.emotion_model.bert = self.sentiment_model.bert
+        self.shared_encoder = True
+        logger.info("🔗 تم تفعيل المشفر المشترك لنموذجي المشاعر والعواطف")
+    
+    def quantize_models(self, validation_file: Optional[str] = None) -> Dict[str, Any]:
+        """
+        تكميم ديناميكي int8 للطبقات الخطية في النموذجين
+        Applies ``torch.quantization.quantize_dynamic`` to every ``nn.Linear``
+        (the bulk of BERT's weights and compute). A shared encoder is quantized
+        once and stays shared.
+
+        With a validation file (CSV or JSONL with ``text`` and ``label``
+        columns), fp32 and int8 sentiment predictions are compared on it; if
+        accuracy drops by more than ``max_quantization_accuracy_drop`` the
+        fp32 models are kept. The report is stored in ``quantization_report``.
+        """
+        if self.device.type != 'cpu':
+            logger.warning("⚠️ التكميم الديناميكي مدعوم على المعالج فقط - سيتم استخدام fp32")
+            return {}
+        
+        fp32_models = (self.sentiment_model, self.emotion_model)
+        for model in fp32_models:
+            model.eval()
+        
+        quantized_sentiment = torch.quantization.quantize_dynamic(
+            self.sentiment_model, {nn.Linear}, dtype=torch.qint8
+        )
+        if self.shared_encoder:
+            # المشفر المشترك مكمّم مسبقاً ضمن نموذج المشاعر
+            encoder = self.emotion_model.bert
+            self.emotion_model.bert = None
+            try:
+                quantized_emotion = torch.quantization.quantize_dynamic(
+                    self.emotion_model, {nn.Linear}, dtype=torch.qint8
+                )
+            finally:
+                self.emotion_model.bert = encoder
+            quantized_emotion.bert = quantized_sentiment.bert
+        else:
+            quantized_emotion = torch.quantization.quantize_dynamic(
+                self.emotion_model, {nn.Linear}, dtype=torch.qint8
+            )
+        
+        report = {
+            'fp32_size_mb': model_size_mb(self.sentiment_model) + model_size_mb(self.emotion_model),
+            'int8_size_mb': model_size_mb(quantized_sentiment) + model_size_mb(quantized_emotion),
+        }
+        
+        if validation_file:
+            texts, labels = self._load_validation_file(validation_file)
+            fp32_predictions, fp32_metrics = self._evaluate_sentiment(texts, labels)
+            self.sentiment_model, self.emotion_model = quantized_sentiment, quantized_emotion
+            int8_predictions, int8_metrics = self._evaluate_sentiment(texts, labels)
+            self.sentiment_model, self.emotion_model = fp32_models
+            
+            report.update({
+                'validation_samples': len(texts),
+                'fp32_accuracy': fp32_metrics['accuracy'],
+                'int8_accuracy': int8_metrics['accuracy'],
+                'accuracy_delta': int8_metrics['accuracy'] - fp32_metrics['accuracy'],
+                'prediction_agreement': float(np.mean(
+                    [a == b for a, b in zip(fp32_predictions, int8_predictions)]
+                )),
+                'fp32_latency_ms': fp32_metrics['latency_ms'],
+                'int8_latency_ms': int8_metrics['latency_ms'],
+            })
+            logger.info(f"📏 التحقق من التكميم: دقة fp32={report['fp32_accuracy']:.4f}، "
+                        f"int8={report['int8_accuracy']:.4f}")
+            
+            if -report['accuracy_delta'] > self.config.max_quantization_accuracy_drop:
+                report['applied'] = False
+                self.quantization_report = report
+                logger.warning(f"⚠️ انخفاض الدقة ({-report['accuracy_delta']:.4f}) يتجاوز الحد المسموح - "
+                               f"سيتم استخدام fp32")
+                return report
+        
+        self.sentiment_model, self.emotion_model = quantized_sentiment, quantized_emotion
+        self.inference_backend = 'int8'
+        report['applied'] = True
+        self.quantization_report = report
+        logger.info(f"⚡ تم تكميم النماذج إلى int8 ({report['fp32_size_mb']:.0f}MB → "
+                    f"{report['int8_size_mb']:.0f}MB)")
+        return report
+    
+    def _load_validation_file(self, path: str) -> Tuple[List[str], List[str]]:
+        """تحميل ملف التحقق (text, label)"""
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            data = pd.read_json(path, lines=path.endswith('.jsonl'))
+        else:
+            data = pd.read_csv(path)
+        data = data.dropna(subset=['text', 'label'])
+        return data['text'].astype(str).tolist(), data['label'].astype(str).tolist()
+    
+    def _evaluate_sentiment(self, texts: List[str], labels: List[str]) -> Tuple[List[str], Dict[str, float]]:
+        """دقة وزمن نموذج المشاعر الحالي على بيانات موسومة"""
+        # تجاوز التخزين المؤقت حتى تُحسب كل التنبؤات بالنموذج الحالي
+        self.cache.l1.clear()
+        start_time = time.perf_counter()
+        results = self.batch_analyze(texts, analysis_type='sentiment')
+        elapsed = time.perf_counter() - start_time
+        self.cache.l1.clear()
+        
+        predictions = [result['predicted_sentiment'] for result in results]
+        return predictions, {
+            'accuracy': accuracy_score(labels, predictions),
+            'latency_ms': elapsed * 1000 / max(len(texts), 1)
+        }
+    
     def preprocess_text(self, text: str) -> Dict[str, Any]:
-        """معالجة النص قبل التحليل"""
+        """
+        معالجة النص قبل التحليل
+        The encoding is padded only to the text's own length rather than
+        ``max_length``. In sliding-window mode a longer text becomes several
+        overlapping windows (rows of ``input_ids``) whose outputs are averaged.
+        """
         # معالجة النص
         processed = self.text_processor.process_text(text)
         
@@ -287,47 +514,94 @@ class ArabicSentimentAnalyzer:
             return None
         
         # ترميز النص
-        encoding = self.tokenizer(
-            processed['normalized_text'],
-            truncation=True,
-            padding='max_length',
-            max_length=self.config.max_length,
-            return_tensors='pt'
-        )
+        windows, _ = self._tokenize([processed['normalized_text']])
+        encoding = self.tokenizer.pad(windows, return_tensors='pt')
         
         return {
             'processed_text': processed,
             'encoding': encoding,
             'input_ids': encoding['input_ids'].to(self.device),
-            'attention_mask': encoding['attention_mask'].to(self.device)
+            'attention_mask': encoding['attention_mask'].to(self.device),
+            'sequence_info': self._sequence_info(windows, encoding['input_ids'].shape[1])
         }
     
+    def _tokenize(self, texts: List[str]) -> Tuple[List[Dict[str, List[int]]], List[int]]:
+        """
+        ترميز نصوص بدون حشو
+        Returns one encoding per window and the index of the text each window
+        belongs to; without sliding windows that is one truncated window per text.
+        """
+        kwargs = {'truncation': True, 'max_length': self.config.max_length}
+        if self.config.sliding_window:
+            kwargs.update(return_overflowing_tokens=True, stride=self.config.window_stride)
+        
+        encoded = self.tokenizer(texts, **kwargs)
+        owners = encoded.get('overflow_to_sample_mapping', range(len(texts)))
+        windows = [
+            {'input_ids': input_ids, 'attention_mask': attention_mask}
+            for input_ids, attention_mask in zip(encoded['input_ids'], encoded['attention_mask'])
+        ]
+        return windows, list(owners)
+    
+    @staticmethod
+    def _sequence_info(windows: List[Dict[str, List[int]]], padded_length: int) -> Dict[str, int]:
+        """أطوال التسلسل الفعلية لنص واحد (للتقارير)"""
+        lengths = [len(window['input_ids']) for window in windows]
+        return {
+            'sequence_length': max(lengths),
+            'padded_length': padded_length,
+            'windows': len(windows),
+            'tokens_processed': sum(lengths)
+        }
+    
+    def _analyze_encoded(self, preprocessed: Dict[str, Any],
+                         run_sentiment: bool, run_emotion: bool) -> Dict[str, Any]:
+        """تشغيل النماذج على نص واحد مُرمّز (بجميع نوافذه)"""
+        raw = self._infer(preprocessed['input_ids'], preprocessed['attention_mask'],
+                          run_sentiment, run_emotion)
+        return self._window_probabilities(raw)
+    
+    @staticmethod
+    def _window_probabilities(raw: Dict[str, Any]) -> Dict[str, Any]:
+        """متوسط مخرجات نوافذ نص واحد (في فضاء logits) ثم تحويلها إلى احتمالات"""
+        mean = {name: value.mean(dim=0) for name, value in raw.items() if isinstance(value, torch.Tensor)}
+        
+        outputs = {'shared_encoder': raw.get('shared_encoder', False)}
+        if 'sentiment_logits' in mean:
+            outputs['sentiment_probs'] = F.softmax(mean['sentiment_logits'], dim=-1)
+            outputs['confidence'] = mean['confidence'].item()
+        if 'emotion_logits' in mean:
+            outputs['emotion_presence'] = F.softmax(mean['emotion_logits'], dim=-1)[..., 1]
+            outputs['general_sentiment_probs'] = F.softmax(mean['general_sentiment_logits'], dim=-1)
+        return outputs
+    
     def analyze_sentiment(self, text: str, include_confidence: bool = True) -> Dict[str, Any]:
         """تحليل المشاعر الأساسي"""
         if not self.sentiment_model:
             raise ValueError("نموذج المشاعر غير محمل")
         
-        # التحقق من التخزين المؤقت
-        cache_key = f"sentiment_{hash(text)}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        
+        # التخزين المؤقت مع حساب واحد للطلبات المتزامنة لنفس النص
+        result = self.cache.get_or_compute_local(text, 'sentiment', lambda: self._compute_sentiment(text))
+        return result if include_confidence else dict(result, confidence=1.0)
+    
+    def _compute_sentiment(self, text: str) -> Dict[str, Any]:
+        """تحليل المشاعر عند عدم وجود النتيجة في التخزين المؤقت"""
         # معالجة النص
         preprocessed = self.preprocess_text(text)
         if not preprocessed:
             return self._empty_sentiment_result()
         
         # التحليل
-        with torch.no_grad():
-            outputs, confidence_scores = self.sentiment_model(
-                input_ids=preprocessed['input_ids'],
-                attention_mask=preprocessed['attention_mask']
-            )
+        outputs = self._analyze_encoded(preprocessed, True, False)
         
-        # تحويل النتائج
-        probabilities = F.softmax(outputs.logits, dim=-1)
-        predicted_class = torch.argmax(probabilities, dim=-1).item()
-        confidence = confidence_scores.squeeze().item() if include_confidence else 1.0
+        return self._build_sentiment_result(text, preprocessed['processed_text'], outputs['sentiment_probs'],
+                                            outputs['confidence'], preprocessed['sequence_info'])
+    
+    def _build_sentiment_result(self, text: str, processed: Dict[str, Any],
+                                probabilities: torch.Tensor, confidence: float,
+                                sequence_info: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """بناء نتيجة المشاعر من احتمالات نص واحد"""
+        predicted_class = torch.argmax(probabilities).item()
         
         # بناء النتيجة
         result = {
@@ -336,25 +610,24 @@ class ArabicSentimentAnalyzer:
             'confidence': confidence,
             'probabilities': {
                 label: prob.item() 
-                for label, prob in zip(self.sentiment_labels, probabilities.squeeze())
+                for label, prob in zip(self.sentiment_labels, probabilities)
             },
             'analysis_metadata': {
                 'model_used': 'arabic_bert_sentiment',
                 'processing_time': 0,  # يمكن إضافة قياس الوقت
                 'text_length': len(text),
-                'normalized_length': len(preprocessed['processed_text']['normalized_text'])
+                'normalized_length': len(processed['normalized_text']),
+                **(sequence_info or {})
             }
         }
         
         # إضافة تحليل إضافي من معالج النصوص
-        if preprocessed['processed_text']['emoji_analysis']:
-            result['emoji_sentiment'] = preprocessed['processed_text']['emoji_analysis']
+        if processed['emoji_analysis']:
+            result['emoji_sentiment'] = processed['emoji_analysis']
         
-        if preprocessed['processed_text']['dialect_analysis']:
-            result['dialect_info'] = preprocessed['processed_text']['dialect_analysis']
+        if processed['dialect_analysis']:
+            result['dialect_info'] = processed['dialect_analysis']
         
-        # حفظ في التخزين المؤقت
-        self.cache[cache_key] = result
         self.analysis_count += 1
         
         return result
@@ -364,29 +637,34 @@ class ArabicSentimentAnalyzer:
         if not self.emotion_model:
             raise ValueError("نموذج العواطف غير محمل")
         
+        return self.cache.get_or_compute_local(text, 'emotion', lambda: self._compute_emotions(text))
+    
+    def _compute_emotions(self, text: str) -> Dict[str, Any]:
+        """تحليل العواطف عند عدم وجود النتيجة في التخزين المؤقت"""
         # معالجة النص
         preprocessed = self.preprocess_text(text)
         if not preprocessed:
             return self._empty_emotion_result()
         
         # التحليل
-        with torch.no_grad():
-            outputs = self.emotion_model(
-                input_ids=preprocessed['input_ids'],
-                attention_mask=preprocessed['attention_mask']
-            )
+        outputs = self._analyze_encoded(preprocessed, False, True)
         
+        return self._build_emotion_result(text, outputs['emotion_presence'],
+                                          outputs['general_sentiment_probs'], preprocessed['sequence_info'])
+    
+    def _build_emotion_result(self, text: str, presence: torch.Tensor,
+                              sentiment_probs: torch.Tensor,
+                              sequence_info: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """بناء نتيجة العواطف من احتمالات نص واحد"""
         # استخراج النتائج
         emotion_results = {}
-        for emotion in self.emotion_labels:
-            probs = outputs['emotion_probs'][emotion].squeeze()
+        for emotion, probability in zip(self.emotion_labels, presence.tolist()):
             emotion_results[emotion] = {
-                'probability': probs[1].item(),  # احتمالية وجود العاطفة
-                'present': probs[1].item() > 0.5
+                'probability': probability,  # احتمالية وجود العاطفة
+                'present': probability > 0.5
             }
         
         # المشاعر العامة
-        sentiment_probs = outputs['sentiment_probs'].squeeze()
         general_sentiment = {
             'predicted': self.sentiment_labels[torch.argmax(sentiment_probs).item()],
             'probabilities': {
@@ -410,15 +688,49 @@ class ArabicSentimentAnalyzer:
             'analysis_metadata': {
                 'model_used': 'multidimensional_emotion',
                 'emotions_detected': sum(1 for v in emotion_results.values() if v['present']),
-                'text_length': len(text)
+                'text_length': len(text),
+                **(sequence_info or {})
             }
         }
     
     def comprehensive_analysis(self, text: str) -> Dict[str, Any]:
         """تحليل شامل للمشاعر والعواطف"""
-        sentiment_result = self.analyze_sentiment(text)
-        emotion_result = self.analyze_emotions(text)
+        if not self.sentiment_model:
+            raise ValueError("نموذج المشاعر غير محمل")
+        if not self.emotion_model:
+            raise ValueError("نموذج العواطف غير محمل")
+        
+        return self.cache.get_or_compute_local(text, 'comprehensive', lambda: self._compute_comprehensive(text))
+    
+    def _compute_comprehensive(self, text: str) -> Dict[str, Any]:
+        """تحليل شامل عند عدم وجود النتيجة في التخزين المؤقت"""
+        # معالجة النص مرة واحدة للنموذجين
+        preprocessed = self.preprocess_text(text)
+        if not preprocessed:
+            return self._build_comprehensive_result(
+                text, self._empty_sentiment_result(), self._empty_emotion_result()
+            )
         
+        outputs = self._analyze_encoded(preprocessed, True, True)
+        sentiment_result = self._build_sentiment_result(
+            text, preprocessed['processed_text'], outputs['sentiment_probs'],
+            outputs['confidence'], preprocessed['sequence_info']
+        )
+        emotion_result = self._build_emotion_result(
+            text, outputs['emotion_presence'], outputs['general_sentiment_probs'],
+            preprocessed['sequence_info']
+        )
+        # الجزءان متاحان مجاناً لطلبات المشاعر أو العواطف اللاحقة
+        self.cache.set_local(text, 'sentiment', sentiment_result)
+        self.cache.set_local(text, 'emotion', emotion_result)
+        
+        return self._build_comprehensive_result(text, sentiment_result, emotion_result,
+                                                outputs['shared_encoder'])
+    
+    def _build_comprehensive_result(self, text: str, sentiment_result: Dict[str, Any],
+                                    emotion_result: Dict[str, Any],
+                                    shared_encoder: bool = False) -> Dict[str, Any]:
+        """دمج نتيجتي المشاعر والعواطف"""
         # دمج النتائج
         comprehensive_result = {
             'text': text,
@@ -430,7 +742,9 @@ class ArabicSentimentAnalyzer:
                 'dominant_emotion': emotion_result['dominant_emotion'],
                 'emotional_intensity': emotion_result['emotional_intensity'],
                 'analysis_timestamp': datetime.now().isoformat()
-            }
+            },
+            # هل حُسب الرأسان من تمرير واحد عبر المشفر؟
+            'shared_encoder': shared_encoder
         }
         
         # إضافة تحليل متقدم
@@ -523,40 +837,228 @@ class ArabicSentimentAnalyzer:
             'analysis_metadata': {'error': 'text_processing_failed'}
         }
     
-    def batch_analyze(self, texts: List[str], analysis_type: str = 'comprehensive') -> List[Dict[str, Any]]:
-        """تحليل مجمع للنصوص"""
-        results = []
+    def batch_analyze(self, texts: List[str], analysis_type: str = 'comprehensive',
+                      use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        تحليل مجمع للنصوص
+        Texts are normalised and tokenised together, sorted by token length
+        and run through the models in mini-batches bounded by
+        ``max_batch_tokens`` (batch size × longest sequence), so each batch is
+        padded only to its own longest text. With sliding windows, every
+        window is batched separately and averaged back per text. Cached and
+        duplicate texts are analysed once; results are returned in input order.
+        With ``use_cache=False`` cached results are not read (fresh results
+        are still stored).
+        """
+        if not texts:
+            return []
+        
+        run_sentiment = analysis_type in ('sentiment', 'comprehensive')
+        run_emotion = analysis_type in ('emotion', 'comprehensive')
+        if run_sentiment and not self.sentiment_model:
+            raise ValueError("نموذج المشاعر غير محمل")
+        if run_emotion and not self.emotion_model:
+            raise ValueError("نموذج العواطف غير محمل")
         
-        for text in texts:
+        final_results: Dict[str, Dict[str, Any]] = {}
+        sentiment_results: Dict[str, Dict[str, Any]] = {}
+        emotion_results: Dict[str, Dict[str, Any]] = {}
+        
+        # النتائج المخزنة مسبقاً لا تحتاج تمريراً عبر النموذج
+        pending = []
+        for text in dict.fromkeys(texts):
+            cached = self.cache.get_local(text, analysis_type) if use_cache else None
+            if cached is not None:
+                final_results[text] = cached
+            else:
+                pending.append(text)
+        
+        processed, windows, owners = self._prepare_batch(pending)
+        window_outputs: List[Optional[Dict[str, torch.Tensor]]] = [None] * len(windows)
+        padded_lengths = [0] * len(windows)
+        shared_encoder = False
+        
+        for batch in self._length_batches(windows):
             try:
-                if analysis_type == 'sentiment':
-                    result = self.analyze_sentiment(text)
-                elif analysis_type == 'emotion':
-                    result = self.analyze_emotions(text)
-                else:
-                    result = self.comprehensive_analysis(text)
-                
-                results.append(result)
-                
+                outputs = self._run_batch([windows[i] for i in batch], run_sentiment, run_emotion)
             except Exception as e:
-                logger.error(f"خطأ في تحليل النص: {text[:50]}... - {str(e)}")
-                results.append(self._empty_sentiment_result() if analysis_type == 'sentiment' 
-                             else self._empty_emotion_result())
+                logger.error(f"خطأ في تحليل دفعة من {len(batch)} نص: {str(e)}")
+                continue
+            
+            shared_encoder = outputs.pop('shared_encoder')
+            padded_length = max(len(windows[i]['input_ids']) for i in batch)
+            for row, i in enumerate(batch):
+                window_outputs[i] = {name: value[row] for name, value in outputs.items()}
+                padded_lengths[i] = padded_length
+        
+        text_windows: List[List[int]] = [[] for _ in pending]
+        for window, owner in enumerate(owners):
+            text_windows[owner].append(window)
+        
+        for i, text in enumerate(pending):
+            # النصوص غير الصالحة
+            if not processed[i]['is_valid']:
+                if run_sentiment:
+                    sentiment_results[text] = self._empty_sentiment_result()
+                if run_emotion:
+                    emotion_results[text] = self._empty_emotion_result()
+                continue
+            
+            # فشل تحليل دفعة تحتوي إحدى نوافذ النص
+            text_window_ids = text_windows[i]
+            if any(window_outputs[w] is None for w in text_window_ids):
+                continue
+            
+            outputs = self._window_probabilities({
+                name: torch.stack([window_outputs[w][name] for w in text_window_ids])
+                for name in window_outputs[text_window_ids[0]]
+            })
+            sequence_info = self._sequence_info([windows[w] for w in text_window_ids],
+                                                max(padded_lengths[w] for w in text_window_ids))
+            
+            if run_sentiment:
+                result = self._build_sentiment_result(
+                    text, processed[i], outputs['sentiment_probs'], outputs['confidence'], sequence_info
+                )
+                sentiment_results[text] = result
+                self.cache.set_local(text, 'sentiment', result)
+            if run_emotion:
+                result = self._build_emotion_result(
+                    text, outputs['emotion_presence'], outputs['general_sentiment_probs'], sequence_info
+                )
+                emotion_results[text] = result
+                self.cache.set_local(text, 'emotion', result)
+        
+        for text in pending:
+            sentiment_result = sentiment_results.get(text)
+            emotion_result = emotion_results.get(text)
+            
+            if analysis_type == 'sentiment':
+                result = sentiment_result
+            elif analysis_type == 'emotion':
+                result = emotion_result
+            elif sentiment_result is not None and emotion_result is not None:
+                result = self._build_comprehensive_result(text, sentiment_result, emotion_result,
+                                                          shared_encoder)
+                self.cache.set_local(text, 'comprehensive', result)
+            else:
+                result = None
+            
+            if result is not None:
+                final_results[text] = result
+        
+        results = []
+        for text in texts:
+            result = final_results.get(text)
+            if result is None:
+                # فشل تحليل الدفعة التي تحتوي النص
+                result = (self._empty_sentiment_result() if analysis_type == 'sentiment'
+                          else self._empty_emotion_result())
+            results.append(result)
         
         return results
     
+    def _prepare_batch(self, texts: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, List[int]]], List[int]]:
+        """معالجة وترميز قائمة نصوص دفعة واحدة بدون حشو"""
+        processed = [self.text_processor.process_text(text) for text in texts]
+        
+        valid = [i for i, item in enumerate(processed) if item['is_valid']]
+        if not valid:
+            return processed, [], []
+        
+        windows, window_owners = self._tokenize([processed[i]['normalized_text'] for i in valid])
+        return processed, windows, [valid[owner] for owner in window_owners]
+    
+    def _length_batches(self, windows: List[Dict[str, List[int]]]) -> List[List[int]]:
+        """تجميع النوافذ حسب الطول في دفعات ضمن ميزانية الرموز"""
+        order = sorted(range(len(windows)), key=lambda i: len(windows[i]['input_ids']))
+        
+        batches, current = [], []
+        for i in order:
+            # الترتيب تصاعدي، فالنافذة الحالية هي الأطول في الدفعة
+            length = len(windows[i]['input_ids'])
+            if current and ((len(current) + 1) * length > self.config.max_batch_tokens or
+                            len(current) >= self.config.max_inference_batch_size):
+                batches.append(current)
+                current = []
+            current.append(i)
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _run_batch(self, encodings: List[Dict[str, List[int]]],
+                   run_sentiment: bool, run_emotion: bool) -> Dict[str, Any]:
+        """تمرير دفعة واحدة (محشوة لأطول نافذة فيها) عبر النماذج المطلوبة"""
+        padded = self.tokenizer.pad(encodings, return_tensors='pt')
+        return self._infer(padded['input_ids'].to(self.device),
+                           padded['attention_mask'].to(self.device),
+                           run_sentiment, run_emotion)
+    
+    def _infer(self, input_ids: torch.Tensor, attention_mask: torch.Tensor,
+               run_sentiment: bool, run_emotion: bool) -> Dict[str, Any]:
+        """
+        تشغيل رأسي المشاعر و/أو العواطف على دفعة
+        With a shared encoder and both heads requested, BERT runs once and
+        both heads read its output; otherwise each model runs its own pass.
+        Returns per-row logits (and confidence) so windows can be averaged
+        before the softmax.
+        """
+        shared = run_sentiment and run_emotion and self.shared_encoder
+        
+        outputs = {'shared_encoder': shared}
+        with torch.no_grad():
+            if shared:
+                encoder_outputs = self.sentiment_model.bert(
+                    input_ids=input_ids, attention_mask=attention_mask,
+                    output_hidden_states=True, return_dict=True
+                )
+                logits, confidence_scores = self.sentiment_model.classify(
+                    self.sentiment_model.pool(encoder_outputs.hidden_states)
+                )
+                emotion_outputs = self.emotion_model.classify(encoder_outputs.last_hidden_state[:, 0, :])
+            else:
+                if run_sentiment:
+                    sentiment_outputs, confidence_scores = self.sentiment_model(
+                        input_ids=input_ids, attention_mask=attention_mask
+                    )
+                    logits = sentiment_outputs.logits
+                if run_emotion:
+                    emotion_outputs = self.emotion_model(input_ids=input_ids, attention_mask=attention_mask)
+            
+            if run_sentiment:
+                outputs['sentiment_logits'] = logits.cpu()
+                outputs['confidence'] = confidence_scores.squeeze(-1).cpu()
+            if run_emotion:
+                # (batch_size, num_emotions, 2)
+                outputs['emotion_logits'] = torch.stack(
+                    [emotion_outputs['emotion_logits'][emotion] for emotion in self.emotion_labels], dim=1
+                ).cpu()
+                outputs['general_sentiment_logits'] = emotion_outputs['sentiment_logits'].cpu()
+        
+        return outputs
+    
     def get_model_info(self) -> Dict[str, Any]:
         """معلومات النماذج المحملة"""
         return {
             'sentiment_model_loaded': self.sentiment_model is not None,
             'emotion_model_loaded': self.emotion_model is not None,
+            'shared_encoder': self.shared_encoder,
+            'inference_backend': self.inference_backend,
+            'quantization_report': self.quantization_report,
+            'torch_threads': {
+                'intra_op': torch.get_num_threads(),
+                'inter_op': torch.get_num_interop_threads()
+            },
             'model_config': self.config.__dict__,
             'supported_labels': {
                 'sentiment': self.sentiment_labels,
                 'emotions': self.emotion_labels
             },
             'analysis_count': self.analysis_count,
+            'model_version': self.model_version,
             'cache_size': len(self.cache),
+            'cache_stats': self.cache.stats(),
             'device': str(self.device)
         }
 
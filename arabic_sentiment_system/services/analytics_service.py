@@ -43,13 +43,165 @@ class AnalyticsMetrics:
         if self.daily_trends is None:
             self.daily_trends = {}
 
+class AnalyticsBatch:
+    """
+    تجميع محلي لعدادات التحليلات قبل كتابتها
+    Accumulates the same counters ``record_analysis`` used to write one
+    result at a time (totals, sentiment/emotion/dialect/hourly counts,
+    confidence and processing-time sums, daily sentiment, special events),
+    so a whole batch or time tick is flushed as a single Redis pipeline.
+    """
+    
+    def __init__(self):
+        self.total = 0
+        self.sentiment_counts = Counter()
+        self.emotion_counts = Counter()
+        self.dialect_counts = Counter()
+        self.hourly_counts = Counter()
+        self.daily_sentiment: Dict[str, Counter] = defaultdict(Counter)
+        self.confidence_sum = 0.0
+        self.processing_time_sum = 0.0
+        self.events: Dict[str, List[str]] = defaultdict(list)
+    
+    def __len__(self) -> int:
+        return self.total
+    
+    def add(self, analysis_result: Dict[str, Any], timestamp: datetime):
+        """إضافة نتيجة تحليل إلى العدادات المحلية"""
+        # استخراج البيانات من نتيجة التحليل
+        sentiment_data = analysis_result.get('sentiment_analysis', {})
+        emotion_data = analysis_result.get('emotion_analysis', {})
+        metadata = analysis_result.get('summary', {})
+        
+        # الأحداث أولاً: نتيجة غير صالحة لا تترك العدادات محدثة جزئياً
+        events = special_events(analysis_result, timestamp)
+        
+        self.total += 1
+        
+        # توزيع المشاعر
+        sentiment = sentiment_data.get('predicted_sentiment', 'neutral')
+        self.sentiment_counts[sentiment] += 1
+        
+        # توزيع العواطف
+        if emotion_data and 'emotions' in emotion_data:
+            for emotion, data in emotion_data['emotions'].items():
+                if data.get('present', False):
+                    self.emotion_counts[emotion] += 1
+        
+        # مجموع الثقة وزمن المعالجة
+        confidence = sentiment_data.get('confidence', 0.0)
+        if confidence > 0:
+            self.confidence_sum += confidence
+        
+        processing_time = metadata.get('processing_time', 0.0)
+        if processing_time > 0:
+            self.processing_time_sum += processing_time
+        
+        # توزيع اللهجات
+        dialect_info = sentiment_data.get('dialect_info', {})
+        if dialect_info:
+            self.dialect_counts[dialect_info.get('predicted_dialect', 'unknown')] += 1
+        
+        # التوزيع الساعي والاتجاهات اليومية
+        self.hourly_counts[str(timestamp.hour)] += 1
+        self.daily_sentiment[timestamp.strftime('%Y-%m-%d')][sentiment] += 1
+        
+        for event_key, event_data in events:
+            self.events[event_key].append(event_data)
+    
+    def merge(self, other: 'AnalyticsBatch'):
+        """دمج دفعة أخرى (لإعادة دفعة فشلت كتابتها إلى الدفعة المعلقة)"""
+        self.total += other.total
+        self.sentiment_counts.update(other.sentiment_counts)
+        self.emotion_counts.update(other.emotion_counts)
+        self.dialect_counts.update(other.dialect_counts)
+        self.hourly_counts.update(other.hourly_counts)
+        for date_str, counts in other.daily_sentiment.items():
+            self.daily_sentiment[date_str].update(counts)
+        self.confidence_sum += other.confidence_sum
+        self.processing_time_sum += other.processing_time_sum
+        for event_key, events in other.events.items():
+            self.events[event_key].extend(events)
+    
+    def write(self, pipe, keys: Dict[str, str]):
+        """إضافة جميع العدادات المجمعة إلى خط أنابيب Redis"""
+        pipe.incrby(keys['total_analyses'], self.total)
+        
+        for key, counts in ((keys['sentiment_counts'], self.sentiment_counts),
+                            (keys['emotion_counts'], self.emotion_counts),
+                            (keys['dialect_counts'], self.dialect_counts),
+                            (keys['hourly_counts'], self.hourly_counts)):
+            for field, count in counts.items():
+                pipe.hincrby(key, field, count)
+        
+        if self.confidence_sum > 0:
+            pipe.incrbyfloat(keys['confidence_sum'], self.confidence_sum)
+        if self.processing_time_sum > 0:
+            pipe.incrbyfloat(keys['processing_time_sum'], self.processing_time_sum)
+        
+        for date_str, counts in self.daily_sentiment.items():
+            daily_key = f"{keys['daily_sentiment']}:{date_str}"
+            for sentiment, count in counts.items():
+                pipe.hincrby(daily_key, sentiment, count)
+            pipe.expire(daily_key, 86400 * 30)  # انتهاء صلاحية بعد 30 يوم
+        
+        for event_key, events in self.events.items():
+            pipe.lpush(event_key, *events)
+            pipe.expire(event_key, 86400 * 7)  # احتفاظ لمدة أسبوع
+
+def special_events(analysis_result: Dict[str, Any], timestamp: datetime) -> List[Tuple[str, str]]:
+    """الأحداث الخاصة لنتيجة تحليل: (مفتاح القائمة، بيانات الحدث)"""
+    sentiment_data = analysis_result.get('sentiment_analysis', {})
+    emotion_data = analysis_result.get('emotion_analysis', {})
+    advanced_data = analysis_result.get('advanced_analysis', {})
+    date_str = timestamp.strftime('%Y-%m-%d')
+    text_preview = analysis_result.get('text', '')[:100]
+    events = []
+    
+    # كشف المشاعر القوية
+    if sentiment_data.get('confidence', 0.0) > 0.9:
+        events.append((f"events:high_confidence:{date_str}", json.dumps({
+            'timestamp': timestamp.isoformat(),
+            'sentiment': sentiment_data.get('predicted_sentiment'),
+            'confidence': sentiment_data['confidence'],
+            'text_preview': text_preview
+        })))
+    
+    # كشف العواطف المختلطة
+    if emotion_data and emotion_data.get('emotional_intensity', 0.0) > 0.8:
+        events.append((f"events:high_emotion:{date_str}", json.dumps({
+            'timestamp': timestamp.isoformat(),
+            'dominant_emotion': emotion_data.get('dominant_emotion'),
+            'intensity': emotion_data['emotional_intensity'],
+            'text_preview': text_preview
+        })))
+    
+    # كشف التناقضات
+    if advanced_data and advanced_data.get('emotional_coherence', 0.0) > 0.5:  # تناقض عالي
+        events.append((f"events:contradiction:{date_str}", json.dumps({
+            'timestamp': timestamp.isoformat(),
+            'sentiment': sentiment_data.get('predicted_sentiment'),
+            'dominant_emotion': (emotion_data or {}).get('dominant_emotion'),
+            'coherence_score': advanced_data['emotional_coherence'],
+            'text_preview': text_preview
+        })))
+    
+    return events
+
 class SentimentAnalyticsService:
     """خدمة تحليلات المشاعر المتقدمة"""
     
-    def __init__(self, redis_client: redis.Redis = None, db_session: AsyncSession = None):
+    def __init__(self, redis_client: redis.Redis = None, db_session: AsyncSession = None,
+                 flush_interval: float = 1.0, max_pending: int = 10000):
         self.redis_client = redis_client
         self.db_session = db_session
         
+        # النتائج المعلقة حتى نبضة التفريغ التالية
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = AnalyticsBatch()
+        self._flusher: Optional[asyncio.Task] = None
+        
         # مفاتيح Redis للإحصائيات
         self.keys = {
             'total_analyses': 'analytics:total_analyses',
@@ -71,138 +223,96 @@ class SentimentAnalyticsService:
         
     async def record_analysis(self, analysis_result: Dict[str, Any]) -> bool:
         """تسجيل نتيجة تحليل في الإحصائيات"""
+        return await self.record_analyses_bulk([analysis_result])
+    
+    async def record_analyses_bulk(self, analysis_results: List[Dict[str, Any]],
+                                   timestamp: Optional[datetime] = None) -> bool:
+        """
+        تسجيل مجموعة نتائج في خط أنابيب Redis واحد
+        Counters are summed locally first, so a batch costs one round trip
+        regardless of its size; the keys are the same ones
+        ``get_analytics_summary`` reads. Malformed results are logged and
+        skipped so the rest of the batch is still recorded.
+        """
+        if not self.redis_client or not analysis_results:
+            return False
+        
+        batch = AnalyticsBatch()
+        now = timestamp or datetime.now()
+        for analysis_result in analysis_results:
+            try:
+                batch.add(analysis_result, now)
+            except Exception as e:
+                logger.warning(f"⚠️ تجاهل نتيجة تحليل غير صالحة للإحصائيات: {str(e)}")
+        if not len(batch):
+            return False
+        return await self._flush_batch(batch)
+    
+    def enqueue_analysis(self, analysis_result: Dict[str, Any]):
+        """
+        إضافة نتيجة إلى الدفعة المعلقة (تُكتب مع نبضة التفريغ التالية)
+        A no-op without Redis, since nothing would ever flush the batch; a
+        malformed result is logged and skipped rather than failing the
+        request that produced it.
+        """
+        if not self.redis_client:
+            return
+        if len(self._pending) >= self.max_pending:
+            logger.warning(f"⚠️ الدفعة المعلقة ممتلئة ({self.max_pending})، تجاهل نتيجة التحليل")
+            return
+        try:
+            self._pending.add(analysis_result, datetime.now())
+        except Exception as e:
+            logger.warning(f"⚠️ تجاهل نتيجة تحليل غير صالحة للإحصائيات: {str(e)}")
+    
+    async def flush_pending(self) -> bool:
+        """كتابة الدفعة المعلقة"""
+        if not len(self._pending):
+            return True
+        batch, self._pending = self._pending, AnalyticsBatch()
+        return await self._flush_batch(batch)
+    
+    async def _flush_batch(self, batch: AnalyticsBatch) -> bool:
+        if not self.redis_client:
+            return False
         try:
-            if not self.redis_client:
-                return False
-            
-            # استخراج البيانات من نتيجة التحليل
-            sentiment_data = analysis_result.get('sentiment_analysis', {})
-            emotion_data = analysis_result.get('emotion_analysis', {})
-            metadata = analysis_result.get('summary', {})
-            
-            # الحصول على الوقت الحالي
-            now = datetime.now()
-            hour = now.hour
-            date_str = now.strftime('%Y-%m-%d')
-            
-            # استخدام pipeline لتحسين الأداء
             pipe = self.redis_client.pipeline()
-            
-            # تحديث العدادات الأساسية
-            pipe.incr(self.keys['total_analyses'])
-            
-            # تحديث توزيع المشاعر
-            sentiment = sentiment_data.get('predicted_sentiment', 'neutral')
-            pipe.hincrby(self.keys['sentiment_counts'], sentiment, 1)
-            
-            # تحديث توزيع العواطف
-            if emotion_data and 'emotions' in emotion_data:
-                for emotion, data in emotion_data['emotions'].items():
-                    if data.get('present', False):
-                        pipe.hincrby(self.keys['emotion_counts'], emotion, 1)
-            
-            # تحديث مجموع الثقة
-            confidence = sentiment_data.get('confidence', 0.0)
-            if confidence > 0:
-                pipe.incrbyfloat(self.keys['confidence_sum'], confidence)
-            
-            # تحديث زمن المعالجة
-            processing_time = metadata.get('processing_time', 0.0)
-            if processing_time > 0:
-                pipe.incrbyfloat(self.keys['processing_time_sum'], processing_time)
-            
-            # تحديث توزيع اللهجات
-            dialect_info = sentiment_data.get('dialect_info', {})
-            if dialect_info:
-                dialect = dialect_info.get('predicted_dialect', 'unknown')
-                pipe.hincrby(self.keys['dialect_counts'], dialect, 1)
-            
-            # تحديث التوزيع الساعي
-            pipe.hincrby(self.keys['hourly_counts'], str(hour), 1)
-            
-            # تحديث الاتجاهات اليومية
-            daily_key = f"{self.keys['daily_sentiment']}:{date_str}"
-            pipe.hincrby(daily_key, sentiment, 1)
-            pipe.expire(daily_key, 86400 * 30)  # انتهاء صلاحية بعد 30 يوم
-            
-            # تنفيذ العمليات
+            batch.write(pipe, self.keys)
             await pipe.execute()
-            
-            # تسجيل أحداث خاصة
-            await self._record_special_events(analysis_result, now)
-            
             return True
-            
         except Exception as e:
-            logger.error(f"❌ فشل في تسجيل التحليل: {str(e)}")
+            self._retain(batch)
+            logger.error(f"❌ فشل في تسجيل {len(batch)} تحليل: {str(e)}")
             return False
     
-    async def _record_special_events(self, analysis_result: Dict[str, Any], timestamp: datetime):
-        """تسجيل الأحداث الخاصة والتنبيهات"""
-        try:
-            sentiment_data = analysis_result.get('sentiment_analysis', {})
-            emotion_data = analysis_result.get('emotion_analysis', {})
-            advanced_data = analysis_result.get('advanced_analysis', {})
-            
-            # كشف المشاعر القوية
-            confidence = sentiment_data.get('confidence', 0.0)
-            if confidence > 0.9:
-                await self._record_high_confidence_event(analysis_result, timestamp)
-            
-            # كشف العواطف المختلطة
-            if emotion_data and 'emotional_intensity' in emotion_data:
-                intensity = emotion_data['emotional_intensity']
-                if intensity > 0.8:
-                    await self._record_high_emotion_event(analysis_result, timestamp)
-            
-            # كشف التناقضات
-            if advanced_data and 'emotional_coherence' in advanced_data:
-                coherence = advanced_data['emotional_coherence']
-                if coherence > 0.5:  # تناقض عالي
-                    await self._record_contradiction_event(analysis_result, timestamp)
-            
-        except Exception as e:
-            logger.warning(f"⚠️ فشل في تسجيل الأحداث الخاصة: {str(e)}")
+    def _retain(self, batch: AnalyticsBatch):
+        """إعادة دفعة فشلت كتابتها إلى الدفعة المعلقة لتُعاد مع النبضة التالية (ضمن الحد الأقصى)"""
+        if len(self._pending) + len(batch) > self.max_pending:
+            logger.error(f"❌ تجاوز حد الدفعة المعلقة ({self.max_pending})، إسقاط {len(batch)} تحليل")
+            return
+        batch.merge(self._pending)
+        self._pending = batch
     
-    async def _record_high_confidence_event(self, analysis_result: Dict[str, Any], timestamp: datetime):
-        """تسجيل حدث ثقة عالية"""
-        event_key = f"events:high_confidence:{timestamp.strftime('%Y-%m-%d')}"
-        event_data = {
-            'timestamp': timestamp.isoformat(),
-            'sentiment': analysis_result['sentiment_analysis']['predicted_sentiment'],
-            'confidence': analysis_result['sentiment_analysis']['confidence'],
-            'text_preview': analysis_result.get('text', '')[:100]
-        }
-        
-        await self.redis_client.lpush(event_key, json.dumps(event_data))
-        await self.redis_client.expire(event_key, 86400 * 7)  # احتفاظ لمدة أسبوع
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_pending()
     
-    async def _record_high_emotion_event(self, analysis_result: Dict[str, Any], timestamp: datetime):
-        """تسجيل حدث عاطفة قوية"""
-        event_key = f"events:high_emotion:{timestamp.strftime('%Y-%m-%d')}"
-        event_data = {
-            'timestamp': timestamp.isoformat(),
-            'dominant_emotion': analysis_result['emotion_analysis']['dominant_emotion'],
-            'intensity': analysis_result['emotion_analysis']['emotional_intensity'],
-            'text_preview': analysis_result.get('text', '')[:100]
-        }
-        
-        await self.redis_client.lpush(event_key, json.dumps(event_data))
-        await self.redis_client.expire(event_key, 86400 * 7)
+    async def start(self):
+        """بدء التفريغ الدوري للدفعة المعلقة"""
+        if self._flusher is None and self.redis_client:
+            self._flusher = asyncio.get_event_loop().create_task(self._flush_loop())
     
-    async def _record_contradiction_event(self, analysis_result: Dict[str, Any], timestamp: datetime):
-        """تسجيل حدث تناقض عاطفي"""
-        event_key = f"events:contradiction:{timestamp.strftime('%Y-%m-%d')}"
-        event_data = {
-            'timestamp': timestamp.isoformat(),
-            'sentiment': analysis_result['sentiment_analysis']['predicted_sentiment'],
-            'dominant_emotion': analysis_result['emotion_analysis']['dominant_emotion'],
-            'coherence_score': analysis_result['advanced_analysis']['emotional_coherence'],
-            'text_preview': analysis_result.get('text', '')[:100]
-        }
-        
-        await self.redis_client.lpush(event_key, json.dumps(event_data))
-        await self.redis_client.expire(event_key, 86400 * 7)
+    async def stop(self):
+        """إيقاف التفريغ الدوري وكتابة ما تبقى"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush_pending()
     
     async def get_analytics_summary(self, time_range: str = "24h") -> AnalyticsMetrics:
         """الحصول على ملخص التحليلات"""
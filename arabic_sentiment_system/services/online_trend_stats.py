@@ -0,0 +1,242 @@
+# إحصائيات متدفقة لكشف شذوذ الاتجاهات والتنبؤ بها
+# Streaming (Exponentially Weighted) Statistics for Trend Anomalies and Forecasts
+
+import json
+import math
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EWStats:
+    """
+    متوسط وتباين موزونان أسياً بالزمن لسلسلة واحدة
+    Sums are decayed by ``0.5 ** (elapsed / half_life)`` before every
+    update, so the statistics describe roughly the last few half-lives.
+    Each update is O(1) and the state is only a handful of floats. A Holt
+    level/trend pair (``alpha``/``beta``, per observation) drives
+    forecasting, and the mean inter-arrival time is smoothed so that
+    forecasts can be placed on the time axis.
+    """
+
+    __slots__ = ('half_life', 'alpha', 'beta', 'count', 'weight', 'sum', 'sum_sq',
+                 'level', 'trend', 'interval', 'last_time')
+
+    def __init__(self, half_life: float, alpha: float = 0.1, beta: float = 0.05):
+        self.half_life = half_life
+        self.alpha = alpha
+        self.beta = beta
+        self.count = 0
+        self.weight = 0.0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.level: Optional[float] = None
+        self.trend = 0.0
+        self.interval: Optional[float] = None
+        self.last_time: Optional[float] = None
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.weight if self.weight > 0 else 0.0
+
+    @property
+    def std(self) -> float:
+        if self.weight <= 0:
+            return 0.0
+        mean = self.mean
+        return math.sqrt(max(self.sum_sq / self.weight - mean * mean, 0.0))
+
+    def z_score(self, value: float) -> Optional[float]:
+        """الانحراف المعياري للقيمة عن التوزيع الحالي (None إذا كان التباين صفراً)"""
+        std = self.std
+        return (value - self.mean) / std if std > 0 else None
+
+    def update(self, value: float, timestamp: float):
+        if self.last_time is not None:
+            elapsed = max(timestamp - self.last_time, 0.0)
+            decay = 0.5 ** (elapsed / self.half_life)
+            self.weight *= decay
+            self.sum *= decay
+            self.sum_sq *= decay
+            self.interval = elapsed if self.interval is None else \
+                self.interval + self.alpha * (elapsed - self.interval)
+        self.last_time = max(timestamp, self.last_time or timestamp)
+
+        self.count += 1
+        self.weight += 1.0
+        self.sum += value
+        self.sum_sq += value * value
+
+        # تنعيم هولت (مستوى + ميل)
+        if self.level is None:
+            self.level = value
+        else:
+            previous = self.level
+            self.level = self.alpha * value + (1 - self.alpha) * (previous + self.trend)
+            self.trend = self.beta * (self.level - previous) + (1 - self.beta) * self.trend
+
+    def forecast(self, steps: int) -> List[Tuple[float, float]]:
+        """(الوقت، القيمة المتوقعة) للنقاط التالية"""
+        if self.level is None:
+            return []
+        interval = self.interval or 3600.0
+        return [(self.last_time + interval * step, self.level + self.trend * step)
+                for step in range(1, steps + 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'EWStats':
+        stats = cls(data['half_life'], data['alpha'], data['beta'])
+        for slot in cls.__slots__:
+            if slot in data:
+                setattr(stats, slot, data[slot])
+        return stats
+
+
+class StreamingTrendDetector:
+    """
+    كشف الشذوذ والتنبؤ بالاتجاهات دون قراءة نطاقات زمنية
+    One ``EWStats`` is kept per scope: ``all`` plus each category, and
+    with ``track_emotions`` also ``<scope>:emotion:<name>``. ``update``
+    scores a point against the statistics *before* folding it in, so a
+    spike cannot mask itself. It returns the anomalies it found.
+
+    State lives in process. ``persist`` writes it to one Redis hash at most
+    every ``persist_interval`` seconds; ``load`` restores it after a restart.
+    """
+
+    def __init__(self, half_life_hours: float = 6.0, threshold: float = 2.0,
+                 min_points: int = 10, track_emotions: bool = True,
+                 alpha: float = 0.1, beta: float = 0.05,
+                 redis_key: str = 'trends:online_stats', persist_interval: float = 30.0):
+        self.half_life = half_life_hours * 3600
+        self.threshold = threshold
+        self.min_points = min_points
+        self.track_emotions = track_emotions
+        self.alpha = alpha
+        self.beta = beta
+        self.redis_key = redis_key
+        self.persist_interval = persist_interval
+
+        self.streams: Dict[str, EWStats] = {}
+        self._dirty: set = set()
+        self._last_persist = time.monotonic()
+        self._loaded = False
+
+    def stream(self, scope: str) -> EWStats:
+        stats = self.streams.get(scope)
+        if stats is None:
+            stats = self.streams[scope] = EWStats(self.half_life, self.alpha, self.beta)
+        return stats
+
+    def _observe(self, scope: str, value: float, timestamp: float,
+                 anomaly_type: str) -> Optional[Dict[str, Any]]:
+        stats = self.stream(scope)
+        anomaly = None
+        if stats.count >= self.min_points:
+            z_score = stats.z_score(value)
+            if z_score is not None and abs(z_score) > self.threshold:
+                anomaly = {
+                    'type': anomaly_type,
+                    'scope': scope,
+                    'value': value,
+                    'z_score': z_score,
+                    'baseline_mean': stats.mean,
+                    'baseline_std': stats.std,
+                }
+        stats.update(value, timestamp)
+        self._dirty.add(scope)
+        return anomaly
+
+    def update(self, timestamp: datetime, sentiment_score: float,
+               emotion_scores: Dict[str, float], category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """تحديث الإحصائيات بنقطة جديدة وإرجاع الشذوذات المكتشفة"""
+        epoch = timestamp.timestamp()
+        anomalies = []
+        for scope in ['all'] + ([category] if category else []):
+            anomaly = self._observe(scope, sentiment_score, epoch, 'sentiment_spike')
+            if anomaly:
+                anomalies.append(anomaly)
+            if self.track_emotions:
+                for emotion, score in emotion_scores.items():
+                    anomaly = self._observe(f"{scope}:emotion:{emotion}", score, epoch, 'emotion_spike')
+                    if anomaly:
+                        anomaly['emotion'] = emotion
+                        anomalies.append(anomaly)
+        return anomalies
+
+    def forecast(self, scope: str = 'all', steps: int = 5) -> Dict[str, Any]:
+        """تنبؤات EWMA/هولت لنطاق (بنفس شكل تنبؤات الانحدار الخطي)"""
+        stats = self.streams.get(scope)
+        if stats is None or stats.count < self.min_points:
+            return {'error': 'insufficient_data_for_prediction'}
+
+        # الثقة تنخفض مع التقلب وتزيد مع حجم البيانات الفعلي
+        confidence = max(0.1, min(1.0, 1.0 - stats.std)) * min(1.0, stats.weight / (2 * self.min_points))
+        return {
+            'predictions': [
+                {
+                    'timestamp': datetime.fromtimestamp(at).isoformat(),
+                    'predicted_sentiment': value,
+                    'confidence': max(0.1, confidence)
+                }
+                for at, value in stats.forecast(steps)
+            ],
+            'model_stats': {
+                'model': 'holt_ewma',
+                'level': stats.level,
+                'trend': stats.trend,
+                'ewm_mean': stats.mean,
+                'ewm_std': stats.std,
+                'effective_points': stats.weight,
+                'half_life_hours': self.half_life / 3600
+            },
+            'confidence_level': confidence
+        }
+
+    # ----------------------------- الحفظ في Redis -----------------------------
+
+    async def load(self, redis_client: Any):
+        """استعادة الحالة المحفوظة (مرة واحدة)"""
+        if self._loaded or redis_client is None:
+            return
+        self._loaded = True
+        try:
+            saved = await redis_client.hgetall(self.redis_key)
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في استعادة إحصائيات الاتجاه: {str(e)}")
+            return
+        for scope, raw in saved.items():
+            scope = scope.decode() if isinstance(scope, bytes) else scope
+            if scope in self.streams:
+                continue
+            try:
+                self.streams[scope] = EWStats.from_dict(json.loads(raw))
+            except (ValueError, KeyError, TypeError):
+                continue
+        logger.info(f"📥 استعادة {len(saved)} سلسلة إحصائيات اتجاه")
+
+    def persist(self, pipe, force: bool = False):
+        """إضافة الحالات المتغيرة إلى خط الأنابيب إذا حان وقت الحفظ"""
+        now = time.monotonic()
+        if not self._dirty or (not force and now - self._last_persist < self.persist_interval):
+            return
+        pipe.hset(self.redis_key, mapping={
+            scope: json.dumps(self.streams[scope].to_dict()) for scope in self._dirty
+        })
+        self._dirty.clear()
+        self._last_persist = now
+
+    def stats(self) -> Dict[str, Any]:
+        overall = self.streams.get('all')
+        return {
+            'streams': len(self.streams),
+            'points': overall.count if overall else 0,
+            'ewm_mean': overall.mean if overall else 0.0,
+            'ewm_std': overall.std if overall else 0.0,
+        }
@@ -19,6 +19,9 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.utils import PlotlyJSONEncoder
 
+from .trend_rollup import TrendRollupStore, TrendBuckets
+from .online_trend_stats import StreamingTrendDetector
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -67,6 +70,110 @@ class TrendAnalysis:
             'confidence_interval': self.confidence_interval
         }
 
+def local_datetime64(epochs: np.ndarray) -> np.ndarray:
+    """تحويل ثواني epoch إلى datetime64 بالتوقيت المحلي (مثل datetime.fromtimestamp)"""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if not len(epochs):
+        return epochs.astype('datetime64[s]')
+    
+    def offset(epoch) -> int:
+        return int(datetime.fromtimestamp(int(epoch)).astimezone().utcoffset().total_seconds())
+    
+    # فرق توقيت واحد ما لم تعبر النافذة تغيير التوقيت الصيفي
+    first, last = offset(epochs[0]), offset(epochs[-1])
+    offsets = first if first == last else np.array([offset(epoch) for epoch in epochs])
+    return (epochs + offsets).astype('datetime64[s]')
+
+@dataclass
+class TrendSeries:
+    """
+    سلسلة اتجاه بأعمدة NumPy
+    One row per point (or rollup bucket), sorted by time: local
+    ``datetime64`` timestamps, sentiment scores, volumes, confidences and an
+    ``(n, len(emotions))`` emotion matrix where 0 means the emotion was
+    absent. ``TrendPoint`` objects are only built for the rows that appear
+    in results.
+    """
+    timestamps: np.ndarray
+    scores: np.ndarray
+    volumes: np.ndarray
+    confidences: np.ndarray
+    emotions: List[str]
+    emotion_matrix: np.ndarray
+    category: Optional[str] = None
+    
+    def __len__(self) -> int:
+        return len(self.scores)
+    
+    @property
+    def seconds(self) -> np.ndarray:
+        return self.timestamps.astype(np.int64).astype(np.float64)
+    
+    @property
+    def hours(self) -> np.ndarray:
+        return self.timestamps.astype('datetime64[h]').astype(np.int64) % 24
+    
+    @property
+    def weekdays(self) -> np.ndarray:
+        # 1970-01-01 كان يوم خميس (الاثنين = 0)
+        return (self.timestamps.astype('datetime64[D]').astype(np.int64) + 3) % 7
+    
+    def emotion(self, name: str) -> np.ndarray:
+        if name in self.emotions:
+            return self.emotion_matrix[:, self.emotions.index(name)]
+        return np.zeros(len(self))
+    
+    def point(self, i: int) -> TrendPoint:
+        row = self.emotion_matrix[i]
+        return TrendPoint(
+            timestamp=self.timestamps[i].item(),
+            sentiment_score=float(self.scores[i]),
+            emotion_scores={emotion: float(row[j]) for j, emotion in enumerate(self.emotions) if row[j] > 0},
+            volume=int(self.volumes[i]),
+            confidence=float(self.confidences[i]),
+            category=self.category
+        )
+    
+    @classmethod
+    def empty(cls, emotions: List[str], category: Optional[str] = None) -> 'TrendSeries':
+        return cls(np.empty(0, dtype='datetime64[s]'), np.empty(0), np.empty(0, dtype=np.int64),
+                   np.empty(0), list(emotions), np.empty((0, len(emotions))), category)
+    
+    @classmethod
+    def from_points(cls, points: List[TrendPoint], emotions: List[str],
+                    category: Optional[str] = None) -> 'TrendSeries':
+        """بناء سلسلة من نقاط اتجاه (مثل البيانات التاريخية)"""
+        points = sorted(points, key=lambda p: p.timestamp)
+        return cls(
+            timestamps=np.array([p.timestamp for p in points], dtype='datetime64[s]'),
+            scores=np.array([p.sentiment_score for p in points], dtype=np.float64),
+            volumes=np.array([p.volume for p in points], dtype=np.int64),
+            confidences=np.array([p.confidence for p in points], dtype=np.float64),
+            emotions=list(emotions),
+            emotion_matrix=np.array([[p.emotion_scores.get(emotion, 0.0) for emotion in emotions]
+                                     for p in points], dtype=np.float64).reshape(len(points), len(emotions)),
+            category=category
+        )
+    
+    @classmethod
+    def from_buckets(cls, buckets: TrendBuckets, emotions: List[str],
+                     category: Optional[str] = None) -> 'TrendSeries':
+        """بناء سلسلة من فترات مجمعة (صف لكل فترة، الحجم = عدد التحليلات)"""
+        count = buckets.count
+        matrix = np.zeros((len(buckets), len(emotions)))
+        for j, emotion in enumerate(emotions):
+            if emotion in buckets.emotion_sums:
+                matrix[:, j] = buckets.emotion_sums[emotion] / count
+        return cls(
+            timestamps=local_datetime64(buckets.starts),
+            scores=buckets.means,
+            volumes=count.astype(np.int64),
+            confidences=buckets.confidence_sum / count,
+            emotions=list(emotions),
+            emotion_matrix=matrix,
+            category=category
+        )
+
 class TrendAnalysisService:
     """خدمة تحليل الاتجاهات العاطفية المتقدمة"""
     
@@ -79,6 +186,9 @@ class TrendAnalysisService:
         self.anomaly_threshold = 2.0  # عدد الانحرافات المعيارية
         self.trend_strength_threshold = 0.3
         self.peak_prominence = 0.1
+        self.anomaly_half_life_hours = 6.0  # نصف عمر الإحصائيات المتدفقة
+        self.max_cluster_points = 20000  # حد عينة DBSCAN
+        self.max_plot_points = 2000  # حد النقاط في الرسوم البيانية
         
         # أنواع العواطف المتتبعة
         self.emotions = [
@@ -95,11 +205,34 @@ class TrendAnalysisService:
         # مفاتيح Redis
         self.keys = {
             'trend_data': 'trends:data',
+            'trend_rollup': 'trends:rollup',
             'trend_cache': 'trends:cache',
             'anomalies': 'trends:anomalies',
             'predictions': 'trends:predictions',
-            'correlations': 'trends:correlations'
+            'correlations': 'trends:correlations',
+            'online_stats': 'trends:online_stats'
         }
+        
+        # تجميعات الدقيقة والساعة (بدلاً من تخزين كل نقطة)
+        self.rollups = TrendRollupStore(redis_client, self.emotions,
+                                        key_prefix=self.keys['trend_rollup'])
+        
+        # كشف الشذوذ والتنبؤ المتدفق (O(1) لكل نقطة)
+        self.detector = StreamingTrendDetector(
+            half_life_hours=self.anomaly_half_life_hours,
+            threshold=self.anomaly_threshold,
+            min_points=self.min_data_points,
+            redis_key=self.keys['online_stats']
+        )
+    
+    async def initialize(self):
+        """تنظيف الفترات التي انتهت صلاحيتها أثناء توقف الخدمة"""
+        if not self.redis_client:
+            return
+        try:
+            await self.rollups.sweep_expired()
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في تنظيف تجميعات الاتجاهات المنتهية: {str(e)}")
     
     async def record_trend_point(self, analysis_result: Dict[str, Any], 
                                 category: Optional[str] = None) -> bool:
@@ -126,11 +259,13 @@ class TrendAnalysisService:
                 category=category
             )
             
-            # تخزين النقطة
-            await self._store_trend_point(trend_point)
+            await self.detector.load(self.redis_client)
             
-            # تحديث التحليلات في الوقت الفعلي
-            await self._update_real_time_analysis(trend_point)
+            # تخزين النقطة وتحديث التحليلات في الوقت الفعلي (خط أنابيب واحد)
+            pipe = self.redis_client.pipeline()
+            self._store_trend_point(pipe, trend_point)
+            self._update_real_time_analysis(pipe, trend_point)
+            await pipe.execute()
             
             return True
             
@@ -157,143 +292,70 @@ class TrendAnalysisService:
             if emotion in self.emotions
         }
     
-    async def _store_trend_point(self, trend_point: TrendPoint):
-        """تخزين نقطة الاتجاه في Redis"""
-        # تخزين في قائمة زمنية مرتبة
-        timestamp_key = int(trend_point.timestamp.timestamp())
-        
-        # تخزين البيانات الأساسية
-        await self.redis_client.zadd(
-            f"{self.keys['trend_data']}:sentiment",
-            {json.dumps(trend_point.to_dict()): timestamp_key}
-        )
-        
-        # تخزين حسب الفئة إذا توفرت
-        if trend_point.category:
-            await self.redis_client.zadd(
-                f"{self.keys['trend_data']}:category:{trend_point.category}",
-                {json.dumps(trend_point.to_dict()): timestamp_key}
-            )
-        
-        # تخزين العواطف منفصلة
-        for emotion, score in trend_point.emotion_scores.items():
-            await self.redis_client.zadd(
-                f"{self.keys['trend_data']}:emotion:{emotion}",
-                {score: timestamp_key}
-            )
-        
-        # حذف البيانات القديمة (أكثر من 90 يوم)
-        cutoff = int((datetime.now() - timedelta(days=90)).timestamp())
-        await self.redis_client.zremrangebyscore(
-            f"{self.keys['trend_data']}:sentiment", 0, cutoff
+    def _store_trend_point(self, pipe, trend_point: TrendPoint):
+        """إضافة نقطة الاتجاه إلى تجميعات الدقيقة والساعة في Redis"""
+        self.rollups.record(
+            pipe, trend_point.timestamp, trend_point.sentiment_score,
+            trend_point.confidence, trend_point.emotion_scores, trend_point.category
         )
     
-    async def _update_real_time_analysis(self, trend_point: TrendPoint):
-        """تحديث التحليل في الوقت الفعلي"""
-        # كشف الشذوذ
-        if await self._is_anomaly(trend_point):
-            await self._record_anomaly(trend_point)
+    def _update_real_time_analysis(self, pipe, trend_point: TrendPoint):
+        """تحديث التحليل في الوقت الفعلي دون قراءة بيانات سابقة"""
+        # كشف الشذوذ (مقارنة بالإحصائيات قبل إضافة النقطة)
+        anomalies = self.detector.update(
+            trend_point.timestamp, trend_point.sentiment_score,
+            trend_point.emotion_scores, trend_point.category
+        )
+        for anomaly in anomalies:
+            self._record_anomaly(pipe, trend_point, anomaly)
         
         # تحديث التنبؤات
-        await self._update_predictions(trend_point)
-    
-    async def _is_anomaly(self, trend_point: TrendPoint) -> bool:
-        """كشف الشذوذ في النقطة الحالية"""
-        try:
-            # الحصول على البيانات الأخيرة
-            recent_data = await self._get_recent_trend_data(hours=24)
-            
-            if len(recent_data) < self.min_data_points:
-                return False
-            
-            # حساب الإحصائيات
-            sentiment_scores = [p.sentiment_score for p in recent_data]
-            mean_sentiment = np.mean(sentiment_scores)
-            std_sentiment = np.std(sentiment_scores)
-            
-            # كشف الشذوذ بناءً على الانحراف المعياري
-            if std_sentiment > 0:
-                z_score = abs(trend_point.sentiment_score - mean_sentiment) / std_sentiment
-                return z_score > self.anomaly_threshold
-            
-            return False
-            
-        except Exception as e:
-            logger.warning(f"⚠️ فشل في كشف الشذوذ: {str(e)}")
-            return False
+        predictions = self.detector.forecast('all')
+        if 'predictions' in predictions:
+            pipe.setex(
+                self.keys['predictions'],
+                3600,  # صالح لساعة واحدة
+                json.dumps(predictions, default=str)
+            )
+        
+        # حفظ الإحصائيات دورياً
+        self.detector.persist(pipe)
     
-    async def _record_anomaly(self, trend_point: TrendPoint):
+    def _record_anomaly(self, pipe, trend_point: TrendPoint, anomaly: Dict[str, Any]):
         """تسجيل نقطة شاذة"""
         anomaly_data = {
             'timestamp': trend_point.timestamp.isoformat(),
             'sentiment_score': trend_point.sentiment_score,
             'category': trend_point.category,
             'confidence': trend_point.confidence,
-            'type': 'sentiment_spike'
+            **anomaly
         }
         
-        await self.redis_client.lpush(
-            self.keys['anomalies'],
-            json.dumps(anomaly_data)
-        )
+        pipe.lpush(self.keys['anomalies'], json.dumps(anomaly_data))
         
         # الاحتفاظ بأحدث 1000 شذوذ
-        await self.redis_client.ltrim(self.keys['anomalies'], 0, 999)
+        pipe.ltrim(self.keys['anomalies'], 0, 999)
     
-    async def _update_predictions(self, trend_point: TrendPoint):
-        """تحديث التنبؤات"""
+    async def persist_state(self):
+        """حفظ الإحصائيات المتدفقة فوراً (عند الإغلاق)"""
+        if not self.redis_client:
+            return
         try:
-            # الحصول على البيانات الأخيرة
-            recent_data = await self._get_recent_trend_data(hours=72)
-            
-            if len(recent_data) >= 20:  # الحد الأدنى للتنبؤ
-                predictions = await self._generate_predictions(recent_data)
-                
-                await self.redis_client.setex(
-                    self.keys['predictions'],
-                    3600,  # صالح لساعة واحدة
-                    json.dumps(predictions, default=str)
-                )
-        
+            pipe = self.redis_client.pipeline()
+            self.detector.persist(pipe, force=True)
+            await pipe.execute()
         except Exception as e:
-            logger.warning(f"⚠️ فشل في تحديث التنبؤات: {str(e)}")
+            logger.warning(f"⚠️ فشل في حفظ إحصائيات الاتجاه: {str(e)}")
     
-    async def _get_recent_trend_data(self, hours: int = 24) -> List[TrendPoint]:
+    async def _get_recent_trend_data(self, hours: int = 24) -> TrendSeries:
         """الحصول على بيانات الاتجاه الأخيرة"""
         try:
-            cutoff = int((datetime.now() - timedelta(hours=hours)).timestamp())
-            current = int(datetime.now().timestamp())
-            
-            # جلب البيانات من Redis
-            raw_data = await self.redis_client.zrangebyscore(
-                f"{self.keys['trend_data']}:sentiment",
-                cutoff, current
-            )
-            
-            trend_points = []
-            for data_str in raw_data:
-                try:
-                    data = json.loads(data_str)
-                    trend_point = TrendPoint(
-                        timestamp=datetime.fromisoformat(data['timestamp']),
-                        sentiment_score=data['sentiment_score'],
-                        emotion_scores=data['emotion_scores'],
-                        volume=data['volume'],
-                        confidence=data['confidence'],
-                        category=data.get('category')
-                    )
-                    trend_points.append(trend_point)
-                except (json.JSONDecodeError, KeyError) as e:
-                    logger.warning(f"⚠️ فشل في تحليل نقطة اتجاه: {str(e)}")
-                    continue
-            
-            # ترتيب حسب الوقت
-            trend_points.sort(key=lambda x: x.timestamp)
-            return trend_points
-            
+            buckets = await self.rollups.window(hours)
+            return TrendSeries.from_buckets(buckets, self.emotions)
+        
         except Exception as e:
             logger.error(f"❌ فشل في جلب بيانات الاتجاه: {str(e)}")
-            return []
+            return TrendSeries.empty(self.emotions)
     
     async def analyze_trends(self, category: Optional[str] = None,
                            time_range: str = "24h",
@@ -317,47 +379,8 @@ class TrendAnalysisService:
                     'available_data_points': len(trend_data)
                 }
             
-            # تحليل الاتجاه الرئيسي
-            trend_analysis = await self._analyze_sentiment_trend(trend_data)
-            
-            # تحليل العواطف إذا طُلب ذلك
-            emotion_analysis = {}
-            if include_emotions:
-                emotion_analysis = await self._analyze_emotion_trends(trend_data)
-            
-            # كشف الأنماط
-            patterns = await self._detect_patterns(trend_data)
-            
-            # التنبؤات
-            predictions = await self._generate_predictions(trend_data)
-            
-            # الأحداث البارزة
-            notable_events = await self._identify_notable_events(trend_data)
-            
-            # التصورات البيانية
-            visualizations = await self._generate_trend_visualizations(
-                trend_data, emotion_analysis, category
-            )
-            
-            return {
-                'success': True,
-                'data': {
-                    'trend_analysis': trend_analysis.to_dict(),
-                    'emotion_analysis': emotion_analysis,
-                    'patterns': patterns,
-                    'predictions': predictions,
-                    'notable_events': notable_events,
-                    'visualizations': visualizations,
-                    'metadata': {
-                        'category': category,
-                        'time_range': time_range,
-                        'data_points': len(trend_data),
-                        'analysis_timestamp': datetime.now().isoformat(),
-                        'includes_emotions': include_emotions
-                    }
-                }
-            }
-            
+            return await self.analyze_series(trend_data, time_range, include_emotions)
+        
         except Exception as e:
             logger.error(f"❌ فشل في تحليل الاتجاهات: {str(e)}")
             return {
@@ -366,6 +389,48 @@ class TrendAnalysisService:
                 'message': 'فشل في تحليل الاتجاهات'
             }
     
+    async def analyze_series(self, trend_data: TrendSeries, time_range: Optional[str] = None,
+                             include_emotions: bool = True) -> Dict[str, Any]:
+        """تحليل سلسلة اتجاه عمودية جاهزة (من Redis أو من بيانات تاريخية)"""
+        # تحليل الاتجاه الرئيسي (يتضمن التنبؤات)
+        trend_analysis = await self._analyze_sentiment_trend(trend_data)
+        
+        # تحليل العواطف إذا طُلب ذلك
+        emotion_analysis = {}
+        if include_emotions:
+            emotion_analysis = await self._analyze_emotion_trends(trend_data)
+        
+        # كشف الأنماط
+        patterns = await self._detect_patterns(trend_data)
+        
+        # الأحداث البارزة
+        notable_events = await self._identify_notable_events(trend_data)
+        
+        # التصورات البيانية
+        visualizations = await self._generate_trend_visualizations(
+            trend_data, emotion_analysis, trend_data.category
+        )
+        
+        return {
+            'success': True,
+            'data': {
+                'trend_analysis': trend_analysis.to_dict(),
+                'emotion_analysis': emotion_analysis,
+                'patterns': patterns,
+                'predictions': trend_analysis.predictions,
+                'notable_events': notable_events,
+                'visualizations': visualizations,
+                'metadata': {
+                    'category': trend_data.category,
+                    'time_range': time_range,
+                    'data_points': len(trend_data),
+                    'analyses_count': int(trend_data.volumes.sum()),
+                    'analysis_timestamp': datetime.now().isoformat(),
+                    'includes_emotions': include_emotions
+                }
+            }
+        }
+    
     def _parse_time_range(self, time_range: str) -> int:
         """تحويل النطاق الزمني إلى ساعات"""
         if time_range.endswith('h'):
@@ -375,56 +440,27 @@ class TrendAnalysisService:
         else:
             return 24  # افتراضي
     
-    async def _get_category_trend_data(self, category: str, hours: int) -> List[TrendPoint]:
+    async def _get_category_trend_data(self, category: str, hours: int) -> TrendSeries:
         """جلب بيانات اتجاه فئة معينة"""
         try:
-            cutoff = int((datetime.now() - timedelta(hours=hours)).timestamp())
-            current = int(datetime.now().timestamp())
-            
-            raw_data = await self.redis_client.zrangebyscore(
-                f"{self.keys['trend_data']}:category:{category}",
-                cutoff, current
-            )
-            
-            trend_points = []
-            for data_str in raw_data:
-                try:
-                    data = json.loads(data_str)
-                    trend_point = TrendPoint(
-                        timestamp=datetime.fromisoformat(data['timestamp']),
-                        sentiment_score=data['sentiment_score'],
-                        emotion_scores=data['emotion_scores'],
-                        volume=data['volume'],
-                        confidence=data['confidence'],
-                        category=data.get('category')
-                    )
-                    trend_points.append(trend_point)
-                except (json.JSONDecodeError, KeyError):
-                    continue
-            
-            trend_points.sort(key=lambda x: x.timestamp)
-            return trend_points
-            
+            buckets = await self.rollups.window(hours, category=category)
+            return TrendSeries.from_buckets(buckets, self.emotions, category)
+        
         except Exception as e:
             logger.error(f"❌ فشل في جلب بيانات فئة {category}: {str(e)}")
-            return []
+            return TrendSeries.empty(self.emotions, category)
     
-    async def _analyze_sentiment_trend(self, trend_data: List[TrendPoint]) -> TrendAnalysis:
+    async def _analyze_sentiment_trend(self, trend_data: TrendSeries) -> TrendAnalysis:
         """تحليل اتجاه المشاعر"""
-        # استخراج البيانات الزمنية
-        timestamps = [p.timestamp for p in trend_data]
-        sentiment_scores = [p.sentiment_score for p in trend_data]
+        sentiment_scores = trend_data.scores
         
         # تنعيم البيانات
-        if len(sentiment_scores) >= self.smoothing_window:
-            smoothed_scores = self._smooth_data(sentiment_scores, self.smoothing_window)
-        else:
-            smoothed_scores = sentiment_scores
+        smoothed_scores = self._smooth_data(sentiment_scores, self.smoothing_window)
         
         # حساب الاتجاه
         if len(smoothed_scores) > 1:
             slope, intercept, r_value, p_value, std_err = stats.linregress(
-                range(len(smoothed_scores)), smoothed_scores
+                np.arange(len(smoothed_scores)), smoothed_scores
             )
             
             # تحديد اتجاه الترند
@@ -448,21 +484,18 @@ class TrendAnalysisService:
             slope = 0.0
         
         # كشف القمم والوديان
-        peaks = self._find_peaks(smoothed_scores)
-        valleys = self._find_valleys(smoothed_scores)
-        
-        peak_points = [trend_data[i] for i in peaks]
-        valley_points = [trend_data[i] for i in valleys]
+        peak_points = [trend_data.point(i) for i in self._find_peaks(smoothed_scores)]
+        valley_points = [trend_data.point(i) for i in self._find_valleys(smoothed_scores)]
         
         # كشف الشذوذ
-        anomalies = self._detect_anomalies(trend_data)
+        anomalies = [trend_data.point(i) for i in self._detect_anomalies(sentiment_scores)]
         
         # عوامل الارتباط
         correlation_factors = self._calculate_correlations(trend_data)
         
         # فترة الاتجاه
-        if len(timestamps) > 1:
-            trend_duration = timestamps[-1] - timestamps[0]
+        if len(trend_data) > 1:
+            trend_duration = (trend_data.timestamps[-1] - trend_data.timestamps[0]).item()
         else:
             trend_duration = timedelta(0)
         
@@ -491,131 +524,110 @@ class TrendAnalysisService:
             confidence_interval=confidence_interval
         )
     
-    def _smooth_data(self, data: List[float], window_size: int) -> List[float]:
-        """تنعيم البيانات باستخدام المتوسط المتحرك"""
+    def _smooth_data(self, data: np.ndarray, window_size: int) -> np.ndarray:
+        """
+        تنعيم البيانات باستخدام المتوسط المتحرك المتمركز
+        Implemented as one convolution; near the edges the window is
+        truncated and averaged over the points it actually covers.
+        """
+        data = np.asarray(data, dtype=np.float64)
         if len(data) < window_size:
             return data
         
-        smoothed = []
-        for i in range(len(data)):
-            start = max(0, i - window_size // 2)
-            end = min(len(data), i + window_size // 2 + 1)
-            smoothed.append(np.mean(data[start:end]))
-        
-        return smoothed
+        kernel = np.ones(2 * (window_size // 2) + 1)
+        sums = np.convolve(data, kernel, mode='same')
+        counts = np.convolve(np.ones(len(data)), kernel, mode='same')
+        return sums / counts
     
-    def _find_peaks(self, data: List[float]) -> List[int]:
+    def _find_peaks(self, data: np.ndarray) -> np.ndarray:
         """العثور على القمم في البيانات"""
         if len(data) < 3:
-            return []
+            return np.empty(0, dtype=np.int64)
         
         peaks, _ = find_peaks(data, prominence=self.peak_prominence)
-        return peaks.tolist()
+        return peaks
     
-    def _find_valleys(self, data: List[float]) -> List[int]:
+    def _find_valleys(self, data: np.ndarray) -> np.ndarray:
         """العثور على الوديان في البيانات"""
         if len(data) < 3:
-            return []
+            return np.empty(0, dtype=np.int64)
         
         # قلب البيانات للعثور على الوديان
-        inverted_data = [-x for x in data]
-        valleys, _ = find_peaks(inverted_data, prominence=self.peak_prominence)
-        return valleys.tolist()
+        valleys, _ = find_peaks(-np.asarray(data), prominence=self.peak_prominence)
+        return valleys
     
-    def _detect_anomalies(self, trend_data: List[TrendPoint]) -> List[TrendPoint]:
-        """كشف النقاط الشاذة"""
-        if len(trend_data) < self.min_data_points:
-            return []
-        
-        sentiment_scores = [p.sentiment_score for p in trend_data]
-        mean_score = np.mean(sentiment_scores)
-        std_score = np.std(sentiment_scores)
-        
-        anomalies = []
-        for point in trend_data:
-            if std_score > 0:
-                z_score = abs(point.sentiment_score - mean_score) / std_score
-                if z_score > self.anomaly_threshold:
-                    anomalies.append(point)
+    def _z_scores(self, data: np.ndarray) -> np.ndarray:
+        """الانحرافات المعيارية لكل نقطة (أصفار إذا كانت السلسلة ثابتة)"""
+        std = np.std(data)
+        if std == 0:
+            return np.zeros(len(data))
+        return (data - np.mean(data)) / std
+    
+    def _detect_anomalies(self, scores: np.ndarray) -> np.ndarray:
+        """مواقع النقاط الشاذة"""
+        if len(scores) < self.min_data_points:
+            return np.empty(0, dtype=np.int64)
         
-        return anomalies
+        return np.flatnonzero(np.abs(self._z_scores(scores)) > self.anomaly_threshold)
     
-    def _calculate_correlations(self, trend_data: List[TrendPoint]) -> Dict[str, float]:
-        """حساب عوامل الارتباط"""
+    def _calculate_correlations(self, trend_data: TrendSeries) -> Dict[str, float]:
+        """حساب عوامل الارتباط (مصفوفة ارتباط واحدة)"""
         correlations = {}
         
         if len(trend_data) < 3:
             return correlations
         
         try:
-            # الارتباط بين المشاعر والثقة
-            sentiment_scores = [p.sentiment_score for p in trend_data]
-            confidence_scores = [p.confidence for p in trend_data]
-            
-            if len(set(confidence_scores)) > 1:  # تجنب الارتباط مع القيم الثابتة
-                corr_sentiment_confidence = np.corrcoef(sentiment_scores, confidence_scores)[0, 1]
-                if not np.isnan(corr_sentiment_confidence):
-                    correlations['sentiment_confidence'] = corr_sentiment_confidence
-            
-            # الارتباط بين المشاعر والحجم
-            volumes = [p.volume for p in trend_data]
-            if len(set(volumes)) > 1:
-                corr_sentiment_volume = np.corrcoef(sentiment_scores, volumes)[0, 1]
-                if not np.isnan(corr_sentiment_volume):
-                    correlations['sentiment_volume'] = corr_sentiment_volume
-            
-            # الارتباط بالوقت (اتجاه زمني)
-            time_indices = list(range(len(sentiment_scores)))
-            corr_sentiment_time = np.corrcoef(sentiment_scores, time_indices)[0, 1]
-            if not np.isnan(corr_sentiment_time):
-                correlations['sentiment_time'] = corr_sentiment_time
+            columns = {
+                'confidence': trend_data.confidences,
+                'volume': trend_data.volumes.astype(np.float64),
+                'time': np.arange(len(trend_data), dtype=np.float64),
+            }
+            # تجنب الارتباط مع القيم الثابتة
+            names = [name for name, values in columns.items() if np.ptp(values) > 0]
+            if not names or np.ptp(trend_data.scores) == 0:
+                return correlations
             
+            matrix = np.corrcoef(np.vstack([trend_data.scores] + [columns[name] for name in names]))
+            for j, name in enumerate(names, start=1):
+                if not np.isnan(matrix[0, j]):
+                    correlations[f'sentiment_{name}'] = float(matrix[0, j])
+        
         except Exception as e:
             logger.warning(f"⚠️ فشل في حساب بعض الارتباطات: {str(e)}")
         
         return correlations
     
-    async def _analyze_emotion_trends(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    async def _analyze_emotion_trends(self, trend_data: TrendSeries) -> Dict[str, Any]:
         """تحليل اتجاهات العواطف"""
         emotion_trends = {}
         
-        for emotion in self.emotions:
-            emotion_scores = []
-            timestamps = []
-            
-            for point in trend_data:
-                if emotion in point.emotion_scores:
-                    emotion_scores.append(point.emotion_scores[emotion])
-                    timestamps.append(point.timestamp)
+        for j, emotion in enumerate(trend_data.emotions):
+            # النقاط التي ظهرت فيها العاطفة فقط
+            column = trend_data.emotion_matrix[:, j]
+            emotion_scores = column[column > 0]
             
             if len(emotion_scores) >= 3:
-                # حساب الاتجاه
-                if len(emotion_scores) > 1:
-                    slope, _, r_value, _, _ = stats.linregress(
-                        range(len(emotion_scores)), emotion_scores
-                    )
-                    
-                    direction = 'stable'
-                    if abs(slope) > 0.001:
-                        direction = 'increasing' if slope > 0 else 'decreasing'
-                    
-                    strength = abs(r_value)
-                else:
-                    direction = 'stable'
-                    strength = 0.0
+                slope, _, r_value, _, _ = stats.linregress(
+                    np.arange(len(emotion_scores)), emotion_scores
+                )
+                
+                direction = 'stable'
+                if abs(slope) > 0.001:
+                    direction = 'increasing' if slope > 0 else 'decreasing'
                 
                 emotion_trends[emotion] = {
                     'direction': direction,
-                    'strength': strength,
-                    'average_intensity': np.mean(emotion_scores),
-                    'peak_intensity': np.max(emotion_scores),
-                    'volatility': np.std(emotion_scores),
+                    'strength': abs(r_value),
+                    'average_intensity': float(np.mean(emotion_scores)),
+                    'peak_intensity': float(np.max(emotion_scores)),
+                    'volatility': float(np.std(emotion_scores)),
                     'data_points': len(emotion_scores)
                 }
         
         return emotion_trends
     
-    async def _detect_patterns(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    async def _detect_patterns(self, trend_data: TrendSeries) -> Dict[str, Any]:
         """كشف الأنماط في البيانات"""
         patterns = {}
         
@@ -634,27 +646,68 @@ class TrendAnalysisService:
             
             # أنماط العواطف
             patterns['emotion_patterns'] = self._detect_emotion_patterns(trend_data)
-            
+        
         except Exception as e:
             logger.warning(f"⚠️ فشل في كشف بعض الأنماط: {str(e)}")
         
         return patterns
     
-    def _detect_cyclical_patterns(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
-        """كشف الأنماط الدورية"""
-        # تحليل التكرار اليومي
-        hourly_sentiment = defaultdict(list)
-        
-        for point in trend_data:
-            hour = point.timestamp.hour
-            hourly_sentiment[hour].append(point.sentiment_score)
+    def _group_stats(self, groups: np.ndarray, values: np.ndarray,
+                     size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """العدد والمتوسط والانحراف المعياري لكل مجموعة (bincount)"""
+        counts = np.bincount(groups, minlength=size)
+        sums = np.bincount(groups, weights=values, minlength=size)
+        sq_sums = np.bincount(groups, weights=values * values, minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+            stds = np.sqrt(np.maximum(sq_sums / counts - means * means, 0.0))
+        return counts, means, stds
+    
+    def _dominant_cycle(self, trend_data: TrendSeries) -> Dict[str, Any]:
+        """
+        الدورة المهيمنة في السلسلة (FFT + الارتباط الذاتي)
+        The series is resampled to hourly means (empty hours take the
+        overall mean). The strongest FFT frequency gives the dominant
+        period, and the autocorrelation at lag 24 measures how much each
+        hour resembles the same hour of the previous day.
+        """
+        seconds = trend_data.seconds
+        slots = ((seconds - seconds[0]) // 3600).astype(np.int64)
+        n_hours = int(slots[-1]) + 1
+        if n_hours < 48:
+            return {}
+        
+        counts, means, _ = self._group_stats(slots, trend_data.scores, n_hours)
+        hourly = np.where(counts > 0, means, np.mean(trend_data.scores))
+        hourly = hourly - hourly.mean()
+        
+        power = np.abs(np.fft.rfft(hourly)) ** 2
+        freqs = np.fft.rfftfreq(n_hours, d=1.0)
+        # تجاهل المكوّن الثابت والدورات الأطول من نصف السلسلة
+        valid = freqs >= 2.0 / n_hours
+        if not valid.any() or power[valid].sum() == 0:
+            return {}
+        best = np.flatnonzero(valid)[np.argmax(power[valid])]
+        
+        # الارتباط الذاتي عبر FFT (طول مضاعف لتجنب الالتفاف)
+        spectrum = np.fft.rfft(hourly, n=2 * n_hours)
+        autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:n_hours]
+        daily_autocorr = autocorr[24] / autocorr[0] if autocorr[0] > 0 else 0.0
         
-        # حساب متوسط المشاعر لكل ساعة
+        return {
+            'dominant_period_hours': float(1.0 / freqs[best]),
+            'period_strength': float(power[best] / power[valid].sum()),
+            'daily_autocorrelation': float(daily_autocorr)
+        }
+    
+    def _detect_cyclical_patterns(self, trend_data: TrendSeries) -> Dict[str, Any]:
+        """كشف الأنماط الدورية"""
+        # تحليل التكرار اليومي: متوسط المشاعر لكل ساعة
+        counts, means, _ = self._group_stats(trend_data.hours, trend_data.scores, 24)
         hourly_averages = {
-            hour: np.mean(scores) 
-            for hour, scores in hourly_sentiment.items()
-            if len(scores) >= 2
+            int(hour): float(means[hour]) for hour in np.flatnonzero(counts >= 2)
         }
+        cycle = self._dominant_cycle(trend_data)
         
         # كشف ساعات الذروة والانخفاض
         if len(hourly_averages) >= 6:  # الحد الأدنى للتحليل
@@ -668,32 +721,32 @@ class TrendAnalysisService:
                 'valley_hour': valley_hour[0],
                 'valley_sentiment': valley_hour[1],
                 'cycle_strength': peak_hour[1] - valley_hour[1],
-                'hourly_distribution': hourly_averages
+                'hourly_distribution': hourly_averages,
+                **cycle
             }
         
-        return {'has_daily_cycle': False}
+        return {'has_daily_cycle': False, **cycle}
     
-    def _detect_clustering_patterns(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    def _detect_clustering_patterns(self, trend_data: TrendSeries) -> Dict[str, Any]:
         """كشف أنماط التجميع"""
         if len(trend_data) < 10:
             return {'has_clusters': False}
         
         try:
-            # تحضير البيانات للتجميع
-            features = []
-            for point in trend_data:
-                feature_vector = [
-                    point.sentiment_score,
-                    point.confidence,
-                    point.timestamp.hour,  # ساعة اليوم
-                    point.timestamp.weekday()  # يوم الأسبوع
-                ]
-                
-                # إضافة العواطف الرئيسية
-                for emotion in ['joy', 'sadness', 'anger']:
-                    feature_vector.append(point.emotion_scores.get(emotion, 0.0))
-                
-                features.append(feature_vector)
+            # DBSCAN تربيعي في أسوأ الحالات: عينة منتظمة للسلاسل الطويلة
+            sample = np.arange(len(trend_data))
+            if len(sample) > self.max_cluster_points:
+                sample = np.linspace(0, len(trend_data) - 1, self.max_cluster_points).astype(np.int64)
+            
+            # تحضير البيانات للتجميع (مع العواطف الرئيسية)
+            main_emotions = [trend_data.emotion(emotion) for emotion in ['joy', 'sadness', 'anger']]
+            features = np.column_stack([
+                trend_data.scores,
+                trend_data.confidences,
+                trend_data.hours,  # ساعة اليوم
+                trend_data.weekdays,  # يوم الأسبوع
+                *main_emotions
+            ])[sample]
             
             # تطبيق التجميع
             scaler = StandardScaler()
@@ -702,64 +755,56 @@ class TrendAnalysisService:
             clustering = DBSCAN(eps=0.5, min_samples=3)
             cluster_labels = clustering.fit_predict(scaled_features)
             
-            # تحليل النتائج
-            unique_clusters = set(cluster_labels)
-            if -1 in unique_clusters:  # إزالة النقاط الشاذة
-                unique_clusters.remove(-1)
+            # تحليل النتائج (إزالة النقاط الشاذة -1)
+            unique_clusters = np.unique(cluster_labels[cluster_labels >= 0])
             
             if len(unique_clusters) >= 2:
+                labels = np.where(cluster_labels >= 0, cluster_labels, len(unique_clusters))
+                size = int(labels.max()) + 1
+                counts, avg_sentiment, _ = self._group_stats(labels, trend_data.scores[sample], size)
+                _, avg_confidence, _ = self._group_stats(labels, trend_data.confidences[sample], size)
+                timestamps = trend_data.timestamps[sample]
+                
                 cluster_analysis = {}
                 for cluster_id in unique_clusters:
-                    cluster_points = [
-                        trend_data[i] for i, label in enumerate(cluster_labels)
-                        if label == cluster_id
-                    ]
-                    
-                    if cluster_points:
-                        avg_sentiment = np.mean([p.sentiment_score for p in cluster_points])
-                        avg_confidence = np.mean([p.confidence for p in cluster_points])
-                        
-                        cluster_analysis[f'cluster_{cluster_id}'] = {
-                            'size': len(cluster_points),
-                            'avg_sentiment': avg_sentiment,
-                            'avg_confidence': avg_confidence,
-                            'time_span': {
-                                'start': min(p.timestamp for p in cluster_points).isoformat(),
-                                'end': max(p.timestamp for p in cluster_points).isoformat()
-                            }
+                    members = timestamps[labels == cluster_id]
+                    cluster_analysis[f'cluster_{cluster_id}'] = {
+                        'size': int(counts[cluster_id]),
+                        'avg_sentiment': float(avg_sentiment[cluster_id]),
+                        'avg_confidence': float(avg_confidence[cluster_id]),
+                        'time_span': {
+                            'start': members.min().item().isoformat(),
+                            'end': members.max().item().isoformat()
                         }
+                    }
                 
                 return {
                     'has_clusters': True,
                     'num_clusters': len(unique_clusters),
                     'cluster_analysis': cluster_analysis,
-                    'outliers': sum(1 for label in cluster_labels if label == -1)
+                    'outliers': int(np.sum(cluster_labels == -1)),
+                    'sampled_points': len(sample)
                 }
-            
+        
         except Exception as e:
             logger.warning(f"⚠️ فشل في تحليل التجميع: {str(e)}")
         
         return {'has_clusters': False}
     
-    def _detect_seasonal_patterns(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    def _detect_seasonal_patterns(self, trend_data: TrendSeries) -> Dict[str, Any]:
         """كشف الأنماط الموسمية"""
         # تحليل حسب يوم الأسبوع
-        weekday_sentiment = defaultdict(list)
-        
-        for point in trend_data:
-            weekday = point.timestamp.weekday()
-            weekday_sentiment[weekday].append(point.sentiment_score)
-        
-        weekday_analysis = {}
+        counts, means, stds = self._group_stats(trend_data.weekdays, trend_data.scores, 7)
         weekday_names = ['الاثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة', 'السبت', 'الأحد']
         
-        for weekday, scores in weekday_sentiment.items():
-            if len(scores) >= 2:
-                weekday_analysis[weekday_names[weekday]] = {
-                    'average_sentiment': np.mean(scores),
-                    'sentiment_std': np.std(scores),
-                    'sample_size': len(scores)
-                }
+        weekday_analysis = {
+            weekday_names[weekday]: {
+                'average_sentiment': float(means[weekday]),
+                'sentiment_std': float(stds[weekday]),
+                'sample_size': int(counts[weekday])
+            }
+            for weekday in np.flatnonzero(counts >= 2)
+        }
         
         # تحديد أفضل وأسوأ أيام الأسبوع
         if len(weekday_analysis) >= 3:
@@ -777,32 +822,36 @@ class TrendAnalysisService:
         
         return {'has_weekly_pattern': False}
     
-    def _detect_emotion_patterns(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    def _detect_emotion_patterns(self, trend_data: TrendSeries) -> Dict[str, Any]:
         """كشف أنماط العواطف"""
+        emotions = trend_data.emotions
+        matrix = trend_data.emotion_matrix
         emotion_correlations = {}
         
-        # حساب الارتباط بين العواطف المختلفة
-        for emotion1 in self.emotions:
-            for emotion2 in self.emotions:
-                if emotion1 != emotion2:
-                    scores1 = [p.emotion_scores.get(emotion1, 0.0) for p in trend_data]
-                    scores2 = [p.emotion_scores.get(emotion2, 0.0) for p in trend_data]
-                    
-                    if len(set(scores1)) > 1 and len(set(scores2)) > 1:
-                        correlation = np.corrcoef(scores1, scores2)[0, 1]
-                        if not np.isnan(correlation) and abs(correlation) > 0.3:
-                            emotion_correlations[f'{emotion1}_{emotion2}'] = correlation
+        # الارتباط بين العواطف المختلفة (مصفوفة واحدة للعواطف غير الثابتة)
+        varying = np.flatnonzero(np.ptp(matrix, axis=0) > 0) if len(matrix) else []
+        if len(varying) >= 2:
+            correlation = np.corrcoef(matrix[:, varying], rowvar=False)
+            for a, i in enumerate(varying):
+                for b, j in enumerate(varying):
+                    value = correlation[a, b]
+                    if i != j and not np.isnan(value) and abs(value) > 0.3:
+                        emotion_correlations[f'{emotions[i]}_{emotions[j]}'] = float(value)
         
         # العثور على العواطف المهيمنة
         emotion_dominance = {}
-        for emotion in self.emotions:
-            scores = [p.emotion_scores.get(emotion, 0.0) for p in trend_data]
-            if scores:
-                emotion_dominance[emotion] = {
-                    'average_intensity': np.mean(scores),
-                    'max_intensity': np.max(scores),
-                    'frequency': sum(1 for score in scores if score > 0.5) / len(scores)
+        if len(matrix):
+            averages = matrix.mean(axis=0)
+            maxima = matrix.max(axis=0)
+            frequencies = (matrix > 0.5).mean(axis=0)
+            emotion_dominance = {
+                emotion: {
+                    'average_intensity': float(averages[j]),
+                    'max_intensity': float(maxima[j]),
+                    'frequency': float(frequencies[j])
                 }
+                for j, emotion in enumerate(emotions)
+            }
         
         # ترتيب العواطف حسب الهيمنة
         dominant_emotions = sorted(
@@ -817,38 +866,31 @@ class TrendAnalysisService:
             'emotion_dominance_full': emotion_dominance
         }
     
-    async def _generate_predictions(self, trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    async def _generate_predictions(self, trend_data: TrendSeries) -> Dict[str, Any]:
         """إنشاء التنبؤات"""
         if len(trend_data) < 5:
             return {'error': 'insufficient_data_for_prediction'}
         
         try:
-            sentiment_scores = [p.sentiment_score for p in trend_data]
-            timestamps = [p.timestamp for p in trend_data]
+            sentiment_scores = trend_data.scores
             
             # التنبؤ بالاتجاه (Linear Regression)
-            time_indices = list(range(len(sentiment_scores)))
             slope, intercept, r_value, p_value, std_err = stats.linregress(
-                time_indices, sentiment_scores
+                np.arange(len(sentiment_scores)), sentiment_scores
             )
             
-            # التنبؤ للنقاط التالية
+            # التنبؤ للنقاط التالية (بناءً على متوسط الفترات)
             future_points = 5  # التنبؤ لـ 5 نقاط مستقبلية
+            last_time = trend_data.timestamps[-1].item()
+            avg_interval = (trend_data.timestamps[-1] - trend_data.timestamps[0]).item() / (len(trend_data) - 1)
             predictions = []
             
             for i in range(1, future_points + 1):
                 future_index = len(sentiment_scores) + i
                 predicted_sentiment = slope * future_index + intercept
                 
-                # تقدير الوقت المستقبلي (بناءً على متوسط الفترات)
-                if len(timestamps) > 1:
-                    avg_interval = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
-                    future_time = timestamps[-1] + avg_interval * i
-                else:
-                    future_time = datetime.now() + timedelta(hours=i)
-                
                 predictions.append({
-                    'timestamp': future_time.isoformat(),
+                    'timestamp': (last_time + avg_interval * i).isoformat(),
                     'predicted_sentiment': predicted_sentiment,
                     'confidence': max(0.1, abs(r_value))  # الثقة بناءً على جودة الاتساق
                 })
@@ -874,85 +916,83 @@ class TrendAnalysisService:
                 'prediction_quality': prediction_quality,
                 'confidence_level': abs(r_value)
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ فشل في إنشاء التنبؤات: {str(e)}")
             return {'error': str(e)}
     
-    async def _identify_notable_events(self, trend_data: List[TrendPoint]) -> List[Dict[str, Any]]:
-        """تحديد الأحداث البارزة"""
-        notable_events = []
-        
+    async def _identify_notable_events(self, trend_data: TrendSeries) -> List[Dict[str, Any]]:
+        """تحديد الأحداث البارزة (أهم 10 أحداث)"""
         if len(trend_data) < 3:
-            return notable_events
+            return []
         
-        sentiment_scores = [p.sentiment_score for p in trend_data]
-        mean_sentiment = np.mean(sentiment_scores)
-        std_sentiment = np.std(sentiment_scores)
+        z_scores = self._z_scores(trend_data.scores)
+        matrix = trend_data.emotion_matrix
+        max_emotion = matrix.max(axis=1) if matrix.shape[1] else np.zeros(len(trend_data))
         
-        for i, point in enumerate(trend_data):
-            event = None
-            
-            # تحديد نوع الحدث
-            if std_sentiment > 0:
-                z_score = (point.sentiment_score - mean_sentiment) / std_sentiment
-                
-                if z_score > 2.0:
-                    event = {
-                        'type': 'sentiment_spike',
-                        'description': 'ارتفاع حاد في المشاعر الإيجابية',
-                        'severity': 'high' if z_score > 3.0 else 'medium'
-                    }
-                elif z_score < -2.0:
-                    event = {
-                        'type': 'sentiment_drop',
-                        'description': 'انخفاض حاد في المشاعر',
-                        'severity': 'high' if z_score < -3.0 else 'medium'
-                    }
+        # تكفي مواقع أعلى 10 أحداث حسب الانحراف المعياري
+        candidates = np.flatnonzero((np.abs(z_scores) > 2.0) | (max_emotion > 0.8))
+        if len(candidates) > 10:
+            top = np.argpartition(-np.abs(z_scores[candidates]), 9)[:10]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-np.abs(z_scores[candidates]), kind='stable')]
+        
+        notable_events = []
+        for i in candidates:
+            z_score = float(z_scores[i])
             
-            # أحداث العواطف القوية
-            max_emotion_score = max(point.emotion_scores.values()) if point.emotion_scores else 0
-            if max_emotion_score > 0.8:
-                dominant_emotion = max(point.emotion_scores.items(), key=lambda x: x[1])
+            # أحداث العواطف القوية لها الأولوية
+            if max_emotion[i] > 0.8:
+                j = int(np.argmax(matrix[i]))
                 event = {
                     'type': 'strong_emotion',
-                    'description': f'عاطفة قوية: {dominant_emotion[0]}',
-                    'emotion': dominant_emotion[0],
-                    'intensity': dominant_emotion[1],
-                    'severity': 'high' if max_emotion_score > 0.9 else 'medium'
+                    'description': f'عاطفة قوية: {trend_data.emotions[j]}',
+                    'emotion': trend_data.emotions[j],
+                    'intensity': float(matrix[i, j]),
+                    'severity': 'high' if max_emotion[i] > 0.9 else 'medium'
+                }
+            elif z_score > 2.0:
+                event = {
+                    'type': 'sentiment_spike',
+                    'description': 'ارتفاع حاد في المشاعر الإيجابية',
+                    'severity': 'high' if z_score > 3.0 else 'medium'
+                }
+            else:
+                event = {
+                    'type': 'sentiment_drop',
+                    'description': 'انخفاض حاد في المشاعر',
+                    'severity': 'high' if z_score < -3.0 else 'medium'
                 }
             
-            # تسجيل الحدث إذا وُجد
-            if event:
-                event.update({
-                    'timestamp': point.timestamp.isoformat(),
-                    'sentiment_score': point.sentiment_score,
-                    'confidence': point.confidence,
-                    'category': point.category,
-                    'z_score': (point.sentiment_score - mean_sentiment) / std_sentiment if std_sentiment > 0 else 0
-                })
-                notable_events.append(event)
+            event.update({
+                'timestamp': trend_data.timestamps[i].item().isoformat(),
+                'sentiment_score': float(trend_data.scores[i]),
+                'confidence': float(trend_data.confidences[i]),
+                'category': trend_data.category,
+                'z_score': z_score
+            })
+            notable_events.append(event)
         
-        # ترتيب الأحداث حسب الأهمية
-        notable_events.sort(key=lambda x: abs(x.get('z_score', 0)), reverse=True)
-        
-        return notable_events[:10]  # أهم 10 أحداث
+        return notable_events
     
-    async def _generate_trend_visualizations(self, trend_data: List[TrendPoint],
+    async def _generate_trend_visualizations(self, trend_data: TrendSeries,
                                            emotion_analysis: Dict[str, Any],
                                            category: Optional[str]) -> Dict[str, str]:
-        """إنشاء التصورات البيانية للاتجاهات"""
+        """إنشاء التصورات البيانية للاتجاهات (بعدد نقاط محدود للرسم)"""
         visualizations = {}
         
         try:
-            timestamps = [p.timestamp for p in trend_data]
-            sentiment_scores = [p.sentiment_score for p in trend_data]
+            sentiment_scores = trend_data.scores
+            plotted = np.arange(len(trend_data))
+            if len(plotted) > self.max_plot_points:
+                plotted = np.linspace(0, len(trend_data) - 1, self.max_plot_points).astype(np.int64)
+            timestamps = trend_data.timestamps[plotted]
             
             # رسم الاتجاه الرئيسي
             fig_main = go.Figure()
             fig_main.add_trace(go.Scatter(
                 x=timestamps,
-                y=sentiment_scores,
+                y=sentiment_scores[plotted],
                 mode='lines+markers',
                 name='اتجاه المشاعر',
                 line=dict(color='blue', width=2)
@@ -960,13 +1000,13 @@ class TrendAnalysisService:
             
             # إضافة خط الاتجاه
             if len(sentiment_scores) > 1:
-                x_numeric = list(range(len(sentiment_scores)))
-                slope, intercept, _, _, _ = stats.linregress(x_numeric, sentiment_scores)
-                trend_line = [slope * x + intercept for x in x_numeric]
+                slope, intercept, _, _, _ = stats.linregress(
+                    np.arange(len(sentiment_scores)), sentiment_scores
+                )
                 
                 fig_main.add_trace(go.Scatter(
                     x=timestamps,
-                    y=trend_line,
+                    y=slope * plotted + intercept,
                     mode='lines',
                     name='خط الاتجاه',
                     line=dict(color='red', width=1, dash='dash')
@@ -987,13 +1027,9 @@ class TrendAnalysisService:
                 
                 for emotion, data in emotion_analysis.items():
                     if 'average_intensity' in data:
-                        emotion_scores = []
-                        for point in trend_data:
-                            emotion_scores.append(point.emotion_scores.get(emotion, 0.0))
-                        
                         fig_emotions.add_trace(go.Scatter(
                             x=timestamps,
-                            y=emotion_scores,
+                            y=trend_data.emotion(emotion)[plotted],
                             mode='lines',
                             name=emotion,
                             opacity=0.7
@@ -1008,19 +1044,21 @@ class TrendAnalysisService:
                 
                 visualizations['emotion_trends'] = json.dumps(fig_emotions, cls=PlotlyJSONEncoder)
             
-            # رسم التوزيع
-            fig_dist = px.histogram(
-                x=sentiment_scores,
-                nbins=20,
-                title='توزيع نقاط المشاعر'
-            )
+            # رسم التوزيع (محسوب مسبقاً بدلاً من إرسال كل النقاط)
+            counts, edges = np.histogram(sentiment_scores, bins=20)
+            fig_dist = go.Figure(go.Bar(
+                x=(edges[:-1] + edges[1:]) / 2,
+                y=counts,
+                width=np.diff(edges)
+            ))
             fig_dist.update_layout(
+                title='توزيع نقاط المشاعر',
                 xaxis_title='نقاط المشاعر',
                 yaxis_title='التكرار'
             )
             
             visualizations['sentiment_distribution'] = json.dumps(fig_dist, cls=PlotlyJSONEncoder)
-            
+        
         except Exception as e:
             logger.warning(f"⚠️ فشل في إنشاء بعض التصورات: {str(e)}")
         
@@ -1030,20 +1068,23 @@ class TrendAnalysisService:
         """الحصول على ملخص سريع للاتجاهات"""
         try:
             # جلب البيانات الأخيرة
-            recent_data = await self._get_recent_trend_data(hours=24)
+            if category:
+                recent_data = await self._get_category_trend_data(category, 24)
+            else:
+                recent_data = await self._get_recent_trend_data(hours=24)
             
-            if not recent_data:
+            if not len(recent_data):
                 return {
                     'status': 'no_data',
                     'message': 'لا توجد بيانات متاحة للتحليل'
                 }
             
             # حساب الإحصائيات الأساسية
-            sentiment_scores = [p.sentiment_score for p in recent_data]
+            sentiment_scores = recent_data.scores
             
-            current_sentiment = sentiment_scores[-1] if sentiment_scores else 0.0
-            average_sentiment = np.mean(sentiment_scores)
-            sentiment_change = current_sentiment - sentiment_scores[0] if len(sentiment_scores) > 1 else 0.0
+            current_sentiment = float(sentiment_scores[-1])
+            average_sentiment = float(np.average(sentiment_scores, weights=recent_data.volumes))
+            sentiment_change = current_sentiment - float(sentiment_scores[0]) if len(sentiment_scores) > 1 else 0.0
             
             # تحديد الاتجاه
             if abs(sentiment_change) < 0.05:
@@ -1056,16 +1097,15 @@ class TrendAnalysisService:
                 trend_status = 'declining'
                 trend_emoji = '📉'
             
-            # العاطفة المهيمنة
-            all_emotions = defaultdict(list)
-            for point in recent_data:
-                for emotion, score in point.emotion_scores.items():
-                    all_emotions[emotion].append(score)
-            
+            # العاطفة المهيمنة (متوسط كل عاطفة حيث ظهرت)
             dominant_emotion = None
-            if all_emotions:
-                avg_emotions = {emotion: np.mean(scores) for emotion, scores in all_emotions.items()}
-                dominant_emotion = max(avg_emotions.items(), key=lambda x: x[1])
+            matrix = recent_data.emotion_matrix
+            present = (matrix > 0).sum(axis=0)
+            if present.any():
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    averages = np.where(present > 0, matrix.sum(axis=0) / present, -np.inf)
+                j = int(np.argmax(averages))
+                dominant_emotion = (recent_data.emotions[j], float(averages[j]))
             
             return {
                 'status': 'success',
@@ -1079,12 +1119,12 @@ class TrendAnalysisService:
                         'emotion': dominant_emotion[0] if dominant_emotion else 'unknown',
                         'intensity': dominant_emotion[1] if dominant_emotion else 0.0
                     },
-                    'data_points': len(recent_data),
+                    'data_points': int(recent_data.volumes.sum()),
                     'category': category,
-                    'last_updated': recent_data[-1].timestamp.isoformat() if recent_data else None
+                    'last_updated': recent_data.timestamps[-1].item().isoformat()
                 }
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ فشل في الحصول على ملخص الاتجاهات: {str(e)}")
             return {
@@ -0,0 +1,213 @@
+# تخزين تجميعات الاتجاهات في فترات زمنية
+# Time-Bucketed Rollup Store for Emotional Trends
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# الدقة: (طول الفترة بالثواني، مدة الاحتفاظ بالثواني)
+RESOLUTIONS = {
+    'minute': (60, 86400 * 3),
+    'hour': (3600, 86400 * 90),
+}
+
+BASE_METRICS = ('count', 'sum', 'sumsq', 'confidence')
+
+
+@dataclass
+class TrendBuckets:
+    """
+    فترات اتجاه مجمعة (غير الفارغة فقط، مرتبة زمنياً)
+    ``count``, ``value_sum``, ``value_sq_sum`` and ``confidence_sum`` are
+    aligned arrays, one entry per bucket; ``emotion_sums`` maps an emotion
+    to its per-bucket score sum.
+    """
+    resolution: int
+    starts: np.ndarray
+    count: np.ndarray
+    value_sum: np.ndarray
+    value_sq_sum: np.ndarray
+    confidence_sum: np.ndarray
+    emotion_sums: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def total(self) -> int:
+        return int(self.count.sum())
+
+    @property
+    def means(self) -> np.ndarray:
+        return self.value_sum / self.count
+
+    def mean(self) -> float:
+        """متوسط المشاعر لكل النقاط في النافذة"""
+        return float(self.value_sum.sum() / self.total) if self.total else 0.0
+
+    def std(self) -> float:
+        """الانحراف المعياري (للمجتمع) لكل النقاط في النافذة"""
+        if not self.total:
+            return 0.0
+        mean = self.mean()
+        variance = self.value_sq_sum.sum() / self.total - mean * mean
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def timestamps(self) -> List[datetime]:
+        return [datetime.fromtimestamp(int(start)) for start in self.starts]
+
+
+class TrendRollupStore:
+    """
+    تجميعات الاتجاهات لكل دقيقة ولكل ساعة
+    Every recorded point is added to the minute and hour bucket of the
+    overall scope (``all``) and of its category. A scope/resolution pair is
+    one Redis hash whose fields are ``<metric>:<bucket_start>``. The metrics
+    are count, sum and sum of squares of the sentiment score, the confidence
+    sum, and one score sum per emotion. Every field is updated with
+    ``HINCRBY``/``HINCRBYFLOAT``, so concurrent writers never race.
+
+    Reading a window is one ``HMGET`` per scope, returning O(buckets) numbers
+    whatever the number of points. Mean and standard deviation over any
+    window are exact, computed from the sums.
+
+    Retention: buckets older than the resolution's retention are removed
+    with ``HDEL`` as time moves on. Each hash also expires after its
+    retention, so an idle system leaves nothing behind. The prune position
+    lives in memory only, so ``sweep_expired`` runs once at startup to drop
+    buckets that expired while the process was down.
+    """
+
+    def __init__(self, redis_client: Any, emotions: Sequence[str],
+                 key_prefix: str = 'trends:rollup', max_prune_buckets: int = 60):
+        self.redis = redis_client
+        self.emotions = list(emotions)
+        self.key_prefix = key_prefix
+        self.metrics = list(BASE_METRICS) + [f"emotion:{emotion}" for emotion in self.emotions]
+        self.max_prune_buckets = max_prune_buckets
+        # آخر فترة حُذفت لكل (دقة، نطاق)
+        self._pruned: Dict[Tuple[str, str], int] = {}
+
+    def _key(self, resolution: str, scope: str) -> str:
+        return f"{self.key_prefix}:{resolution}:{scope}"
+
+    @staticmethod
+    def bucket_start(timestamp: float, step: int) -> int:
+        return int(timestamp) // step * step
+
+    def record(self, pipe, timestamp: datetime, sentiment_score: float, confidence: float,
+               emotion_scores: Dict[str, float], category: Optional[str] = None):
+        """إضافة نقطة إلى تجميعات الدقيقة والساعة (أوامر في خط الأنابيب المعطى)"""
+        scopes = ['all'] + ([category] if category else [])
+        epoch = timestamp.timestamp()
+
+        for resolution, (step, retention) in RESOLUTIONS.items():
+            bucket = self.bucket_start(epoch, step)
+            for scope in scopes:
+                key = self._key(resolution, scope)
+                pipe.hincrby(key, f"count:{bucket}", 1)
+                pipe.hincrbyfloat(key, f"sum:{bucket}", sentiment_score)
+                pipe.hincrbyfloat(key, f"sumsq:{bucket}", sentiment_score * sentiment_score)
+                pipe.hincrbyfloat(key, f"confidence:{bucket}", confidence)
+                for emotion, score in emotion_scores.items():
+                    if emotion in self.emotions and score:
+                        pipe.hincrbyfloat(key, f"emotion:{emotion}:{bucket}", score)
+                pipe.expire(key, retention)
+                self._prune(pipe, resolution, scope, bucket - retention)
+
+    def _prune(self, pipe, resolution: str, scope: str, expired_upto: int):
+        """حذف الفترات التي تجاوزت مدة الاحتفاظ (حتى max_prune_buckets في كل مرة)"""
+        step = RESOLUTIONS[resolution][0]
+        expired_upto = self.bucket_start(expired_upto, step)
+        last = self._pruned.get((resolution, scope), expired_upto - step)
+        if expired_upto <= last:
+            return
+
+        first = max(last + step, expired_upto - (self.max_prune_buckets - 1) * step)
+        fields = [f"{metric}:{bucket}"
+                  for bucket in range(first, expired_upto + step, step)
+                  for metric in self.metrics]
+        pipe.hdel(self._key(resolution, scope), *fields)
+        self._pruned[(resolution, scope)] = expired_upto
+
+    async def sweep_expired(self, now: Optional[datetime] = None, chunk_size: int = 1000) -> int:
+        """
+        حذف كل الفترات المنتهية بمسح التجميعات (عند بدء التشغيل)
+        Scans every rollup hash with ``HSCAN``, deletes fields older than the
+        retention and seeds the in-memory prune position from there.
+        """
+        epoch = (now or datetime.now()).timestamp()
+        removed = 0
+        async for raw_key in self.redis.scan_iter(match=f"{self.key_prefix}:*"):
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            resolution, _, scope = key[len(self.key_prefix) + 1:].partition(':')
+            if resolution not in RESOLUTIONS or not scope:
+                continue
+            step, retention = RESOLUTIONS[resolution]
+            expired_upto = self.bucket_start(self.bucket_start(epoch, step) - retention, step)
+
+            expired = []
+            async for raw_field, _ in self.redis.hscan_iter(key):
+                field = raw_field.decode() if isinstance(raw_field, bytes) else raw_field
+                bucket = field.rpartition(':')[2]
+                if bucket.isdigit() and int(bucket) <= expired_upto:
+                    expired.append(field)
+            for start in range(0, len(expired), chunk_size):
+                await self.redis.hdel(key, *expired[start:start + chunk_size])
+            removed += len(expired)
+            self._pruned[(resolution, scope)] = expired_upto
+
+        if removed:
+            logger.info(f"🧹 حذف {removed} حقل منتهي من تجميعات الاتجاهات")
+        return removed
+
+    @staticmethod
+    def resolution_for(hours: float) -> str:
+        """أدق دقة مناسبة للنافذة (الدقائق حتى 24 ساعة)"""
+        return 'minute' if hours <= 24 else 'hour'
+
+    async def window(self, hours: float, category: Optional[str] = None,
+                     resolution: Optional[str] = None,
+                     metrics: Optional[Sequence[str]] = None,
+                     now: Optional[datetime] = None) -> TrendBuckets:
+        """
+        قراءة الفترات في آخر ``hours`` ساعة
+        ``metrics`` restricts the read to a subset (e.g. only count/sum/sumsq
+        for anomaly checks); unread metrics come back as zeros.
+        """
+        resolution = resolution or self.resolution_for(hours)
+        step = RESOLUTIONS[resolution][0]
+        metrics = list(metrics) if metrics else self.metrics
+        if 'count' not in metrics:
+            metrics.insert(0, 'count')
+
+        end = (now or datetime.now()).timestamp()
+        starts = np.arange(self.bucket_start(end - hours * 3600, step),
+                           self.bucket_start(end, step) + step, step, dtype=np.int64)
+
+        fields = [f"{metric}:{start}" for metric in metrics for start in starts]
+        raw = await self.redis.hmget(self._key(resolution, category or 'all'), fields)
+        values = np.array([float(v) if v is not None else 0.0 for v in raw],
+                          dtype=np.float64).reshape(len(metrics), len(starts))
+
+        by_metric = dict(zip(metrics, values))
+        present = by_metric['count'] > 0
+        zeros = np.zeros(int(present.sum()))
+
+        def column(metric: str) -> np.ndarray:
+            return by_metric[metric][present] if metric in by_metric else zeros
+
+        return TrendBuckets(
+            resolution=step,
+            starts=starts[present],
+            count=column('count'),
+            value_sum=column('sum'),
+            value_sq_sum=column('sumsq'),
+            confidence_sum=column('confidence'),
+            emotion_sums={emotion: column(f"emotion:{emotion}") for emotion in self.emotions
+                          if f"emotion:{emotion}" in by_metric},
+        )
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس أداء تحليل الاتجاهات: المسار القديم (قوائم TrendPoint) مقابل المسار العمودي (NumPy)
+Trend Analysis Benchmark - list-of-TrendPoint loops vs. columnar NumPy pipeline
+
+Usage:
+    python tests/trend_benchmark.py --points 1000000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Callable, Tuple
+
+import numpy as np
+from scipy.signal import find_peaks
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.trend_analysis import TrendAnalysisService, TrendSeries, TrendPoint
+
+
+# ========================= المسار القديم (للمقارنة) =========================
+
+def legacy_smooth_data(data: List[float], window_size: int) -> List[float]:
+    if len(data) < window_size:
+        return data
+    smoothed = []
+    for i in range(len(data)):
+        start = max(0, i - window_size // 2)
+        end = min(len(data), i + window_size // 2 + 1)
+        smoothed.append(np.mean(data[start:end]))
+    return smoothed
+
+
+def legacy_find_peaks(data: List[float], prominence: float) -> List[int]:
+    if len(data) < 3:
+        return []
+    peaks, _ = find_peaks(data, prominence=prominence)
+    return peaks.tolist()
+
+
+def legacy_find_valleys(data: List[float], prominence: float) -> List[int]:
+    if len(data) < 3:
+        return []
+    inverted_data = [-x for x in data]
+    valleys, _ = find_peaks(inverted_data, prominence=prominence)
+    return valleys.tolist()
+
+
+def legacy_detect_anomalies(trend_data: List[TrendPoint], threshold: float) -> List[TrendPoint]:
+    sentiment_scores = [p.sentiment_score for p in trend_data]
+    mean_score = np.mean(sentiment_scores)
+    std_score = np.std(sentiment_scores)
+    anomalies = []
+    for point in trend_data:
+        if std_score > 0:
+            z_score = abs(point.sentiment_score - mean_score) / std_score
+            if z_score > threshold:
+                anomalies.append(point)
+    return anomalies
+
+
+def legacy_calculate_correlations(trend_data: List[TrendPoint]) -> Dict[str, float]:
+    correlations = {}
+    sentiment_scores = [p.sentiment_score for p in trend_data]
+    confidence_scores = [p.confidence for p in trend_data]
+    if len(set(confidence_scores)) > 1:
+        correlations['sentiment_confidence'] = np.corrcoef(sentiment_scores, confidence_scores)[0, 1]
+    volumes = [p.volume for p in trend_data]
+    if len(set(volumes)) > 1:
+        correlations['sentiment_volume'] = np.corrcoef(sentiment_scores, volumes)[0, 1]
+    time_indices = list(range(len(sentiment_scores)))
+    correlations['sentiment_time'] = np.corrcoef(sentiment_scores, time_indices)[0, 1]
+    return correlations
+
+
+def legacy_detect_cyclical_patterns(trend_data: List[TrendPoint]) -> Dict[str, Any]:
+    hourly_sentiment = defaultdict(list)
+    for point in trend_data:
+        hourly_sentiment[point.timestamp.hour].append(point.sentiment_score)
+    hourly_averages = {
+        hour: np.mean(scores)
+        for hour, scores in hourly_sentiment.items()
+        if len(scores) >= 2
+    }
+    return {'hourly_distribution': hourly_averages}
+
+
+# ========================= البيانات =========================
+
+def generate_series(n_points: int, days: int, emotions: List[str], seed: int = 42) -> TrendSeries:
+    """سلسلة اصطناعية: اتجاه بطيء + دورة يومية + ضوضاء + قفزات"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(datetime.now().replace(microsecond=0) - timedelta(days=days), 's')
+    offsets = np.sort(rng.integers(0, days * 86400, n_points))
+    timestamps = start + offsets.astype('timedelta64[s]')
+
+    hours = (offsets % 86400) / 3600
+    scores = 0.1 + 0.2 * np.sin(2 * np.pi * hours / 24) + offsets / (days * 86400) * 0.2
+    scores += rng.normal(0, 0.15, n_points)
+    spikes = rng.random(n_points) < 0.001
+    scores[spikes] += rng.choice([-1.0, 1.0], spikes.sum())
+
+    emotion_matrix = np.clip(rng.normal(0.3, 0.2, (n_points, len(emotions))), 0, 1)
+    emotion_matrix[:, 0] = np.clip(0.5 + scores / 2, 0, 1)  # joy تتبع المشاعر
+
+    return TrendSeries(
+        timestamps=timestamps,
+        scores=np.clip(scores, -1, 1),
+        volumes=rng.integers(1, 20, n_points),
+        confidences=rng.uniform(0.6, 0.99, n_points),
+        emotions=list(emotions),
+        emotion_matrix=emotion_matrix,
+        category='news'
+    )
+
+
+def to_points(series: TrendSeries) -> List[TrendPoint]:
+    return [series.point(i) for i in range(len(series))]
+
+
+# ========================= القياس =========================
+
+def timed(function: Callable, *args) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def compare(name: str, legacy: Tuple[Any, float], columnar: Tuple[Any, float], same: bool) -> Dict[str, Any]:
+    row = {
+        'stage': name,
+        'legacy_seconds': legacy[1],
+        'columnar_seconds': columnar[1],
+        'speedup': legacy[1] / columnar[1] if columnar[1] > 0 else float('inf'),
+        'same_result': same,
+    }
+    print(f"  {name:<22} {legacy[1]:>10.3f}s {columnar[1]:>10.4f}s {row['speedup']:>9.1f}x  "
+          f"{'✅' if same else '❌'}")
+    return row
+
+
+def run(n_points: int, days: int) -> List[Dict[str, Any]]:
+    service = TrendAnalysisService()
+    series = generate_series(n_points, days, service.emotions)
+
+    print(f"📦 تجهيز {n_points:,} نقطة على {days} يوم...")
+    points, build_time = timed(to_points, series)
+    print(f"   إنشاء كائنات TrendPoint للمسار القديم: {build_time:.2f}s\n")
+
+    print(f"  {'المرحلة':<22} {'القديم':>11} {'العمودي':>11} {'التسريع':>10}")
+    rows = []
+    scores_list = [p.sentiment_score for p in points]
+
+    legacy = timed(legacy_smooth_data, scores_list, service.smoothing_window)
+    columnar = timed(service._smooth_data, series.scores, service.smoothing_window)
+    rows.append(compare('smooth_data', legacy, columnar, np.allclose(legacy[0], columnar[0])))
+    smoothed_list, smoothed = legacy[0], columnar[0]
+
+    legacy = timed(legacy_find_peaks, smoothed_list, service.peak_prominence)
+    columnar = timed(service._find_peaks, smoothed)
+    rows.append(compare('find_peaks', legacy, columnar, legacy[0] == columnar[0].tolist()))
+
+    legacy = timed(legacy_find_valleys, smoothed_list, service.peak_prominence)
+    columnar = timed(service._find_valleys, smoothed)
+    rows.append(compare('find_valleys', legacy, columnar, legacy[0] == columnar[0].tolist()))
+
+    legacy = timed(legacy_detect_anomalies, points, service.anomaly_threshold)
+    columnar = timed(service._detect_anomalies, series.scores)
+    rows.append(compare('detect_anomalies', legacy, columnar, len(legacy[0]) == len(columnar[0])))
+
+    legacy = timed(legacy_calculate_correlations, points)
+    columnar = timed(service._calculate_correlations, series)
+    rows.append(compare('calculate_correlations', legacy, columnar,
+                        all(np.isclose(legacy[0][key], columnar[0].get(key, np.nan)) for key in legacy[0])))
+
+    legacy = timed(legacy_detect_cyclical_patterns, points)
+    columnar = timed(service._detect_cyclical_patterns, series)
+    legacy_hours = legacy[0]['hourly_distribution']
+    columnar_hours = columnar[0].get('hourly_distribution', {})
+    rows.append(compare('detect_cyclical', legacy, columnar,
+                        legacy_hours.keys() == columnar_hours.keys() and
+                        all(np.isclose(legacy_hours[h], columnar_hours[h]) for h in legacy_hours)))
+
+    # المسار العمودي الكامل (المسار القديم لا ينتهي في وقت معقول مع DBSCAN والرسوم)
+    result, total = timed(lambda: asyncio.run(service.analyze_series(series, f'{days}d')))
+    print(f"\n⏱️ analyze_series الكامل (عمودي): {total:.2f}s - نجاح: {result.get('success')}")
+    rows.append({'stage': 'analyze_series', 'columnar_seconds': total})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أداء تحليل الاتجاهات')
+    parser.add_argument('--points', type=int, default=1_000_000, help='عدد النقاط')
+    parser.add_argument('--days', type=int, default=30, help='طول السلسلة بالأيام')
+    args = parser.parse_args()
+
+    print("🚀 قياس أداء تحليل الاتجاهات")
+    print("=" * 60)
+    run(args.points, args.days)
+
+
+if __name__ == "__main__":
+    main()
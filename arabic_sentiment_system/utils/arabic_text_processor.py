@@ -294,6 +294,10 @@ class ArabicTextProcessor:
         
         return text
     
+    def normalize_text(self, text: str) -> str:
+        """التنظيف والتطبيع فقط (النص الذي يراه النموذج)"""
+        return self.normalize_arabic(self.basic_clean(text))
+    
     def tokenize(self, text: str) -> List[str]:
         """تقسيم النص إلى رموز"""
         if not text:
@@ -0,0 +1,184 @@
+# تجميع الطلبات في دفعات صغيرة لنظام تحليل المشاعر
+# Asyncio Micro-Batching Request Coalescer for Arabic Sentiment Analysis
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ('item', 'future', 'enqueued_at')
+
+    def __init__(self, item: Any, future: asyncio.Future, enqueued_at: float):
+        self.item = item
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class MicroBatcher:
+    """
+    تجميع الطلبات المتزامنة في دفعات للاستدلال
+    Requests are queued with ``submit``; a collector task flushes a batch
+    when it reaches ``max_batch_size`` or when the oldest queued item has
+    waited ``max_wait_ms``. ``process_batch`` runs on a dedicated inference
+    thread (so the event loop never blocks on the model) and must return
+    one result per item, in order. A result that is an ``Exception`` fails
+    only its own request.
+
+    While a batch is running, new requests keep queueing, so under load
+    the next batch is naturally larger.
+
+    Optional Prometheus metrics: ``queue_depth`` (Gauge), ``batch_sizes``
+    and ``wait_seconds`` (Histograms).
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 queue_depth: Any = None, batch_sizes: Any = None, wait_seconds: Any = None,
+                 name: str = 'inference'):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.queue_depth = queue_depth
+        self.batch_sizes = batch_sizes
+        self.wait_seconds = wait_seconds
+        self.name = name
+
+        # خيط استدلال واحد: النموذج لا يُستدعى من عدة خيوط في آن واحد
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        # الدفعة المسحوبة من الطابور ولم تُحسم نتائجها بعد
+        self._in_flight: List[_Pending] = []
+
+        self.batches_processed = 0
+        self.items_processed = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """بدء مهمة التجميع"""
+        if self._collector is None:
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.get_event_loop().create_task(self._collect())
+            logger.info(f"🚀 بدء تجميع الطلبات ({self.name}): "
+                        f"حتى {self.max_batch_size} طلب أو {self.max_wait * 1000:.1f}ms")
+
+    async def stop(self):
+        """إيقاف التجميع وإفشال الطلبات المتبقية (بما فيها الدفعة الجارية)"""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+
+        remaining, self._in_flight = self._in_flight, []
+        while self._queue is not None and not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for pending in remaining:
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("تم إيقاف خدمة التحليل"))
+        self._set_depth()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, item: Any) -> Any:
+        """إضافة طلب إلى الطابور وانتظار نتيجته"""
+        if self._collector is None:
+            raise RuntimeError("خدمة التجميع غير مشغلة")
+
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait(_Pending(item, future, time.monotonic()))
+        self._set_depth()
+        return await future
+
+    async def run(self, function: Callable, *args) -> Any:
+        """تشغيل دالة على خيط الاستدلال (للتحليلات المجمعة الكاملة)"""
+        return await asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    def _set_depth(self):
+        if self.queue_depth is not None:
+            self.queue_depth.set(self.depth)
+
+    async def _next_batch(self) -> List[_Pending]:
+        """
+        انتظار أول طلب ثم التجميع حتى الحجم الأقصى أو انتهاء مهلة الانتظار
+        Dequeued items go straight into ``_in_flight`` so ``stop`` can fail
+        them if the collector is cancelled mid-batch.
+        """
+        first = await self._queue.get()
+        batch = self._in_flight = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self._set_depth()
+        return batch
+
+    async def _collect(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._next_batch()
+            # الطلبات الملغاة (انقطاع العميل) لا تحتاج تحليلاً
+            batch = self._in_flight = [pending for pending in batch if not pending.future.done()]
+            if not batch:
+                continue
+
+            started_at = time.monotonic()
+            if self.batch_sizes is not None:
+                self.batch_sizes.observe(len(batch))
+            if self.wait_seconds is not None:
+                for pending in batch:
+                    self.wait_seconds.observe(started_at - pending.enqueued_at)
+
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.process_batch, [pending.item for pending in batch]
+                )
+                if len(results) != len(batch):
+                    raise RuntimeError(f"عدد النتائج {len(results)} لا يطابق حجم الدفعة {len(batch)}")
+            except Exception as e:
+                logger.error(f"❌ فشل في معالجة دفعة من {len(batch)} طلب: {str(e)}")
+                results = [e] * len(batch)
+
+            for pending, result in zip(batch, results):
+                if pending.future.done():
+                    continue
+                if isinstance(result, Exception):
+                    pending.future.set_exception(result)
+                else:
+                    pending.future.set_result(result)
+            self._in_flight = []
+
+            self.batches_processed += 1
+            self.items_processed += len(batch)
+
+    def stats(self) -> dict:
+        """إحصائيات التجميع"""
+        return {
+            'name': self.name,
+            'queue_depth': self.depth,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches_processed': self.batches_processed,
+            'items_processed': self.items_processed,
+            'average_batch_size': (self.items_processed / self.batches_processed
+                                   if self.batches_processed else 0.0),
+        }
@@ -0,0 +1,181 @@
+# تخزين نتائج تحليل المشاعر حسب محتوى النص المطبّع
+# Content-Addressed Sentiment Result Cache (in-process LRU + Redis)
+
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable
+
+from .bounded_cache import BoundedCache
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """بصمة محتوى ملف (لأوزان النماذج)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_fingerprint(*parts: Any) -> str:
+    """إصدار نموذج ثابت عبر العمليات من مكوناته (أسماء، إعدادات، بصمات أوزان)"""
+    return hashlib.blake2b(
+        json.dumps(parts, sort_keys=True, default=str).encode('utf-8'), digest_size=8
+    ).hexdigest()
+
+
+def _with_text_fields(result: Dict[str, Any], text: str) -> Dict[str, Any]:
+    result = dict(result, text=text)
+    if isinstance(result.get('analysis_metadata'), dict) and 'text_length' in result['analysis_metadata']:
+        result['analysis_metadata'] = dict(result['analysis_metadata'], text_length=len(text))
+    return result
+
+
+def with_text(result: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """
+    نسخة من النتيجة تحمل نص الطلب الحالي (قد يختلف عن النص المخزن بالتشكيل مثلاً)
+    Per-request fields are refreshed as well: ``text_length`` in each
+    ``analysis_metadata`` and the summary's ``analysis_timestamp``.
+    """
+    result = _with_text_fields(result, text)
+    for section in ('sentiment_analysis', 'emotion_analysis'):
+        if isinstance(result.get(section), dict):
+            result[section] = _with_text_fields(result[section], text)
+    if isinstance(result.get('summary'), dict) and 'analysis_timestamp' in result['summary']:
+        result['summary'] = dict(result['summary'], analysis_timestamp=datetime.now().isoformat())
+    return result
+
+
+class SentimentResultCache:
+    """
+    تخزين مؤقت موحد لنتائج التحليل
+    Keys are ``<prefix>result:<model_version>:<analysis_type>:<hash>``, where
+    the hash is a stable BLAKE2b digest of the text after the same cleaning
+    and normalisation the model sees. Texts that differ only in diacritics,
+    tatweel or letter repetition therefore share one entry, in every process.
+
+    - L1: in-process ``BoundedCache``; its sync ``get_local``/``set_local``
+      are used by the analyzer on the inference thread
+    - L2: Redis, read with one ``MGET`` per batch (``get_many``) and written
+      with one pipeline (``set_many``) from the event loop
+
+    The model version is part of every key, so loading different weights
+    (``set_model_version``) makes all earlier entries unreachable; L1 is
+    cleared and old Redis entries expire with their TTL.
+    """
+
+    def __init__(self, normalize: Callable[[str], str], redis_client: Any = None,
+                 key_prefix: str = 'sentiment:', ttl: int = 3600,
+                 max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 name: str = 'sentiment_results'):
+        self.normalize = normalize
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.model_version = 'unversioned'
+        self.l1 = BoundedCache(max_entries=max_entries, max_bytes=max_bytes,
+                               default_ttl=ttl, name=name)
+        self.l2_hits = 0
+        self.l2_misses = 0
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def set_model_version(self, version: str):
+        """تحديث إصدار النموذج (يبطل جميع النتائج السابقة)"""
+        if version != self.model_version:
+            self.model_version = version
+            self.l1.clear()
+            logger.info(f"🔑 إصدار النموذج للتخزين المؤقت: {version}")
+
+    def key(self, text: str, analysis_type: str) -> str:
+        digest = hashlib.blake2b(self.normalize(text).encode('utf-8'), digest_size=16).hexdigest()
+        return f"{self.key_prefix}result:{self.model_version}:{analysis_type}:{digest}"
+
+    @staticmethod
+    def _cacheable(result: Optional[Dict[str, Any]]) -> bool:
+        return bool(result) and 'error' not in result.get('analysis_metadata', {})
+
+    # ----------------------------- L1 (متزامن) -----------------------------
+
+    def get_local(self, text: str, analysis_type: str) -> Optional[Dict[str, Any]]:
+        result = self.l1.get(self.key(text, analysis_type))
+        return with_text(result, text) if result is not None else None
+
+    def set_local(self, text: str, analysis_type: str, result: Dict[str, Any]):
+        if self._cacheable(result):
+            self.l1.set(self.key(text, analysis_type), result)
+
+    def get_or_compute_local(self, text: str, analysis_type: str,
+                             compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """جلب من L1 أو الحساب مرة واحدة للطلبات المتزامنة لنفس المفتاح"""
+        key = self.key(text, analysis_type)
+        result = self.l1.get_or_compute(key, compute)
+        if not self._cacheable(result):
+            self.l1.delete(key)
+        return with_text(result, text)
+
+    # ----------------------------- L1 + Redis -----------------------------
+
+    async def get_many(self, texts: List[str], analysis_type: str) -> List[Optional[Dict[str, Any]]]:
+        """جلب نتائج قائمة نصوص: L1 أولاً ثم MGET واحد لما تبقى"""
+        keys = [self.key(text, analysis_type) for text in texts]
+        results = [self.l1.get(key) for key in keys]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing and self.redis is not None:
+            # مفاتيح مكررة في نفس الدفعة تُجلب مرة واحدة
+            missing_keys = list(dict.fromkeys(keys[i] for i in missing))
+            try:
+                values = dict(zip(missing_keys, await self.redis.mget(missing_keys)))
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في القراءة من Redis: {str(e)}")
+                values = {}
+
+            for i in missing:
+                raw = values.get(keys[i])
+                if raw is None:
+                    self.l2_misses += 1
+                    continue
+                try:
+                    results[i] = json.loads(raw)
+                except ValueError:
+                    continue
+                self.l2_hits += 1
+                self.l1.set(keys[i], results[i])
+
+        return [with_text(result, text) if result is not None else None
+                for text, result in zip(texts, results)]
+
+    async def set_many(self, texts: List[str], analysis_type: str, results: List[Dict[str, Any]]):
+        """حفظ نتائج في الطبقتين (خط أنابيب Redis واحد)"""
+        entries = {}
+        for text, result in zip(texts, results):
+            if self._cacheable(result):
+                key = self.key(text, analysis_type)
+                self.l1.set(key, result)
+                entries[key] = result
+
+        if not entries or self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, result in entries.items():
+                    pipe.setex(key, self.ttl, json.dumps(result, default=str, ensure_ascii=False))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في الحفظ في Redis: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات التخزين المؤقت"""
+        return {
+            **self.l1.stats(),
+            'model_version': self.model_version,
+            'l2_enabled': self.redis is not None,
+            'l2_hits': self.l2_hits,
+            'l2_misses': self.l2_misses,
+        }
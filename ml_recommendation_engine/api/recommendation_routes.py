@@ -15,13 +15,19 @@ import time
 import hashlib
 from contextlib import asynccontextmanager
 import uvicorn
+import redis.asyncio as aioredis
 
 # استيراد نماذج ML
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from models.collaborative_filtering import CollaborativeFilteringEnsemble
+from config import settings
+from models.collaborative_filtering import CollaborativeFilteringEnsemble, MatrixFactorizationModel
+from models.batch_scoring import BatchRecommendationScorer
+from models.neighbor_table import NeighborTable, table_versions
+from models.artifact_store import is_artifact
+from models.tiered_cache import TieredRecommendationCache
 from models.content_based_filtering import ContentBasedRecommender
 from models.hybrid_recommendation import HybridRecommendationEngine
 from models.deep_learning_models import DeepRecommendationTrainer
@@ -90,6 +96,7 @@ class BatchRecommendationRequest(BaseModel):
     recommendation_type: RecommendationType = RecommendationType.PERSONALIZED
     count: int = Field(10, ge=1, le=50)
     context: Optional[UserContext] = None
+    exclude_items: Optional[Dict[str, List[str]]] = Field(None, description="مقالات للاستبعاد لكل مستخدم")
 
 class InteractionRequest(BaseModel):
     """طلب تسجيل تفاعل"""
@@ -162,12 +169,43 @@ class RecommendationServiceManager:
         self.active_users = set()
         self.popular_items = {}
         self.response_times = []
-        self.cache = {}
         self.cache_ttl = 300  # 5 دقائق
+        self.cache = self._create_cache(redis_client=None)
+        self.batch_chunk_size = settings.batch_scoring_chunk_size
+        self.batch_scorer = None
+        self.neighbor_tables: Dict[str, NeighborTable] = {}
+        self.neighbor_table_versions: Dict[str, Optional[str]] = {}
+        self._neighbor_watcher: Optional[asyncio.Task] = None
         
         # قفل للعمليات المتزامنة
         self._lock = asyncio.Lock()
     
+    def _create_cache(self, redis_client: Any) -> TieredRecommendationCache:
+        """إنشاء التخزين المؤقت بطبقتين (L2 اختياري)"""
+        return TieredRecommendationCache(
+            redis_client,
+            key_prefix=settings.redis_key_prefix,
+            ttl=self.cache_ttl,
+            stale_ttl=settings.cache_stale_ttl,
+            max_entries=settings.cache_max_entries,
+            max_bytes=settings.cache_max_bytes,
+            serialize=lambda response: response.json(),
+            deserialize=RecommendationResponse.parse_raw
+        )
+    
+    async def initialize_cache(self):
+        """ربط التخزين المؤقت بـ Redis والاشتراك في رسائل الإبطال"""
+        try:
+            redis_client = aioredis.from_url(settings.redis_url)
+            await redis_client.ping()
+        except Exception as e:
+            logger.warning(f"⚠️ Redis غير متاح، استخدام التخزين المؤقت المحلي فقط: {str(e)}")
+            return
+        
+        self.cache = self._create_cache(redis_client)
+        await self.cache.start()
+        logger.info("📦 تم تفعيل التخزين المؤقت بطبقتين (محلي + Redis)")
+    
     async def initialize_models(self):
         """تهيئة النماذج"""
         logger.info("🚀 بدء تهيئة نماذج التوصيات...")
@@ -177,12 +215,69 @@ class RecommendationServiceManager:
             # للتبسيط، سنستخدم نماذج جديدة
             
             # تهيئة النماذج الأساسية (سيتم تحميلها من الملفات المحفوظة)
+            self.load_neighbor_tables(settings.neighbor_table_path)
             logger.info("✅ تم تهيئة جميع النماذج بنجاح")
             
         except Exception as e:
             logger.error(f"❌ فشل في تهيئة النماذج: {str(e)}")
             raise
     
+    def load_neighbor_tables(self, base_path: str):
+        """
+        تحميل جداول الجيران المحسوبة مسبقاً بربط الذاكرة
+        The new tables replace the old dict in one assignment, so requests in
+        flight keep reading a consistent set; a table that fails to load keeps
+        its previously loaded version.
+        """
+        if not os.path.isdir(base_path):
+            return
+        
+        tables: Dict[str, NeighborTable] = {}
+        versions = table_versions(base_path)
+        for name in sorted(os.listdir(base_path)):
+            directory = os.path.join(base_path, name)
+            if not is_artifact(directory):
+                continue
+            try:
+                tables[name] = NeighborTable.load(directory)
+                logger.info(f"🧭 تم تحميل جدول الجيران {name}: {len(tables[name])} مقال")
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في تحميل جدول الجيران {name}: {str(e)}")
+                if name in self.neighbor_tables:
+                    tables[name] = self.neighbor_tables[name]
+                    versions[name] = self.neighbor_table_versions.get(name)
+        
+        self.neighbor_tables = tables
+        self.neighbor_table_versions = versions
+    
+    async def watch_neighbor_tables(self, base_path: str, interval: int):
+        """إعادة تحميل جداول الجيران عند إعادة بنائها (تغير built_at في manifest)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if table_versions(base_path) != self.neighbor_table_versions:
+                    logger.info("🔁 تغيرت جداول الجيران، إعادة التحميل...")
+                    self.load_neighbor_tables(base_path)
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في إعادة تحميل جداول الجيران: {str(e)}")
+    
+    def start_neighbor_watcher(self):
+        """بدء مراقبة جداول الجيران"""
+        if settings.neighbor_table_reload_interval > 0 and self._neighbor_watcher is None:
+            self._neighbor_watcher = asyncio.create_task(self.watch_neighbor_tables(
+                settings.neighbor_table_path, settings.neighbor_table_reload_interval))
+    
+    async def stop_neighbor_watcher(self):
+        """إيقاف مراقبة جداول الجيران"""
+        if self._neighbor_watcher is None:
+            return
+        self._neighbor_watcher.cancel()
+        try:
+            await self._neighbor_watcher
+        except asyncio.CancelledError:
+            pass
+        self._neighbor_watcher = None
+    
     async def get_recommendations(self, request: RecommendationRequest) -> RecommendationResponse:
         """الحصول على توصيات للمستخدم"""
         start_time = time.time()
@@ -191,61 +286,59 @@ class RecommendationServiceManager:
         self.request_count += 1
         self.active_users.add(request.user_id)
         
-        # التحقق من التخزين المؤقت
+        # التخزين المؤقت: الطلبات المتزامنة لنفس المفتاح تنتظر حساباً واحداً
         cache_key = self._generate_cache_key(request)
-        cached_result = await self._get_from_cache(cache_key)
-        
-        if cached_result:
-            logger.info(f"📦 إرجاع نتائج محفوظة للمستخدم {request.user_id}")
-            return cached_result
-        
         try:
-            # تحديد نوع التوصية وتنفيذها
-            if request.recommendation_type == RecommendationType.INSTANT:
-                recommendations = await self._get_instant_recommendations(request)
-            elif request.recommendation_type == RecommendationType.PERSONALIZED:
-                recommendations = await self._get_personalized_recommendations(request)
-            elif request.recommendation_type == RecommendationType.TRENDING:
-                recommendations = await self._get_trending_recommendations(request)
-            elif request.recommendation_type == RecommendationType.CONTEXTUAL:
-                recommendations = await self._get_contextual_recommendations(request)
-            elif request.recommendation_type == RecommendationType.EXPLORE:
-                recommendations = await self._get_exploratory_recommendations(request)
-            else:
-                recommendations = await self._get_similar_recommendations(request)
-            
-            # إنشاء الاستجابة
-            processing_time = (time.time() - start_time) * 1000
-            self.response_times.append(processing_time)
-            
-            recommendation_id = self._generate_recommendation_id(request.user_id)
-            
-            response = RecommendationResponse(
-                recommendations=recommendations,
-                total_count=len(recommendations),
-                recommendation_id=recommendation_id,
-                generated_at=datetime.now(),
-                user_id=request.user_id,
-                recommendation_type=request.recommendation_type,
-                processing_time_ms=processing_time,
-                metadata={
-                    "model_version": "1.0",
-                    "cache_hit": False,
-                    "filters_applied": request.filters is not None
-                }
+            return await self.cache.get_or_compute(
+                request.user_id, cache_key,
+                lambda: self._generate_recommendations(request, start_time)
             )
-            
-            # حفظ في التخزين المؤقت
-            await self._save_to_cache(cache_key, response)
-            
-            logger.info(f"✅ تم إنشاء {len(recommendations)} توصية للمستخدم {request.user_id}")
-            
-            return response
-            
         except Exception as e:
             logger.error(f"❌ خطأ في إنشاء التوصيات للمستخدم {request.user_id}: {str(e)}")
             raise HTTPException(status_code=500, detail=f"فشل في إنشاء التوصيات: {str(e)}")
     
+    async def _generate_recommendations(self, request: RecommendationRequest,
+                                        start_time: float) -> RecommendationResponse:
+        """إنشاء التوصيات عند عدم وجودها في التخزين المؤقت"""
+        # تحديد نوع التوصية وتنفيذها
+        if request.recommendation_type == RecommendationType.INSTANT:
+            recommendations = await self._get_instant_recommendations(request)
+        elif request.recommendation_type == RecommendationType.PERSONALIZED:
+            recommendations = await self._get_personalized_recommendations(request)
+        elif request.recommendation_type == RecommendationType.TRENDING:
+            recommendations = await self._get_trending_recommendations(request)
+        elif request.recommendation_type == RecommendationType.CONTEXTUAL:
+            recommendations = await self._get_contextual_recommendations(request)
+        elif request.recommendation_type == RecommendationType.EXPLORE:
+            recommendations = await self._get_exploratory_recommendations(request)
+        else:
+            recommendations = await self._get_similar_recommendations(request)
+        
+        # إنشاء الاستجابة
+        processing_time = (time.time() - start_time) * 1000
+        self.response_times.append(processing_time)
+        
+        recommendation_id = self._generate_recommendation_id(request.user_id)
+        
+        response = RecommendationResponse(
+            recommendations=recommendations,
+            total_count=len(recommendations),
+            recommendation_id=recommendation_id,
+            generated_at=datetime.now(),
+            user_id=request.user_id,
+            recommendation_type=request.recommendation_type,
+            processing_time_ms=processing_time,
+            metadata={
+                "model_version": "1.0",
+                "cache_hit": False,
+                "filters_applied": request.filters is not None
+            }
+        )
+        
+        logger.info(f"✅ تم إنشاء {len(recommendations)} توصية للمستخدم {request.user_id}")
+        
+        return response
+    
     async def _get_instant_recommendations(self, request: RecommendationRequest) -> List[RecommendationItem]:
         """توصيات فورية سريعة"""
         # توصيات بناءً على الشعبية والاتجاهات الحديثة
@@ -419,6 +512,27 @@ class RecommendationServiceManager:
     
     async def get_similar_items(self, request: SimilarItemsRequest) -> List[RecommendationItem]:
         """الحصول على عناصر مشابهة لمقال معين"""
+        # القراءة من جداول الجيران المحسوبة مسبقاً في O(K)
+        for method, table in self.neighbor_tables.items():
+            if request.item_id not in table:
+                continue
+            
+            neighbors = table.get_neighbors(request.item_id, request.count,
+                                            threshold=request.similarity_threshold)
+            return [
+                RecommendationItem(
+                    item_id=str(similar_item_id),
+                    score=min(max(score, 0.0), 1.0),
+                    reason=f"مشابه للمقال {request.item_id}",
+                    metadata={
+                        "type": "content_similarity",
+                        "base_item": request.item_id,
+                        "similarity_method": method
+                    }
+                )
+                for similar_item_id, score in neighbors
+            ]
+        
         recommendations = []
         
         # محاكاة العثور على مقالات مشابهة
@@ -461,6 +575,9 @@ class RecommendationServiceManager:
         elif request.interaction_type == InteractionType.SHARE:
             self.popular_items[request.item_id]["shares"] += 1
         
+        # إبطال توصيات المستخدم المخزنة في جميع العمليات حتى لا تُقترح مقالات قرأها
+        await self.cache.invalidate_user(request.user_id)
+        
         # إشعار نظام التعلم المستمر
         if self.continuous_learner:
             # تحويل التفاعل لنظام التعلم المستمر
@@ -504,6 +621,68 @@ class RecommendationServiceManager:
             "learning_updated": True
         }
     
+    def _get_batch_scorer(self) -> Optional[BatchRecommendationScorer]:
+        """
+        الحصول على محرك التقييم المجمع من نموذج تفكيك المصفوفة المحمل
+        The cached scorer is keyed on the model object: a retrain or reload
+        that swaps the model (or the whole collaborative filter) builds a new
+        scorer instead of serving the old embeddings.
+        """
+        current = None
+        models = getattr(self.collaborative_model, 'models', None) or {}
+        for model in models.values():
+            if isinstance(model, MatrixFactorizationModel) and model.item_embeddings is not None:
+                current = model
+                break
+        
+        if current is None:
+            self.batch_scorer = None
+        elif self.batch_scorer is None or self.batch_scorer.model is not current:
+            self.batch_scorer = BatchRecommendationScorer(current, chunk_size=self.batch_chunk_size)
+        return self.batch_scorer
+    
+    async def _get_batched_personalized(self, request: BatchRecommendationRequest) -> Dict[str, RecommendationResponse]:
+        """توصيات شخصية مجمعة بتقييم واحد لكل دفعة من المستخدمين"""
+        scorer = self._get_batch_scorer()
+        if scorer is None or request.recommendation_type != RecommendationType.PERSONALIZED:
+            return {}
+        
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        batch_results = await loop.run_in_executor(
+            None, scorer.recommend, request.user_ids, request.count, request.exclude_items
+        )
+        processing_time = (time.time() - start_time) * 1000
+        max_rating = scorer.model.config.max_rating
+        
+        responses = {}
+        for user_id, user_recs in batch_results.items():
+            recommendations = [
+                RecommendationItem(
+                    item_id=str(item_id),
+                    score=min(max(score / max_rating, 0.0), 1.0),
+                    reason="مخصص لاهتماماتك",
+                    metadata={"type": "personalized", "scoring": "batched"}
+                )
+                for item_id, score in user_recs
+            ]
+            responses[user_id] = RecommendationResponse(
+                recommendations=recommendations,
+                total_count=len(recommendations),
+                recommendation_id=self._generate_recommendation_id(user_id),
+                generated_at=datetime.now(),
+                user_id=user_id,
+                recommendation_type=request.recommendation_type,
+                processing_time_ms=processing_time,
+                metadata={
+                    "model_version": "1.0",
+                    "cache_hit": False,
+                    "batched": True
+                }
+            )
+        
+        return responses
+    
     async def get_batch_recommendations(self, request: BatchRecommendationRequest) -> BatchRecommendationResponse:
         """الحصول على توصيات مجمعة لعدة مستخدمين"""
         start_time = time.time()
@@ -511,14 +690,26 @@ class RecommendationServiceManager:
         successful = 0
         failed = 0
         
-        # معالجة كل مستخدم
+        # التقييم المجمع للمستخدمين المعروفين للنموذج
+        try:
+            results.update(await self._get_batched_personalized(request))
+            successful += len(results)
+        except Exception as e:
+            logger.error(f"❌ فشل التقييم المجمع، الرجوع للمعالجة الفردية: {str(e)}")
+            results = {}
+        
+        # معالجة باقي المستخدمين فردياً
         for user_id in request.user_ids:
+            if user_id in results:
+                continue
+            
             try:
                 individual_request = RecommendationRequest(
                     user_id=user_id,
                     recommendation_type=request.recommendation_type,
                     count=request.count,
-                    context=request.context
+                    context=request.context,
+                    exclude_items=(request.exclude_items or {}).get(user_id)
                 )
                 
                 user_recommendations = await self.get_recommendations(individual_request)
@@ -565,7 +756,7 @@ class RecommendationServiceManager:
         performance_metrics = {
             "average_response_time_ms": avg_response_time,
             "requests_per_minute": len(self.response_times[-60:]),  # تقريبي
-            "cache_hit_rate": 0.3,  # محاكاة
+            "cache_hit_rate": self.cache.stats()['hit_rate'],
             "error_rate": 0.01,     # محاكاة
             "throughput": self.request_count
         }
@@ -606,27 +797,6 @@ class RecommendationServiceManager:
             key_data += f":{request.context.device_type}"
         return hashlib.md5(key_data.encode()).hexdigest()
     
-    async def _get_from_cache(self, cache_key: str) -> Optional[RecommendationResponse]:
-        """جلب من التخزين المؤقت"""
-        if cache_key in self.cache:
-            cached_data, timestamp = self.cache[cache_key]
-            if (datetime.now() - timestamp).total_seconds() < self.cache_ttl:
-                return cached_data
-            else:
-                del self.cache[cache_key]
-        return None
-    
-    async def _save_to_cache(self, cache_key: str, response: RecommendationResponse):
-        """حفظ في التخزين المؤقت"""
-        self.cache[cache_key] = (response, datetime.now())
-        
-        # تنظيف الكاش القديم
-        if len(self.cache) > 1000:
-            oldest_keys = sorted(self.cache.keys(), 
-                               key=lambda k: self.cache[k][1])[:100]
-            for key in oldest_keys:
-                del self.cache[key]
-    
     def _generate_recommendation_id(self, user_id: str) -> str:
         """إنشاء معرف توصية فريد"""
         timestamp = int(time.time() * 1000)
@@ -642,10 +812,14 @@ async def lifespan(app: FastAPI):
     """إدارة دورة حياة التطبيق"""
     # بدء التطبيق
     logger.info("🚀 بدء تطبيق API التوصيات...")
+    await service_manager.initialize_cache()
     await service_manager.initialize_models()
+    service_manager.start_neighbor_watcher()
     yield
     # إنهاء التطبيق
     logger.info("🔚 إنهاء تطبيق API التوصيات...")
+    await service_manager.stop_neighbor_watcher()
+    await service_manager.cache.stop()
 
 # إنشاء تطبيق FastAPI
 app = FastAPI(
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+محرك التوصيات الذكي - سبق الذكية
+بناء أو تحديث جداول الجيران المحسوبة مسبقاً
+Sabq AI Recommendation Engine - Neighbor table build job
+
+Usage:
+    python build_neighbor_tables.py                      # بناء كامل
+    python build_neighbor_tables.py --changed-ids a1,a2  # تحديث تزايدي
+
+The API reloads the tables on its own once their manifests change
+(see ``neighbor_table_reload_interval``).
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# إضافة المسار الحالي لاستيراد المكتبات
+sys.path.append(str(Path(__file__).parent))
+
+from config import settings
+from models.artifact_store import is_artifact, load_artifact
+from models.collaborative_filtering import MatrixFactorizationModel, RecommendationConfig
+from models.content_based_filtering import (
+    ContentFilteringConfig, TFIDFContentExtractor, Word2VecContentModel
+)
+from models.neighbor_table import NeighborTable, materialize_neighbor_tables
+
+logger = logging.getLogger(__name__)
+
+
+def load_similarity_models(model_path: str, content_path: str) -> Dict[str, Any]:
+    """تحميل النماذج التي تُبنى منها جداول الجيران (دون تحميل BERT)"""
+    models: Dict[str, Any] = {}
+
+    # تفكيك المصفوفة
+    if os.path.exists(model_path):
+        try:
+            mf_model = MatrixFactorizationModel(RecommendationConfig())
+            mf_model.load_model(model_path)
+            models['matrix_factorization'] = mf_model
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في تحميل نموذج تفكيك المصفوفة: {str(e)}")
+
+    # نماذج المحتوى
+    config = ContentFilteringConfig()
+    if is_artifact(f"{content_path}_config"):
+        config = load_artifact(f"{content_path}_config", kind='content_based').objects['config']
+
+    catalog = None
+    if is_artifact(f"{content_path}_tfidf"):
+        try:
+            tfidf_extractor = TFIDFContentExtractor(config).load(f"{content_path}_tfidf")
+            catalog = tfidf_extractor.catalog
+            models['tfidf'] = tfidf_extractor
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في تحميل نموذج TF-IDF: {str(e)}")
+
+    if is_artifact(f"{content_path}_word2vec"):
+        try:
+            models['word2vec'] = Word2VecContentModel(config, catalog=catalog).load(
+                f"{content_path}_word2vec")
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في تحميل نموذج Word2Vec: {str(e)}")
+
+    return models
+
+
+def build_neighbor_tables(changed_ids: Optional[List[str]] = None,
+                          k: Optional[int] = None,
+                          model_path: Optional[str] = None,
+                          content_path: Optional[str] = None,
+                          output_path: Optional[str] = None) -> Dict[str, NeighborTable]:
+    """
+    بناء جداول الجيران من النماذج المحفوظة
+    Refreshes incrementally when ``changed_ids`` is given; K defaults to
+    ``settings.neighbor_table_k``.
+    """
+    k = k or settings.neighbor_table_k
+    model_path = model_path or os.path.join(settings.model_path, 'matrix_factorization')
+    content_path = content_path or settings.model_path
+    output_path = output_path or settings.neighbor_table_path
+
+    models = load_similarity_models(model_path, content_path)
+    if not models:
+        logger.warning("⚠️ لا توجد نماذج محفوظة لبناء جداول الجيران")
+        return {}
+
+    return materialize_neighbor_tables(models, output_path, k=k, changed_ids=changed_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بناء جداول الجيران - سبق الذكية")
+    parser.add_argument('--changed-ids', default=None,
+                        help="معرفات المقالات الجديدة أو المعدلة مفصولة بفواصل (تحديث تزايدي)")
+    parser.add_argument('--k', type=int, default=settings.neighbor_table_k,
+                        help="عدد الجيران لكل مقال")
+    parser.add_argument('--model-path', default=os.path.join(settings.model_path, 'matrix_factorization'),
+                        help="مسار نموذج تفكيك المصفوفة")
+    parser.add_argument('--content-path', default=settings.model_path,
+                        help="البادئة المشتركة لملفات نماذج المحتوى")
+    parser.add_argument('--output-path', default=settings.neighbor_table_path,
+                        help="مجلد جداول الجيران")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, settings.log_level),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    changed_ids = None
+    if args.changed_ids is not None:
+        changed_ids = [article_id for article_id in args.changed_ids.split(',') if article_id]
+
+    tables = build_neighbor_tables(changed_ids, args.k, args.model_path,
+                                   args.content_path, args.output_path)
+    for name, table in tables.items():
+        logger.info(f"✅ {name}: {len(table)} مقال × {table.k} جار")
+
+
+if __name__ == "__main__":
+    main()
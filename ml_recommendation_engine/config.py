@@ -24,6 +24,7 @@ class Settings(BaseSettings):
     redis_host: str = Field(default="localhost", env="REDIS_HOST")
     redis_port: int = Field(default=6379, env="REDIS_PORT")
     redis_password: Optional[str] = Field(default="sabq_redis_2024", env="REDIS_PASSWORD")
+    redis_key_prefix: str = Field(default="sabq_ai_rec:", env="REDIS_KEY_PREFIX")
     
     @property
     def redis_url(self) -> str:
@@ -55,6 +56,10 @@ class Settings(BaseSettings):
     similarity_threshold: float = Field(default=0.1, env="SIMILARITY_THRESHOLD")
     update_frequency_hours: int = Field(default=24, env="UPDATE_FREQUENCY_HOURS")
     batch_size: int = Field(default=1000, env="BATCH_SIZE")
+    batch_scoring_chunk_size: int = Field(default=256, env="BATCH_SCORING_CHUNK_SIZE")
+    neighbor_table_path: str = Field(default="./models/neighbors", env="NEIGHBOR_TABLE_PATH")
+    neighbor_table_k: int = Field(default=50, env="NEIGHBOR_TABLE_K")
+    neighbor_table_reload_interval: int = Field(default=60, env="NEIGHBOR_TABLE_RELOAD_INTERVAL")
     max_workers: int = Field(default=4, env="MAX_WORKERS")
     
     # ===== إعدادات التعلم المستمر =====
@@ -65,6 +70,9 @@ class Settings(BaseSettings):
     
     # ===== إعدادات الأداء =====
     cache_ttl: int = Field(default=3600, env="CACHE_TTL")
+    cache_max_entries: int = Field(default=10000, env="CACHE_MAX_ENTRIES")
+    cache_max_bytes: int = Field(default=256 * 1024 * 1024, env="CACHE_MAX_BYTES")
+    cache_stale_ttl: int = Field(default=900, env="CACHE_STALE_TTL")
     max_concurrent_requests: int = Field(default=100, env="MAX_CONCURRENT_REQUESTS")
     request_timeout: int = Field(default=30, env="REQUEST_TIMEOUT")
     health_check_interval: int = Field(default=60, env="HEALTH_CHECK_INTERVAL")
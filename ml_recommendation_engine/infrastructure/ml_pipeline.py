@@ -24,6 +24,12 @@ import time
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import torch
 import joblib
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from models.artifact_store import is_artifact, load_artifact, archive_artifact, extract_artifact
+from models.tiered_cache import TieredRecommendationCache
 
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -53,6 +59,8 @@ class RedisConfig:
     pool_size: int = 10
     timeout: int = 30
     key_prefix: str = "sabq_ai_rec:"
+    recommendation_ttl: int = 300  # صلاحية التوصيات (ثواني)
+    recommendation_stale_ttl: int = 900  # مدة تقديم التوصيات القديمة أثناء التحديث
 
 @dataclass
 class S3Config:
@@ -762,6 +770,9 @@ class MLPipelineManager:
         self.executor = ThreadPoolExecutor(max_workers=config.ml.max_workers)
         self.process_executor = ProcessPoolExecutor(max_workers=2)
         
+        # تخزين التوصيات المؤقت (L1 داخل العملية + L2 Redis)، يُهيأ بعد Redis
+        self.recommendation_cache: Optional[TieredRecommendationCache] = None
+        
         # نماذج ML محملة
         self.loaded_models = {}
         self.model_metadata = {}
@@ -780,6 +791,13 @@ class MLPipelineManager:
             
             # تهيئة Redis
             await self.redis_manager.initialize()
+            self.recommendation_cache = TieredRecommendationCache(
+                self.redis_manager.redis_client,
+                key_prefix=self.redis_manager.key_prefix,
+                ttl=self.config.redis.recommendation_ttl,
+                stale_ttl=self.config.redis.recommendation_stale_ttl
+            )
+            await self.recommendation_cache.start()
             
             # تهيئة S3 (اختياري)
             await self.s3_manager.initialize()
@@ -824,7 +842,15 @@ class MLPipelineManager:
                         continue
                 
                 # محاولة تحميل من S3
-                if s3_key:
+                if s3_key and s3_key.endswith('.tar'):
+                    # أرشيف بالصيغة المربوطة بالذاكرة: فك إلى مجلد ثم التحميل
+                    local_path = os.path.join(self.config.ml.model_storage_path, model_id)
+                    if await self.s3_manager.download_model(s3_key, f"{local_path}.tar"):
+                        await asyncio.get_event_loop().run_in_executor(
+                            self.executor, extract_artifact, f"{local_path}.tar", local_path
+                        )
+                        await self._load_model_from_file(model_id, model_type, local_path)
+                elif s3_key:
                     local_path = os.path.join(self.config.ml.model_storage_path, f"{model_id}.pkl")
                     if await self.s3_manager.download_model(s3_key, local_path):
                         await self._load_model_from_file(model_id, model_type, local_path)
@@ -837,9 +863,10 @@ class MLPipelineManager:
     async def _load_model_from_file(self, model_id: str, model_type: str, model_path: str) -> bool:
         """تحميل نموذج من ملف"""
         try:
-            # تحميل النموذج في thread منفصل
+            # تحميل النموذج في thread منفصل (ربط المصفوفات بالذاكرة للصيغة الجديدة)
             loop = asyncio.get_event_loop()
-            model = await loop.run_in_executor(self.executor, joblib.load, model_path)
+            loader = load_artifact if is_artifact(model_path) else joblib.load
+            model = await loop.run_in_executor(self.executor, loader, model_path)
             
             self.loaded_models[model_id] = model
             self.model_metadata[model_id] = {
@@ -972,18 +999,31 @@ class MLPipelineManager:
             try:
                 # نسخ النماذج إلى S3
                 for model_id, model in self.loaded_models.items():
-                    local_path = os.path.join(
-                        self.config.ml.model_storage_path, 
-                        f"{model_id}_backup.pkl"
-                    )
+                    model_path = self.model_metadata.get(model_id, {}).get('path')
                     
-                    # حفظ النموذج محلياً
-                    await asyncio.get_event_loop().run_in_executor(
-                        self.executor, joblib.dump, model, local_path
-                    )
+                    if model_path and is_artifact(model_path):
+                        # النموذج محفوظ بالصيغة الجديدة: أرشفة ملفاته كما هي بدون إعادة تسلسل
+                        local_path = os.path.join(
+                            self.config.ml.model_storage_path,
+                            f"{model_id}_backup.tar"
+                        )
+                        await asyncio.get_event_loop().run_in_executor(
+                            self.executor, archive_artifact, model_path, local_path
+                        )
+                        s3_key = f"models/backups/{model_id}_{int(time.time())}.tar"
+                    else:
+                        local_path = os.path.join(
+                            self.config.ml.model_storage_path, 
+                            f"{model_id}_backup.pkl"
+                        )
+                        
+                        # حفظ النموذج محلياً
+                        await asyncio.get_event_loop().run_in_executor(
+                            self.executor, joblib.dump, model, local_path
+                        )
+                        s3_key = f"models/backups/{model_id}_{int(time.time())}.pkl"
                     
                     # رفع إلى S3
-                    s3_key = f"models/backups/{model_id}_{int(time.time())}.pkl"
                     await self.s3_manager.upload_model(local_path, s3_key)
                 
                 logger.info("💾 تم إجراء نسخ احتياطي للنماذج")
@@ -1022,26 +1062,11 @@ class MLPipelineManager:
                                 context: Optional[Dict] = None) -> List[Dict]:
         """الحصول على توصيات للمستخدم"""
         
-        # البحث في التخزين المؤقت أولاً
-        cached_recs = await self.redis_manager.get_cached_recommendations(
-            user_id, recommendation_type
+        # التخزين المؤقت بطبقتين؛ يُبطل عند كل تفاعل للمستخدم
+        return await self.recommendation_cache.get_or_compute(
+            user_id, f"{recommendation_type}:{count}",
+            lambda: self._generate_recommendations(user_id, recommendation_type, count, context)
         )
-        
-        if cached_recs:
-            logger.info(f"📦 إرجاع توصيات مخزنة مؤقتاً للمستخدم {user_id}")
-            return cached_recs[:count]
-        
-        # إنشاء توصيات جديدة
-        recommendations = await self._generate_recommendations(
-            user_id, recommendation_type, count, context
-        )
-        
-        # حفظ في التخزين المؤقت
-        await self.redis_manager.cache_recommendations(
-            user_id, recommendations, recommendation_type, expire=300
-        )
-        
-        return recommendations
     
     async def _generate_recommendations(self, user_id: str, 
                                       recommendation_type: str,
@@ -1120,8 +1145,8 @@ class MLPipelineManager:
             await self.redis_manager.increment_counter(f"interactions_today:{item_id}")
             await self.redis_manager.increment_counter(f"user_activity_today:{user_id}")
             
-            # إزالة التوصيات المخزنة مؤقتاً للمستخدم (لإعادة إنشائها)
-            await self.redis_manager.delete(f"recommendations:{user_id}:personalized")
+            # إبطال توصيات المستخدم المخزنة في جميع العمليات (لإعادة إنشائها)
+            await self.recommendation_cache.invalidate_user(user_id)
             
             logger.info(f"📝 تم تسجيل تفاعل: {user_id} {interaction_type} {item_id}")
             
@@ -1148,7 +1173,7 @@ class MLPipelineManager:
             # مقاييس Redis
             redis_info = {
                 'connected': self.redis_manager.redis_client is not None,
-                'cached_recommendations': 0  # يمكن تطوير هذا
+                'recommendation_cache': self.recommendation_cache.stats() if self.recommendation_cache else {}
             }
             
             # مقاييس النماذج
@@ -1188,6 +1213,8 @@ class MLPipelineManager:
         
         # انتظار انتهاء المهام
         await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        if self.recommendation_cache:
+            await self.recommendation_cache.stop()
         
         # إغلاق الاتصالات
         await self.db_manager.close()
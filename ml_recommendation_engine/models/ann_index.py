@@ -0,0 +1,227 @@
+# محرك التوصيات - فهارس البحث التقريبي عن الجيران الأقرب
+# Approximate Nearest-Neighbour Indexes for Sabq AI Recommendation Engine
+
+import numpy as np
+import logging
+from typing import Dict, List, Tuple, Optional, Any, Type
+
+from .top_k import top_k
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _to_index_array(exclude: Optional[Any]) -> Optional[np.ndarray]:
+    """تحويل قائمة المؤشرات المستبعدة إلى مصفوفة أعداد صحيحة"""
+    if exclude is None:
+        return None
+    exclude = np.asarray(exclude, dtype=np.int64).ravel()
+    return exclude if exclude.size else None
+
+
+class BruteForceIndex:
+    """
+    فهرس البحث الشامل (الدقيق)
+    Exact brute-force inner-product index, also used as the ANN fallback
+    """
+
+    index_type = 'brute_force'
+    ARRAY_FIELDS = ('vectors',)
+
+    def __init__(self, **kwargs):
+        self.vectors = None
+
+    @property
+    def size(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def build(self, vectors: np.ndarray) -> 'BruteForceIndex':
+        """بناء الفهرس"""
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return self
+
+    def search(self, query: np.ndarray, k: int,
+               exclude: Optional[Any] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """البحث عن أفضل k عناصر حسب الضرب النقطي"""
+        if self.vectors is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.vectors @ np.asarray(query, dtype=np.float32)
+        return top_k(scores, k, exclude=_to_index_array(exclude))
+
+
+class IVFIndex:
+    """
+    فهرس الملفات المقلوبة (IVF) مع إعادة ترتيب دقيقة
+    Inverted-file index: k-means coarse quantizer, float16 candidate scoring
+    and exact float32 re-ranking of the shortlist.
+
+    ``n_probe`` is the recall/latency knob: more probed lists means higher
+    recall and more candidates scored per query.
+    """
+
+    index_type = 'ivf'
+    ARRAY_FIELDS = ('vectors', 'coarse_vectors', 'centroids', 'list_items', 'list_offsets')
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 rerank_factor: int = 4, kmeans_iters: int = 20,
+                 train_sample_size: int = 65536, random_state: int = 42, **kwargs):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.rerank_factor = rerank_factor
+        self.kmeans_iters = kmeans_iters
+        self.train_sample_size = train_sample_size
+        self.random_state = random_state
+
+        self.vectors = None          # float32 للإعادة الدقيقة
+        self.coarse_vectors = None   # float16 مرتبة حسب القوائم
+        self.centroids = None
+        self.list_items = None       # مؤشرات العناصر مرتبة حسب القائمة
+        self.list_offsets = None     # بداية كل قائمة في list_items
+
+    @property
+    def size(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def _train_centroids(self, vectors: np.ndarray, n_lists: int) -> np.ndarray:
+        """تدريب مراكز k-means على عينة من المتجهات"""
+        rng = np.random.default_rng(self.random_state)
+        n = vectors.shape[0]
+
+        sample = vectors
+        if n > self.train_sample_size:
+            sample = vectors[rng.choice(n, self.train_sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assignments = self._assign(sample, centroids)
+            counts = np.bincount(assignments, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+
+            # إعادة تهيئة المراكز الفارغة بنقاط عشوائية
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+                counts[empty] = 1
+            centroids = sums / counts[:, np.newaxis]
+
+        return centroids.astype(np.float32)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray,
+                chunk_size: int = 16384) -> np.ndarray:
+        """إسناد كل متجه لأقرب مركز (مسافة إقليدية) على دفعات"""
+        centroid_norms = (centroids ** 2).sum(axis=1)
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            distances = centroid_norms[np.newaxis, :] - 2.0 * (chunk @ centroids.T)
+            assignments[start:start + chunk_size] = distances.argmin(axis=1)
+        return assignments
+
+    def build(self, vectors: np.ndarray) -> 'IVFIndex':
+        """بناء الفهرس"""
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = self.vectors.shape[0]
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+
+        self.centroids = self._train_centroids(self.vectors, n_lists)
+        assignments = self._assign(self.vectors, self.centroids)
+
+        self.list_items = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=self.list_offsets[1:])
+        self.coarse_vectors = self.vectors[self.list_items].astype(np.float16)
+
+        logger.info(f"🗂️ تم بناء فهرس IVF: {n} عنصر في {n_lists} قائمة")
+        return self
+
+    def search(self, query: np.ndarray, k: int,
+               exclude: Optional[Any] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """البحث التقريبي ثم إعادة الترتيب الدقيقة للقائمة المختصرة"""
+        if self.vectors is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = min(self.n_probe, self.centroids.shape[0])
+        probed, _ = top_k(self.centroids @ query, n_probe)
+
+        # مواقع المرشحين داخل المصفوفات المرتبة حسب القوائم
+        positions = np.concatenate([
+            np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in probed
+        ])
+        candidates = self.list_items[positions]
+
+        approx_scores = self.coarse_vectors[positions].astype(np.float32) @ query
+        exclude = _to_index_array(exclude)
+        candidate_mask = np.isin(candidates, exclude) if exclude is not None else None
+
+        shortlist_idx, _ = top_k(approx_scores, k * self.rerank_factor, exclude=candidate_mask)
+        shortlist = candidates[shortlist_idx]
+        if shortlist.shape[0] < k:
+            # عدد المرشحين غير كافٍ - الرجوع للبحث الشامل
+            return BruteForceIndex().build(self.vectors).search(query, k, exclude)
+
+        top, top_scores = top_k(self.vectors[shortlist] @ query, k)
+        return shortlist[top], top_scores
+
+
+# سجل أنواع الفهارس المتاحة
+ANN_INDEX_TYPES: Dict[str, Type] = {
+    'brute_force': BruteForceIndex,
+    'ivf': IVFIndex,
+}
+
+
+def register_ann_index(name: str, index_cls: Type):
+    """تسجيل نوع فهرس جديد"""
+    ANN_INDEX_TYPES[name] = index_cls
+
+
+def index_arrays(index, prefix: str) -> Dict[str, np.ndarray]:
+    """مصفوفات الفهرس للحفظ ضمن نموذج (بأسماء مسبوقة بـ prefix)"""
+    return {f"{prefix}.{field}": getattr(index, field) for field in index.ARRAY_FIELDS}
+
+
+def restore_ann_index(index_type: str, arrays: Dict[str, np.ndarray], prefix: str, **params):
+    """
+    استعادة فهرس محفوظ بدون إعادة بنائه
+    Rebuild an index object around saved (typically memory-mapped) arrays;
+    returns ``None`` when the type is unknown or an array is missing.
+    """
+    index_cls = ANN_INDEX_TYPES.get(index_type)
+    if index_cls is None:
+        return None
+
+    index = index_cls(**params)
+    for field in index_cls.ARRAY_FIELDS:
+        key = f"{prefix}.{field}"
+        if key not in arrays:
+            return None
+        setattr(index, field, arrays[key])
+    return index
+
+
+def build_ann_index(vectors: np.ndarray, index_type: str = 'ivf',
+                    min_items: int = 0, **params):
+    """
+    بناء فهرس بحث مع الرجوع للبحث الشامل عند الحاجة
+    Build an index over ``vectors``; falls back to brute force for small
+    catalogues, unknown index types or build failures.
+    """
+    if index_type not in ANN_INDEX_TYPES:
+        logger.warning(f"⚠️ نوع فهرس غير معروف: {index_type}، استخدام البحث الشامل")
+        index_type = 'brute_force'
+
+    if vectors.shape[0] < min_items:
+        index_type = 'brute_force'
+
+    try:
+        return ANN_INDEX_TYPES[index_type](**params).build(vectors)
+    except Exception as e:
+        logger.warning(f"⚠️ فشل في بناء فهرس {index_type}: {str(e)}، استخدام البحث الشامل")
+        return BruteForceIndex().build(vectors)
@@ -0,0 +1,202 @@
+# محرك التوصيات - صيغة حفظ النماذج المربوطة بالذاكرة
+# Memory-Mapped, Versioned Model Artifacts for Sabq AI Recommendation Engine
+
+import numpy as np
+import json
+import os
+import shutil
+import tarfile
+import logging
+import joblib
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+from pathlib import Path
+from scipy.sparse import csr_matrix
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+OBJECTS_FILE = 'objects.pkl'
+
+
+def is_artifact(path: str) -> bool:
+    """هل المسار مجلد نموذج بالصيغة الجديدة؟"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def _replace_directory(tmp: Path, target: Path):
+    """استبدال المجلد الهدف بالمجلد المؤقت بشكل ذري قدر الإمكان"""
+    if target.exists():
+        backup = target.with_name(target.name + '.old')
+        if backup.exists():
+            shutil.rmtree(backup)
+        os.replace(target, backup)
+        os.replace(tmp, target)
+        # الملفات المربوطة حالياً في العمليات الأخرى تبقى صالحة حتى إغلاقها
+        shutil.rmtree(backup)
+    else:
+        os.replace(tmp, target)
+
+
+def save_artifact(directory: str, kind: str,
+                  arrays: Optional[Dict[str, Optional[np.ndarray]]] = None,
+                  sparse: Optional[Dict[str, Optional[csr_matrix]]] = None,
+                  lists: Optional[Dict[str, Optional[List[Any]]]] = None,
+                  metadata: Optional[Dict[str, Any]] = None,
+                  objects: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    حفظ نموذج كمجلد: مصفوفات .npy + بيان JSON
+    Write an artifact directory:
+
+    - ``arrays``: dense arrays, one ``<name>.npy`` each
+    - ``sparse``: CSR matrices as ``<name>.data/.indices/.indptr.npy``
+    - ``lists``: id lists (user/article ids, vocabularies) as ``<name>.json``
+    - ``metadata``: small JSON-serializable values kept in the manifest
+    - ``objects``: small Python objects (configs, sklearn estimators) that
+      have no array form; pickled once into ``objects.pkl``
+
+    ``None`` entries are skipped. The directory is written next to the target
+    and swapped in, so readers never see a half-written artifact.
+    """
+    target = Path(directory)
+    tmp = target.with_name(target.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'kind': kind,
+        'created_at': datetime.now().isoformat(),
+        'arrays': {},
+        'sparse': {},
+        'lists': [],
+        'objects': False,
+        'metadata': metadata or {},
+    }
+
+    for name, array in (arrays or {}).items():
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        np.save(tmp / f"{name}.npy", array, allow_pickle=False)
+        manifest['arrays'][name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    for name, matrix in (sparse or {}).items():
+        if matrix is None:
+            continue
+        matrix = csr_matrix(matrix)
+        matrix.sort_indices()
+        for part in ('data', 'indices', 'indptr'):
+            np.save(tmp / f"{name}.{part}.npy", np.ascontiguousarray(getattr(matrix, part)),
+                    allow_pickle=False)
+        manifest['sparse'][name] = {'dtype': str(matrix.dtype), 'shape': list(matrix.shape),
+                                    'nnz': int(matrix.nnz)}
+
+    for name, values in (lists or {}).items():
+        if values is None:
+            continue
+        with open(tmp / f"{name}.json", 'w', encoding='utf-8') as f:
+            json.dump([v.item() if isinstance(v, np.generic) else v for v in values],
+                      f, ensure_ascii=False)
+        manifest['lists'].append(name)
+
+    if objects:
+        joblib.dump(objects, tmp / OBJECTS_FILE)
+        manifest['objects'] = True
+
+    with open(tmp / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    _replace_directory(tmp, target)
+    logger.info(f"💾 تم حفظ النموذج ({kind}) في {directory}")
+    return target
+
+
+class Artifact:
+    """
+    نموذج محمل من مجلد
+    A loaded artifact. Dense and sparse arrays are memory-mapped read-only,
+    so worker processes share the same pages; id lists and objects are read
+    eagerly since they are small.
+    """
+
+    def __init__(self, directory: str, manifest: Dict[str, Any],
+                 mmap_mode: Optional[str] = 'r'):
+        self.directory = Path(directory)
+        self.manifest = manifest
+        self.kind = manifest['kind']
+        self.metadata = manifest.get('metadata', {})
+
+        self.arrays = {
+            name: np.load(self.directory / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+            for name in manifest.get('arrays', {})
+        }
+        self.sparse = {}
+        for name, info in manifest.get('sparse', {}).items():
+            data, indices, indptr = (
+                np.load(self.directory / f"{name}.{part}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+                for part in ('data', 'indices', 'indptr')
+            )
+            # بدون نسخ: المصفوفة النادرة تشير مباشرة للملفات المربوطة
+            self.sparse[name] = csr_matrix((data, indices, indptr),
+                                           shape=tuple(info['shape']), copy=False)
+
+        self.lists = {}
+        for name in manifest.get('lists', []):
+            with open(self.directory / f"{name}.json", encoding='utf-8') as f:
+                self.lists[name] = json.load(f)
+
+        self.objects = joblib.load(self.directory / OBJECTS_FILE) if manifest.get('objects') else {}
+
+    def array(self, name: str) -> Optional[np.ndarray]:
+        return self.arrays.get(name)
+
+
+def load_artifact(directory: str, kind: Optional[str] = None,
+                  mmap_mode: Optional[str] = 'r') -> Artifact:
+    """
+    تحميل نموذج من مجلد مع ربط المصفوفات بالذاكرة
+    Load an artifact; ``mmap_mode=None`` reads arrays into memory instead.
+    Raises ``ValueError`` for unknown format versions or a kind mismatch.
+    """
+    with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    version = manifest.get('format_version')
+    if version is None or version > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"إصدار صيغة غير مدعوم: {version}")
+    if kind is not None and manifest.get('kind') != kind:
+        raise ValueError(f"نوع النموذج {manifest.get('kind')} لا يطابق {kind}")
+
+    artifact = Artifact(directory, manifest, mmap_mode=mmap_mode)
+    logger.info(f"📂 تم تحميل النموذج ({artifact.kind}) من {directory}")
+    return artifact
+
+
+def archive_artifact(directory: str, archive_path: str) -> str:
+    """أرشفة مجلد النموذج في ملف tar واحد (للنسخ الاحتياطي والرفع)"""
+    Path(archive_path).parent.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(archive_path, 'w') as tar:
+        tar.add(directory, arcname='.')
+    return archive_path
+
+
+def extract_artifact(archive_path: str, directory: str) -> str:
+    """فك أرشيف نموذج إلى مجلد"""
+    target = Path(directory)
+    tmp = target.with_name(target.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    with tarfile.open(archive_path, 'r') as tar:
+        for member in tar.getmembers():
+            # رفض المسارات الخارجة عن المجلد
+            if member.name.startswith('/') or '..' in Path(member.name).parts:
+                raise ValueError(f"مسار غير آمن في الأرشيف: {member.name}")
+        tar.extractall(tmp)
+    _replace_directory(tmp, target)
+    return directory
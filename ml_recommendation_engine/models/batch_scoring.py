@@ -0,0 +1,110 @@
+# محرك التوصيات - التقييم المجمع لعدة مستخدمين
+# Batched Multi-User Scoring for Sabq AI Recommendation Engine
+
+import numpy as np
+import logging
+from typing import Dict, List, Tuple, Optional, Any
+from scipy.sparse import csr_matrix
+
+from .collaborative_filtering import MatrixFactorizationModel
+from .top_k import top_k_rows
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class BatchRecommendationScorer:
+    """
+    محرك التقييم المجمع
+    Batched scorer: stacks user embeddings into a (U×d) matrix, scores each
+    chunk against all item embeddings in one GEMM, masks seen items through a
+    sparse (U×n_items) matrix and takes the top-K per row.
+
+    ``chunk_size`` bounds peak memory to chunk_size × n_items scores.
+    """
+
+    def __init__(self, model: MatrixFactorizationModel, chunk_size: int = 256):
+        self.model = model
+        self.chunk_size = max(1, chunk_size)
+
+    def build_seen_matrix(self, user_ids: List[str],
+                          seen_items: Optional[Dict[str, List[str]]]) -> Optional[csr_matrix]:
+        """بناء مصفوفة نادرة للمقالات المرئية (مستخدم × مقال)"""
+        if not seen_items:
+            return None
+
+        item_mapping = self.model.item_mapping
+        rows, cols = [], []
+        for row, user_id in enumerate(user_ids):
+            for item_id in seen_items.get(user_id, ()):
+                item_idx = item_mapping.get(item_id)
+                if item_idx is not None:
+                    rows.append(row)
+                    cols.append(item_idx)
+
+        if not rows:
+            return None
+
+        return csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)),
+                          shape=(len(user_ids), self.model.n_items))
+
+    def _score_chunk(self, user_indices: np.ndarray,
+                     seen_chunk: Optional[csr_matrix]) -> np.ndarray:
+        """تقييم دفعة من المستخدمين مقابل جميع المقالات"""
+        model = self.model
+        scores = model.user_embeddings[user_indices] @ model.item_embeddings.T
+
+        # إضافة الانحيازات
+        if model.global_bias is not None:
+            scores += model.global_bias
+        if model.user_biases is not None:
+            scores += model.user_biases[user_indices][:, np.newaxis]
+        if model.item_biases is not None:
+            scores += model.item_biases[np.newaxis, :]
+
+        # استبعاد المقالات المرئية
+        if seen_chunk is not None and seen_chunk.nnz:
+            seen_rows, seen_cols = seen_chunk.nonzero()
+            scores[seen_rows, seen_cols] = -np.inf
+
+        return scores
+
+    def recommend(self, user_ids: List[str], n_recommendations: int = 10,
+                  seen_items: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        توصيات مجمعة لقائمة مستخدمين
+        Batched recommendations; users unknown to the model get the popular
+        items, as in ``MatrixFactorizationModel.get_user_recommendations``.
+        """
+        model = self.model
+        results: Dict[str, List[Tuple[str, float]]] = {}
+
+        known_users = [user_id for user_id in user_ids if user_id in model.user_mapping]
+        for user_id in user_ids:
+            if user_id not in model.user_mapping:
+                results[user_id] = model._get_popular_items(n_recommendations)
+
+        if not known_users or model.item_embeddings is None:
+            return results
+
+        user_indices = np.fromiter((model.user_mapping[user_id] for user_id in known_users),
+                                   dtype=np.int64, count=len(known_users))
+        seen_matrix = self.build_seen_matrix(known_users, seen_items)
+
+        for start in range(0, len(known_users), self.chunk_size):
+            end = start + self.chunk_size
+            seen_chunk = seen_matrix[start:end] if seen_matrix is not None else None
+
+            scores = self._score_chunk(user_indices[start:end], seen_chunk)
+            top_indices, top_scores = top_k_rows(scores, n_recommendations)
+
+            for row, user_id in enumerate(known_users[start:end]):
+                valid = np.isfinite(top_scores[row])
+                results[user_id] = [
+                    (model.reverse_item_mapping[idx], float(score))
+                    for idx, score in zip(top_indices[row][valid], top_scores[row][valid])
+                ]
+
+        logger.info(f"📦 تم تقييم {len(known_users)} مستخدم في دفعات بحجم {self.chunk_size}")
+        return results
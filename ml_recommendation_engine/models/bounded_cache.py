@@ -0,0 +1,244 @@
+# محرك التوصيات - تخزين مؤقت محدود داخل العملية
+# Bounded LRU + TTL In-Process Cache for Sabq AI Recommendation Engine
+
+import sys
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Callable, Awaitable, Hashable
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    تقدير تقريبي لحجم القيمة بالبايت
+    Rough recursive ``sys.getsizeof`` over common containers, pydantic models
+    and objects with ``__dict__``; NumPy arrays report ``nbytes``.
+    """
+    size = sys.getsizeof(value)
+    if _depth > 6:
+        return size
+
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return size + nbytes
+
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+                          for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, _depth + 1) for item in value)
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        return size + estimate_size(vars(value), _depth + 1)
+    return size
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size')
+
+    def __init__(self, value: Any, expires_at: Optional[float], size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+class BoundedCache:
+    """
+    تخزين مؤقت محدود بالعدد والحجم مع صلاحية زمنية
+    Thread-safe LRU cache bounded by entry count and (optionally) total
+    bytes, with a per-entry TTL.
+
+    - get/set/eviction are O(1) (``OrderedDict`` move_to_end / popitem)
+    - expired entries are dropped lazily on access
+    - ``get_or_compute`` / ``aget_or_compute`` de-duplicate concurrent misses
+      for the same key: one caller computes, the others wait for its result
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 default_ttl: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = estimate_size,
+                 name: str = 'cache'):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.sizeof = sizeof
+        self.name = name
+
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._total_bytes = 0
+
+        # الطلبات الجارية لكل مفتاح (single-flight)
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._async_inflight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key, count=False) is not _MISSING
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _remove(self, key: Hashable) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+        return entry
+
+    def _lookup(self, key: Hashable, count: bool = True) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return _MISSING
+
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry.value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """جلب قيمة (مع تحديث ترتيب الاستخدام)"""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """حفظ قيمة مع إخراج الأقدم استخداماً عند تجاوز الحدود"""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # قيمة أكبر من السعة الكاملة - لا تُخزن
+                return
+
+            self._entries[key] = _Entry(value, expires_at, size)
+            self._total_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._total_bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """حذف مفتاح"""
+        with self._lock:
+            return self._remove(key) is not None
+
+    def clear(self):
+        """مسح جميع المدخلات"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def purge_expired(self) -> int:
+        """حذف جميع المدخلات المنتهية (للتنظيف الدوري)"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items()
+                       if entry.expires_at is not None and entry.expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any],
+                       ttl: Optional[float] = None) -> Any:
+        """
+        جلب القيمة أو حسابها مرة واحدة فقط للطلبات المتزامنة
+        Threads missing on the same key wait for the first caller's result;
+        if that computation fails, each waiter retries on its own.
+        """
+        while True:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return value
+
+            with self._lock:
+                event = self._inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = self._inflight[key] = threading.Event()
+
+            if not owner:
+                event.wait()
+                continue
+
+            try:
+                value = compute()
+                self.set(key, value, ttl)
+                return value
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    async def aget_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                              ttl: Optional[float] = None) -> Any:
+        """
+        نسخة غير متزامنة من get_or_compute لحلقة asyncio واحدة
+        Concurrent callers await the first caller's future, so they also
+        receive its exception if the computation fails.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        future = self._async_inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_event_loop().create_future()
+        self._async_inflight[key] = future
+        try:
+            value = await compute()
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # منع تحذير "exception was never retrieved" إذا لم ينتظر أحد
+            future.exception()
+            raise
+        finally:
+            self._async_inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات التخزين المؤقت"""
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -21,6 +21,10 @@ import redis
 import asyncio
 from dataclasses import dataclass
 
+from .ann_index import build_ann_index, index_arrays, restore_ann_index
+from .top_k import top_k, top_k_items, top_k_from_dict
+from .artifact_store import save_artifact, load_artifact, is_artifact
+
 # إعداد التسجيل بالعربية
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -37,6 +41,12 @@ class RecommendationConfig:
     negative_samples: int = 5
     min_rating: float = 1.0
     max_rating: float = 5.0
+    # فهرس البحث التقريبي للتوصيات
+    ann_index_type: str = "ivf"    # ivf, brute_force
+    ann_n_lists: Optional[int] = None  # الافتراضي: الجذر التربيعي لعدد المقالات
+    ann_n_probe: int = 8           # مقبض الدقة/زمن الاستجابة
+    ann_rerank_factor: int = 4     # حجم القائمة المختصرة لإعادة الترتيب الدقيقة
+    ann_min_items: int = 50000     # أقل من ذلك يُستخدم البحث الشامل
 
 class MatrixFactorizationModel:
     """
@@ -57,6 +67,8 @@ class MatrixFactorizationModel:
         self.item_mapping = {}
         self.reverse_user_mapping = {}
         self.reverse_item_mapping = {}
+        self.item_index = None
+        self.similarity_index = None
         
     def _prepare_data(self, interactions_df: pd.DataFrame) -> Tuple[np.ndarray, Dict]:
         """
@@ -184,6 +196,7 @@ class MatrixFactorizationModel:
         
         # حساب الانحيازات
         self._calculate_biases(processed_interactions)
+        self.build_indexes()
         
         # تقييم النموذج
         train_rmse = self._calculate_rmse(interaction_matrix, user_features, item_features)
@@ -231,6 +244,7 @@ class MatrixFactorizationModel:
         
         # حساب الانحيازات
         self._calculate_biases(processed_interactions)
+        self.build_indexes()
         
         # تقييم النموذج
         train_rmse = self._calculate_rmse(interaction_matrix, 
@@ -270,6 +284,37 @@ class MatrixFactorizationModel:
                 item_idx = self.item_mapping[item_id]
                 self.item_biases[item_idx] = mean_rating - self.global_bias
     
+    def build_indexes(self):
+        """
+        بناء فهارس البحث التقريبي فوق تضمينات المقالات
+        Build the ANN indexes over item embeddings and biases
+        """
+        if self.item_embeddings is None:
+            return
+        
+        item_embeddings = np.asarray(self.item_embeddings, dtype=np.float32)
+        index_params = self._index_params()
+        
+        # دمج انحياز المقال كبُعد إضافي: score = [u, 1] · [v, b]
+        item_biases = (self.item_biases if self.item_biases is not None 
+                       else np.zeros(item_embeddings.shape[0]))
+        scoring_vectors = np.hstack([item_embeddings, 
+                                     np.asarray(item_biases, dtype=np.float32)[:, np.newaxis]])
+        self.item_index = build_ann_index(
+            scoring_vectors, self.config.ann_index_type,
+            min_items=self.config.ann_min_items, **index_params
+        )
+        
+        # متجهات مطبعة للتشابه الكوساني
+        norms = np.linalg.norm(item_embeddings, axis=1, keepdims=True)
+        normalized = item_embeddings / np.maximum(norms, 1e-12)
+        self.similarity_index = build_ann_index(
+            normalized, self.config.ann_index_type,
+            min_items=self.config.ann_min_items, **index_params
+        )
+        
+        logger.info(f"🗂️ تم بناء فهارس البحث ({type(self.item_index).__name__}) لـ {self.n_items} مقال")
+    
     def _calculate_rmse(self, interaction_matrix: csr_matrix, 
                        user_features: np.ndarray, 
                        item_features: np.ndarray) -> float:
@@ -328,42 +373,36 @@ class MatrixFactorizationModel:
         
         user_idx = self.user_mapping[user_id]
         
-        # حساب النقاط لجميع المقالات
-        scores = np.dot(self.user_embeddings[user_idx], self.item_embeddings.T)
-        
-        # إضافة الانحيازات
-        if self.global_bias is not None:
-            scores += self.global_bias
-        if self.user_biases is not None:
-            scores += self.user_biases[user_idx]
-        if self.item_biases is not None:
-            scores += self.item_biases
+        if self.item_index is None:
+            self.build_indexes()
         
         # استبعاد المقالات المرئية مسبقاً
+        exclude_indices = None
         if exclude_seen and seen_items:
-            for item_id in seen_items:
-                if item_id in self.item_mapping:
-                    item_idx = self.item_mapping[item_id]
-                    scores[item_idx] = -np.inf
+            exclude_indices = [self.item_mapping[item_id] for item_id in seen_items
+                               if item_id in self.item_mapping]
         
-        # ترتيب وإرجاع أفضل التوصيات
-        top_indices = np.argsort(scores)[::-1][:n_recommendations]
-        recommendations = []
+        # البحث في الفهرس بالاستعلام [u, 1] ليشمل انحياز المقال
+        query = np.append(self.user_embeddings[user_idx], 1.0)
+        top_indices, top_scores = self.item_index.search(query, n_recommendations, 
+                                                         exclude=exclude_indices)
         
-        for idx in top_indices:
-            if scores[idx] > -np.inf:
-                item_id = self.reverse_item_mapping[idx]
-                score = scores[idx]
-                recommendations.append((item_id, float(score)))
+        # إضافة الانحيازات الثابتة لكل المقالات
+        offset = 0.0
+        if self.global_bias is not None:
+            offset += self.global_bias
+        if self.user_biases is not None:
+            offset += self.user_biases[user_idx]
         
-        return recommendations
+        return [(self.reverse_item_mapping[idx], float(score + offset))
+                for idx, score in zip(top_indices, top_scores)]
     
     def _get_popular_items(self, n_items: int) -> List[Tuple[str, float]]:
         """الحصول على أكثر المقالات شعبية للمستخدمين الجدد"""
         if self.item_biases is not None:
-            popular_indices = np.argsort(self.item_biases)[::-1][:n_items]
-            return [(self.reverse_item_mapping[idx], float(self.item_biases[idx])) 
-                   for idx in popular_indices]
+            popular_indices, popular_scores = top_k(self.item_biases, n_items)
+            return [(self.reverse_item_mapping[idx], float(score)) 
+                   for idx, score in zip(popular_indices, popular_scores)]
         return []
     
     def get_similar_users(self, user_id: str, n_similar: int = 10) -> List[Tuple[str, float]]:
@@ -377,16 +416,11 @@ class MatrixFactorizationModel:
         # حساب التشابه الكوساني
         similarities = cosine_similarity([user_vector], self.user_embeddings)[0]
         
-        # ترتيب المستخدمين حسب التشابه
-        similar_indices = np.argsort(similarities)[::-1][1:n_similar+1]  # استبعاد المستخدم نفسه
-        
-        similar_users = []
-        for idx in similar_indices:
-            similar_user_id = self.reverse_user_mapping[idx]
-            similarity = similarities[idx]
-            similar_users.append((similar_user_id, float(similarity)))
+        # ترتيب المستخدمين حسب التشابه مع استبعاد المستخدم نفسه
+        similar_indices, similar_scores = top_k(similarities, n_similar, exclude=[user_idx])
         
-        return similar_users
+        return [(self.reverse_user_mapping[idx], float(similarity))
+                for idx, similarity in zip(similar_indices, similar_scores)]
     
     def get_similar_items(self, item_id: str, n_similar: int = 10) -> List[Tuple[str, float]]:
         """العثور على مقالات مشابهة"""
@@ -394,44 +428,113 @@ class MatrixFactorizationModel:
             return []
         
         item_idx = self.item_mapping[item_id]
-        item_vector = self.item_embeddings[item_idx]
         
-        # حساب التشابه الكوساني
-        similarities = cosine_similarity([item_vector], self.item_embeddings)[0]
-        
-        # ترتيب المقالات حسب التشابه
-        similar_indices = np.argsort(similarities)[::-1][1:n_similar+1]  # استبعاد المقال نفسه
+        if self.similarity_index is None:
+            self.build_indexes()
         
-        similar_items = []
-        for idx in similar_indices:
-            similar_item_id = self.reverse_item_mapping[idx]
-            similarity = similarities[idx]
-            similar_items.append((similar_item_id, float(similarity)))
+        # البحث بالتشابه الكوساني مع استبعاد المقال نفسه
+        item_vector = self.similarity_index.vectors[item_idx]
+        similar_indices, similarities = self.similarity_index.search(
+            item_vector, n_similar, exclude=[item_idx]
+        )
         
-        return similar_items
+        return [(self.reverse_item_mapping[idx], float(similarity))
+                for idx, similarity in zip(similar_indices, similarities)]
+    
+    ARTIFACT_KIND = 'matrix_factorization'
     
     def save_model(self, filepath: str):
-        """حفظ النموذج"""
-        model_data = {
-            'config': self.config,
-            'user_embeddings': self.user_embeddings,
-            'item_embeddings': self.item_embeddings,
-            'user_biases': self.user_biases,
-            'item_biases': self.item_biases,
-            'global_bias': self.global_bias,
-            'n_users': self.n_users,
-            'n_items': self.n_items,
-            'user_mapping': self.user_mapping,
-            'item_mapping': self.item_mapping,
-            'reverse_user_mapping': self.reverse_user_mapping,
-            'reverse_item_mapping': self.reverse_item_mapping
-        }
-        
-        joblib.dump(model_data, filepath)
+        """
+        حفظ النموذج كمجلد مصفوفات مربوطة بالذاكرة
+        Saves embeddings and biases as .npy files and the id mappings as
+        ordered id lists, so ``load_model`` can memory-map them.
+        """
+        save_artifact(
+            filepath, self.ARTIFACT_KIND,
+            arrays={
+                'user_embeddings': self.user_embeddings,
+                'item_embeddings': self.item_embeddings,
+                'user_biases': self.user_biases,
+                'item_biases': self.item_biases,
+                **self._index_arrays(),
+            },
+            lists={
+                'user_ids': [self.reverse_user_mapping[idx] for idx in range(len(self.reverse_user_mapping))],
+                'item_ids': [self.reverse_item_mapping[idx] for idx in range(len(self.reverse_item_mapping))],
+            },
+            metadata={
+                'global_bias': None if self.global_bias is None else float(self.global_bias),
+                'n_users': self.n_users,
+                'n_items': self.n_items,
+                'item_index_type': getattr(self.item_index, 'index_type', None),
+                'similarity_index_type': getattr(self.similarity_index, 'index_type', None),
+            },
+            objects={'config': self.config}
+        )
         logger.info(f"💾 تم حفظ النموذج في {filepath}")
     
-    def load_model(self, filepath: str):
-        """تحميل النموذج"""
+    def load_model(self, filepath: str, mmap_mode: Optional[str] = 'r'):
+        """تحميل النموذج (الصيغة المربوطة بالذاكرة، أو ملف joblib قديم)"""
+        if not is_artifact(filepath):
+            self._load_legacy_model(filepath)
+            self.build_indexes()
+            logger.info(f"📂 تم تحميل النموذج من {filepath}")
+            return
+        
+        artifact = load_artifact(filepath, kind=self.ARTIFACT_KIND, mmap_mode=mmap_mode)
+        
+        self.config = artifact.objects.get('config', self.config)
+        self.user_embeddings = artifact.array('user_embeddings')
+        self.item_embeddings = artifact.array('item_embeddings')
+        self.user_biases = artifact.array('user_biases')
+        self.item_biases = artifact.array('item_biases')
+        self.global_bias = artifact.metadata.get('global_bias')
+        self.n_users = artifact.metadata['n_users']
+        self.n_items = artifact.metadata['n_items']
+        
+        user_ids = artifact.lists.get('user_ids', [])
+        item_ids = artifact.lists.get('item_ids', [])
+        self.user_mapping = {user_id: idx for idx, user_id in enumerate(user_ids)}
+        self.item_mapping = {item_id: idx for idx, item_id in enumerate(item_ids)}
+        self.reverse_user_mapping = dict(enumerate(user_ids))
+        self.reverse_item_mapping = dict(enumerate(item_ids))
+        
+        # استخدام الفهارس المحفوظة إن وجدت بدل إعادة تدريب k-means في كل عملية
+        if not self._restore_indexes(artifact):
+            self.build_indexes()
+        
+        logger.info(f"📂 تم تحميل النموذج من {filepath}")
+    
+    def _index_params(self) -> Dict[str, Any]:
+        return {
+            'n_lists': self.config.ann_n_lists,
+            'n_probe': self.config.ann_n_probe,
+            'rerank_factor': self.config.ann_rerank_factor
+        }
+    
+    def _index_arrays(self) -> Dict[str, np.ndarray]:
+        """مصفوفات فهارس البحث للحفظ مع النموذج"""
+        arrays = {}
+        if self.item_index is not None and self.similarity_index is not None:
+            arrays.update(index_arrays(self.item_index, 'item_index'))
+            arrays.update(index_arrays(self.similarity_index, 'similarity_index'))
+        return arrays
+    
+    def _restore_indexes(self, artifact) -> bool:
+        """استعادة فهارس البحث من النموذج المحفوظ"""
+        item_index = restore_ann_index(artifact.metadata.get('item_index_type'),
+                                       artifact.arrays, 'item_index', **self._index_params())
+        similarity_index = restore_ann_index(artifact.metadata.get('similarity_index_type'),
+                                             artifact.arrays, 'similarity_index', **self._index_params())
+        if item_index is None or similarity_index is None:
+            return False
+        
+        self.item_index = item_index
+        self.similarity_index = similarity_index
+        return True
+    
+    def _load_legacy_model(self, filepath: str):
+        """تحميل ملف joblib بالصيغة القديمة"""
         model_data = joblib.load(filepath)
         
         self.config = model_data['config']
@@ -446,8 +549,6 @@ class MatrixFactorizationModel:
         self.item_mapping = model_data['item_mapping']
         self.reverse_user_mapping = model_data['reverse_user_mapping']
         self.reverse_item_mapping = model_data['reverse_item_mapping']
-        
-        logger.info(f"📂 تم تحميل النموذج من {filepath}")
 
 
 class NeuralCollaborativeFiltering:
@@ -650,7 +751,8 @@ class NeuralCollaborativeFiltering:
         # تحضير جميع المقالات للتنبؤ
         all_items = list(self.item_mapping.keys())
         if exclude_seen and seen_items:
-            all_items = [item for item in all_items if item not in seen_items]
+            seen_set = set(seen_items)
+            all_items = [item for item in all_items if item not in seen_set]
         
         if not all_items:
             return []
@@ -665,10 +767,7 @@ class NeuralCollaborativeFiltering:
         ).flatten()
         
         # ترتيب التوصيات
-        item_scores = list(zip(all_items, predictions))
-        item_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        return [(item, float(score)) for item, score in item_scores[:n_recommendations]]
+        return top_k_items(all_items, predictions, n_recommendations)
     
     def save_model(self, filepath: str):
         """حفظ النموذج"""
@@ -790,13 +889,7 @@ class CollaborativeFilteringEnsemble:
                 all_recommendations[item_id] /= total_weight
         
         # ترتيب وإرجاع أفضل التوصيات
-        sorted_recommendations = sorted(
-            all_recommendations.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:n_recommendations]
-        
-        return sorted_recommendations
+        return top_k_from_dict(all_recommendations, n_recommendations)
     
     def optimize_weights(self, validation_data: pd.DataFrame) -> Dict[str, float]:
         """تحسين أوزان النماذج بناءً على بيانات التحقق"""
@@ -10,6 +10,8 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import LatentDirichletAllocation, NMF
 from sklearn.cluster import KMeans
+from sklearn.preprocessing import normalize
+from scipy.sparse import csr_matrix
 import arabic_reshaper
 import bidi.algorithm
 import re
@@ -21,6 +23,7 @@ from gensim.models import Word2Vec, Doc2Vec
 from gensim.models.doc2vec import TaggedDocument
 import logging
 from typing import Dict, List, Tuple, Optional, Any, Union
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import joblib
 import pickle
@@ -28,6 +31,10 @@ from dataclasses import dataclass
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import multiprocessing as mp
+import os
+
+from .top_k import top_k, top_k_items, top_k_from_dict
+from .artifact_store import save_artifact, load_artifact, is_artifact
 
 # إعداد NLTK للعربية
 try:
@@ -60,6 +67,10 @@ class ContentFilteringConfig:
     similarity_threshold: float = 0.1
     top_similar_articles: int = 100
     
+    # User profiles
+    profile_recency_decay: float = 1.0  # 1.0 = متوسط عادي، أقل من 1 يفضل الأحدث
+    profile_cache_size: int = 10000
+    
     # Word2Vec settings
     word2vec_size: int = 200
     word2vec_window: int = 5
@@ -186,6 +197,55 @@ class ArabicTextProcessor:
         return processed
 
 
+class ArticleCatalog:
+    """
+    فهرس المقالات المشترك
+    Compact article catalog shared by the content models: a NumPy array of
+    ids in matrix-row order plus a dict for O(1) id→row lookups.
+    """
+    
+    def __init__(self, article_ids: Optional[List[str]] = None):
+        self.ids = np.asarray(article_ids if article_ids is not None else [], dtype=object)
+        self._positions = {article_id: idx for idx, article_id in enumerate(self.ids)}
+    
+    @classmethod
+    def from_dataframe(cls, articles_df: pd.DataFrame,
+                       shared: Optional['ArticleCatalog'] = None) -> 'ArticleCatalog':
+        """بناء الفهرس من إطار المقالات أو إعادة استخدام الفهرس المشترك إذا تطابق"""
+        return cls.from_ids(articles_df['id'].to_numpy(dtype=object), shared=shared)
+    
+    @classmethod
+    def from_ids(cls, article_ids: Any,
+                 shared: Optional['ArticleCatalog'] = None) -> 'ArticleCatalog':
+        """بناء الفهرس من قائمة معرفات أو إعادة استخدام الفهرس المشترك إذا تطابق"""
+        article_ids = np.asarray(article_ids, dtype=object)
+        if shared is not None and np.array_equal(shared.ids, article_ids):
+            return shared
+        return cls(article_ids)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._positions
+    
+    def index_of(self, article_id: str) -> Optional[int]:
+        """مؤشر المقال أو None إذا لم يكن موجوداً"""
+        return self._positions.get(article_id)
+    
+    def indices_of(self, article_ids: List[str]) -> np.ndarray:
+        """مؤشرات المقالات المعروفة فقط بنفس ترتيب الإدخال"""
+        positions = self._positions
+        return np.fromiter((positions[article_id] for article_id in article_ids
+                            if article_id in positions), dtype=np.int64)
+    
+    def exclusion_mask(self, article_ids: List[str]) -> np.ndarray:
+        """قناع منطقي للمقالات المستبعدة"""
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[self.indices_of(article_ids)] = True
+        return mask
+
+
 class BERTContentExtractor:
     """
     مستخرج المحتوى باستخدام BERT العربي
@@ -268,44 +328,95 @@ class TFIDFContentExtractor:
     TF-IDF based Content Feature Extractor
     """
     
-    def __init__(self, config: ContentFilteringConfig):
+    def __init__(self, config: ContentFilteringConfig, catalog: Optional[ArticleCatalog] = None):
         self.config = config
         self.text_processor = ArabicTextProcessor(config)
         self.vectorizer = None
         self.feature_matrix = None
-        self.article_ids = []
+        self.catalog = catalog or ArticleCatalog()
+        self.profile_cache = OrderedDict()  # user_id -> (بصمة التاريخ، الملف النادر)
+    
+    def __getstate__(self):
+        # لا نحفظ ملفات المستخدمين المؤقتة مع النموذج
+        state = self.__dict__.copy()
+        state['profile_cache'] = OrderedDict()
+        return state
+    
+    def __setstate__(self, state):
+        # ملفات pkl القديمة (قبل ArticleCatalog) تحفظ article_ids كقائمة في __dict__
+        legacy_ids = state.pop('article_ids', None)
+        self.__dict__.update(state)
+        if 'catalog' not in state:
+            self.catalog = ArticleCatalog(list(legacy_ids) if legacy_ids is not None else [])
+        self.profile_cache = OrderedDict()
+    
+    @property
+    def article_ids(self) -> np.ndarray:
+        """معرفات المقالات بترتيب صفوف المصفوفة"""
+        return self.catalog.ids
     
     def _custom_tokenizer(self, text: str) -> List[str]:
         """مُرمز مخصص للنصوص العربية"""
         return self.text_processor.tokenize(text)
     
+    def _create_vectorizer(self) -> TfidfVectorizer:
+        """إنشاء مُجمع TF-IDF بإعدادات التكوين"""
+        return TfidfVectorizer(
+            max_features=self.config.max_features,
+            min_df=self.config.min_df,
+            max_df=self.config.max_df,
+            ngram_range=self.config.ngram_range,
+            tokenizer=self._custom_tokenizer,
+            lowercase=False,  # العربية لا تحتاج تحويل لأحرف صغيرة
+            stop_words=None   # نتعامل مع كلمات الإيقاف في المُرمز
+        )
+    
+    def save(self, directory: str):
+        """
+        حفظ النموذج كمصفوفات مربوطة بالذاكرة
+        The CSR feature matrix is stored as its data/indices/indptr arrays;
+        the vectorizer is reduced to its vocabulary (in column order) and idf
+        vector instead of pickling it together with the bound tokenizer.
+        """
+        vocabulary = sorted(self.vectorizer.vocabulary_, key=self.vectorizer.vocabulary_.get)
+        save_artifact(
+            directory, 'tfidf',
+            arrays={'idf': np.asarray(self.vectorizer.idf_, dtype=np.float64)},
+            sparse={'feature_matrix': self.feature_matrix},
+            lists={'article_ids': list(self.article_ids), 'vocabulary': vocabulary}
+        )
+    
+    def load(self, directory: str, mmap_mode: Optional[str] = 'r'):
+        """تحميل النموذج مع ربط مصفوفة الخصائص بالذاكرة"""
+        artifact = load_artifact(directory, kind='tfidf', mmap_mode=mmap_mode)
+        
+        self.vectorizer = self._create_vectorizer()
+        self.vectorizer.vocabulary_ = {term: idx for idx, term in enumerate(artifact.lists['vocabulary'])}
+        self.vectorizer.idf_ = np.asarray(artifact.arrays['idf'])
+        self.feature_matrix = artifact.sparse['feature_matrix']
+        self.catalog = ArticleCatalog.from_ids(artifact.lists['article_ids'], shared=self.catalog)
+        self.profile_cache.clear()
+        return self
+    
     def fit_transform(self, articles_df: pd.DataFrame) -> np.ndarray:
         """تدريب وتحويل مجموعة المقالات"""
         logger.info("🔄 بناء مصفوفة TF-IDF...")
         
         # تحضير النصوص
         texts = []
-        self.article_ids = []
+        self.catalog = ArticleCatalog.from_dataframe(articles_df, shared=self.catalog)
         
         for _, article in articles_df.iterrows():
             # دمج العنوان والمحتوى
             combined_text = f"{article.get('title', '')} {article.get('content', '')}"
             texts.append(combined_text)
-            self.article_ids.append(article['id'])
         
         # إنشاء مُجمع TF-IDF
-        self.vectorizer = TfidfVectorizer(
-            max_features=self.config.max_features,
-            min_df=self.config.min_df,
-            max_df=self.config.max_df,
-            ngram_range=self.config.ngram_range,
-            tokenizer=self._custom_tokenizer,
-            lowercase=False,  # العربية لا تحتاج تحويل لأحرف صغيرة
-            stop_words=None   # نتعامل مع كلمات الإيقاف في المُرمز
-        )
+        self.vectorizer = self._create_vectorizer()
         
-        # تدريب وتحويل البيانات
-        self.feature_matrix = self.vectorizer.fit_transform(texts)
+        # تدريب وتحويل البيانات مع تطبيع L2 لتصبح الكوساين ضرباً نقطياً نادراً
+        self.feature_matrix = normalize(self.vectorizer.fit_transform(texts), norm='l2').tocsr()
+        self.profile_cache.clear()
         
         logger.info(f"✅ تم بناء مصفوفة TF-IDF: {self.feature_matrix.shape}")
         return self.feature_matrix
@@ -319,62 +430,78 @@ class TFIDFContentExtractor:
     
     def get_similar_articles(self, article_id: str, n_similar: int = 10) -> List[Tuple[str, float]]:
         """العثور على مقالات مشابهة لمقال معين"""
-        if article_id not in self.article_ids:
-            return []
-        
         # الحصول على مؤشر المقال
-        article_idx = self.article_ids.index(article_id)
-        
-        # حساب التشابه الكوساني
-        article_vector = self.feature_matrix[article_idx:article_idx+1]
-        similarities = cosine_similarity(article_vector, self.feature_matrix).flatten()
-        
-        # ترتيب المقالات حسب التشابه
-        similar_indices = np.argsort(similarities)[::-1][1:n_similar+1]  # استبعاد المقال نفسه
+        article_idx = self.catalog.index_of(article_id)
+        if article_idx is None:
+            return []
         
-        similar_articles = []
-        for idx in similar_indices:
-            similar_id = self.article_ids[idx]
-            similarity = similarities[idx]
-            if similarity > self.config.similarity_threshold:
-                similar_articles.append((similar_id, float(similarity)))
+        # حساب التشابه الكوساني (الصفوف مطبعة مسبقاً)
+        article_vector = self.feature_matrix[article_idx]
+        similarities = (self.feature_matrix @ article_vector.T).toarray().ravel()
         
-        return similar_articles
+        # ترتيب المقالات حسب التشابه مع استبعاد المقال نفسه
+        return top_k_items(self.article_ids, similarities, n_similar,
+                           exclude=[article_idx],
+                           threshold=self.config.similarity_threshold)
+    
+    def build_user_profile(self, user_indices: np.ndarray) -> csr_matrix:
+        """
+        بناء ملف المستخدم كمتوسط نادر (مرجح بالحداثة اختيارياً) لمقالاته
+        Sparse (1 × features) row mean of the history rows, L2-normalised.
+        ``user_indices`` are ordered oldest to newest.
+        """
+        n = user_indices.shape[0]
+        weights = self.config.profile_recency_decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        weights /= weights.sum()
+        
+        profile = csr_matrix(weights[np.newaxis, :]) @ self.feature_matrix[user_indices]
+        return normalize(profile, norm='l2')
+    
+    def get_user_profile(self, user_indices: np.ndarray,
+                         user_id: Optional[str] = None) -> csr_matrix:
+        """الحصول على ملف المستخدم من التخزين المؤقت أو بناؤه"""
+        if user_id is None:
+            return self.build_user_profile(user_indices)
+        
+        fingerprint = hash(user_indices.tobytes())
+        cached = self.profile_cache.get(user_id)
+        if cached is not None and cached[0] == fingerprint:
+            self.profile_cache.move_to_end(user_id)
+            return cached[1]
+        
+        profile = self.build_user_profile(user_indices)
+        self.profile_cache[user_id] = (fingerprint, profile)
+        self.profile_cache.move_to_end(user_id)
+        while len(self.profile_cache) > self.config.profile_cache_size:
+            self.profile_cache.popitem(last=False)
+        
+        return profile
+    
+    def invalidate_user_profile(self, user_id: str):
+        """إلغاء ملف المستخدم المؤقت عند وصول تفاعلات جديدة"""
+        self.profile_cache.pop(user_id, None)
     
     def get_content_recommendations(self, user_articles: List[str], 
-                                  n_recommendations: int = 10) -> List[Tuple[str, float]]:
+                                  n_recommendations: int = 10,
+                                  user_id: Optional[str] = None) -> List[Tuple[str, float]]:
         """الحصول على توصيات بناءً على مقالات المستخدم"""
         if not user_articles or self.feature_matrix is None:
             return []
         
-        # بناء ملف المستخدم كمتوسط مقالاته
-        user_vectors = []
-        for article_id in user_articles:
-            if article_id in self.article_ids:
-                article_idx = self.article_ids.index(article_id)
-                user_vectors.append(self.feature_matrix[article_idx].toarray()[0])
-        
-        if not user_vectors:
+        # بناء ملف المستخدم من مقالاته
+        user_indices = self.catalog.indices_of(user_articles)
+        if user_indices.size == 0:
             return []
         
-        # حساب متوسط ملف المستخدم
-        user_profile = np.mean(user_vectors, axis=0)
+        user_profile = self.get_user_profile(user_indices, user_id)
         
-        # حساب التشابه مع جميع المقالات
-        similarities = cosine_similarity([user_profile], self.feature_matrix).flatten()
+        # حساب التشابه مع جميع المقالات كضرب نقطي نادر
+        similarities = (self.feature_matrix @ user_profile.T).toarray().ravel()
         
         # ترتيب واستبعاد المقالات المرئية
-        recommendations = []
-        for i, similarity in enumerate(similarities):
-            article_id = self.article_ids[i]
-            if (article_id not in user_articles and 
-                similarity > self.config.similarity_threshold):
-                recommendations.append((article_id, float(similarity)))
-        
-        # ترتيب حسب التشابه
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        
-        return recommendations[:n_recommendations]
+        return top_k_items(self.article_ids, similarities, n_recommendations,
+                           exclude=user_indices,
+                           threshold=self.config.similarity_threshold)
     
     def get_feature_names(self) -> List[str]:
         """الحصول على أسماء المعالم"""
@@ -385,13 +512,11 @@ class TFIDFContentExtractor:
     def explain_similarity(self, article1_id: str, article2_id: str, 
                           top_features: int = 10) -> Dict[str, Any]:
         """شرح التشابه بين مقالين"""
-        if (article1_id not in self.article_ids or 
-            article2_id not in self.article_ids):
+        idx1 = self.catalog.index_of(article1_id)
+        idx2 = self.catalog.index_of(article2_id)
+        if idx1 is None or idx2 is None:
             return {}
         
-        idx1 = self.article_ids.index(article1_id)
-        idx2 = self.article_ids.index(article2_id)
-        
         vector1 = self.feature_matrix[idx1].toarray()[0]
         vector2 = self.feature_matrix[idx2].toarray()[0]
         
@@ -400,17 +525,16 @@ class TFIDFContentExtractor:
         feature_names = self.get_feature_names()
         
         # ترتيب المعالم حسب المساهمة
-        top_indices = np.argsort(feature_contributions)[::-1][:top_features]
+        top_indices, _ = top_k(feature_contributions, top_features, threshold=0.0)
         
         explanations = []
         for idx in top_indices:
-            if feature_contributions[idx] > 0:
-                explanations.append({
-                    'feature': feature_names[idx],
-                    'contribution': float(feature_contributions[idx]),
-                    'weight1': float(vector1[idx]),
-                    'weight2': float(vector2[idx])
-                })
+            explanations.append({
+                'feature': feature_names[idx],
+                'contribution': float(feature_contributions[idx]),
+                'weight1': float(vector1[idx]),
+                'weight2': float(vector2[idx])
+            })
         
         overall_similarity = cosine_similarity([vector1], [vector2])[0][0]
         
@@ -426,13 +550,41 @@ class TopicModelingEngine:
     Topic Modeling Engine
     """
     
-    def __init__(self, config: ContentFilteringConfig):
+    def __init__(self, config: ContentFilteringConfig, catalog: Optional[ArticleCatalog] = None):
         self.config = config
         self.text_processor = ArabicTextProcessor(config)
         self.topic_model = None
         self.vectorizer = None
         self.article_topics = None
         self.topic_labels = []
+        self.catalog = catalog or ArticleCatalog()
+    
+    def __setstate__(self, state):
+        # ملفات pkl القديمة لا تحمل فهرساً: صفوفها بترتيب مقالات TF-IDF
+        # ويُربط الفهرس المشترك عند التحميل (_load_legacy_models)
+        self.__dict__.update(state)
+        if 'catalog' not in state:
+            self.catalog = ArticleCatalog(state.get('article_ids', []))
+    
+    def save(self, directory: str):
+        """حفظ النموذج: توزيعات الموضوعات كمصفوفة، والمقدّرات الصغيرة كعناصر"""
+        save_artifact(
+            directory, 'topic_model',
+            arrays={'article_topics': self.article_topics},
+            lists={'article_ids': list(self.catalog.ids), 'topic_labels': self.topic_labels},
+            objects={'topic_model': self.topic_model, 'vectorizer': self.vectorizer}
+        )
+    
+    def load(self, directory: str, mmap_mode: Optional[str] = 'r'):
+        """تحميل النموذج مع ربط توزيعات الموضوعات بالذاكرة"""
+        artifact = load_artifact(directory, kind='topic_model', mmap_mode=mmap_mode)
+        
+        self.topic_model = artifact.objects.get('topic_model')
+        self.vectorizer = artifact.objects.get('vectorizer')
+        self.article_topics = artifact.array('article_topics')
+        self.topic_labels = artifact.lists.get('topic_labels', [])
+        self.catalog = ArticleCatalog.from_ids(artifact.lists['article_ids'], shared=self.catalog)
+        return self
     
     def train_lda_model(self, articles_df: pd.DataFrame) -> Dict[str, Any]:
         """تدريب نموذج LDA"""
@@ -440,6 +592,7 @@ class TopicModelingEngine:
         
         # تحضير النصوص
         texts = []
+        self.catalog = ArticleCatalog.from_dataframe(articles_df, shared=self.catalog)
         for _, article in articles_df.iterrows():
             combined_text = f"{article.get('title', '')} {article.get('content', '')}"
             texts.append(combined_text)
@@ -491,6 +644,7 @@ class TopicModelingEngine:
         
         # تحضير النصوص (مشابه لـ LDA)
         texts = []
+        self.catalog = ArticleCatalog.from_dataframe(articles_df, shared=self.catalog)
         for _, article in articles_df.iterrows():
             combined_text = f"{article.get('title', '')} {article.get('content', '')}"
             texts.append(combined_text)
@@ -537,7 +691,7 @@ class TopicModelingEngine:
         
         self.topic_labels = []
         for topic_idx, topic in enumerate(self.topic_model.components_):
-            top_features_ind = topic.argsort()[-top_words:][::-1]
+            top_features_ind, _ = top_k(topic, top_words)
             top_features = [feature_names[i] for i in top_features_ind]
             self.topic_labels.append(f"موضوع_{topic_idx}: {', '.join(top_features[:3])}")
     
@@ -548,12 +702,9 @@ class TopicModelingEngine:
         
         topic_distribution = self.article_topics[article_idx]
         
-        # ترتيب الموضوعات حسب الاحتمالية
-        topic_probs = [(i, prob) for i, prob in enumerate(topic_distribution)]
-        topic_probs.sort(key=lambda x: x[1], reverse=True)
-        
-        # إرجاع الموضوعات ذات الاحتمالية > 0.1
-        return [(topic_id, prob) for topic_id, prob in topic_probs if prob > 0.1]
+        # ترتيب الموضوعات ذات الاحتمالية > 0.1
+        topic_ids, topic_probs = top_k(topic_distribution, len(topic_distribution), threshold=0.1)
+        return [(int(topic_id), float(prob)) for topic_id, prob in zip(topic_ids, topic_probs)]
     
     def get_similar_articles_by_topic(self, article_idx: int, 
                                     n_similar: int = 10) -> List[Tuple[int, float]]:
@@ -564,10 +715,10 @@ class TopicModelingEngine:
         article_topics = self.article_topics[article_idx:article_idx+1]
         similarities = cosine_similarity(article_topics, self.article_topics).flatten()
         
-        # ترتيب المقالات حسب التشابه
-        similar_indices = np.argsort(similarities)[::-1][1:n_similar+1]
+        # ترتيب المقالات حسب التشابه مع استبعاد المقال نفسه
+        similar_indices, similar_scores = top_k(similarities, n_similar, exclude=[article_idx])
         
-        return [(int(idx), float(similarities[idx])) for idx in similar_indices]
+        return [(int(idx), float(score)) for idx, score in zip(similar_indices, similar_scores)]
     
     def get_topic_trends(self, time_window: str = "daily") -> Dict[str, List]:
         """تحليل اتجاهات الموضوعات عبر الزمن"""
@@ -594,11 +745,16 @@ class Word2VecContentModel:
     Word2Vec Content Model for Arabic
     """
     
-    def __init__(self, config: ContentFilteringConfig):
+    GENSIM_FILE = 'word2vec.model'
+    
+    def __init__(self, config: ContentFilteringConfig, catalog: Optional[ArticleCatalog] = None):
         self.config = config
         self.text_processor = ArabicTextProcessor(config)
         self.word2vec_model = None
         self.article_vectors = {}
+        self.catalog = catalog
+        self.vector_matrix = None  # متجهات مطبعة بترتيب الفهرس
+        self.has_vector = None     # قناع المقالات التي لها متجه
     
     def train_word2vec(self, articles_df: pd.DataFrame) -> Dict[str, Any]:
         """تدريب نموذج Word2Vec"""
@@ -626,7 +782,9 @@ class Word2VecContentModel:
         )
         
         # حساب متجهات المقالات
+        self.catalog = ArticleCatalog.from_dataframe(articles_df, shared=self.catalog)
         self._calculate_article_vectors(articles_df)
+        self.build_vector_matrix()
         
         vocab_size = len(self.word2vec_model.wv.key_to_index)
         logger.info(f"✅ تم تدريب Word2Vec - حجم المفردات: {vocab_size}")
@@ -657,23 +815,72 @@ class Word2VecContentModel:
                 article_vector = np.mean(word_vectors, axis=0)
                 self.article_vectors[article['id']] = article_vector
     
+    def build_vector_matrix(self):
+        """بناء مصفوفة المتجهات المطبعة بترتيب الفهرس المشترك"""
+        if self.catalog is None:
+            self.catalog = ArticleCatalog(list(self.article_vectors.keys()))
+        
+        self.vector_matrix = np.zeros((len(self.catalog), self.config.word2vec_size), dtype=np.float32)
+        self.has_vector = np.zeros(len(self.catalog), dtype=bool)
+        
+        for article_id, vector in self.article_vectors.items():
+            idx = self.catalog.index_of(article_id)
+            if idx is not None:
+                norm = np.linalg.norm(vector)
+                if norm > 0:
+                    self.vector_matrix[idx] = vector / norm
+                    self.has_vector[idx] = True
+    
+    def save(self, directory: str):
+        """
+        حفظ النموذج: متجهات المقالات كمصفوفة، ونموذج gensim بصيغته الأصلية
+        gensim stores its large arrays as separate .npy files itself, so
+        ``load`` memory-maps those as well.
+        """
+        if self.vector_matrix is None:
+            self.build_vector_matrix()
+        
+        save_artifact(
+            directory, 'word2vec',
+            arrays={'vector_matrix': self.vector_matrix, 'has_vector': self.has_vector},
+            lists={'article_ids': list(self.catalog.ids)}
+        )
+        if self.word2vec_model is not None:
+            self.word2vec_model.save(os.path.join(directory, self.GENSIM_FILE))
+    
+    def load(self, directory: str, mmap_mode: Optional[str] = 'r'):
+        """تحميل النموذج مع ربط المتجهات بالذاكرة"""
+        artifact = load_artifact(directory, kind='word2vec', mmap_mode=mmap_mode)
+        
+        gensim_path = os.path.join(directory, self.GENSIM_FILE)
+        if os.path.exists(gensim_path):
+            self.word2vec_model = Word2Vec.load(gensim_path, mmap=mmap_mode)
+        
+        self.catalog = ArticleCatalog.from_ids(artifact.lists['article_ids'], shared=self.catalog)
+        self.vector_matrix = artifact.arrays['vector_matrix']
+        self.has_vector = artifact.arrays['has_vector']
+        
+        # صفوف المصفوفة المطبعة كمشاهد بدون نسخ
+        self.article_vectors = {self.catalog.ids[idx]: self.vector_matrix[idx]
+                                for idx in np.flatnonzero(self.has_vector)}
+        return self
+    
     def get_similar_articles(self, article_id: str, n_similar: int = 10) -> List[Tuple[str, float]]:
         """العثور على مقالات مشابهة باستخدام Word2Vec"""
-        if article_id not in self.article_vectors:
-            return []
+        if self.vector_matrix is None:
+            self.build_vector_matrix()
         
-        target_vector = self.article_vectors[article_id]
-        similarities = []
+        article_idx = self.catalog.index_of(article_id)
+        if article_idx is None or not self.has_vector[article_idx]:
+            return []
         
-        for other_id, other_vector in self.article_vectors.items():
-            if other_id != article_id:
-                similarity = cosine_similarity([target_vector], [other_vector])[0][0]
-                similarities.append((other_id, float(similarity)))
+        # التشابه الكوساني كضرب نقطي للمتجهات المطبعة
+        similarities = self.vector_matrix @ self.vector_matrix[article_idx]
+        exclude = ~self.has_vector
+        exclude[article_idx] = True
         
         # ترتيب حسب التشابه
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
-        return similarities[:n_similar]
+        return top_k_items(self.catalog.ids, similarities, n_similar, exclude=exclude)
     
     def find_similar_words(self, word: str, top_n: int = 10) -> List[Tuple[str, float]]:
         """العثور على كلمات مشابهة"""
@@ -706,6 +913,7 @@ class ContentBasedRecommender:
         # بيانات المقالات
         self.articles_df = None
         self.article_features = {}
+        self.catalog = None
         
         # أوزان الطرق المختلفة
         self.method_weights = {
@@ -720,6 +928,7 @@ class ContentBasedRecommender:
         logger.info("🏭 بدء تدريب جميع نماذج التصفية المحتوائية...")
         
         self.articles_df = articles_df.copy()
+        self.catalog = ArticleCatalog.from_dataframe(articles_df)
         results = {}
         
         try:
@@ -735,7 +944,7 @@ class ContentBasedRecommender:
         try:
             # تدريب TF-IDF
             logger.info("2️⃣ تدريب مستخرج TF-IDF...")
-            self.tfidf_extractor = TFIDFContentExtractor(self.config)
+            self.tfidf_extractor = TFIDFContentExtractor(self.config, catalog=self.catalog)
             self.tfidf_extractor.fit_transform(articles_df)
             results['tfidf'] = {'status': 'success', 'model_type': 'TF-IDF'}
             
@@ -746,7 +955,7 @@ class ContentBasedRecommender:
         try:
             # تدريب نمذجة الموضوعات
             logger.info("3️⃣ تدريب نمذجة الموضوعات...")
-            self.topic_model = TopicModelingEngine(self.config)
+            self.topic_model = TopicModelingEngine(self.config, catalog=self.catalog)
             if self.config.topic_model_type.upper() == 'LDA':
                 topic_result = self.topic_model.train_lda_model(articles_df)
             else:
@@ -760,7 +969,7 @@ class ContentBasedRecommender:
         try:
             # تدريب Word2Vec
             logger.info("4️⃣ تدريب Word2Vec...")
-            self.word2vec_model = Word2VecContentModel(self.config)
+            self.word2vec_model = Word2VecContentModel(self.config, catalog=self.catalog)
             w2v_result = self.word2vec_model.train_word2vec(articles_df)
             results['word2vec'] = w2v_result
             
@@ -773,7 +982,8 @@ class ContentBasedRecommender:
     
     def get_content_recommendations(self, user_articles: List[str], 
                                   n_recommendations: int = 10,
-                                  exclude_articles: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+                                  exclude_articles: Optional[List[str]] = None,
+                                  user_id: Optional[str] = None) -> List[Tuple[str, float]]:
         """الحصول على توصيات محتوائية موحدة"""
         if not user_articles:
             return self._get_popular_articles(n_recommendations)
@@ -786,7 +996,7 @@ class ContentBasedRecommender:
         if self.tfidf_extractor:
             try:
                 tfidf_recs = self.tfidf_extractor.get_content_recommendations(
-                    user_articles, n_recommendations * 2
+                    user_articles, n_recommendations * 2, user_id=user_id
                 )
                 self._merge_recommendations(all_recommendations, tfidf_recs, 
                                          self.method_weights['tfidf'])
@@ -821,17 +1031,17 @@ class ContentBasedRecommender:
         
         # استبعاد المقالات المحددة
         if exclude_articles:
-            for article_id in exclude_articles:
-                all_recommendations.pop(article_id, None)
+            exclude_set = set(exclude_articles)
+            all_recommendations = {article_id: score for article_id, score in all_recommendations.items()
+                                   if article_id not in exclude_set}
         
         # ترتيب وإرجاع أفضل التوصيات
-        sorted_recommendations = sorted(
-            all_recommendations.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:n_recommendations]
-        
-        return sorted_recommendations
+        return top_k_from_dict(all_recommendations, n_recommendations)
+    
+    def invalidate_user_profile(self, user_id: str):
+        """إلغاء ملفات المستخدم المؤقتة بعد تفاعل جديد"""
+        if self.tfidf_extractor:
+            self.tfidf_extractor.invalidate_user_profile(user_id)
     
     def _merge_recommendations(self, all_recs: Dict[str, float], 
                              new_recs: List[Tuple[str, float]], weight: float):
@@ -866,8 +1076,7 @@ class ContentBasedRecommender:
                 all_similar[article_id] /= len(user_articles)
         
         # ترتيب وإرجاع النتائج
-        sorted_similar = sorted(all_similar.items(), key=lambda x: x[1], reverse=True)
-        return sorted_similar[:n_recommendations]
+        return top_k_from_dict(all_similar, n_recommendations)
     
     def _get_topic_recommendations(self, user_articles: List[str],
                                  n_recommendations: int) -> List[Tuple[str, float]]:
@@ -876,37 +1085,24 @@ class ContentBasedRecommender:
             return []
         
         # بناء ملف اهتمامات المستخدم بناءً على موضوعات مقالاته
-        user_topic_profile = np.zeros(self.config.n_topics)
-        article_count = 0
-        
-        for article_id in user_articles:
-            if article_id in self.tfidf_extractor.article_ids:
-                article_idx = self.tfidf_extractor.article_ids.index(article_id)
-                if article_idx < len(self.topic_model.article_topics):
-                    user_topic_profile += self.topic_model.article_topics[article_idx]
-                    article_count += 1
+        catalog = self.topic_model.catalog
+        user_indices = catalog.indices_of(user_articles)
+        user_indices = user_indices[user_indices < len(self.topic_model.article_topics)]
         
-        if article_count == 0:
+        if user_indices.size == 0:
             return []
         
         # تطبيع ملف المستخدم
-        user_topic_profile /= article_count
+        user_topic_profile = self.topic_model.article_topics[user_indices].mean(axis=0)
         
         # حساب التشابه مع جميع المقالات
         similarities = cosine_similarity([user_topic_profile], 
                                        self.topic_model.article_topics).flatten()
         
-        # إنشاء قائمة التوصيات
-        recommendations = []
-        for i, similarity in enumerate(similarities):
-            if i < len(self.tfidf_extractor.article_ids):
-                article_id = self.tfidf_extractor.article_ids[i]
-                if article_id not in user_articles and similarity > 0.1:
-                    recommendations.append((article_id, float(similarity)))
-        
-        # ترتيب حسب التشابه
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        return recommendations[:n_recommendations]
+        # إنشاء قائمة التوصيات مع استبعاد مقالات المستخدم
+        similarities = similarities[:len(catalog)]
+        return top_k_items(catalog.ids, similarities, n_recommendations,
+                           exclude=user_indices, threshold=0.1)
     
     def _get_popular_articles(self, n_articles: int) -> List[Tuple[str, float]]:
         """الحصول على أكثر المقالات شعبية للمستخدمين الجدد"""
@@ -948,8 +1144,8 @@ class ContentBasedRecommender:
                     })
         
         # شرح الموضوعات
-        if self.topic_model and recommended_article in self.tfidf_extractor.article_ids:
-            rec_idx = self.tfidf_extractor.article_ids.index(recommended_article)
+        if self.topic_model and recommended_article in self.topic_model.catalog:
+            rec_idx = self.topic_model.catalog.index_of(recommended_article)
             rec_topics = self.topic_model.get_article_topics(recommended_article, rec_idx)
             
             explanation['topics'] = {
@@ -960,59 +1156,73 @@ class ContentBasedRecommender:
         return explanation
     
     def save_models(self, base_path: str):
-        """حفظ جميع النماذج"""
+        """
+        حفظ جميع النماذج
+        Each component is written as a memory-mappable artifact directory
+        (``<base_path>_tfidf``, ``_topics``, ``_word2vec``, ``_config``).
+        """
         logger.info(f"💾 حفظ النماذج في {base_path}")
         
         # حفظ TF-IDF
-        if self.tfidf_extractor:
-            joblib.dump(self.tfidf_extractor, f"{base_path}_tfidf.pkl")
+        if self.tfidf_extractor and self.tfidf_extractor.feature_matrix is not None:
+            self.tfidf_extractor.save(f"{base_path}_tfidf")
         
         # حفظ Topic Model
-        if self.topic_model:
-            joblib.dump(self.topic_model, f"{base_path}_topics.pkl")
+        if self.topic_model and self.topic_model.article_topics is not None:
+            self.topic_model.save(f"{base_path}_topics")
         
         # حفظ Word2Vec
         if self.word2vec_model and self.word2vec_model.word2vec_model:
-            self.word2vec_model.word2vec_model.save(f"{base_path}_word2vec.model")
-            joblib.dump(self.word2vec_model.article_vectors, f"{base_path}_article_vectors.pkl")
+            self.word2vec_model.save(f"{base_path}_word2vec")
         
         # حفظ التكوين
-        joblib.dump({
-            'config': self.config,
-            'method_weights': self.method_weights,
-            'article_count': len(self.articles_df) if self.articles_df is not None else 0
-        }, f"{base_path}_config.pkl")
+        save_artifact(
+            f"{base_path}_config", 'content_based',
+            metadata={'article_count': len(self.articles_df) if self.articles_df is not None else 0},
+            objects={'config': self.config, 'method_weights': self.method_weights}
+        )
         
         logger.info("✅ تم حفظ جميع النماذج")
     
-    def load_models(self, base_path: str):
-        """تحميل جميع النماذج"""
+    def load_models(self, base_path: str, mmap_mode: Optional[str] = 'r'):
+        """تحميل جميع النماذج (الصيغة المربوطة بالذاكرة أو ملفات pkl القديمة)"""
         logger.info(f"📂 تحميل النماذج من {base_path}")
         
+        if not is_artifact(f"{base_path}_config"):
+            self._load_legacy_models(base_path)
+            return
+        
         try:
             # تحميل التكوين
-            config_data = joblib.load(f"{base_path}_config.pkl")
+            config_data = load_artifact(f"{base_path}_config", kind='content_based').objects
             self.config = config_data['config']
             self.method_weights = config_data['method_weights']
             
             # تحميل TF-IDF
             try:
-                self.tfidf_extractor = joblib.load(f"{base_path}_tfidf.pkl")
-            except:
+                self.tfidf_extractor = TFIDFContentExtractor(self.config).load(f"{base_path}_tfidf", mmap_mode)
+                self.catalog = self.tfidf_extractor.catalog
+            except Exception:
                 logger.warning("⚠️ فشل في تحميل نموذج TF-IDF")
             
             # تحميل Topic Model
             try:
-                self.topic_model = joblib.load(f"{base_path}_topics.pkl")
-            except:
+                self.topic_model = TopicModelingEngine(self.config, catalog=self.catalog).load(
+                    f"{base_path}_topics", mmap_mode)
+                if self.catalog is None:
+                    self.catalog = self.topic_model.catalog
+            except Exception:
                 logger.warning("⚠️ فشل في تحميل نموذج الموضوعات")
             
             # تحميل Word2Vec
             try:
-                self.word2vec_model = Word2VecContentModel(self.config)
-                self.word2vec_model.word2vec_model = Word2Vec.load(f"{base_path}_word2vec.model")
-                self.word2vec_model.article_vectors = joblib.load(f"{base_path}_article_vectors.pkl")
-            except:
+                self.word2vec_model = Word2VecContentModel(self.config, catalog=self.catalog).load(
+                    f"{base_path}_word2vec", mmap_mode)
+                if self.word2vec_model.catalog is not self.catalog and self.catalog is not None:
+                    # فهرس مختلف: إعادة ترتيب المتجهات حسب الفهرس المشترك
+                    self.word2vec_model.catalog = self.catalog
+                    self.word2vec_model.build_vector_matrix()
+            except Exception:
                 logger.warning("⚠️ فشل في تحميل نموذج Word2Vec")
             
             # تحميل BERT
@@ -1026,6 +1236,54 @@ class ContentBasedRecommender:
         except Exception as e:
             logger.error(f"❌ فشل في تحميل النماذج: {str(e)}")
             raise
+    
+    def _load_legacy_models(self, base_path: str):
+        """تحميل النماذج المحفوظة بصيغة joblib القديمة"""
+        try:
+            # تحميل التكوين
+            config_data = joblib.load(f"{base_path}_config.pkl")
+            self.config = config_data['config']
+            self.method_weights = config_data['method_weights']
+            
+            # تحميل TF-IDF (__setstate__ يبني الفهرس من article_ids القديمة)
+            try:
+                tfidf_extractor = joblib.load(f"{base_path}_tfidf.pkl")
+                self.catalog = tfidf_extractor.catalog
+                self.tfidf_extractor = tfidf_extractor
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في تحميل نموذج TF-IDF: {e}")
+            
+            # تحميل Topic Model
+            try:
+                topic_model = joblib.load(f"{base_path}_topics.pkl")
+                if len(topic_model.catalog) == 0 and self.catalog is not None:
+                    # الصيغة القديمة: توزيعات الموضوعات بترتيب مقالات TF-IDF
+                    topic_model.catalog = self.catalog
+                self.topic_model = topic_model
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في تحميل نموذج الموضوعات: {e}")
+            
+            # تحميل Word2Vec
+            try:
+                word2vec_model = Word2VecContentModel(self.config, catalog=self.catalog)
+                word2vec_model.word2vec_model = Word2Vec.load(f"{base_path}_word2vec.model")
+                word2vec_model.article_vectors = joblib.load(f"{base_path}_article_vectors.pkl")
+                word2vec_model.build_vector_matrix()
+                self.word2vec_model = word2vec_model
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في تحميل نموذج Word2Vec: {e}")
+            
+            # تحميل BERT
+            try:
+                self.bert_extractor = BERTContentExtractor(self.config)
+            except:
+                logger.warning("⚠️ فشل في تحميل نموذج BERT")
+            
+            logger.info("✅ تم تحميل النماذج")
+            
+        except Exception as e:
+            logger.error(f"❌ فشل في تحميل النماذج: {str(e)}")
+            raise
 
 
 # مثال على الاستخدام
@@ -28,6 +28,9 @@ import json
 
 from .collaborative_filtering import CollaborativeFilteringEnsemble, MatrixFactorizationModel, NeuralCollaborativeFiltering
 from .content_based_filtering import ContentBasedRecommender, ContentFilteringConfig
+from .top_k import top_k
+from .artifact_store import save_artifact, load_artifact, is_artifact
+from .bounded_cache import BoundedCache
 
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -59,6 +62,7 @@ class HybridConfig:
     min_confidence: float = 0.1
     max_recommendations: int = 100
     cache_ttl: int = 300  # ثواني
+    cache_max_entries: int = 10000
     
     # A/B Testing
     enable_ab_testing: bool = True
@@ -487,7 +491,14 @@ class HybridRecommendationEngine:
         self.user_profile_manager = UserProfileManager(config)
         self.adaptive_weighting = AdaptiveWeightingModule(config)
         self.popularity_scores = {}
-        self.recommendation_cache = {}
+        # ترتيب الشعبية المحسوب مسبقاً (تنازلياً)، يُحدّث مع نقاط الشعبية
+        self.popularity_ranked_ids = np.empty(0, dtype=object)
+        self.popularity_ranked_scores = np.empty(0, dtype=np.float64)
+        self.recommendation_cache = BoundedCache(
+            max_entries=self.config.cache_max_entries,
+            default_ttl=self.config.cache_ttl,
+            name='hybrid_recommendations'
+        )
         self.performance_metrics = defaultdict(list)
         self.ab_test_groups = {}
         
@@ -508,52 +519,80 @@ class HybridRecommendationEngine:
         """تحديث نقاط الشعبية"""
         logger.info("📊 تحديث نقاط الشعبية...")
         
-        # حساب نقاط الشعبية بناءً على التفاعلات
-        for _, article in articles_df.iterrows():
-            score = 0.0
-            
-            # عوامل الشعبية
-            views = article.get('views', 0)
-            likes = article.get('likes', 0)
-            shares = article.get('shares', 0)
-            comments = article.get('comments', 0)
-            
-            # حساب النقاط المرجحة
-            score = (
-                views * 1.0 +
-                likes * 3.0 +
-                shares * 5.0 +
-                comments * 4.0
-            )
-            
-            # تطبيق تراجع زمني
-            if 'created_at' in article:
-                days_old = (datetime.now() - pd.to_datetime(article['created_at'])).days
-                time_decay = self.config.temporal_decay ** days_old
-                score *= time_decay
-            
-            self.popularity_scores[article['id']] = score
+        def column(name: str) -> np.ndarray:
+            if name not in articles_df:
+                return np.zeros(len(articles_df))
+            return articles_df[name].fillna(0).to_numpy(dtype=np.float64)
+        
+        # حساب النقاط المرجحة لجميع المقالات دفعة واحدة
+        scores = (
+            column('views') * 1.0 +
+            column('likes') * 3.0 +
+            column('shares') * 5.0 +
+            column('comments') * 4.0
+        )
+        
+        # تطبيق تراجع زمني
+        if 'created_at' in articles_df:
+            days_old = (pd.Timestamp(datetime.now()) - pd.to_datetime(articles_df['created_at'])).dt.days
+            time_decay = self.config.temporal_decay ** days_old.to_numpy(dtype=np.float64)
+            scores *= np.where(np.isnan(time_decay), 1.0, time_decay)
+        
+        self.popularity_scores.update(zip(articles_df['id'], scores.tolist()))
         
         # تطبيع النقاط
         if self.popularity_scores:
-            max_score = max(self.popularity_scores.values())
+            values = np.fromiter(self.popularity_scores.values(), dtype=np.float64,
+                                 count=len(self.popularity_scores))
+            max_score = values.max()
             if max_score > 0:
-                for article_id in self.popularity_scores:
-                    self.popularity_scores[article_id] /= max_score
+                values /= max_score
+                self.popularity_scores = dict(zip(self.popularity_scores.keys(), values.tolist()))
         
+        self._rebuild_popularity_ranking()
         logger.info(f"✅ تم تحديث نقاط الشعبية لـ {len(self.popularity_scores)} مقال")
     
+    def _rebuild_popularity_ranking(self):
+        """ترتيب المقالات حسب الشعبية مرة واحدة بدل كل طلب"""
+        ids = np.asarray(list(self.popularity_scores.keys()), dtype=object)
+        scores = np.fromiter(self.popularity_scores.values(), dtype=np.float64, count=len(ids))
+        order = np.argsort(-scores, kind='stable')
+        self.popularity_ranked_ids = ids[order]
+        self.popularity_ranked_scores = scores[order]
+    
+    def _top_popular(self, n_recs: int,
+                     exclude_articles: Optional[List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        أفضل المقالات شعبية من الترتيب المحسوب مسبقاً
+        Only the first ``n_recs + len(exclude_articles)`` ranked entries can be
+        in the result, so the work is independent of the catalogue size.
+        """
+        exclude_set = set(exclude_articles) if exclude_articles else None
+        head = n_recs + (len(exclude_set) if exclude_set else 0)
+        ids = self.popularity_ranked_ids[:head]
+        scores = self.popularity_ranked_scores[:head]
+        
+        if exclude_set:
+            keep = np.fromiter((article_id not in exclude_set for article_id in ids),
+                               dtype=bool, count=len(ids))
+            ids, scores = ids[keep], scores[keep]
+        return ids[:n_recs], scores[:n_recs]
+    
     def get_hybrid_recommendations(self, user_id: str, context: Dict[str, Any],
                                  n_recommendations: int = 10,
                                  exclude_articles: Optional[List[str]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
         """الحصول على التوصيات الهجينة"""
-        # تحقق من التخزين المؤقت
+        # التخزين المؤقت مع حساب واحد للطلبات المتزامنة لنفس المفتاح
         cache_key = f"{user_id}_{hash(str(context))}_{n_recommendations}"
-        if cache_key in self.recommendation_cache:
-            cached_result, timestamp = self.recommendation_cache[cache_key]
-            if (datetime.now() - timestamp).seconds < self.config.cache_ttl:
-                return cached_result
-        
+        return self.recommendation_cache.get_or_compute(
+            cache_key,
+            lambda: self._build_hybrid_recommendations(user_id, context, n_recommendations, exclude_articles)
+        )
+    
+    def _build_hybrid_recommendations(self, user_id: str, context: Dict[str, Any],
+                                      n_recommendations: int,
+                                      exclude_articles: Optional[List[str]]) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """حساب التوصيات الهجينة"""
         # الحصول على ملف المستخدم
         user_profile = self.user_profile_manager.get_user_profile(user_id)
         is_cold_start = self.user_profile_manager.is_cold_start_user(user_id)
@@ -561,9 +600,8 @@ class HybridRecommendationEngine:
         # الحصول على الأوزان المتكيفة
         adaptive_weights = self.adaptive_weighting.get_adaptive_weights(user_id, context)
         
-        # جمع التوصيات من الطرق المختلفة
-        all_recommendations = defaultdict(lambda: {'score': 0.0, 'methods': {}, 'confidence': 0.0})
-        total_weight = 0.0
+        # جمع التوصيات من الطرق المختلفة: (الطريقة، المعرفات، النقاط، الوزن)
+        sources = []
         
         # التوصيات التعاونية
         if self.collaborative_model and not is_cold_start:
@@ -571,10 +609,8 @@ class HybridRecommendationEngine:
                 collab_recs = self._get_collaborative_recommendations(
                     user_id, n_recommendations * 2, exclude_articles
                 )
-                weight = adaptive_weights.get('collaborative', 0.0)
-                self._merge_recommendations(all_recommendations, collab_recs, 
-                                         weight, 'collaborative')
-                total_weight += weight
+                sources.append(('collaborative', *self._as_arrays(collab_recs),
+                                adaptive_weights.get('collaborative', 0.0)))
             except Exception as e:
                 logger.warning(f"⚠️ فشل في الحصول على توصيات تعاونية: {str(e)}")
         
@@ -584,72 +620,37 @@ class HybridRecommendationEngine:
                 content_recs = self._get_content_recommendations(
                     user_id, user_profile, n_recommendations * 2, exclude_articles
                 )
-                weight = adaptive_weights.get('content', 0.0)
-                self._merge_recommendations(all_recommendations, content_recs,
-                                         weight, 'content')
-                total_weight += weight
+                sources.append(('content', *self._as_arrays(content_recs),
+                                adaptive_weights.get('content', 0.0)))
             except Exception as e:
                 logger.warning(f"⚠️ فشل في الحصول على توصيات محتوائية: {str(e)}")
         
         # توصيات الشعبية
         try:
-            popularity_recs = self._get_popularity_recommendations(
-                n_recommendations * 2, exclude_articles
-            )
-            weight = adaptive_weights.get('popularity', 0.0)
-            self._merge_recommendations(all_recommendations, popularity_recs,
-                                     weight, 'popularity')
-            total_weight += weight
+            popularity_ids, popularity_scores = self._top_popular(n_recommendations * 2, exclude_articles)
+            sources.append(('popularity', popularity_ids, popularity_scores,
+                            adaptive_weights.get('popularity', 0.0)))
         except Exception as e:
             logger.warning(f"⚠️ فشل في الحصول على توصيات الشعبية: {str(e)}")
         
         # توصيات زمنية (الحداثة)
         try:
-            temporal_recs = self._get_temporal_recommendations(
-                context, n_recommendations * 2, exclude_articles
-            )
-            weight = adaptive_weights.get('temporal', 0.0)
-            self._merge_recommendations(all_recommendations, temporal_recs,
-                                     weight, 'temporal')
-            total_weight += weight
+            temporal_ids, temporal_scores = self._top_popular(n_recommendations * 2, exclude_articles)
+            sources.append(('temporal', temporal_ids, temporal_scores * self._temporal_factor(context),
+                            adaptive_weights.get('temporal', 0.0)))
         except Exception as e:
             logger.warning(f"⚠️ فشل في الحصول على توصيات زمنية: {str(e)}")
         
-        # تطبيع النقاط وحساب الثقة
-        final_recommendations = []
-        for article_id, rec_data in all_recommendations.items():
-            if total_weight > 0:
-                normalized_score = rec_data['score'] / total_weight
-                
-                # حساب الثقة بناءً على عدد الطرق المساهمة
-                confidence = len(rec_data['methods']) / len(self.config.ensemble_methods)
-                
-                # إضافة عوامل إضافية للثقة
-                confidence *= user_profile.get('profile_confidence', 0.5)
-                
-                if normalized_score >= self.config.min_confidence:
-                    final_recommendations.append((
-                        article_id,
-                        normalized_score,
-                        {
-                            'methods': rec_data['methods'],
-                            'confidence': confidence,
-                            'weights_used': adaptive_weights
-                        }
-                    ))
-        
-        # ترتيب وتحديد العدد المطلوب
-        final_recommendations.sort(key=lambda x: x[1], reverse=True)
-        final_recommendations = final_recommendations[:n_recommendations]
+        # دمج النقاط وحساب الثقة وتحديد العدد المطلوب
+        final_recommendations = self._fuse_recommendations(
+            sources, n_recommendations, user_profile.get('profile_confidence', 0.5), adaptive_weights
+        )
         
         # تطبيق تنويع إضافي
         final_recommendations = self._apply_diversification(
             final_recommendations, user_profile
         )
         
-        # حفظ في التخزين المؤقت
-        self.recommendation_cache[cache_key] = (final_recommendations, datetime.now())
-        
         logger.info(f"🎯 تم إنشاء {len(final_recommendations)} توصية هجينة للمستخدم {user_id}")
         
         return final_recommendations
@@ -682,54 +683,98 @@ class HybridRecommendationEngine:
         return self.content_model.get_content_recommendations(
             user_articles=user_articles,
             n_recommendations=n_recs,
-            exclude_articles=exclude_articles
+            exclude_articles=exclude_articles,
+            user_id=user_id
         )
     
     def _get_popularity_recommendations(self, n_recs: int,
                                      exclude_articles: Optional[List[str]]) -> List[Tuple[str, float]]:
         """الحصول على توصيات الشعبية"""
-        exclude_set = set(exclude_articles or [])
-        
-        # ترتيب المقالات حسب الشعبية
-        popular_articles = [
-            (article_id, score) for article_id, score in self.popularity_scores.items()
-            if article_id not in exclude_set
-        ]
-        
-        popular_articles.sort(key=lambda x: x[1], reverse=True)
-        return popular_articles[:n_recs]
+        ids, scores = self._top_popular(n_recs, exclude_articles)
+        return list(zip(ids.tolist(), scores.tolist()))
+    
+    @staticmethod
+    def _temporal_factor(context: Dict[str, Any]) -> float:
+        """عامل زمني بناءً على الوقت الحالي"""
+        # تفضيل المقالات الحديثة بناءً على السياق
+        # يمكن تحسين هذا ليأخذ في الاعتبار أوقات النشر والاتجاهات
+        current_hour = datetime.now().hour
+        if 6 <= current_hour <= 12:  # صباحاً - تفضيل الأخبار
+            return 1.2
+        elif 18 <= current_hour <= 23:  # مساءً - تفضيل المحتوى الترفيهي
+            return 1.1
+        return 1.0
     
     def _get_temporal_recommendations(self, context: Dict[str, Any], n_recs: int,
                                     exclude_articles: Optional[List[str]]) -> List[Tuple[str, float]]:
         """الحصول على توصيات زمنية (حداثة)"""
-        exclude_set = set(exclude_articles or [])
+        # العامل ثابت لجميع المقالات فلا يغير ترتيب الشعبية
+        ids, scores = self._top_popular(n_recs, exclude_articles)
+        return list(zip(ids.tolist(), (scores * self._temporal_factor(context)).tolist()))
+    
+    @staticmethod
+    def _as_arrays(recs: List[Tuple[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """تحويل قائمة (معرف، نقاط) إلى مصفوفتين"""
+        ids = np.empty(len(recs), dtype=object)
+        ids[:] = [article_id for article_id, _ in recs]
+        scores = np.fromiter((score for _, score in recs), dtype=np.float64, count=len(recs))
+        return ids, scores
+    
+    def _fuse_recommendations(self, sources: List[Tuple[str, np.ndarray, np.ndarray, float]],
+                              n_recommendations: int, profile_confidence: float,
+                              adaptive_weights: Dict[str, float]) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        دمج نقاط المصادر المختلفة
+        Each source is mapped onto a shared candidate index, giving an aligned
+        (sources × candidates) score matrix; weighting, normalisation,
+        confidence and the min-confidence cut are then NumPy operations and
+        only the top ``n_recommendations`` rows are turned back into dicts.
+        """
+        total_weight = sum(weight for _, _, _, weight in sources)
+        if not sources or total_weight <= 0:
+            return []
         
-        # تفضيل المقالات الحديثة بناءً على السياق
-        current_hour = datetime.now().hour
+        # فهرس المرشحين المشترك بترتيب أول ظهور
+        candidate_index: Dict[str, int] = {}
+        positions = [
+            np.fromiter((candidate_index.setdefault(article_id, len(candidate_index)) for article_id in ids),
+                        dtype=np.int64, count=len(ids))
+            for _, ids, _, _ in sources
+        ]
+        n_candidates = len(candidate_index)
+        if n_candidates == 0:
+            return []
         
-        # يمكن تحسين هذا ليأخذ في الاعتبار أوقات النشر والاتجاهات
-        temporal_scores = {}
-        for article_id, popularity_score in self.popularity_scores.items():
-            if article_id not in exclude_set:
-                # تطبيق عامل زمني بناءً على الوقت الحالي
-                temporal_factor = 1.0
-                if 6 <= current_hour <= 12:  # صباحاً - تفضيل الأخبار
-                    temporal_factor = 1.2
-                elif 18 <= current_hour <= 23:  # مساءً - تفضيل المحتوى الترفيهي
-                    temporal_factor = 1.1
-                
-                temporal_scores[article_id] = popularity_score * temporal_factor
+        weighted = np.zeros((len(sources), n_candidates))
+        present = np.zeros((len(sources), n_candidates), dtype=bool)
+        for row, ((_, _, scores, weight), cols) in enumerate(zip(sources, positions)):
+            weighted[row, cols] = scores * weight
+            present[row, cols] = True
         
-        # ترتيب حسب النقاط الزمنية
-        temporal_recs = sorted(temporal_scores.items(), key=lambda x: x[1], reverse=True)
-        return temporal_recs[:n_recs]
-    
-    def _merge_recommendations(self, all_recs: Dict, new_recs: List[Tuple[str, float]],
-                             weight: float, method_name: str):
-        """دمج توصيات جديدة مع الموجودة"""
-        for article_id, score in new_recs:
-            all_recs[article_id]['score'] += score * weight
-            all_recs[article_id]['methods'][method_name] = score * weight
+        normalized = weighted.sum(axis=0) / total_weight
+        # الثقة بناءً على عدد الطرق المساهمة وملف المستخدم
+        confidence = present.sum(axis=0) / len(self.config.ensemble_methods) * profile_confidence
+        
+        selected, selected_scores = top_k(normalized, n_recommendations,
+                                          exclude=normalized < self.config.min_confidence)
+        
+        candidate_ids = np.empty(n_candidates, dtype=object)
+        candidate_ids[list(candidate_index.values())] = list(candidate_index.keys())
+        methods = [method for method, _, _, _ in sources]
+        
+        return [
+            (
+                candidate_ids[col],
+                float(score),
+                {
+                    'methods': {methods[row]: float(weighted[row, col])
+                                for row in np.flatnonzero(present[:, col])},
+                    'confidence': float(confidence[col]),
+                    'weights_used': adaptive_weights
+                }
+            )
+            for col, score in zip(selected, selected_scores)
+        ]
     
     def _apply_diversification(self, recommendations: List[Tuple[str, float, Dict]],
                              user_profile: Dict[str, Any]) -> List[Tuple[str, float, Dict]]:
@@ -769,6 +814,10 @@ class HybridRecommendationEngine:
         
         self.user_profile_manager.update_user_profile(user_id, interaction_data)
         
+        # إلغاء ملف المحتوى المؤقت للمستخدم
+        if self.content_model:
+            self.content_model.invalidate_user_profile(user_id)
+        
         # تحديث أداء الطرق المختلفة
         # (يتطلب تتبع أي طريقة أوصت بهذا المقال)
         
@@ -863,27 +912,31 @@ class HybridRecommendationEngine:
         """الحصول على مقاييس الأداء"""
         return {
             'total_recommendations': sum(len(metrics) for metrics in self.performance_metrics.values()),
-            'cache_hit_rate': len(self.recommendation_cache) / max(1, len(self.performance_metrics)),
+            'cache_hit_rate': self.recommendation_cache.stats()['hit_rate'],
             'active_users': len(self.user_profile_manager.user_profiles),
             'method_weights': self.config.base_weights.copy(),
             'last_update': datetime.now().isoformat()
         }
     
     def save_model(self, filepath: str):
-        """حفظ النظام الهجين"""
+        """
+        حفظ النظام الهجين
+        Popularity scores go to an array next to the ordered article ids;
+        user profiles and metrics are small and stay pickled.
+        """
         logger.info(f"💾 حفظ النظام الهجين في {filepath}")
         
-        model_data = {
-            'config': self.config,
-            'user_profiles': dict(self.user_profile_manager.user_profiles),
-            'popularity_scores': self.popularity_scores,
-            'method_weights': self.config.base_weights,
-            'performance_metrics': dict(self.performance_metrics),
-            'save_timestamp': datetime.now().isoformat()
-        }
-        
-        with open(f"{filepath}_hybrid_system.pkl", 'wb') as f:
-            pickle.dump(model_data, f)
+        save_artifact(
+            f"{filepath}_hybrid_system", 'hybrid',
+            arrays={'popularity_scores': np.fromiter(self.popularity_scores.values(), dtype=np.float64,
+                                                     count=len(self.popularity_scores))},
+            lists={'popularity_ids': list(self.popularity_scores.keys())},
+            metadata={'method_weights': self.config.base_weights,
+                      'save_timestamp': datetime.now().isoformat()},
+            objects={'config': self.config,
+                     'user_profiles': dict(self.user_profile_manager.user_profiles),
+                     'performance_metrics': dict(self.performance_metrics)}
+        )
         
         # حفظ نموذج الأوزان المتكيفة
         if self.adaptive_weighting.weight_model:
@@ -896,12 +949,22 @@ class HybridRecommendationEngine:
         logger.info(f"📂 تحميل النظام الهجين من {filepath}")
         
         try:
-            with open(f"{filepath}_hybrid_system.pkl", 'rb') as f:
-                model_data = pickle.load(f)
+            if is_artifact(f"{filepath}_hybrid_system"):
+                artifact = load_artifact(f"{filepath}_hybrid_system", kind='hybrid')
+                model_data = dict(artifact.objects)
+                model_data['popularity_scores'] = dict(zip(
+                    artifact.lists['popularity_ids'],
+                    np.asarray(artifact.arrays['popularity_scores']).tolist()
+                ))
+            else:
+                # الصيغة القديمة
+                with open(f"{filepath}_hybrid_system.pkl", 'rb') as f:
+                    model_data = pickle.load(f)
             
             self.config = model_data['config']
             self.user_profile_manager.user_profiles = model_data['user_profiles']
             self.popularity_scores = model_data['popularity_scores']
+            self._rebuild_popularity_ranking()
             self.performance_metrics = defaultdict(list, model_data['performance_metrics'])
             
             # تحميل نموذج الأوزان المتكيفة
@@ -0,0 +1,320 @@
+# محرك التوصيات - جداول الجيران المحسوبة مسبقاً
+# Precomputed Item-to-Item Neighbour Tables for Sabq AI Recommendation Engine
+
+import numpy as np
+import os
+import json
+import logging
+from typing import Dict, List, Tuple, Optional, Any, Iterable
+from datetime import datetime
+from dataclasses import dataclass
+
+from .top_k import top_k_rows
+from .artifact_store import save_artifact, load_artifact, is_artifact, MANIFEST_FILE
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# الحد الأقصى لكتلة التشابه (صفوف × N بدقة float32) في الذاكرة
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def block_rows(n: int, chunk_size: Optional[int] = None) -> int:
+    """عدد الصفوف في كل كتلة تشابه بحيث لا تتجاوز الكتلة BLOCK_BYTES"""
+    if chunk_size:
+        return chunk_size
+    return int(max(1, min(1024, BLOCK_BYTES // (4 * max(n, 1)))))
+
+
+@dataclass
+class SimilaritySource:
+    """
+    مصدر تشابه موحد لنموذج محتوى أو تعاوني
+    Row-normalised item vectors (dense or sparse) whose dot product is the
+    model's cosine similarity, aligned with ``ids``.
+    """
+    name: str
+    ids: np.ndarray
+    vectors: Any
+    valid: Optional[np.ndarray] = None  # قناع المقالات التي لها متجه
+
+    def block(self, rows: np.ndarray) -> np.ndarray:
+        """تشابه دفعة من الصفوف مع جميع المقالات (B × N)"""
+        scores = self.vectors[rows] @ self.vectors.T
+        if hasattr(scores, 'toarray'):
+            scores = scores.toarray()
+        scores = np.asarray(scores, dtype=np.float32)
+        if self.valid is not None:
+            # المقالات بلا متجه ليست جاراً لأحد ولا جيران لها (صف -1 بالكامل)
+            scores[~self.valid[rows]] = -np.inf
+            scores[:, ~self.valid] = -np.inf
+        return scores
+
+    def block_columns(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """تشابه دفعة من الصفوف مع مجموعة من المقالات فقط (B × M)"""
+        scores = self.vectors[rows] @ self.vectors[columns].T
+        if hasattr(scores, 'toarray'):
+            scores = scores.toarray()
+        scores = np.asarray(scores, dtype=np.float32)
+        if self.valid is not None:
+            # المقالات بلا متجه ليست جاراً لأحد ولا جيران لها (صف -1 بالكامل)
+            scores[~self.valid[rows]] = -np.inf
+            scores[:, ~self.valid[columns]] = -np.inf
+        return scores
+
+
+def similarity_source_from_model(name: str, model: Any) -> Optional[SimilaritySource]:
+    """
+    بناء مصدر التشابه من نموذج مدرب
+    Supports MatrixFactorizationModel, TFIDFContentExtractor and
+    Word2VecContentModel.
+    """
+    # تفكيك المصفوفة: التضمينات المطبعة في فهرس التشابه
+    if getattr(model, 'similarity_index', None) is not None:
+        ids = np.array([model.reverse_item_mapping[idx] for idx in range(model.n_items)],
+                       dtype=object)
+        return SimilaritySource(name, ids, model.similarity_index.vectors)
+
+    # TF-IDF: مصفوفة نادرة مطبعة L2
+    if getattr(model, 'feature_matrix', None) is not None:
+        return SimilaritySource(name, model.catalog.ids, model.feature_matrix)
+
+    # Word2Vec: متجهات مطبعة بترتيب الفهرس
+    if getattr(model, 'article_vectors', None):
+        if model.vector_matrix is None:
+            model.build_vector_matrix()
+        return SimilaritySource(name, model.catalog.ids, model.vector_matrix, model.has_vector)
+
+    return None
+
+
+class NeighborTable:
+    """
+    جدول الجيران الأقرب لكل مقال
+    Top-K neighbours per article: int32 neighbour rows (-1 padded) plus
+    float16 scores, memory-mapped at serving time for O(K) lookups.
+    """
+
+    ARTIFACT_KIND = 'neighbor_table'
+
+    def __init__(self, article_ids: np.ndarray, neighbors: np.ndarray,
+                 scores: np.ndarray, k: int, built_at: Optional[str] = None):
+        self.article_ids = np.asarray(article_ids, dtype=object)
+        self.neighbors = neighbors
+        self.scores = scores
+        self.k = k
+        self.built_at = built_at or datetime.now().isoformat()
+        self._positions = {article_id: idx for idx, article_id in enumerate(self.article_ids)}
+
+    def __len__(self) -> int:
+        return len(self.article_ids)
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._positions
+
+    @staticmethod
+    def _select(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """اختيار أفضل k جيران لكل صف مع استبعاد المقال نفسه"""
+        scores[np.arange(len(rows)), rows] = -np.inf
+        top_indices, top_scores = top_k_rows(scores, k)
+        return _pack_ids(top_indices, top_scores, k)
+
+    @classmethod
+    def build(cls, source: SimilaritySource, k: int = 50,
+              chunk_size: Optional[int] = None) -> 'NeighborTable':
+        """
+        بناء الجدول كاملاً من مصدر التشابه
+        Full build: one (chunk × N) similarity block at a time; the chunk
+        size is derived from N unless given.
+        """
+        n = len(source.ids)
+        chunk_size = block_rows(n, chunk_size)
+        neighbors = np.full((n, k), -1, dtype=np.int32)
+        scores = np.zeros((n, k), dtype=np.float16)
+
+        for start in range(0, n, chunk_size):
+            rows = np.arange(start, min(start + chunk_size, n))
+            neighbors[rows], scores[rows] = cls._select(source.block(rows), rows, k)
+
+        logger.info(f"🧭 تم بناء جدول الجيران ({source.name}): {n} مقال × {k} جار")
+        return cls(source.ids, neighbors, scores, k)
+
+    def refresh(self, source: SimilaritySource, changed_ids: Iterable[str],
+                chunk_size: Optional[int] = None) -> 'NeighborTable':
+        """
+        تحديث تزايدي للمقالات الجديدة أو المعدلة
+        Incremental refresh: rows of changed and new articles are recomputed;
+        every other row is merged with the fresh scores of those articles, so
+        new articles enter existing neighbour lists and stale scores of edited
+        articles are replaced. Articles missing from ``source`` are dropped;
+        rows that lose neighbours this way may hold fewer than K entries until
+        the next full build.
+        """
+        new_ids = source.ids
+        n, k = len(new_ids), self.k
+        chunk_size = block_rows(n, chunk_size)
+        new_positions = {article_id: idx for idx, article_id in enumerate(new_ids)}
+
+        changed = np.fromiter(
+            {new_positions[article_id] for article_id in changed_ids if article_id in new_positions},
+            dtype=np.int64
+        )
+        changed.sort()
+
+        # ربط مؤشرات الجدول القديم بالفهرس الجديد (-1 للمقالات المحذوفة)
+        old_to_new = np.fromiter((new_positions.get(article_id, -1) for article_id in self.article_ids),
+                                 dtype=np.int64, count=len(self.article_ids))
+        new_to_old = np.full(n, -1, dtype=np.int64)
+        kept = old_to_new >= 0
+        new_to_old[old_to_new[kept]] = np.flatnonzero(kept)
+
+        # المقالات المتغيرة والجديدة (بلا صف قديم) تُحسب صفوفها كاملة وتُدمج أعمدتها
+        is_changed = np.zeros(n, dtype=bool)
+        is_changed[changed] = True
+        is_changed |= new_to_old < 0
+        full_rows = np.flatnonzero(is_changed)
+
+        neighbors = np.full((n, k), -1, dtype=np.int32)
+        scores = np.zeros((n, k), dtype=np.float16)
+
+        # إعادة حساب الصفوف المتغيرة كاملة
+        for start in range(0, len(full_rows), chunk_size):
+            rows = full_rows[start:start + chunk_size]
+            neighbors[rows], scores[rows] = self._select(source.block(rows), rows, k)
+
+        # دمج الصفوف الباقية مع أعمدة المقالات المتغيرة
+        merge_rows = np.flatnonzero(~is_changed)
+        for start in range(0, len(merge_rows), chunk_size):
+            rows = merge_rows[start:start + chunk_size]
+            old_rows = new_to_old[rows]
+
+            old_neighbors = np.asarray(self.neighbors[old_rows], dtype=np.int64)
+            mapped = np.where(old_neighbors >= 0, old_to_new[np.maximum(old_neighbors, 0)], -1)
+            old_scores = np.asarray(self.scores[old_rows], dtype=np.float32)
+            # استبعاد الجيران المحذوفين أو المتغيرين (تُستبدل نقاطهم بالحديثة)
+            stale = (mapped < 0) | is_changed[np.maximum(mapped, 0)]
+            old_scores[stale] = -np.inf
+
+            if full_rows.size:
+                fresh = source.block_columns(rows, full_rows)
+                candidate_ids = np.hstack([mapped, np.broadcast_to(full_rows, (len(rows), full_rows.size))])
+                candidate_scores = np.hstack([old_scores, fresh])
+            else:
+                candidate_ids, candidate_scores = mapped, old_scores
+
+            top_indices, top_scores = top_k_rows(candidate_scores, k)
+            picked = np.take_along_axis(candidate_ids, top_indices, axis=1)
+            neighbors[rows], scores[rows] = _pack_ids(picked, top_scores, k)
+
+        logger.info(f"🔄 تحديث جدول الجيران: {len(full_rows)} صف محسوب، {len(merge_rows)} صف مدمج")
+        return NeighborTable(new_ids, neighbors, scores, k)
+
+    def get_neighbors(self, article_id: str, n: Optional[int] = None,
+                      threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """قراءة جيران مقال في O(K)"""
+        row = self._positions.get(article_id)
+        if row is None:
+            return []
+
+        neighbors = self.neighbors[row][:n]
+        scores = self.scores[row][:n]
+        valid = neighbors >= 0
+        if threshold is not None:
+            valid &= scores > threshold
+
+        return [(self.article_ids[idx], float(score))
+                for idx, score in zip(neighbors[valid], scores[valid])]
+
+    def save(self, directory: str):
+        """حفظ الجدول كنموذج مربوط بالذاكرة (كتابة ذرية)"""
+        save_artifact(
+            directory, self.ARTIFACT_KIND,
+            arrays={
+                'neighbors': np.asarray(self.neighbors, dtype=np.int32),
+                'scores': np.asarray(self.scores, dtype=np.float16),
+            },
+            lists={'article_ids': [str(article_id) for article_id in self.article_ids]},
+            metadata={'k': self.k, 'n_articles': len(self), 'built_at': self.built_at}
+        )
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'NeighborTable':
+        """تحميل الجدول مع ربط الذاكرة"""
+        artifact = load_artifact(directory, kind=cls.ARTIFACT_KIND, mmap_mode=mmap_mode)
+        return cls(
+            artifact.lists['article_ids'],
+            artifact.arrays['neighbors'],
+            artifact.arrays['scores'],
+            artifact.metadata['k'],
+            artifact.metadata.get('built_at')
+        )
+
+
+def _pack_ids(ids: np.ndarray, top_scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """تحويل نتائج top_k_rows إلى صفوف int32/float16 بطول k مع -1 للمواقع غير الصالحة"""
+    rows = ids.shape[0]
+    neighbors = np.full((rows, k), -1, dtype=np.int32)
+    scores = np.zeros((rows, k), dtype=np.float16)
+    width = ids.shape[1]
+    valid = np.isfinite(top_scores) & (ids >= 0)
+    neighbors[:, :width] = np.where(valid, ids, -1)
+    scores[:, :width] = np.where(valid, top_scores, 0.0)
+    return neighbors, scores
+
+
+def table_versions(base_path: str) -> Dict[str, Optional[str]]:
+    """وقت بناء كل جدول من ملف manifest فقط (دون تحميل المصفوفات أو المعرفات)"""
+    versions = {}
+    if not os.path.isdir(base_path):
+        return versions
+    for name in sorted(os.listdir(base_path)):
+        manifest_path = os.path.join(base_path, name, MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            continue
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                versions[name] = json.load(f).get('metadata', {}).get('built_at')
+        except (OSError, ValueError):
+            continue
+    return versions
+
+
+def materialize_neighbor_tables(models: Dict[str, Any], base_path: str, k: int = 50,
+                                changed_ids: Optional[Iterable[str]] = None,
+                                chunk_size: Optional[int] = None) -> Dict[str, NeighborTable]:
+    """
+    مهمة دورية لبناء أو تحديث جداول الجيران لكل نموذج
+    Offline job: for each model, refresh the table under ``base_path/<name>``
+    incrementally when ``changed_ids`` is given and a table with the same K
+    exists, otherwise rebuild it from scratch.
+    """
+    tables = {}
+    changed_ids = list(changed_ids) if changed_ids is not None else None
+
+    for name, model in models.items():
+        source = similarity_source_from_model(name, model)
+        if source is None:
+            logger.warning(f"⚠️ النموذج {name} لا يدعم جداول الجيران")
+            continue
+
+        directory = os.path.join(base_path, name)
+        try:
+            existing = None
+            if changed_ids is not None and is_artifact(directory):
+                existing = NeighborTable.load(directory, mmap_mode='r')
+                if existing.k != k:
+                    logger.info(f"🔁 تغير K لجدول {name} ({existing.k} → {k}): بناء كامل")
+                    existing = None
+
+            if existing is not None:
+                table = existing.refresh(source, changed_ids, chunk_size)
+            else:
+                table = NeighborTable.build(source, k, chunk_size)
+
+            table.save(directory)
+            tables[name] = table
+        except Exception as e:
+            logger.error(f"❌ فشل في بناء جدول الجيران {name}: {str(e)}")
+
+    return tables
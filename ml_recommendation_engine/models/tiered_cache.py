@@ -0,0 +1,294 @@
+# محرك التوصيات - تخزين مؤقت بطبقتين (داخل العملية + Redis)
+# Two-Tier Recommendation Cache (in-process L1 + Redis L2) with
+# Pub/Sub Invalidation for Sabq AI Recommendation Engine
+
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Any, Callable, Awaitable, Hashable
+
+from .bounded_cache import BoundedCache
+
+# إعداد التسجيل
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _Cached:
+    __slots__ = ('value', 'fresh_until', 'hits')
+
+    def __init__(self, value: Any, fresh_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.hits = 0
+
+
+class TieredRecommendationCache:
+    """
+    تخزين مؤقت للتوصيات بطبقتين مع إبطال منسق
+    L1 is a per-process ``BoundedCache``; L2 is Redis, shared by all workers.
+
+    Invalidation is per user and O(1): every user has a generation number
+    (``<prefix>recommendations:gen:<user>`` in Redis) that is part of every
+    cache key. ``invalidate_user`` increments it and publishes the new value
+    on the invalidation channel, so all workers stop reading the user's old
+    entries at once. Old entries simply age out. A computation that started
+    before an invalidation writes under the old generation, so it can never
+    be served afterwards.
+
+    Stale-while-revalidate: entries are fresh for ``ttl`` seconds and kept
+    for ``stale_ttl``. A stale hit on a hot key (``hot_hits`` L1 hits or
+    more) is served immediately and refreshed in the background; a stale hit
+    on a cold key is recomputed inline.
+
+    Without a Redis client the cache runs L1-only with local generations.
+    If Redis fails while reading a generation, the request bypasses the
+    cache rather than risk serving entries from before an invalidation.
+    """
+
+    def __init__(self, redis_client: Any = None, key_prefix: str = 'sabq:',
+                 ttl: float = 300, stale_ttl: float = 900,
+                 max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 hot_hits: int = 2,
+                 serialize: Callable[[Any], str] = json.dumps,
+                 deserialize: Callable[[str], Any] = json.loads,
+                 name: str = 'recommendations'):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.hot_hits = hot_hits
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.channel = f"{key_prefix}recommendations:invalidate"
+
+        self.l1 = BoundedCache(max_entries=max_entries, max_bytes=max_bytes,
+                               default_ttl=self.stale_ttl, name=name)
+        # أجيال المستخدمين المعروفة محلياً؛ مع Redis تنتهي لإعادة قراءتها
+        # في حال فقدان رسالة إبطال
+        self._generations = BoundedCache(max_entries=max_entries,
+                                         default_ttl=ttl if redis_client is not None else None,
+                                         name=f"{name}_generations")
+        # بدون Redis: جيل المستخدم غير المعروف هو عداد محلي متزايد، حتى لا
+        # يعود مستخدم أُخرج من الذاكرة إلى جيل قديم
+        self._local_clock = 0
+
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._refreshing: set = set()
+        self._listener: Optional[asyncio.Task] = None
+        self.l2_hits = 0
+        self.stale_hits = 0
+        self.invalidations = 0
+
+    # ----------------------------- الأجيال -----------------------------
+
+    def _gen_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}recommendations:gen:{user_id}"
+
+    def _l2_key(self, user_id: str, generation: int, key: Hashable) -> str:
+        return f"{self.key_prefix}recommendations:{user_id}:{generation}:{key}"
+
+    async def _generation(self, user_id: str) -> Optional[int]:
+        """الجيل الحالي لمستخدم (None عند تعذر معرفته)"""
+        generation = self._generations.get(user_id)
+        if generation is not None:
+            return generation
+
+        if self.redis is None:
+            generation = self._local_clock
+        else:
+            try:
+                value = await self.redis.get(self._gen_key(user_id))
+                generation = int(value) if value is not None else 0
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في قراءة جيل المستخدم {user_id} من Redis: {str(e)}")
+                return None
+        self._generations.set(user_id, generation)
+        return generation
+
+    # ----------------------------- القراءة والكتابة -----------------------------
+
+    async def _read_l2(self, l2_key: str) -> Optional[_Cached]:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(l2_key)
+            if raw is None:
+                return None
+            envelope = json.loads(raw)
+            return _Cached(self.deserialize(envelope['value']), envelope['fresh_until'])
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في القراءة من Redis {l2_key}: {str(e)}")
+            return None
+
+    async def _write(self, user_id: str, generation: int, key: Hashable, value: Any):
+        """الكتابة في الطبقتين"""
+        fresh_until = time.time() + self.ttl
+        self.l1.set((user_id, generation, key), _Cached(value, fresh_until))
+
+        if self.redis is None:
+            return
+        try:
+            envelope = json.dumps({'value': self.serialize(value), 'fresh_until': fresh_until},
+                                  ensure_ascii=False)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(self._l2_key(user_id, generation, key), envelope, ex=int(self.stale_ttl))
+                # مفتاح الجيل يجب أن يعيش أطول من مدخلاته حتى لا يعود الجيل للصفر
+                # بينما مدخلات جيل أحدث ما زالت موجودة
+                pipe.expire(self._gen_key(user_id), int(self.stale_ttl))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ فشل في الكتابة إلى Redis: {str(e)}")
+
+    async def _compute_and_store(self, user_id: str, generation: int, key: Hashable,
+                                 compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = await compute()
+        await self._write(user_id, generation, key, value)
+        return value
+
+    def _refresh_in_background(self, user_id: str, generation: int, key: Hashable,
+                               compute: Callable[[], Awaitable[Any]]):
+        """تحديث مفتاح ساخن في الخلفية (مرة واحدة لكل مفتاح)"""
+        l1_key = (user_id, generation, key)
+        if l1_key in self._refreshing:
+            return
+        self._refreshing.add(l1_key)
+
+        async def refresh():
+            try:
+                await self._compute_and_store(user_id, generation, key, compute)
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في تحديث التوصيات في الخلفية للمستخدم {user_id}: {str(e)}")
+            finally:
+                self._refreshing.discard(l1_key)
+
+        asyncio.get_event_loop().create_task(refresh())
+
+    async def get_or_compute(self, user_id: str, key: Hashable,
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        جلب التوصيات من L1 ثم L2 أو حسابها
+        Concurrent misses for the same (user, key) in this process share
+        one computation.
+        """
+        generation = await self._generation(user_id)
+        if generation is None:
+            return await compute()
+
+        l1_key = (user_id, generation, key)
+        now = time.time()
+
+        cached = self.l1.get(l1_key)
+        if cached is None:
+            cached = await self._read_l2(self._l2_key(user_id, generation, key))
+            if cached is not None:
+                self.l2_hits += 1
+                remaining = cached.fresh_until - self.ttl + self.stale_ttl - now
+                self.l1.set(l1_key, cached, ttl=max(remaining, 0))
+
+        if cached is not None:
+            cached.hits += 1
+            if now < cached.fresh_until:
+                return cached.value
+            if cached.hits >= self.hot_hits:
+                self.stale_hits += 1
+                self._refresh_in_background(user_id, generation, key, compute)
+                return cached.value
+
+        # غير موجود أو قديم لمفتاح غير ساخن: حساب واحد للطلبات المتزامنة
+        future = self._inflight.get(l1_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[l1_key] = future
+        try:
+            value = await self._compute_and_store(user_id, generation, key, compute)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(l1_key, None)
+
+    # ----------------------------- الإبطال -----------------------------
+
+    async def invalidate_user(self, user_id: str):
+        """إبطال جميع توصيات المستخدم في جميع العمليات"""
+        self.invalidations += 1
+        if self.redis is None:
+            self._local_clock += 1
+            self._generations.set(user_id, self._local_clock)
+            return
+
+        try:
+            generation = int(await self.redis.incr(self._gen_key(user_id)))
+            await self.redis.expire(self._gen_key(user_id), int(self.stale_ttl))
+            self._generations.set(user_id, generation)
+            await self.redis.publish(self.channel, json.dumps({'user_id': user_id,
+                                                               'generation': generation}))
+        except Exception as e:
+            # Redis غير متاح: إسقاط الجيل المحلي ليُعاد قراءته (أو تجاوز التخزين)
+            logger.warning(f"⚠️ فشل في نشر إبطال المستخدم {user_id}: {str(e)}")
+            self._generations.delete(user_id)
+
+    def _apply_invalidation(self, message: Dict[str, Any]):
+        user_id = message['user_id']
+        generation = int(message['generation'])
+        current = self._generations.get(user_id)
+        if current is None or generation > current:
+            self._generations.set(user_id, generation)
+
+    async def _listen(self):
+        """الاستماع لرسائل الإبطال من العمليات الأخرى"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    try:
+                        self._apply_invalidation(json.loads(message['data']))
+                    except Exception as e:
+                        logger.warning(f"⚠️ رسالة إبطال غير صالحة: {str(e)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # الأجيال المحلية تنتهي بعد ttl فلا تُفقد الإبطالات نهائياً
+                logger.warning(f"⚠️ انقطع الاشتراك في قناة الإبطال: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def start(self):
+        """بدء الاستماع لرسائل الإبطال"""
+        if self.redis is not None and self._listener is None:
+            self._listener = asyncio.get_event_loop().create_task(self._listen())
+
+    async def stop(self):
+        """إيقاف الاستماع"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات التخزين المؤقت"""
+        l1_stats = self.l1.stats()
+        return {
+            **l1_stats,
+            'l2_enabled': self.redis is not None,
+            'l2_hits': self.l2_hits,
+            'stale_hits': self.stale_hits,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,119 @@
+# محرك التوصيات - نواة اختيار أفضل K عناصر
+# Vectorized Top-K Selection shared by all recommenders
+
+import numpy as np
+from typing import Dict, List, Tuple, Optional, Any, Iterable
+
+
+def top_k(scores: np.ndarray, k: int,
+          exclude: Optional[Any] = None,
+          threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    اختيار أفضل k عناصر من متجه النقاط
+    Select the k highest scores using ``np.argpartition`` plus a sort of only
+    the selected elements.
+
+    - ``exclude``: boolean mask or array of indices to drop (e.g. seen items)
+    - ``threshold``: keep only scores strictly greater than this value
+    - ties are broken by the lower index, so results are deterministic
+
+    Returns ``(indices, scores)`` ordered by descending score; NaN and -inf
+    scores are never returned.
+    """
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    valid = np.isfinite(scores)
+    if exclude is not None:
+        exclude = np.asarray(exclude)
+        if exclude.dtype == bool:
+            valid &= ~exclude
+        elif exclude.size:
+            valid[exclude.astype(np.int64)] = False
+    if threshold is not None:
+        valid &= scores > threshold
+
+    masked = np.where(valid, scores, -np.inf)
+    n_valid = int(valid.sum())
+    k = min(k, n_valid)
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    if k < n:
+        partition = np.argpartition(-masked, k - 1)[:k]
+        kth_score = masked[partition].min()
+
+        # فك التعادل عند الحد الفاصل لصالح المؤشر الأصغر
+        above = np.flatnonzero(masked > kth_score)
+        tied = np.flatnonzero(masked == kth_score)[:k - above.shape[0]]
+        selected = np.concatenate([above, tied])
+    else:
+        selected = np.flatnonzero(valid)
+
+    order = np.lexsort((selected, -masked[selected]))
+    selected = selected[order]
+    return selected, scores[selected]
+
+
+def top_k_items(item_ids: Any, scores: np.ndarray, k: int,
+                exclude: Optional[Any] = None,
+                threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+    """
+    أفضل k عناصر كقائمة (معرف، نقاط)
+    Same as ``top_k`` but maps the selected indices back to ``item_ids``.
+    """
+    indices, top_scores = top_k(scores, k, exclude=exclude, threshold=threshold)
+    return [(item_ids[idx], float(score)) for idx, score in zip(indices, top_scores)]
+
+
+def top_k_from_dict(item_scores: Dict[str, float], k: int,
+                    exclude_items: Optional[Iterable[str]] = None,
+                    threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+    """
+    أفضل k عناصر من قاموس نقاط
+    Top-k over a ``{item_id: score}`` dict without building and sorting a
+    list of tuples.
+    """
+    if not item_scores:
+        return []
+
+    item_ids = list(item_scores.keys())
+    scores = np.fromiter(item_scores.values(), dtype=np.float64, count=len(item_ids))
+
+    exclude = None
+    if exclude_items:
+        exclude_set = set(exclude_items)
+        exclude = np.fromiter((item_id in exclude_set for item_id in item_ids),
+                              dtype=bool, count=len(item_ids))
+
+    return top_k_items(item_ids, scores, k, exclude=exclude, threshold=threshold)
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    أفضل k عناصر لكل صف من مصفوفة نقاط
+    Row-wise top-k over a (rows × items) score matrix in one vectorized pass.
+
+    Returns ``(indices, scores)`` of shape (rows × k) ordered by descending
+    score within each row; ties are ordered by index. Masked entries (-inf)
+    can appear at the tail of a row when it has fewer than k valid items, so
+    callers should drop non-finite scores.
+    """
+    scores = np.asarray(scores)
+    n_rows, n_items = scores.shape
+    k = min(k, n_items)
+    if k <= 0 or n_rows == 0:
+        return (np.empty((n_rows, 0), dtype=np.int64),
+                np.empty((n_rows, 0), dtype=scores.dtype))
+
+    if k < n_items:
+        selected = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        selected = np.broadcast_to(np.arange(n_items), (n_rows, n_items))
+    selected_scores = np.take_along_axis(scores, selected, axis=1)
+
+    order = np.lexsort((selected, -selected_scores), axis=-1)
+    selected = np.take_along_axis(selected, order, axis=1)
+    return selected, np.take_along_axis(selected_scores, order, axis=1)
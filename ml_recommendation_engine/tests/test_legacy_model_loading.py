@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+محرك التوصيات الذكي - سبق الذكية
+اختبار تحميل ملفات pkl القديمة (قبل ArticleCatalog)
+Sabq AI Recommendation Engine - Legacy pickle loading tests
+"""
+
+import os
+import sys
+
+import joblib
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import content_based_filtering
+from models.content_based_filtering import (
+    ContentFilteringConfig, ContentBasedRecommender,
+    TFIDFContentExtractor, TopicModelingEngine, ArticleCatalog
+)
+
+ARTICLE_IDS = ['a1', 'a2', 'a3', 'a4']
+
+
+class LegacyPickle:
+    """
+    يكتب الكائن كما كانت تكتبه النسخ القديمة: الصنف + __dict__ القديم كما هو
+    (بدون المرور على __getstate__ الحالي)
+    """
+
+    def __init__(self, cls, state):
+        self.cls = cls
+        self.state = state
+
+    def __reduce__(self):
+        return self.cls.__new__, (self.cls,), self.state
+
+
+def legacy_tfidf_state(config):
+    feature_matrix = csr_matrix(np.array([
+        [1.0, 0.0, 0.0],
+        [0.8, 0.6, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 0.0, 1.0],
+    ]))
+    return {
+        'config': config,
+        'text_processor': None,
+        'vectorizer': None,
+        'feature_matrix': feature_matrix,
+        'article_ids': list(ARTICLE_IDS),
+    }
+
+
+def legacy_topic_state(config):
+    return {
+        'config': config,
+        'text_processor': None,
+        'topic_model': None,
+        'vectorizer': None,
+        'article_topics': np.array([
+            [0.9, 0.1],
+            [0.8, 0.2],
+            [0.1, 0.9],
+            [0.2, 0.8],
+        ]),
+        'topic_labels': ['سياسة', 'رياضة'],
+    }
+
+
+@pytest.fixture
+def config():
+    return ContentFilteringConfig()
+
+
+def test_tfidf_setstate_builds_catalog_from_legacy_ids(config, tmp_path):
+    path = tmp_path / 'tfidf.pkl'
+    joblib.dump(LegacyPickle(TFIDFContentExtractor, legacy_tfidf_state(config)), path)
+
+    extractor = joblib.load(path)
+
+    assert isinstance(extractor.catalog, ArticleCatalog)
+    assert list(extractor.article_ids) == ARTICLE_IDS
+    assert 'article_ids' not in extractor.__dict__
+    assert len(extractor.profile_cache) == 0
+    assert extractor.catalog.index_of('a3') == 2
+
+    similar = extractor.get_similar_articles('a1', n_similar=2)
+    assert similar[0][0] == 'a2'
+
+    recommendations = extractor.get_content_recommendations(['a1'], 2, user_id='u1')
+    assert recommendations and recommendations[0][0] == 'a2'
+    assert 'u1' in extractor.profile_cache
+
+
+def test_topic_model_setstate_sets_empty_catalog(config, tmp_path):
+    path = tmp_path / 'topics.pkl'
+    joblib.dump(LegacyPickle(TopicModelingEngine, legacy_topic_state(config)), path)
+
+    topic_model = joblib.load(path)
+
+    assert isinstance(topic_model.catalog, ArticleCatalog)
+    assert len(topic_model.catalog) == 0
+
+
+def test_recommender_loads_legacy_files(config, tmp_path, monkeypatch):
+    # لا نحمل نموذج BERT في الاختبار
+    def no_bert(self):
+        raise RuntimeError("BERT disabled in tests")
+    monkeypatch.setattr(content_based_filtering.BERTContentExtractor, '_load_model', no_bert)
+
+    base_path = str(tmp_path / 'content')
+    joblib.dump({'config': config, 'method_weights': {'tfidf': 0.5, 'topics': 0.5}},
+                f"{base_path}_config.pkl")
+    joblib.dump(LegacyPickle(TFIDFContentExtractor, legacy_tfidf_state(config)),
+                f"{base_path}_tfidf.pkl")
+    joblib.dump(LegacyPickle(TopicModelingEngine, legacy_topic_state(config)),
+                f"{base_path}_topics.pkl")
+
+    recommender = ContentBasedRecommender(config)
+    recommender.load_models(base_path)
+
+    assert recommender.tfidf_extractor is not None
+    assert recommender.catalog is recommender.tfidf_extractor.catalog
+    # توزيعات الموضوعات القديمة بترتيب مقالات TF-IDF
+    assert recommender.topic_model.catalog is recommender.catalog
+
+    topic_recommendations = recommender._get_topic_recommendations(['a1'], 2)
+    assert topic_recommendations[0][0] == 'a2'
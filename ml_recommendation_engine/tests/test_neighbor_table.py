@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+محرك التوصيات الذكي - سبق الذكية
+اختبار بناء وتحديث جداول الجيران
+Sabq AI Recommendation Engine - Neighbor table tests
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.neighbor_table import (
+    SimilaritySource, NeighborTable, block_rows, materialize_neighbor_tables, table_versions
+)
+
+K = 10
+
+
+def make_vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def neighbor_sets(table):
+    return [{neighbor for neighbor, _ in table.get_neighbors(article_id)}
+            for article_id in table.article_ids]
+
+
+class VectorModel:
+    """نموذج بسيط يكشف feature_matrix مثل TF-IDF"""
+
+    def __init__(self, ids, vectors):
+        self.catalog = type('Catalog', (), {'ids': np.array(ids, dtype=object)})()
+        self.feature_matrix = vectors
+
+
+def test_block_rows_bounded_by_memory_budget():
+    # 200k مقال: الكتلة لا تتجاوز 64MB بدلاً من ~800MB
+    rows = block_rows(200_000)
+    assert rows * 200_000 * 4 <= 64 * 1024 * 1024
+    assert block_rows(100) == 1024
+    assert block_rows(200_000, chunk_size=8) == 8
+
+
+def test_refresh_merges_new_articles_into_existing_rows():
+    vectors = make_vectors(300)
+    ids = [f"a{i}" for i in range(300)]
+    old = NeighborTable.build(SimilaritySource('x', ids[:250], vectors[:250]), k=K, chunk_size=7)
+
+    source = SimilaritySource('x', ids, vectors)
+    refreshed = old.refresh(source, [], chunk_size=13)
+    full = NeighborTable.build(source, k=K)
+
+    # المقالات الجديدة تدخل قوائم جيران المقالات القديمة كما في البناء الكامل
+    new_ids = set(ids[250:])
+    assert any(neighbors & new_ids for neighbors in neighbor_sets(refreshed)[:250])
+    mismatched = sum(a != b for a, b in zip(neighbor_sets(refreshed), neighbor_sets(full)))
+    assert mismatched <= 3  # فروق ترتيب النقاط المتساوية بدقة float16 فقط
+
+
+def test_materialize_rebuilds_when_k_changes(tmp_path):
+    vectors = make_vectors(50)
+    ids = [f"a{i}" for i in range(50)]
+    models = {'tfidf': VectorModel(ids, vectors)}
+    base_path = str(tmp_path / 'neighbors')
+
+    materialize_neighbor_tables(models, base_path, k=5)
+    first_version = table_versions(base_path)['tfidf']
+
+    tables = materialize_neighbor_tables(models, base_path, k=8, changed_ids=['a1'])
+    assert tables['tfidf'].k == 8
+    assert NeighborTable.load(os.path.join(base_path, 'tfidf')).k == 8
+    assert table_versions(base_path)['tfidf'] != first_version
+
+
+def test_articles_without_vectors_get_no_neighbors():
+    vectors = make_vectors(40)
+    ids = [f"a{i}" for i in range(40)]
+    valid = np.ones(40, dtype=bool)
+    valid[[3, 17]] = False
+    vectors[~valid] = 0.0
+    old = NeighborTable.build(SimilaritySource('x', ids[:30], vectors[:30], valid[:30]), k=K)
+
+    source = SimilaritySource('x', ids, vectors, valid)
+    for table in (NeighborTable.build(source, k=K, chunk_size=7), old.refresh(source, [], chunk_size=7)):
+        assert table.get_neighbors('a3') == []
+        assert table.get_neighbors('a17') == []
+        assert not any(neighbors & {'a3', 'a17'} for neighbors in neighbor_sets(table))
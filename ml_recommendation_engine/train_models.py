@@ -28,6 +28,7 @@ from models.hybrid_recommendation import HybridRecommendation
 from models.user_interest_analysis import UserInterestAnalysis
 from models.contextual_recommendations import ContextualRecommendations
 from models.continuous_learning import ContinuousLearning
+from build_neighbor_tables import build_neighbor_tables
 
 # إعداد السجلات
 logging.basicConfig(
@@ -307,6 +308,23 @@ class ModelTrainer:
             logger.error(f"خطأ في تدريب التصفية المحتوائية: {e}")
             raise
     
+    async def build_neighbor_tables(self):
+        """بناء جداول الجيران من النماذج المحفوظة (تعيد واجهة API تحميلها تلقائياً)"""
+        logger.info("بدء بناء جداول الجيران...")
+        
+        try:
+            loop = asyncio.get_running_loop()
+            tables = await loop.run_in_executor(None, build_neighbor_tables)
+            
+            self.training_stats['neighbor_tables'] = {
+                name: {'articles': len(table), 'k': table.k} for name, table in tables.items()
+            }
+            logger.info("تم بناء جداول الجيران بنجاح")
+            
+        except Exception as e:
+            logger.error(f"خطأ في بناء جداول الجيران: {e}")
+            raise
+    
     async def train_deep_learning_models(self, prepared_data: Dict[str, Any]):
         """تدريب نماذج التعلم العميق"""
         logger.info("بدء تدريب نماذج التعلم العميق...")
@@ -577,6 +595,9 @@ async def main():
         await trainer.train_hybrid_system(prepared_data)
         await trainer.train_contextual_models(prepared_data)
         
+        # جداول الجيران من النماذج المحفوظة
+        await trainer.build_neighbor_tables()
+        
         # إعداد التعلم المستمر
         await trainer.setup_continuous_learning(prepared_data)
         
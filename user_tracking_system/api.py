@@ -8,7 +8,7 @@ User Behavior Tracking System - API Server
 
 import asyncio
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional
 from contextlib import asynccontextmanager
 
@@ -17,10 +17,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
+from sqlalchemy import select, func
 
 from config import settings, LOGGING_CONFIG
 from services.database import db_manager, get_db_session
 from services.redis_service import redis_manager
+from services.ingestion_buffer import ingestion_buffer, IngestionBufferFull
+from services.bulk_writer import bulk_writer, BulkWriteResult
+from services.scroll_aggregator import scroll_aggregator, bucket_labels
+from services.behavior_rollups import behavior_rollup, compute_daily, merge_summaries, day_start
 from models.database import (
     UserInteraction, ReadingSession, ScrollEvent, 
     ContextData, UserSession, UserBehaviorSummary
@@ -30,7 +35,8 @@ from models.schemas import (
     ReadingSessionRequest, ReadingSessionResponse,
     ScrollEventRequest, ContextDataRequest, ContextDataResponse,
     UserSessionRequest, UserSessionResponse,
-    BatchInteractionRequest, BatchProcessingResponse,
+    BatchInteractionRequest, BatchScrollEventRequest, BatchContextDataRequest,
+    BatchProcessingResponse,
     InteractionAnalytics, ReadingAnalytics, UserBehaviorAnalytics,
     HealthCheckResponse, ErrorResponse
 )
@@ -46,6 +52,7 @@ async def lifespan(app: FastAPI):
     """إدارة دورة حياة التطبيق"""
     # بدء التطبيق
     logger.info("🚀 بدء تشغيل نظام تتبع سلوك المستخدم...")
+    partition_task = None
     
     try:
         # تهيئة قاعدة البيانات
@@ -55,6 +62,19 @@ async def lifespan(app: FastAPI):
         # تهيئة Redis
         await redis_manager.initialize()
         
+        # بدء مخزن الاستقبال المؤجل
+        if settings.is_buffered_ingestion():
+            await ingestion_buffer.start()
+        
+        # بدء مجمع أحداث التمرير
+        await scroll_aggregator.start()
+        
+        # بدء حساب ملخصات السلوك اليومية
+        await behavior_rollup.start()
+        
+        # صيانة أقسام الجداول الزمنية (إنشاء القادمة وحذف المنتهية)
+        partition_task = asyncio.create_task(run_partition_maintenance())
+        
         logger.info("✅ تم تشغيل النظام بنجاح")
         
         yield
@@ -65,10 +85,23 @@ async def lifespan(app: FastAPI):
     finally:
         # إيقاف التطبيق
         logger.info("⏹️  إيقاف نظام تتبع سلوك المستخدم...")
+        if partition_task is not None:
+            partition_task.cancel()
+        await ingestion_buffer.stop()
+        await scroll_aggregator.stop()
+        await behavior_rollup.stop()
         await db_manager.close()
         await redis_manager.close()
         logger.info("✅ تم إيقاف النظام بنجاح")
 
+async def run_partition_maintenance():
+    """صيانة دورية لأقسام الجداول الزمنية"""
+    while True:
+        await asyncio.sleep(settings.tracking_partition_maintenance_interval)
+        result = await db_manager.maintain_partitions()
+        if "error" not in result and not result.get("skipped"):
+            logger.info(f"🧱 صيانة الأقسام: {result}")
+
 # إنشاء تطبيق FastAPI
 app = FastAPI(
     title="نظام تتبع سلوك المستخدم - سبق الذكية",
@@ -137,7 +170,10 @@ async def health_check():
             uptime=int((datetime.now() - datetime.fromtimestamp(0)).total_seconds()),
             metrics={
                 "database": db_health,
-                "redis": redis_health
+                "redis": redis_health,
+                "ingestion": ingestion_buffer.stats() if settings.is_buffered_ingestion() else None,
+                "scroll_aggregation": scroll_aggregator.stats(),
+                "behavior_rollups": behavior_rollup.stats()
             }
         )
         
@@ -160,6 +196,9 @@ async def create_interaction(
     session = Depends(get_db_session)
 ):
     """تسجيل تفاعل مستخدم جديد"""
+    if settings.is_buffered_ingestion():
+        return await enqueue_interaction(request)
+    
     try:
         logger.info(f"تسجيل تفاعل جديد: {request.user_id} -> {request.content_id} ({request.interaction_type})")
         
@@ -208,38 +247,80 @@ async def create_interaction(
             detail="فشل في تسجيل التفاعل"
         )
 
+async def enqueue_interaction(request: UserInteractionRequest) -> JSONResponse:
+    """قبول التفاعل في مخزن الاستقبال المؤجل (202) - الكتابة تتم على دفعات"""
+    try:
+        event_id = await ingestion_buffer.enqueue(request.dict())
+    except IngestionBufferFull as e:
+        logger.warning(f"⚠️ رفض تفاعل بسبب امتلاء المخزن: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="الخادم مشغول، يرجى إعادة المحاولة لاحقاً",
+            headers={"Retry-After": str(settings.tracking_flush_interval)}
+        )
+    except Exception as e:
+        logger.error(f"خطأ في استقبال التفاعل: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="فشل في تسجيل التفاعل"
+        )
+    
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "event_id": event_id,
+            "status": "pending"
+        }
+    )
+
 @app.get("/api/v1/interactions")
 async def get_interactions(
     user_id: Optional[str] = None,
     content_id: Optional[str] = None,
     interaction_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     limit: int = 50,
     offset: int = 0,
     session = Depends(get_db_session)
 ):
-    """جلب التفاعلات بناءً على المعايير المحددة"""
+    """جلب التفاعلات بناءً على المعايير المحددة (آخر 30 يوماً افتراضياً)"""
     try:
-        # بناء الاستعلام
-        query = session.query(UserInteraction)
+        # نطاق زمني محدد دائماً حتى تقرأ قاعدة البيانات الأقسام المطلوبة فقط
+        end_date = end_date or datetime.now(timezone.utc)
+        start_date = start_date or end_date - timedelta(days=30)
         
+        # بناء الاستعلام
+        conditions = [
+            UserInteraction.timestamp >= start_date,
+            UserInteraction.timestamp <= end_date
+        ]
         if user_id:
-            query = query.filter(UserInteraction.user_id == user_id)
+            conditions.append(UserInteraction.user_id == user_id)
         if content_id:
-            query = query.filter(UserInteraction.content_id == content_id)
+            conditions.append(UserInteraction.content_id == content_id)
         if interaction_type:
-            query = query.filter(UserInteraction.interaction_type == interaction_type)
+            conditions.append(UserInteraction.interaction_type == interaction_type)
             
         # ترتيب وتطبيق الحدود
-        query = query.order_by(UserInteraction.timestamp.desc())
-        total = await query.count()
-        interactions = await query.offset(offset).limit(limit).all()
+        total = (await session.execute(
+            select(func.count()).select_from(UserInteraction).where(*conditions)
+        )).scalar()
+        interactions = (await session.execute(
+            select(UserInteraction).where(*conditions)
+            .order_by(UserInteraction.timestamp.desc())
+            .offset(offset).limit(limit)
+        )).scalars().all()
         
         return {
             "success": True,
             "data": [interaction.to_dict() for interaction in interactions],
             "total": total,
             "limit": limit,
-            "offset": offset
+            "offset": offset,
+            "start_date": start_date,
+            "end_date": end_date
         }
         
     except Exception as e:
@@ -307,11 +388,13 @@ async def create_reading_session(
 @app.post("/api/v1/scroll-events")
 async def create_scroll_event(
     request: ScrollEventRequest,
-    background_tasks: BackgroundTasks,
     session = Depends(get_db_session)
 ):
-    """تسجيل حدث تمرير"""
+    """تسجيل حدث تمرير (يُجمع في نافذة جلسة القراءة؛ الحدث الخام يُحفظ للجلسات المختارة فقط)"""
     try:
+        if not scroll_aggregator.add(request):
+            return {"success": True, "message": "تم تسجيل حدث التمرير"}
+        
         scroll_event = ScrollEvent(
             reading_session_id=request.reading_session_id,
             user_id=request.user_id,
@@ -333,14 +416,6 @@ async def create_scroll_event(
         session.add(scroll_event)
         await session.commit()
         
-        # تحديث نقاط الاهتمام في الوقت الفعلي
-        background_tasks.add_task(
-            update_attention_points,
-            request.reading_session_id,
-            request.scroll_position,
-            request.is_pause_point
-        )
-        
         return {"success": True, "message": "تم تسجيل حدث التمرير"}
         
     except Exception as e:
@@ -472,35 +547,41 @@ async def get_user_analytics(
     days: int = 30,
     session = Depends(get_db_session)
 ):
-    """جلب تحليلات شاملة لسلوك المستخدم"""
+    """
+    جلب تحليلات شاملة لسلوك المستخدم من الملخصات اليومية (حتى 30 يوماً)
+    مع دلتا حية للأيام التي لم تُلخص بعد (اليوم الحالي عادة)
+    """
     try:
         # حساب نطاق التواريخ
+        days = max(1, min(days, settings.behavior_rollup_max_days))
         end_date = datetime.now(timezone.utc)
-        start_date = end_date - timedelta(days=days)
-        
-        # جلب التفاعلات
-        interactions = await session.query(UserInteraction).filter(
-            UserInteraction.user_id == user_id,
-            UserInteraction.timestamp >= start_date
-        ).all()
-        
-        # جلب جلسات القراءة
-        reading_sessions = await session.query(ReadingSession).filter(
-            ReadingSession.user_id == user_id,
-            ReadingSession.start_time >= start_date
-        ).all()
-        
-        # تحليل التفاعلات
-        interaction_analytics = analyze_interactions(interactions)
-        
-        # تحليل القراءة
-        reading_analytics = analyze_reading_sessions(reading_sessions)
-        
-        # تحليل الجلسات
-        session_analytics = await analyze_user_sessions(session, user_id, start_date)
-        
-        # تحليل السياق
-        context_analytics = await analyze_context_data(session, user_id, start_date)
+        start_date = day_start(end_date) - timedelta(days=days)
+        
+        # الأيام بعد آخر يوم ملخص تُحسب مباشرة من الجداول المصدرية لهذا المستخدم
+        watermark = await behavior_rollup.watermark(session)
+        live_start = start_date
+        if watermark is not None:
+            live_start = max(start_date, min(day_start(end_date), watermark + timedelta(days=1)))
+        
+        # جلب الملخصات اليومية
+        summary_table = UserBehaviorSummary.__table__
+        summaries = (await session.execute(
+            select(summary_table).where(
+                summary_table.c.user_id == user_id,
+                summary_table.c.date >= start_date,
+                summary_table.c.date < live_start
+            ).order_by(summary_table.c.date)
+        )).mappings().all()
+        
+        # دلتا حية
+        live = await compute_daily(session, live_start, end_date, user_id=user_id)
+        totals = merge_summaries([*summaries, *live.values()])
+        
+        # تحليل التفاعلات والقراءة والجلسات والسياق
+        interaction_analytics = analyze_interactions(totals)
+        reading_analytics = analyze_reading(totals)
+        session_analytics = analyze_user_sessions(totals)
+        context_analytics = analyze_context_data(totals)
         
         # استخراج الرؤى السلوكية
         behavioral_insights = generate_behavioral_insights(
@@ -542,59 +623,17 @@ async def process_interactions_batch(
     """معالجة دفعة من التفاعلات"""
     try:
         start_time = datetime.now()
-        processed_count = 0
-        failed_count = 0
-        errors = []
-        warnings = []
-        
-        for interaction_req in request.interactions:
-            try:
-                # إنشاء التفاعل
-                interaction = UserInteraction(
-                    user_id=interaction_req.user_id,
-                    session_id=interaction_req.session_id,
-                    content_id=interaction_req.content_id,
-                    content_type=interaction_req.content_type,
-                    interaction_type=interaction_req.interaction_type,
-                    interaction_value=interaction_req.interaction_value,
-                    page_url=interaction_req.page_url,
-                    element_id=interaction_req.element_id,
-                    element_type=interaction_req.element_type,
-                    scroll_position=interaction_req.scroll_position,
-                    viewport_position=interaction_req.viewport_position,
-                    time_on_page=interaction_req.time_on_page,
-                    metadata=interaction_req.metadata
-                )
-                
-                session.add(interaction)
-                processed_count += 1
-                
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"فشل في معالجة التفاعل: {str(e)}")
-                logger.warning(f"فشل في معالجة تفاعل في الدفعة: {e}")
-        
-        # حفظ جميع التفاعلات المعالجة
+        result = await bulk_writer.write(UserInteraction, request.interactions, session)
         await session.commit()
         
         # معالجة في الخلفية
         background_tasks.add_task(
             process_batch_analytics,
             request.batch_id,
-            processed_count
+            result.inserted
         )
         
-        processing_time = (datetime.now() - start_time).total_seconds()
-        
-        return BatchProcessingResponse(
-            batch_id=request.batch_id or f"batch_{int(start_time.timestamp())}",
-            total_items=len(request.interactions),
-            processed_items=processed_count,
-            failed_items=failed_count,
-            processing_time=processing_time,
-            errors=errors,
-            warnings=warnings
-        )
+        return batch_response(request.batch_id, start_time, result)
         
     except Exception as e:
         logger.error(f"خطأ في معالجة الدفعة: {e}")
@@ -604,6 +643,71 @@ async def process_interactions_batch(
             detail="فشل في معالجة دفعة التفاعلات"
         )
 
+@app.post("/api/v1/scroll-events/batch", response_model=BatchProcessingResponse)
+async def process_scroll_events_batch(
+    request: BatchScrollEventRequest,
+    session = Depends(get_db_session)
+):
+    """معالجة دفعة من أحداث التمرير (تجميع + حفظ خام للجلسات المختارة)"""
+    try:
+        start_time = datetime.now()
+        result = BulkWriteResult(len(request.events))
+        events = [event for _, event in bulk_writer.validate(ScrollEvent, request.events, result)]
+        raw_events = scroll_aggregator.add_many(events)
+        result.inserted = len(events)
+        
+        warnings = []
+        if raw_events:
+            raw = await bulk_writer.write(ScrollEvent, raw_events, session)
+            await session.commit()
+            if raw.failed:
+                warnings.append(f"فشل حفظ {raw.failed_count} حدث خام")
+        
+        response = batch_response(request.batch_id, start_time, result)
+        response.warnings = warnings
+        return response
+        
+    except Exception as e:
+        logger.error(f"خطأ في معالجة دفعة التمرير: {e}")
+        await session.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail="فشل في معالجة دفعة أحداث التمرير"
+        )
+
+@app.post("/api/v1/context-data/batch", response_model=BatchProcessingResponse)
+async def process_context_data_batch(
+    request: BatchContextDataRequest,
+    session = Depends(get_db_session)
+):
+    """معالجة دفعة من بيانات السياق"""
+    try:
+        start_time = datetime.now()
+        result = await bulk_writer.write(ContextData, request.items, session)
+        await session.commit()
+        return batch_response(request.batch_id, start_time, result)
+        
+    except Exception as e:
+        logger.error(f"خطأ في معالجة دفعة السياق: {e}")
+        await session.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail="فشل في معالجة دفعة بيانات السياق"
+        )
+
+def batch_response(batch_id: Optional[str], start_time: datetime, result: BulkWriteResult) -> BatchProcessingResponse:
+    """بناء استجابة الدفعة من نتيجة الكتابة المجمعة"""
+    return BatchProcessingResponse(
+        batch_id=batch_id or f"batch_{int(start_time.timestamp())}",
+        total_items=result.total,
+        processed_items=result.inserted,
+        failed_items=result.failed_count,
+        processing_time=(datetime.now() - start_time).total_seconds(),
+        errors=result.error_messages(),
+        warnings=[],
+        failed_rows=result.failed
+    )
+
 # ===== Background Tasks =====
 
 async def update_interaction_cache(user_id: str, content_id: str, interaction_type: str):
@@ -651,22 +755,6 @@ async def analyze_reading_behavior(reading_session_data: Dict[str, Any]):
     except Exception as e:
         logger.error(f"خطأ في تحليل سلوك القراءة: {e}")
 
-async def update_attention_points(reading_session_id: str, scroll_position: float, is_pause_point: bool):
-    """تحديث نقاط الاهتمام"""
-    try:
-        if is_pause_point:
-            # حفظ نقطة اهتمام في Redis
-            attention_key = f"attention_points:{reading_session_id}"
-            current_points = await redis_manager.get(attention_key, [])
-            current_points.append({
-                "position": scroll_position,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
-            await redis_manager.set(attention_key, current_points, 3600)  # ساعة واحدة
-            
-    except Exception as e:
-        logger.error(f"خطأ في تحديث نقاط الاهتمام: {e}")
-
 async def process_batch_analytics(batch_id: str, processed_count: int):
     """معالجة تحليلات الدفعة"""
     try:
@@ -692,35 +780,128 @@ def calculate_engagement_score(reading_session_data: Dict[str, Any]) -> float:
     except Exception:
         return 0.0
 
-def analyze_interactions(interactions: List[UserInteraction]) -> InteractionAnalytics:
-    """تحليل التفاعلات"""
-    # تنفيذ تحليل التفاعلات
-    pass
+def analyze_interactions(totals: Dict[str, Any]) -> InteractionAnalytics:
+    """تحليل التفاعلات من إجماليات الملخصات"""
+    return InteractionAnalytics(
+        total_interactions=totals["interactions"],
+        interactions_by_type=dict(totals["by_type"]),
+        interactions_by_content=dict(totals["by_content"].most_common(settings.behavior_rollup_top_content)),
+        interactions_by_hour=dict(sorted(totals["by_hour"].items(), key=lambda item: int(item[0]))),
+        # توزيع الأجهزة محسوب من الجلسات (user_interactions لا يحمل نوع الجهاز)
+        interactions_by_device=dict(totals["by_device"]),
+        avg_time_to_interact=(
+            totals["time_on_page_sum"] / totals["time_on_page_count"] if totals["time_on_page_count"] else None
+        ),
+        most_engaging_content=[
+            {"content_id": content_id, "interactions": count}
+            for content_id, count in totals["by_content"].most_common(5)
+        ]
+    )
 
-def analyze_reading_sessions(reading_sessions: List[ReadingSession]) -> ReadingAnalytics:
-    """تحليل جلسات القراءة"""
-    # تنفيذ تحليل القراءة
-    pass
+def analyze_reading(totals: Dict[str, Any]) -> ReadingAnalytics:
+    """تحليل القراءة من إجماليات الملخصات (جلسات القراءة وتجميعات التمرير)"""
+    labels = bucket_labels(len(totals["depth_histogram"]))
+    articles = totals["articles_read"]
+    total_reading_time = totals["reading_time"] or sum(totals["dwell_histogram"])
+    
+    return ReadingAnalytics(
+        total_reading_time=total_reading_time,
+        avg_reading_time=total_reading_time / articles if articles else None,
+        avg_reading_speed=totals["speed_sum"] / totals["speed_count"] if totals["speed_count"] else None,
+        completion_rate=totals["articles_completed"] / articles if articles else None,
+        avg_scroll_depth=totals["depth_sum"] / totals["depth_sessions"] if totals["depth_sessions"] else None,
+        popular_reading_times=[
+            {"hour": int(hour), "scroll_events": count}
+            for hour, count in totals["scroll_by_hour"].most_common(3)
+        ],
+        reading_patterns={
+            "depth_distribution": dict(zip(labels, totals["depth_histogram"])),
+            "dwell_by_depth": dict(zip(labels, totals["dwell_histogram"])),
+            "pause_hotspots": sorted(
+                ({"depth": labels[i], "pauses": count}
+                 for i, count in enumerate(totals["pause_hotspots"]) if count),
+                key=lambda item: item["pauses"], reverse=True
+            )[:5],
+            "pause_count": totals["pause_count"],
+            "pause_duration_total": totals["pause_duration_total"]
+        },
+        engagement_trends={"daily": totals["daily"]}
+    )
 
-async def analyze_user_sessions(session, user_id: str, start_date: datetime) -> Dict[str, Any]:
+def analyze_user_sessions(totals: Dict[str, Any]) -> Dict[str, Any]:
     """تحليل جلسات المستخدم"""
-    # تنفيذ تحليل الجلسات
-    pass
-
-async def analyze_context_data(session, user_id: str, start_date: datetime) -> Dict[str, Any]:
-    """تحليل بيانات السياق"""
-    # تنفيذ تحليل السياق
-    pass
-
-def generate_behavioral_insights(interaction_analytics, reading_analytics, session_analytics) -> List[str]:
-    """توليد الرؤى السلوكية"""
-    # تنفيذ توليد الرؤى
-    pass
-
-def generate_user_recommendations(behavioral_insights) -> List[str]:
-    """توليد توصيات للمستخدم"""
-    # تنفيذ توليد التوصيات
-    pass
+    return {
+        "total_sessions": totals["sessions"],
+        "total_session_duration": totals["session_duration"],
+        "avg_session_duration": totals["session_duration"] / totals["sessions"] if totals["sessions"] else None,
+        "avg_engagement_score": (
+            totals["engagement_sum"] / totals["engagement_count"] if totals["engagement_count"] else None
+        )
+    }
+
+def analyze_context_data(totals: Dict[str, Any]) -> Dict[str, Any]:
+    """تحليل السياق: توزيع الأجهزة وساعات النشاط"""
+    active_hours = totals["by_hour"] + totals["scroll_by_hour"]
+    return {
+        "device_mix": dict(totals["by_device"]),
+        "preferred_device": totals["by_device"].most_common(1)[0][0] if totals["by_device"] else None,
+        "active_hours": dict(sorted(active_hours.items(), key=lambda item: int(item[0]))),
+        "most_active_hour": int(active_hours.most_common(1)[0][0]) if active_hours else None
+    }
+
+# الرؤى الثابتة والتوصية المقابلة لكل منها
+INSIGHT_NO_ACTIVITY = "لا يوجد نشاط مسجل في هذه الفترة"
+INSIGHT_HIGH_COMPLETION = "يكمل المستخدم معظم المقالات التي يبدأ قراءتها"
+INSIGHT_LOW_COMPLETION = "يغادر المستخدم أغلب المقالات قبل إكمالها"
+INSIGHT_SHALLOW_SCROLL = "يتوقف التمرير غالباً في النصف الأول من المقال"
+INSIGHT_SHORT_SESSIONS = "جلسات المستخدم قصيرة (أقل من دقيقتين في المتوسط)"
+INSIGHT_LONG_SESSIONS = "جلسات المستخدم طويلة (أكثر من عشر دقائق في المتوسط)"
+
+INSIGHT_RECOMMENDATIONS = {
+    INSIGHT_NO_ACTIVITY: "عرض المحتوى الأكثر رواجاً لتحفيز أول تفاعل",
+    INSIGHT_HIGH_COMPLETION: "اقتراح مقالات تحليلية ومطولة في الموضوعات المفضلة",
+    INSIGHT_LOW_COMPLETION: "تقديم ملخصات قصيرة ومقالات أقصر",
+    INSIGHT_SHALLOW_SCROLL: "إبراز النقاط الرئيسية في بداية المقال",
+    INSIGHT_SHORT_SESSIONS: "عرض مقالات ذات صلة في نهاية كل مقال لإطالة الجلسة",
+    INSIGHT_LONG_SESSIONS: "اقتراح قوائم قراءة ومحتوى متسلسل",
+}
+
+def generate_behavioral_insights(interaction_analytics: InteractionAnalytics,
+                                 reading_analytics: ReadingAnalytics,
+                                 session_analytics: Dict[str, Any]) -> List[str]:
+    """توليد الرؤى السلوكية من تحليلات التفاعل والقراءة والجلسات"""
+    if not interaction_analytics.total_interactions and not reading_analytics.total_reading_time:
+        return [INSIGHT_NO_ACTIVITY]
+    
+    insights = []
+    if interaction_analytics.interactions_by_type:
+        top_type, count = max(interaction_analytics.interactions_by_type.items(), key=lambda item: item[1])
+        insights.append(f"أكثر أنواع التفاعل: {top_type} ({count} مرة)")
+    if interaction_analytics.interactions_by_hour:
+        hour = max(interaction_analytics.interactions_by_hour.items(), key=lambda item: item[1])[0]
+        insights.append(f"ذروة النشاط عند الساعة {int(hour)}:00")
+    
+    completion_rate = reading_analytics.completion_rate
+    if completion_rate is not None:
+        if completion_rate >= 0.7:
+            insights.append(INSIGHT_HIGH_COMPLETION)
+        elif completion_rate < 0.3:
+            insights.append(INSIGHT_LOW_COMPLETION)
+    if reading_analytics.avg_scroll_depth is not None and reading_analytics.avg_scroll_depth < 50:
+        insights.append(INSIGHT_SHALLOW_SCROLL)
+    
+    avg_session_duration = session_analytics.get("avg_session_duration")
+    if avg_session_duration is not None:
+        if avg_session_duration < 120:
+            insights.append(INSIGHT_SHORT_SESSIONS)
+        elif avg_session_duration > 600:
+            insights.append(INSIGHT_LONG_SESSIONS)
+    return insights
+
+def generate_user_recommendations(behavioral_insights: List[str]) -> List[str]:
+    """توليد توصيات للمستخدم من الرؤى السلوكية"""
+    return [INSIGHT_RECOMMENDATIONS[insight] for insight in behavioral_insights
+            if insight in INSIGHT_RECOMMENDATIONS]
 
 # ===== Server Entry Point =====
 
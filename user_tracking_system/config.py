@@ -95,17 +95,45 @@ class TrackingSettings(BaseSettings):
     encryption_key: Optional[str] = Field(default=None, env="ENCRYPTION_KEY")
     data_retention_days: int = Field(default=365, env="DATA_RETENTION_DAYS")
     
+    # إعدادات تقسيم الجداول الزمنية
+    tracking_partition_interval: str = Field(default="month", env="TRACKING_PARTITION_INTERVAL")  # month أو day
+    tracking_partition_premake: int = Field(default=2, env="TRACKING_PARTITION_PREMAKE")
+    tracking_partition_retention_action: str = Field(default="drop", env="TRACKING_PARTITION_RETENTION_ACTION")  # drop أو detach
+    tracking_partition_maintenance_interval: int = Field(default=3600, env="TRACKING_PARTITION_MAINTENANCE_INTERVAL")  # بالثواني
+    
     # ===== إعدادات التتبع =====
     # معدل جمع البيانات (بالثواني)
     tracking_batch_size: int = Field(default=100, env="TRACKING_BATCH_SIZE")
     tracking_flush_interval: int = Field(default=5, env="TRACKING_FLUSH_INTERVAL")
     tracking_max_retry_attempts: int = Field(default=3, env="TRACKING_MAX_RETRY_ATTEMPTS")
+    tracking_retry_backoff_max: int = Field(default=60, env="TRACKING_RETRY_BACKOFF_MAX")  # بالثواني
+    
+    # الاستقبال المؤجل: direct (كتابة فورية) أو buffered (202 ثم كتابة دفعات)
+    tracking_ingestion_mode: str = Field(default="direct", env="TRACKING_INGESTION_MODE")
+    tracking_buffer_backend: str = Field(default="redis", env="TRACKING_BUFFER_BACKEND")  # redis أو memory
+    tracking_buffer_max_size: int = Field(default=50000, env="TRACKING_BUFFER_MAX_SIZE")
+    tracking_buffer_stream_key: str = Field(default="tracking:interactions:stream", env="TRACKING_BUFFER_STREAM_KEY")
+    
+    # الكتابة المجمعة: values (INSERT متعدد الصفوف) أو copy (COPY عبر asyncpg)
+    tracking_bulk_method: str = Field(default="values", env="TRACKING_BULK_METHOD")
+    tracking_bulk_chunk_size: int = Field(default=1000, env="TRACKING_BULK_CHUNK_SIZE")
     
     # إعدادات تتبع القراءة
     reading_session_timeout: int = Field(default=300, env="READING_SESSION_TIMEOUT")  # 5 دقائق
     scroll_tracking_threshold: float = Field(default=0.1, env="SCROLL_TRACKING_THRESHOLD")  # 10%
     reading_time_update_interval: int = Field(default=10, env="READING_TIME_UPDATE_INTERVAL")  # 10 ثواني
     
+    # تجميع أحداث التمرير: نافذة الكتابة، عدد شرائح العمق، ونسبة جلسات القراءة التي تُحفظ أحداثها خاماً
+    scroll_aggregation_window: int = Field(default=60, env="SCROLL_AGGREGATION_WINDOW")  # ثواني
+    scroll_depth_buckets: int = Field(default=20, env="SCROLL_DEPTH_BUCKETS")  # شرائح 5%
+    scroll_raw_sample_rate: float = Field(default=0.0, env="SCROLL_RAW_SAMPLE_RATE")  # 0 - 1
+    
+    # إعدادات ملخصات السلوك اليومية
+    behavior_rollup_interval: int = Field(default=900, env="BEHAVIOR_ROLLUP_INTERVAL")  # بالثواني
+    behavior_rollup_lookback_days: int = Field(default=2, env="BEHAVIOR_ROLLUP_LOOKBACK_DAYS")
+    behavior_rollup_max_days: int = Field(default=30, env="BEHAVIOR_ROLLUP_MAX_DAYS")
+    behavior_rollup_top_content: int = Field(default=50, env="BEHAVIOR_ROLLUP_TOP_CONTENT")
+    
     # إعدادات الخصوصية
     anonymize_ip: bool = Field(default=True, env="ANONYMIZE_IP")
     respect_do_not_track: bool = Field(default=True, env="RESPECT_DO_NOT_TRACK")
@@ -162,6 +190,10 @@ class TrackingSettings(BaseSettings):
     def is_testing(self) -> bool:
         """التحقق من بيئة الاختبار"""
         return self.environment.lower() == "testing"
+    
+    def is_buffered_ingestion(self) -> bool:
+        """التحقق من تفعيل الاستقبال المؤجل للتفاعلات"""
+        return self.tracking_ingestion_mode.lower() == "buffered"
 
 @lru_cache()
 def get_settings() -> TrackingSettings:
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+ترحيل الجداول المنشأة قبل التقسيم إلى جداول مقسمة
+User Behavior Tracking System - Partition Migration Script
+
+create_all لا يعدل الجداول الموجودة، لذا تبقى قواعد البيانات القديمة بجداول
+غير مقسمة وبدون القيد الفريد (event_id, created_at) الذي يتطلبه الاستقبال المؤجل.
+يعيد السكريبت إنشاء كل جدول غير مقسم من النموذج وينسخ بياناته في معاملة واحدة.
+أوقف الخادم قبل التشغيل؛ الجداول تُقفل أثناء النسخ.
+
+Usage:
+    python migrate_partitions.py
+"""
+
+import asyncio
+import sys
+import logging
+from pathlib import Path
+
+# إضافة المسار الحالي إلى Python path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+from services.database import db_manager
+
+# إعداد السجلات
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("sabq.tracking.migration")
+
+async def main() -> int:
+    try:
+        migrated = await db_manager.migrate_partitions()
+    except Exception as e:
+        logger.error(f"❌ فشل ترحيل الأقسام (لم يتغير شيء): {str(e)}")
+        return 1
+    finally:
+        await db_manager.close()
+    
+    if not migrated:
+        logger.info("✅ كل الجداول مقسمة بالفعل")
+    for table, rows in migrated.items():
+        logger.info(f"✅ {table}: {rows} صف")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -133,8 +133,8 @@ class UserInteraction(BaseModel):
     scroll_position = Column(Float, nullable=True)  # نسبة مئوية
     viewport_position = Column(JSONB, nullable=True)  # إحداثيات العنصر
     
-    # معلومات زمنية
-    timestamp = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    # معلومات زمنية (مفتاح التقسيم - جزء من المفتاح الأساسي)
+    timestamp = Column(DateTime(timezone=True), nullable=False, default=func.now(), primary_key=True)
     time_on_page = Column(Integer, nullable=True)  # بالثواني
     
     # معلومات إضافية
@@ -153,6 +153,7 @@ class UserInteraction(BaseModel):
         Index('idx_interactions_type_timestamp', 'interaction_type', 'timestamp'),
         Index('idx_interactions_session', 'session_id'),
         Index('idx_interactions_timestamp', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
 class ReadingSession(BaseModel):
@@ -225,8 +226,8 @@ class ScrollEvent(BaseModel):
     scroll_direction = Column(String(10), nullable=False)  # up, down
     scroll_speed = Column(Float, nullable=True)  # بكسل/ثانية
     
-    # معلومات زمنية
-    timestamp = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    # معلومات زمنية (مفتاح التقسيم - جزء من المفتاح الأساسي)
+    timestamp = Column(DateTime(timezone=True), nullable=False, default=func.now(), primary_key=True)
     time_since_start = Column(Integer, nullable=False)  # منذ بداية جلسة القراءة (ثواني)
     
     # معلومات السياق
@@ -250,6 +251,44 @@ class ScrollEvent(BaseModel):
         Index('idx_scroll_events_reading_session', 'reading_session_id'),
         Index('idx_scroll_events_timestamp', 'timestamp'),
         Index('idx_scroll_events_user_content', 'user_id', 'content_id'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+class ScrollAggregate(BaseModel):
+    """جدول تجميعات التمرير لكل جلسة قراءة ونافذة زمنية (بدلاً من صف لكل حدث)"""
+    __tablename__ = "scroll_aggregates"
+    
+    # معرفات أساسية
+    reading_session_id = Column(String(100), ForeignKey('reading_sessions.reading_session_id'), nullable=False)
+    user_id = Column(String(100), nullable=False, index=True)
+    content_id = Column(String(100), nullable=False, index=True)
+    
+    # النافذة الزمنية (مفتاح التقسيم - جزء من المفتاح الأساسي)
+    window_start = Column(DateTime(timezone=True), nullable=False, primary_key=True)
+    window_end = Column(DateTime(timezone=True), nullable=False)
+    
+    # إحصائيات التمرير
+    events_count = Column(Integer, default=0, nullable=False)
+    max_depth = Column(Float, nullable=True)  # أقصى عمق في النافذة (نسبة مئوية)
+    last_position = Column(Float, nullable=True)
+    scroll_up_count = Column(Integer, default=0, nullable=False)
+    scroll_down_count = Column(Integer, default=0, nullable=False)
+    avg_scroll_speed = Column(Float, nullable=True)
+    
+    # المدرجات: عدد الأحداث والوقت المقضي (ثواني) لكل شريحة عمق
+    depth_histogram = Column(JSONB, nullable=False)
+    dwell_histogram = Column(JSONB, nullable=False)
+    
+    # نقاط التوقف: [الموقع، مدة التوقف، الوقت منذ البداية]
+    pause_count = Column(Integer, default=0, nullable=False)
+    pause_duration_total = Column(Integer, default=0, nullable=False)
+    pause_points = Column(JSONB, nullable=True)
+    
+    # فهارس
+    __table_args__ = (
+        Index('idx_scroll_aggregates_reading_session', 'reading_session_id'),
+        Index('idx_scroll_aggregates_user_window', 'user_id', 'window_start'),
+        {'postgresql_partition_by': 'RANGE (window_start)'},
     )
 
 class ContextData(BaseModel):
@@ -260,8 +299,8 @@ class ContextData(BaseModel):
     user_id = Column(String(100), nullable=False, index=True)
     session_id = Column(String(100), ForeignKey('user_sessions.session_id'), nullable=False)
     
-    # معلومات زمنية
-    timestamp = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    # معلومات زمنية (مفتاح التقسيم - جزء من المفتاح الأساسي)
+    timestamp = Column(DateTime(timezone=True), nullable=False, default=func.now(), primary_key=True)
     local_time = Column(DateTime, nullable=True)  # الوقت المحلي للمستخدم
     day_of_week = Column(SmallInteger, nullable=True)  # 0-6 (الاثنين-الأحد)
     hour_of_day = Column(SmallInteger, nullable=True)  # 0-23
@@ -295,6 +334,7 @@ class ContextData(BaseModel):
         Index('idx_context_data_user_timestamp', 'user_id', 'timestamp'),
         Index('idx_context_data_activity', 'activity_type'),
         Index('idx_context_data_session', 'session_id'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
 class UserBehaviorSummary(BaseModel):
@@ -349,8 +389,11 @@ class EventProcessingLog(BaseModel):
     """جدول سجل معالجة الأحداث"""
     __tablename__ = "event_processing_log"
     
+    # مفتاح التقسيم: وقت قبول الحدث (ثابت عند إعادة التسليم فيبقى event_id فريداً داخل قسمه)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False, primary_key=True)
+    
     # معلومات الحدث
-    event_id = Column(String(100), nullable=False, unique=True, index=True)
+    event_id = Column(String(100), nullable=False, index=True)
     event_type = Column(String(50), nullable=False, index=True)
     event_source = Column(String(100), nullable=False)  # kafka, api, etc.
     
@@ -378,4 +421,6 @@ class EventProcessingLog(BaseModel):
         Index('idx_event_log_status_timestamp', 'processing_status', 'created_at'),
         Index('idx_event_log_type', 'event_type'),
         Index('idx_event_log_batch', 'batch_id'),
+        UniqueConstraint('event_id', 'created_at', name='uq_event_log_event_created'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
@@ -415,11 +415,21 @@ class UserBehaviorAnalytics(BaseSchema):
 # ===== Batch Processing Schemas =====
 
 class BatchInteractionRequest(BaseSchema):
-    """طلب معالجة دفعة من التفاعلات"""
-    interactions: List[UserInteractionRequest] = Field(..., min_items=1, max_items=1000)
+    """طلب معالجة دفعة من التفاعلات (كل عنصر يُتحقق منه بمفرده كـ UserInteractionRequest)"""
+    interactions: List[Dict[str, Any]] = Field(..., min_items=1, max_items=10000)
     batch_id: Optional[str] = Field(None, description="معرف الدفعة")
     priority: Optional[int] = Field(1, ge=1, le=5, description="أولوية المعالجة")
 
+class BatchScrollEventRequest(BaseSchema):
+    """طلب معالجة دفعة من أحداث التمرير (كل عنصر يُتحقق منه كـ ScrollEventRequest)"""
+    events: List[Dict[str, Any]] = Field(..., min_items=1, max_items=10000)
+    batch_id: Optional[str] = Field(None, description="معرف الدفعة")
+
+class BatchContextDataRequest(BaseSchema):
+    """طلب معالجة دفعة من بيانات السياق (كل عنصر يُتحقق منه كـ ContextDataRequest)"""
+    items: List[Dict[str, Any]] = Field(..., min_items=1, max_items=10000)
+    batch_id: Optional[str] = Field(None, description="معرف الدفعة")
+
 class BatchProcessingResponse(BaseSchema):
     """استجابة معالجة دفعة"""
     batch_id: str
@@ -429,6 +439,7 @@ class BatchProcessingResponse(BaseSchema):
     processing_time: float
     errors: List[str]
     warnings: List[str]
+    failed_rows: List[Dict[str, Any]] = Field(default_factory=list, description="العناصر المرفوضة مع رقمها في الدفعة")
 
 # ===== Error Schemas =====
 
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+ملخصات سلوك المستخدم اليومية المجمعة مسبقاً
+User Behavior Tracking System - Daily Behavior Rollups
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+from sqlalchemy import text, select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.database import UserBehaviorSummary
+from services.database import db_manager
+from services.bulk_writer import build_row
+
+# إعداد السجلات
+logger = logging.getLogger("sabq.tracking.rollups")
+
+# قفل استشاري حتى لا يحسب أكثر من عامل نفس الأيام في نفس الوقت
+ROLLUP_LOCK_KEY = 0x5AB0_B5A1
+
+# عدادات أنواع التفاعل التي لها أعمدة في الملخص
+TYPE_COLUMNS = {
+    "like": "likes_count",
+    "save": "saves_count",
+    "share": "shares_count",
+    "comment": "comments_count",
+}
+
+# اليوم والساعة بتوقيت UTC
+_DAY = "date_trunc('day', {column} AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+_HOUR = "EXTRACT(HOUR FROM {column} AT TIME ZONE 'UTC')::int"
+
+def day_start(moment: datetime) -> datetime:
+    """بداية اليوم (UTC)"""
+    return moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _where(column: str, user_id: Optional[str]) -> str:
+    condition = f"{column} >= :start AND {column} < :end"
+    return condition + " AND user_id = :user_id" if user_id else condition
+
+def _queries(user_id: Optional[str]) -> Dict[str, str]:
+    """استعلامات التجميع لكل (مستخدم، يوم) - كلها محددة بنطاق زمني فتقرأ أقسامه فقط"""
+    interactions = _where("timestamp", user_id)
+    scroll = _where("window_start", user_id)
+    scroll_day = _DAY.format(column="window_start")
+    return {
+        "interactions": f"""
+            SELECT user_id, {_DAY.format(column="timestamp")} AS day, interaction_type,
+                   {_HOUR.format(column="timestamp")} AS hour, count(*) AS n,
+                   coalesce(sum(time_on_page), 0) AS time_sum, count(time_on_page) AS time_count
+            FROM user_interactions WHERE {interactions}
+            GROUP BY 1, 2, 3, 4
+        """,
+        "content": f"""
+            SELECT user_id, day, content_id, n FROM (
+                SELECT user_id, {_DAY.format(column="timestamp")} AS day, content_id, count(*) AS n,
+                       row_number() OVER (
+                           PARTITION BY user_id, {_DAY.format(column="timestamp")} ORDER BY count(*) DESC
+                       ) AS rank
+                FROM user_interactions WHERE {interactions}
+                GROUP BY 1, 2, 3
+            ) ranked WHERE rank <= CAST(:top_content AS int)
+        """,
+        "reading": f"""
+            SELECT user_id, {_DAY.format(column="start_time")} AS day, count(*) AS n,
+                   count(*) FILTER (WHERE is_completed) AS completed,
+                   coalesce(sum(total_reading_time), 0) AS reading_time,
+                   avg(reading_speed) AS speed, count(reading_speed) AS speed_count,
+                   avg(engagement_score) AS engagement, count(engagement_score) AS engagement_count
+            FROM reading_sessions WHERE {_where("start_time", user_id)}
+            GROUP BY 1, 2
+        """,
+        "sessions": f"""
+            SELECT user_id, {_DAY.format(column="start_time")} AS day,
+                   coalesce(device_type, 'unknown') AS device, count(*) AS n,
+                   coalesce(sum(session_duration), 0) AS duration
+            FROM user_sessions WHERE {_where("start_time", user_id)}
+            GROUP BY 1, 2, 3
+        """,
+        "scroll": f"""
+            SELECT user_id, {scroll_day} AS day, {_HOUR.format(column="window_start")} AS hour,
+                   sum(events_count) AS events, sum(pause_count) AS pauses,
+                   sum(pause_duration_total) AS pause_total
+            FROM scroll_aggregates WHERE {scroll}
+            GROUP BY 1, 2, 3
+        """,
+        "depth": f"""
+            SELECT user_id, day, sum(depth) AS depth_sum, count(*) AS n FROM (
+                SELECT user_id, {scroll_day} AS day, reading_session_id, max(max_depth) AS depth
+                FROM scroll_aggregates WHERE {scroll} AND max_depth IS NOT NULL
+                GROUP BY 1, 2, 3
+            ) sessions GROUP BY 1, 2
+        """,
+        "depth_histogram": f"""
+            SELECT user_id, {scroll_day} AS day, bucket.idx - 1 AS bucket, sum(bucket.value::float) AS value
+            FROM scroll_aggregates, jsonb_array_elements_text(depth_histogram) WITH ORDINALITY AS bucket(value, idx)
+            WHERE {scroll}
+            GROUP BY 1, 2, 3
+        """,
+        "dwell_histogram": f"""
+            SELECT user_id, {scroll_day} AS day, bucket.idx - 1 AS bucket, sum(bucket.value::float) AS value
+            FROM scroll_aggregates, jsonb_array_elements_text(dwell_histogram) WITH ORDINALITY AS bucket(value, idx)
+            WHERE {scroll}
+            GROUP BY 1, 2, 3
+        """,
+        "pause_hotspots": f"""
+            SELECT user_id, {scroll_day} AS day,
+                   LEAST(FLOOR((point->>0)::float * CAST(:buckets AS int) / 100)::int, CAST(:buckets AS int) - 1) AS bucket,
+                   count(*) AS value
+            FROM scroll_aggregates, jsonb_array_elements(coalesce(pause_points, '[]'::jsonb)) AS point
+            WHERE {scroll}
+            GROUP BY 1, 2, 3
+        """,
+    }
+
+def empty_summary(user_id: str, day: datetime, buckets: int) -> Dict[str, Any]:
+    """ملخص يوم فارغ بأعمدة UserBehaviorSummary"""
+    return {
+        "user_id": user_id,
+        "date": day,
+        "total_sessions": 0,
+        "total_session_duration": 0,
+        "avg_session_duration": None,
+        "total_reading_time": 0,
+        "articles_read": 0,
+        "articles_completed": 0,
+        "avg_reading_speed": None,
+        "avg_engagement_score": None,
+        "total_interactions": 0,
+        **{column: 0 for column in TYPE_COLUMNS.values()},
+        "most_active_hour": None,
+        "preferred_device": None,
+        "avg_scroll_depth": None,
+        # القيم المجمعة القابلة للدمج عبر الأيام
+        "engagement_patterns": {
+            "by_type": {}, "by_hour": {}, "by_content": {}, "by_device": {},
+            "time_on_page_sum": 0, "time_on_page_count": 0,
+        },
+        "reading_patterns": {
+            "scroll_events": 0, "scroll_by_hour": {},
+            "depth_histogram": [0] * buckets, "dwell_histogram": [0] * buckets,
+            "pause_count": 0, "pause_duration_total": 0, "pause_hotspots": [0] * buckets,
+            "speed_count": 0, "engagement_count": 0, "depth_sessions": 0,
+        },
+    }
+
+def _finalize(summary: Dict[str, Any]) -> Dict[str, Any]:
+    patterns = summary["engagement_patterns"]
+    reading = summary["reading_patterns"]
+    for interaction_type, column in TYPE_COLUMNS.items():
+        summary[column] = patterns["by_type"].get(interaction_type, 0)
+    
+    if summary["total_sessions"]:
+        summary["avg_session_duration"] = summary["total_session_duration"] / summary["total_sessions"]
+    hours = Counter(patterns["by_hour"]) + Counter(reading["scroll_by_hour"])
+    if hours:
+        summary["most_active_hour"] = int(hours.most_common(1)[0][0])
+    if patterns["by_device"]:
+        summary["preferred_device"] = Counter(patterns["by_device"]).most_common(1)[0][0]
+    return summary
+
+async def compute_daily(session: AsyncSession, start: datetime, end: datetime,
+                        user_id: Optional[str] = None,
+                        buckets: Optional[int] = None) -> Dict[Tuple[str, datetime], Dict[str, Any]]:
+    """
+    حساب ملخصات (مستخدم، يوم) للفترة [start, end) من الجداول المصدرية
+    تُستخدم للملخصات اليومية المخزنة ولدلتا اليوم الحالي لمستخدم واحد
+    """
+    buckets = buckets or settings.scroll_depth_buckets
+    params = {"start": start, "end": end, "buckets": buckets,
+              "top_content": settings.behavior_rollup_top_content}
+    if user_id:
+        params["user_id"] = user_id
+    
+    summaries: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+    
+    def summary_for(row) -> Dict[str, Any]:
+        key = (row.user_id, row.day)
+        if key not in summaries:
+            summaries[key] = empty_summary(row.user_id, row.day, buckets)
+        return summaries[key]
+    
+    queries = _queries(user_id)
+    
+    async def rows(name: str):
+        return (await session.execute(text(queries[name]), params)).all()
+    
+    for row in await rows("interactions"):
+        summary = summary_for(row)
+        patterns = summary["engagement_patterns"]
+        hour = str(row.hour)
+        summary["total_interactions"] += row.n
+        patterns["by_type"][row.interaction_type] = patterns["by_type"].get(row.interaction_type, 0) + row.n
+        patterns["by_hour"][hour] = patterns["by_hour"].get(hour, 0) + row.n
+        patterns["time_on_page_sum"] += int(row.time_sum)
+        patterns["time_on_page_count"] += row.time_count
+    
+    for row in await rows("content"):
+        summary_for(row)["engagement_patterns"]["by_content"][row.content_id] = row.n
+    
+    for row in await rows("reading"):
+        summary = summary_for(row)
+        summary["articles_read"] = row.n
+        summary["articles_completed"] = row.completed
+        summary["total_reading_time"] = int(row.reading_time)
+        summary["avg_reading_speed"] = row.speed
+        summary["avg_engagement_score"] = row.engagement
+        summary["reading_patterns"]["speed_count"] = row.speed_count
+        summary["reading_patterns"]["engagement_count"] = row.engagement_count
+    
+    for row in await rows("sessions"):
+        summary = summary_for(row)
+        summary["total_sessions"] += row.n
+        summary["total_session_duration"] += int(row.duration)
+        summary["engagement_patterns"]["by_device"][row.device] = row.n
+    
+    for row in await rows("scroll"):
+        reading = summary_for(row)["reading_patterns"]
+        reading["scroll_events"] += int(row.events)
+        reading["scroll_by_hour"][str(row.hour)] = int(row.events)
+        reading["pause_count"] += int(row.pauses)
+        reading["pause_duration_total"] += int(row.pause_total)
+    
+    for row in await rows("depth"):
+        summary = summary_for(row)
+        summary["avg_scroll_depth"] = row.depth_sum / row.n
+        summary["reading_patterns"]["depth_sessions"] = row.n
+    
+    for name in ("depth_histogram", "dwell_histogram", "pause_hotspots"):
+        for row in await rows(name):
+            histogram = summary_for(row)["reading_patterns"][name]
+            if row.bucket < buckets:
+                histogram[row.bucket] += int(row.value)
+    
+    return {key: _finalize(summary) for key, summary in summaries.items()}
+
+def _add_histogram(target: List[int], values: Optional[List[int]]) -> None:
+    for i, value in enumerate((values or [])[:len(target)]):
+        target[i] += value
+
+def merge_summaries(summaries: Iterable[Dict[str, Any]], buckets: Optional[int] = None) -> Dict[str, Any]:
+    """دمج ملخصات يومية (صفوف مخزنة أو دلتا محسوبة) في إجماليات الفترة"""
+    buckets = buckets or settings.scroll_depth_buckets
+    totals: Dict[str, Any] = {
+        "interactions": 0, "by_type": Counter(), "by_hour": Counter(), "by_content": Counter(),
+        "by_device": Counter(), "time_on_page_sum": 0, "time_on_page_count": 0,
+        "sessions": 0, "session_duration": 0,
+        "reading_time": 0, "articles_read": 0, "articles_completed": 0,
+        "speed_sum": 0.0, "speed_count": 0, "engagement_sum": 0.0, "engagement_count": 0,
+        "scroll_events": 0, "scroll_by_hour": Counter(),
+        "depth_histogram": [0] * buckets, "dwell_histogram": [0] * buckets, "pause_hotspots": [0] * buckets,
+        "pause_count": 0, "pause_duration_total": 0, "depth_sum": 0.0, "depth_sessions": 0,
+        "daily": {},
+    }
+    
+    for summary in summaries:
+        patterns = summary.get("engagement_patterns") or {}
+        reading = summary.get("reading_patterns") or {}
+        
+        totals["interactions"] += summary["total_interactions"]
+        for key in ("by_type", "by_hour", "by_content", "by_device"):
+            totals[key].update(patterns.get(key) or {})
+        totals["time_on_page_sum"] += patterns.get("time_on_page_sum", 0)
+        totals["time_on_page_count"] += patterns.get("time_on_page_count", 0)
+        
+        totals["sessions"] += summary["total_sessions"]
+        totals["session_duration"] += summary["total_session_duration"]
+        totals["reading_time"] += summary["total_reading_time"]
+        totals["articles_read"] += summary["articles_read"]
+        totals["articles_completed"] += summary["articles_completed"]
+        
+        # المتوسطات تُدمج موزونة بعدد عيناتها
+        speed_count = reading.get("speed_count", 0)
+        engagement_count = reading.get("engagement_count", 0)
+        depth_sessions = reading.get("depth_sessions", 0)
+        totals["speed_sum"] += (summary["avg_reading_speed"] or 0) * speed_count
+        totals["speed_count"] += speed_count
+        totals["engagement_sum"] += (summary["avg_engagement_score"] or 0) * engagement_count
+        totals["engagement_count"] += engagement_count
+        totals["depth_sum"] += (summary["avg_scroll_depth"] or 0) * depth_sessions
+        totals["depth_sessions"] += depth_sessions
+        
+        totals["scroll_events"] += reading.get("scroll_events", 0)
+        totals["scroll_by_hour"].update(reading.get("scroll_by_hour") or {})
+        totals["pause_count"] += reading.get("pause_count", 0)
+        totals["pause_duration_total"] += reading.get("pause_duration_total", 0)
+        for key in ("depth_histogram", "dwell_histogram", "pause_hotspots"):
+            _add_histogram(totals[key], reading.get(key))
+        
+        day = totals["daily"].setdefault(summary["date"].date().isoformat(), {
+            "interactions": 0, "reading_time": 0, "scroll_events": 0, "dwell": 0
+        })
+        day["interactions"] += summary["total_interactions"]
+        day["reading_time"] += summary["total_reading_time"]
+        day["scroll_events"] += reading.get("scroll_events", 0)
+        day["dwell"] += sum(reading.get("dwell_histogram") or [])
+    
+    totals["daily"] = dict(sorted(totals["daily"].items()))
+    return totals
+
+class BehaviorRollup:
+    """
+    عامل دوري يحسب ملخصات سلوك المستخدمين اليومية في user_behavior_summary
+    
+    - كل يوم مغلق يُحسب بالكامل من الجداول المصدرية ويُكتب بـ upsert، فإعادة
+      الحساب آمنة؛ آخر lookback_days أيام تُعاد في كل دورة لالتقاط الأحداث المتأخرة
+      (مخزن الاستقبال المؤجل ونوافذ التمرير)
+    - إذا توقف العامل يُستأنف من آخر يوم محسوب، وفي أول تشغيل يُحسب max_days يوماً
+    - اليوم الحالي لا يُخزن؛ يُحسب كدلتا حية للمستخدم عند الطلب
+    """
+    
+    def __init__(self,
+                 interval: Optional[int] = None,
+                 lookback_days: Optional[int] = None,
+                 max_days: Optional[int] = None,
+                 buckets: Optional[int] = None):
+        self.interval = interval or settings.behavior_rollup_interval
+        self.lookback_days = lookback_days or settings.behavior_rollup_lookback_days
+        self.max_days = max_days or settings.behavior_rollup_max_days
+        self.buckets = buckets or settings.scroll_depth_buckets
+        self._task: Optional[asyncio.Task] = None
+        
+        self.days_rolled = 0
+        self.rows_written = 0
+        self.last_run: Optional[datetime] = None
+    
+    # ===== دورة الحياة =====
+    
+    async def start(self) -> None:
+        """بدء العامل الدوري"""
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"📊 بدء ملخصات السلوك اليومية - كل {self.interval} ثانية")
+    
+    async def stop(self) -> None:
+        """إيقاف العامل (الأيام المحسوبة جزئياً تُعاد في الدورة التالية)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("✅ تم إيقاف ملخصات السلوك اليومية")
+    
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ خطأ في حساب ملخصات السلوك: {e}")
+            await asyncio.sleep(self.interval)
+    
+    # ===== الحساب =====
+    
+    @staticmethod
+    async def watermark(session: AsyncSession) -> Optional[datetime]:
+        """آخر يوم محسوب في الملخصات"""
+        return (await session.execute(select(func.max(UserBehaviorSummary.date)))).scalar()
+    
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """حساب الأيام المغلقة التي لم تُحسب أو قد تصلها أحداث متأخرة"""
+        today = day_start(now or datetime.now(timezone.utc))
+        async with db_manager.get_session() as session:
+            last = await self.watermark(session)
+        
+        start = today - timedelta(days=self.lookback_days)
+        if last is None:
+            start = today - timedelta(days=self.max_days)
+        elif last + timedelta(days=1) < start:
+            start = max(last + timedelta(days=1), today - timedelta(days=self.max_days))
+        
+        written = 0
+        day = start
+        while day < today:
+            result = await self.rollup_day(day)
+            if result is None:
+                logger.info("⏭️ ملخصات السلوك قيد الحساب في عامل آخر")
+                break
+            written += result
+            day += timedelta(days=1)
+        
+        self.last_run = datetime.now(timezone.utc)
+        return written
+    
+    async def rollup_day(self, day: datetime) -> Optional[int]:
+        """حساب ملخصات يوم واحد لكل المستخدمين وكتابتها؛ None إذا كان القفل مأخوذاً"""
+        now = datetime.now(timezone.utc)
+        table = UserBehaviorSummary.__table__
+        async with db_manager.get_session() as session:
+            locked = await session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY})
+            if not locked.scalar():
+                return None
+            
+            summaries = await compute_daily(session, day, day + timedelta(days=1), buckets=self.buckets)
+            rows = [build_row(table, {**summary, "last_updated": now}, now) for summary in summaries.values()]
+            if rows:
+                statement = pg_insert(table)
+                excluded = {
+                    column.name: statement.excluded[column.name]
+                    for column in table.columns if column.name not in ("id", "created_at")
+                }
+                await session.execute(
+                    statement.on_conflict_do_update(index_elements=["user_id", "date"], set_=excluded),
+                    rows
+                )
+        
+        self.days_rolled += 1
+        self.rows_written += len(rows)
+        logger.info(f"📊 ملخصات يوم {day.date().isoformat()}: {len(rows)} مستخدم")
+        return len(rows)
+    
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات العامل"""
+        return {
+            "days_rolled": self.days_rolled,
+            "rows_written": self.rows_written,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+# مثيل مشترك من عامل الملخصات
+behavior_rollup = BehaviorRollup()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+الكتابة المجمعة للأحداث عالية الحجم
+User Behavior Tracking System - Bulk Writer (Core executemany / COPY)
+"""
+
+import json
+import time
+import uuid
+import logging
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Type
+
+import asyncpg
+from pydantic import ValidationError
+from sqlalchemy import insert, Table, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.database import UserInteraction, ScrollEvent, ContextData
+from models.schemas import UserInteractionRequest, ScrollEventRequest, ContextDataRequest
+from services.database import db_manager
+
+# إعداد السجلات
+logger = logging.getLogger("sabq.tracking.bulk")
+
+# مخطط التحقق لكل جدول
+REQUEST_SCHEMAS = {
+    UserInteraction: UserInteractionRequest,
+    ScrollEvent: ScrollEventRequest,
+    ContextData: ContextDataRequest,
+}
+
+# أخطاء تخص صفاً بعينه (وليست انقطاعاً في قاعدة البيانات)
+ROW_ERRORS = (
+    IntegrityError, DataError,
+    asyncpg.exceptions.IntegrityConstraintViolationError,
+    asyncpg.exceptions.DataError,
+)
+
+# علامة القيمة الافتراضية "وقت الكتابة"
+_NOW = object()
+
+@lru_cache(maxsize=None)
+def _column_plan(table: Table) -> Tuple[Tuple[str, Any, bool], ...]:
+    """(اسم العمود، مولد القيمة الافتراضية، هل هو تاريخ) لكل عمود - يُحسب مرة لكل جدول"""
+    plan = []
+    for column in table.columns:
+        if column.name == "id":
+            default = uuid.uuid4
+        elif column.name in ("created_at", "updated_at", "timestamp"):
+            default = _NOW
+        elif column.default is not None and column.default.is_scalar:
+            default = column.default.arg
+        else:
+            default = None
+        plan.append((column.name, default, isinstance(column.type, DateTime)))
+    return tuple(plan)
+
+def build_row(table: Table, data: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    بناء صف كامل لجدول من بيانات الحدث
+    كل الأعمدة موجودة في كل صف (شرط executemany وCOPY)، والقيم الافتراضية
+    تُحسب هنا لأن COPY لا يطبق القيم الافتراضية المعرفة في النموذج
+    """
+    now = now or datetime.now(timezone.utc)
+    row = {}
+    for name, default, is_datetime in _column_plan(table):
+        value = data.get(name)
+        if value is None:
+            if default is _NOW:
+                value = now
+            elif callable(default):
+                value = default()
+            else:
+                value = default
+        elif is_datetime and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        row[name] = value
+    return row
+
+class BulkWriteResult:
+    """نتيجة كتابة مجمعة"""
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.inserted = 0
+        self.failed: List[Dict[str, Any]] = []
+        self.duration = 0.0
+    
+    @property
+    def failed_count(self) -> int:
+        return len(self.failed)
+    
+    def fail(self, index: int, errors: List[Any]) -> None:
+        self.failed.append({"index": index, "errors": errors})
+    
+    def error_messages(self) -> List[str]:
+        return [f"العنصر {item['index']}: {item['errors']}" for item in sorted(self.failed, key=lambda item: item["index"])]
+
+class BulkWriter:
+    """
+    كاتب مجمع لجداول التفاعلات والتمرير والسياق
+    
+    - كل عنصر يُتحقق منه بمفرده وتُعاد أخطاؤه مع رقمه في الدفعة
+    - الصفوف الصالحة تُكتب على أجزاء (chunk_size) بعبارة INSERT واحدة
+      متعددة الصفوف (method="values") أو عبر COPY في asyncpg (method="copy")
+    - كل جزء داخل SAVEPOINT؛ إذا رفضت قاعدة البيانات صفاً يُقسم الجزء
+      لتحديد الصفوف المرفوضة وتُكتب البقية
+    - لا يوجد refresh ولا كائنات ORM
+    """
+    
+    def __init__(self, chunk_size: Optional[int] = None, method: Optional[str] = None):
+        self.chunk_size = chunk_size or settings.tracking_bulk_chunk_size
+        self.method = method or settings.tracking_bulk_method
+    
+    def validate(self, model: Type, items: List[Any], result: BulkWriteResult) -> List[Tuple[int, Any]]:
+        """التحقق من كل عنصر بمفرده؛ يعيد (رقم العنصر، الطلب) للعناصر الصالحة ويسجل أخطاء البقية"""
+        schema = REQUEST_SCHEMAS[model]
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, schema):
+                    item = schema.parse_obj(item)
+            except ValidationError as e:
+                result.fail(index, e.errors())
+                continue
+            valid.append((index, item))
+        return valid
+    
+    def prepare(self, model: Type, items: List[Any], result: BulkWriteResult
+                ) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """التحقق من العناصر وبناء الصفوف؛ يعيد (الصفوف، أرقام العناصر الأصلية)"""
+        table = model.__table__
+        now = datetime.now(timezone.utc)
+        valid = self.validate(model, items, result)
+        return [build_row(table, dict(item), now) for _, item in valid], [index for index, _ in valid]
+    
+    async def write(self, model: Type, items: List[Any],
+                    session: Optional[AsyncSession] = None) -> BulkWriteResult:
+        """التحقق من العناصر وكتابتها؛ الالتزام (commit) مسؤولية صاحب الجلسة"""
+        started = time.perf_counter()
+        result = BulkWriteResult(len(items))
+        rows, indexes = self.prepare(model, items, result)
+        
+        if rows:
+            if session is None:
+                async with db_manager.get_session() as own_session:
+                    await self._write_chunks(own_session, model.__table__, rows, indexes, result)
+            else:
+                await self._write_chunks(session, model.__table__, rows, indexes, result)
+        
+        result.duration = time.perf_counter() - started
+        logger.info(
+            f"📦 كتابة مجمعة {model.__tablename__}: {result.inserted}/{result.total} "
+            f"({result.failed_count} فاشل) في {result.duration:.3f} ثانية"
+        )
+        return result
+    
+    async def insert_checked(self, session: AsyncSession, table: Table,
+                             rows: List[Dict[str, Any]]) -> BulkWriteResult:
+        """إدراج صفوف جاهزة (من build_row) مع عزل الصفوف التي ترفضها قاعدة البيانات"""
+        result = BulkWriteResult(len(rows))
+        await self._write_chunks(session, table, rows, list(range(len(rows))), result)
+        return result
+    
+    async def _write_chunks(self, session: AsyncSession, table: Table, rows: List[Dict[str, Any]],
+                            indexes: List[int], result: BulkWriteResult) -> None:
+        for start in range(0, len(rows), self.chunk_size):
+            end = start + self.chunk_size
+            await self._write_isolating(session, table, rows[start:end], indexes[start:end], result)
+    
+    async def _write_isolating(self, session: AsyncSession, table: Table, rows: List[Dict[str, Any]],
+                               indexes: List[int], result: BulkWriteResult) -> None:
+        try:
+            async with session.begin_nested():
+                await self.insert_rows(session, table, rows)
+            result.inserted += len(rows)
+        except ROW_ERRORS as e:
+            if len(rows) == 1:
+                result.fail(indexes[0], [str(getattr(e, "orig", e))])
+                return
+            middle = len(rows) // 2
+            await self._write_isolating(session, table, rows[:middle], indexes[:middle], result)
+            await self._write_isolating(session, table, rows[middle:], indexes[middle:], result)
+    
+    async def insert_rows(self, session: AsyncSession, table: Table, rows: List[Dict[str, Any]]) -> None:
+        """إدراج صفوف كاملة (من build_row) دون تحقق أو عزل للأخطاء"""
+        if not rows:
+            return
+        if self.method == "copy":
+            await self._copy(session, table, rows)
+        else:
+            # executemany: SQLAlchemy يجمعها في عبارات INSERT ... VALUES متعددة الصفوف
+            await session.execute(insert(table), rows)
+    
+    async def _copy(self, session: AsyncSession, table: Table, rows: List[Dict[str, Any]]) -> None:
+        columns = [column.name for column in table.columns]
+        json_columns = {column.name for column in table.columns if isinstance(column.type, JSONB)}
+        records = [
+            tuple(
+                json.dumps(row[name], ensure_ascii=False, default=str)
+                if name in json_columns and row[name] is not None else row[name]
+                for name in columns
+            )
+            for row in rows
+        ]
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name, records=records, columns=columns
+        )
+
+# مثيل مشترك من الكاتب المجمع
+bulk_writer = BulkWriter()
@@ -24,6 +24,7 @@ from sqlalchemy.exc import SQLAlchemyError, IntegrityError, DataError
 
 from config import settings, DATABASE_CONFIG
 from models.database import Base
+from services.partitions import PartitionManager
 
 # إعداد السجلات
 logger = logging.getLogger("sabq.tracking.database")
@@ -35,6 +36,7 @@ class DatabaseManager:
         self.engine: Optional[AsyncEngine] = None
         self.async_session_factory: Optional[async_sessionmaker] = None
         self._is_initialized = False
+        self.partitions = PartitionManager()
         
     async def initialize(self) -> None:
         """تهيئة اتصال قاعدة البيانات"""
@@ -92,6 +94,8 @@ class DatabaseManager:
             
             async with self.engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                # أقسام الجداول الزمنية (الماضية بقدر مدة الاحتفاظ والقادمة)
+                await self.partitions.ensure_partitions(conn)
                 
             logger.info("✅ تم إنشاء جداول قاعدة البيانات بنجاح")
             
@@ -275,53 +279,45 @@ class DatabaseManager:
             logger.error(f"خطأ في تحسين الجداول: {e}")
             return {"error": str(e)}
     
-    async def cleanup_old_data(self, days: int = None) -> Dict[str, int]:
-        """تنظيف البيانات القديمة"""
-        if days is None:
-            days = settings.data_retention_days
-            
+    async def maintain_partitions(self) -> Dict[str, Any]:
+        """إنشاء الأقسام القادمة وحذف الأقسام المنتهية"""
+        if not self._is_initialized:
+            await self.initialize()
+        
         try:
-            logger.info(f"بدء تنظيف البيانات الأقدم من {days} يوم...")
-            
-            cleanup_queries = [
-                {
-                    "table": "scroll_events",
-                    "query": """
-                    DELETE FROM scroll_events 
-                    WHERE created_at < NOW() - INTERVAL '%s days'
-                    """ % days
-                },
-                {
-                    "table": "context_data",
-                    "query": """
-                    DELETE FROM context_data 
-                    WHERE created_at < NOW() - INTERVAL '%s days'
-                    """ % days
-                },
-                {
-                    "table": "event_processing_log",
-                    "query": """
-                    DELETE FROM event_processing_log 
-                    WHERE created_at < NOW() - INTERVAL '%s days'
-                    AND processing_status = 'processed'
-                    """ % (days // 2)  # حذف سجلات المعالجة بعد نصف المدة
-                }
-            ]
-            
-            results = {}
+            async with self.engine.begin() as conn:
+                return await self.partitions.maintain(conn)
+        except Exception as e:
+            logger.error(f"❌ فشل في صيانة الأقسام: {e}")
+            return {"error": str(e)}
+    
+    async def migrate_partitions(self) -> Dict[str, int]:
+        """ترحيل الجداول المنشأة قبل التقسيم إلى جداول مقسمة (معاملة واحدة)"""
+        if not self._is_initialized:
+            await self.initialize()
+        
+        async with self.engine.begin() as conn:
+            if not await self.partitions.try_lock(conn):
+                raise RuntimeError("صيانة الأقسام قيد التنفيذ في عامل آخر")
+            return await self.partitions.migrate(conn, Base.metadata.tables)
+    
+    async def cleanup_old_data(self, days: int = None) -> Dict[str, Any]:
+        """
+        تنظيف البيانات القديمة بحذف الأقسام المنتهية كاملة بدلاً من DELETE
+        (سجلات المعالجة تُحذف بعد نصف المدة)
+        """
+        manager = self.partitions if days is None else PartitionManager(retention_days=days)
+        
+        try:
+            logger.info(f"بدء تنظيف البيانات الأقدم من {days or settings.data_retention_days} يوم...")
             
-            async with self.get_session() as session:
-                for cleanup in cleanup_queries:
-                    try:
-                        result = await session.execute(text(cleanup["query"]))
-                        deleted_count = result.rowcount
-                        results[cleanup["table"]] = deleted_count
-                        logger.info(f"✅ تم حذف {deleted_count} سجل من جدول {cleanup['table']}")
-                        
-                    except Exception as e:
-                        results[cleanup["table"]] = f"error: {str(e)}"
-                        logger.error(f"❌ فشل تنظيف جدول {cleanup['table']}: {e}")
+            async with self.engine.begin() as conn:
+                if not await manager.try_lock(conn):
+                    logger.info("⏭️ صيانة الأقسام قيد التنفيذ في عامل آخر")
+                    return {"skipped": True}
+                results = await manager.drop_expired(conn)
             
+            logger.info(f"✅ تم تنظيف البيانات القديمة: {results}")
             return results
             
         except Exception as e:
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+مخزن الاستقبال المؤجل للتفاعلات
+User Behavior Tracking System - Write-Behind Interaction Ingestion Buffer
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from config import settings, CACHE_CONFIG
+from models.database import UserInteraction, EventProcessingLog
+from services.database import db_manager
+from services.redis_service import redis_manager
+from services.bulk_writer import bulk_writer, build_row, ROW_ERRORS
+from services.partitions import PartitionManager
+
+# إعداد السجلات
+logger = logging.getLogger("sabq.tracking.ingestion")
+
+class IngestionBufferFull(Exception):
+    """المخزن ممتلئ - يجب على العميل إعادة المحاولة لاحقاً"""
+    pass
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+class InteractionIngestionBuffer:
+    """
+    مخزن مؤجل لكتابة التفاعلات دفعة واحدة
+    
+    - enqueue يضيف الحدث إلى المخزن ويعيد معرفه فوراً (202)
+    - عامل الكتابة يفرغ المخزن عند امتلاء دفعة أو انقضاء المهلة
+    - كل دفعة تُكتب في معاملة واحدة مع صفوف EventProcessingLog؛ معرف الحدث
+      فريد في السجل فلا يُكرر الحدث عند إعادة تسليمه (تسليم مرة واحدة على الأقل)
+    - الأحداث التي ترفضها قاعدة البيانات (أخطاء بيانات) تُحفظ بعد عدد المحاولات
+      في السجل بحالة failed مع بياناتها
+    - أخطاء البنية (انقطاع قاعدة البيانات) لا تُحسب محاولات: تبقى الدفعة في المخزن
+      وتُعاد كتابتها بتأخير متزايد
+    
+    الخلفية "redis" تستخدم Redis Stream مع مجموعة مستهلكين، فتبقى الأحداث
+    المقبولة بعد إعادة تشغيل العملية وتُستعاد رسائل العمال المتوقفين.
+    الخلفية "memory" أبسط لكنها تفقد ما لم يُكتب إذا توقفت العملية فجأة.
+    """
+    
+    def __init__(self,
+                 backend: Optional[str] = None,
+                 max_size: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None,
+                 max_attempts: Optional[int] = None,
+                 max_backoff: Optional[float] = None,
+                 stream_key: Optional[str] = None,
+                 consumer_group: str = "tracking-writers",
+                 reclaim_idle: int = 60):
+        self.backend = backend or settings.tracking_buffer_backend
+        self.max_size = max_size or settings.tracking_buffer_max_size
+        self.batch_size = batch_size or settings.tracking_batch_size
+        self.flush_interval = flush_interval or settings.tracking_flush_interval
+        self.max_attempts = max_attempts or settings.tracking_max_retry_attempts
+        self.max_backoff = max_backoff or settings.tracking_retry_backoff_max
+        self.stream_key = stream_key or settings.tracking_buffer_stream_key
+        self.consumer_group = consumer_group
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+        self.reclaim_idle = reclaim_idle
+        
+        # الخلفية المحلية: (معرف الإدخال، الحدث)
+        self._memory: deque = deque()
+        self._attempts: Dict[str, int] = defaultdict(int)
+        self._backlog = 0
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_reclaim = 0.0
+        self._failures = 0
+        self._retry_at = 0.0
+        
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.duplicates = 0
+        self.dead_lettered = 0
+    
+    # ===== الاستقبال =====
+    
+    async def enqueue(self, event: Dict[str, Any]) -> str:
+        """إضافة حدث إلى المخزن وإرجاع معرفه (يرفع IngestionBufferFull عند الامتلاء)"""
+        if self._backlog >= self.max_size:
+            self.rejected += 1
+            raise IngestionBufferFull(f"المخزن ممتلئ ({self._backlog} حدث بانتظار الكتابة)")
+        
+        event = dict(event)
+        event.setdefault("event_id", uuid.uuid4().hex)
+        event.setdefault("timestamp", datetime.now(timezone.utc).isoformat())
+        
+        if self.backend == "redis":
+            await redis_manager.redis.xadd(self.stream_key, {
+                "event_id": event["event_id"],
+                "data": json.dumps(event, ensure_ascii=False, default=str)
+            })
+        else:
+            self._memory.append((event["event_id"], event))
+        
+        self._backlog += 1
+        self.accepted += 1
+        if self._backlog >= self.batch_size:
+            self._ready.set()
+        return event["event_id"]
+    
+    # ===== دورة الحياة =====
+    
+    async def start(self) -> None:
+        """بدء عامل الكتابة في الخلفية"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        # ON CONFLICT (event_id, created_at) يتطلب القيد الفريد للجدول المقسم؛ على جدول قديم
+        # تفشل كل دفعة ويتراكم المخزن بلا نهاية، لذا يُرفض التشغيل بدلاً من قبول أحداث لن تُكتب
+        async with db_manager.get_session() as session:
+            if not await PartitionManager.is_partitioned(session, EventProcessingLog.__tablename__):
+                raise RuntimeError(
+                    f"جدول {EventProcessingLog.__tablename__} غير مقسم - "
+                    "شغّل python migrate_partitions.py قبل تفعيل الاستقبال المؤجل"
+                )
+        if self.backend == "redis":
+            await redis_manager.initialize()
+            try:
+                await redis_manager.redis.xgroup_create(
+                    self.stream_key, self.consumer_group, id="0", mkstream=True
+                )
+            except Exception as e:
+                # المجموعة موجودة مسبقاً (BUSYGROUP)
+                if "BUSYGROUP" not in str(e):
+                    raise
+            self._backlog = await redis_manager.redis.xlen(self.stream_key)
+        
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"📥 بدء مخزن الاستقبال ({self.backend}) - دفعة {self.batch_size} كل {self.flush_interval} ثانية")
+    
+    async def stop(self) -> None:
+        """إيقاف عامل الكتابة وتفريغ ما تبقى"""
+        if self._task is None:
+            return
+        # لا يُلغى العامل أثناء كتابة دفعة حتى لا تضيع أحداث سُحبت من المخزن
+        self._stopping = True
+        self._ready.set()
+        await self._task
+        self._task = None
+        
+        await self.flush()
+        if self.backend == "memory" and self._memory:
+            logger.error(f"❌ فقدان {len(self._memory)} حدث لم يُكتب عند الإيقاف")
+        logger.info("✅ تم إيقاف مخزن الاستقبال")
+    
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            if self._stopping:
+                break
+            if time.monotonic() < self._retry_at:
+                # تأخير بعد خطأ في البنية: لا محاولة قبل انقضائه
+                continue
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ خطأ في تفريغ مخزن الاستقبال: {e}")
+    
+    async def flush(self) -> int:
+        """كتابة كل الدفعات المتاحة وإرجاع عدد الأحداث المكتوبة"""
+        if self.backend == "redis":
+            await self._reclaim_stale()
+        
+        written = 0
+        while True:
+            entries = await self._read_batch()
+            if not entries:
+                break
+            
+            done, rejected, unavailable = await self._write_isolating(entries)
+            written += len(done)
+            failed_ids = {entry_id for entry_id, _ in rejected + unavailable}
+            
+            # المحاولات تُحسب للأحداث المرفوضة وحدها؛ الأحداث التي استنفدتها تُحفظ في السجل كأحداث فاشلة
+            exhausted = []
+            for entry_id, event in rejected:
+                self._attempts[entry_id] += 1
+                if self._attempts[entry_id] >= self.max_attempts:
+                    exhausted.append((entry_id, event))
+            if exhausted and await self._dead_letter(exhausted):
+                done.extend(exhausted)
+                failed_ids -= {entry_id for entry_id, _ in exhausted}
+            
+            await self._ack([entry_id for entry_id, _ in done])
+            self._retain([entry for entry in entries if entry[0] in failed_ids])
+            if unavailable:
+                self._backoff()
+            else:
+                self._failures = 0
+                self._retry_at = 0.0
+            if failed_ids:
+                # إعادة المحاولة في الدورة التالية
+                break
+        
+        if self.backend == "redis":
+            self._backlog = await redis_manager.redis.xlen(self.stream_key)
+        else:
+            self._backlog = len(self._memory)
+        return written
+    
+    def _backoff(self) -> None:
+        """تأخير أسّي لإعادة المحاولة بعد خطأ في البنية"""
+        self._failures += 1
+        delay = min(self.flush_interval * 2 ** (self._failures - 1), self.max_backoff)
+        self._retry_at = time.monotonic() + delay
+        logger.warning(f"⏳ إعادة محاولة الكتابة بعد {delay:.0f} ثانية (فشل متتالٍ رقم {self._failures})")
+    
+    # ===== القراءة والتأكيد =====
+    
+    async def _read_batch(self) -> List[Tuple[str, Dict[str, Any]]]:
+        if self.backend != "redis":
+            count = min(self.batch_size, len(self._memory))
+            return [self._memory.popleft() for _ in range(count)]
+        
+        # الرسائل المعلقة لهذا العامل أولاً (فشلت سابقاً أو استُعيدت) ثم الجديدة
+        entries, invalid = [], []
+        for start_id in ("0", ">"):
+            response = await redis_manager.redis.xreadgroup(
+                self.consumer_group, self.consumer_name,
+                {self.stream_key: start_id}, count=self.batch_size - len(entries)
+            )
+            for _, messages in response or []:
+                for message_id, fields in messages:
+                    entry = self._decode(message_id, fields)
+                    if entry is not None:
+                        entries.append(entry)
+                    else:
+                        invalid.append(_text(message_id))
+            if len(entries) >= self.batch_size:
+                break
+        
+        # الرسائل التالفة لا يمكن كتابتها أبداً
+        await self._ack(invalid)
+        return entries
+    
+    def _decode(self, message_id: Any, fields: Dict[Any, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        message_id = _text(message_id)
+        fields = {_text(key): _text(value) for key, value in (fields or {}).items()}
+        try:
+            return message_id, json.loads(fields["data"])
+        except (KeyError, ValueError) as e:
+            logger.warning(f"⚠️ رسالة غير صالحة في مخزن الاستقبال {message_id}: {e}")
+            return None
+    
+    def _retain(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        # Redis يحتفظ بها في قائمة الانتظار؛ الذاكرة تعيدها لبداية الطابور
+        if self.backend != "redis":
+            self._memory.extendleft(reversed(entries))
+    
+    async def _ack(self, entry_ids: List[str]) -> None:
+        for entry_id in entry_ids:
+            self._attempts.pop(entry_id, None)
+        if self.backend != "redis" or not entry_ids:
+            return
+        async with redis_manager.redis.pipeline(transaction=False) as pipe:
+            pipe.xack(self.stream_key, self.consumer_group, *entry_ids)
+            pipe.xdel(self.stream_key, *entry_ids)
+            await pipe.execute()
+    
+    async def _reclaim_stale(self) -> None:
+        """استعادة الرسائل المعلقة لدى عمال متوقفين"""
+        now = time.monotonic()
+        if now - self._last_reclaim < self.reclaim_idle:
+            return
+        self._last_reclaim = now
+        
+        pending = await redis_manager.redis.xpending_range(
+            self.stream_key, self.consumer_group, min="-", max="+", count=self.batch_size * 10
+        )
+        stale = [
+            item["message_id"] for item in pending
+            if _text(item["consumer"]) != self.consumer_name
+            and item["time_since_delivered"] >= self.reclaim_idle * 1000
+        ]
+        if stale:
+            await redis_manager.redis.xclaim(
+                self.stream_key, self.consumer_group, self.consumer_name,
+                self.reclaim_idle * 1000, stale
+            )
+            logger.info(f"♻️ استعادة {len(stale)} حدث من عمال متوقفين")
+    
+    # ===== الكتابة =====
+    
+    async def _write_isolating(self, entries: List[Tuple[str, Dict[str, Any]]]
+                               ) -> Tuple[List[Tuple[str, Dict[str, Any]]],
+                                          List[Tuple[str, Dict[str, Any]]],
+                                          List[Tuple[str, Dict[str, Any]]]]:
+        """
+        كتابة دفعة وإرجاع (المكتوب، المرفوض، غير المكتوب لخطأ في البنية)
+        أخطاء البيانات تُعزل بتقسيم الدفعة حتى لا يُفشل حدث واحد الدفعة كلها؛
+        أي خطأ آخر (انقطاع قاعدة البيانات) يُفشل الدفعة كاملة لإعادة المحاولة
+        """
+        try:
+            await self._write(entries)
+            return list(entries), [], []
+        except ROW_ERRORS as e:
+            if len(entries) == 1:
+                logger.warning(f"⚠️ حدث غير صالح {entries[0][1].get('event_id')}: {e}")
+                entries[0][1]["_error"] = str(e)
+                return [], list(entries), []
+            middle = len(entries) // 2
+            done_left, rejected_left, unavailable_left = await self._write_isolating(entries[:middle])
+            done_right, rejected_right, unavailable_right = await self._write_isolating(entries[middle:])
+            return (done_left + done_right, rejected_left + rejected_right,
+                    unavailable_left + unavailable_right)
+        except Exception as e:
+            logger.error(f"❌ فشل في كتابة دفعة من {len(entries)} حدث: {e}")
+            return [], [], list(entries)
+    
+    async def _write(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """كتابة التفاعلات وصفوف السجل في معاملة واحدة"""
+        now = datetime.now(timezone.utc)
+        batch_id = f"ingest_{uuid.uuid4().hex[:12]}"
+        log_rows = []
+        for entry_id, event in entries:
+            accepted_at = _parse_time(event.get("timestamp")) or now
+            log_rows.append({
+                "id": uuid.uuid4(),
+                "event_id": event["event_id"],
+                "event_type": "interaction",
+                "event_source": "api",
+                "processing_status": "processed",
+                # مفتاح التقسيم: ثابت عند إعادة التسليم حتى يكشف القيد الفريد التكرار
+                "created_at": accepted_at,
+                "updated_at": now,
+                "processing_start": accepted_at,
+                "processing_end": now,
+                "processing_duration": int((now - accepted_at).total_seconds() * 1000),
+                "retry_count": self._attempts.get(entry_id, 0),
+                "processor_id": self.consumer_name,
+                "batch_id": batch_id,
+            })
+        
+        log_table = EventProcessingLog.__table__
+        async with db_manager.get_session() as session:
+            # الأحداث المكتوبة سابقاً (إعادة تسليم) لا تُعاد كتابتها
+            result = await session.execute(
+                pg_insert(log_table).values(log_rows)
+                .on_conflict_do_nothing(index_elements=["event_id", "created_at"])
+                .returning(log_table.c.event_id)
+            )
+            fresh = set(result.scalars().all())
+            events = [event for _, event in entries if event["event_id"] in fresh]
+            table = UserInteraction.__table__
+            await bulk_writer.insert_rows(session, table, [build_row(table, event, now) for event in events])
+        
+        self.written += len(events)
+        self.duplicates += len(entries) - len(events)
+        await self._update_caches(events)
+    
+    async def _dead_letter(self, entries: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """حفظ الأحداث الفاشلة في السجل مع بياناتها لإعادة معالجتها لاحقاً"""
+        now = datetime.now(timezone.utc)
+        rows = [{
+            "id": uuid.uuid4(),
+            "event_id": event["event_id"],
+            "event_type": "interaction",
+            "event_source": "api",
+            "processing_status": "failed",
+            "created_at": _parse_time(event.get("timestamp")) or now,
+            "updated_at": now,
+            "processing_end": now,
+            "error_message": event.pop("_error", "تجاوز عدد محاولات الكتابة"),
+            "retry_count": self._attempts.get(entry_id, 0),
+            "event_data": event,
+            "processor_id": self.consumer_name,
+        } for entry_id, event in entries]
+        
+        log_table = EventProcessingLog.__table__
+        try:
+            async with db_manager.get_session() as session:
+                await session.execute(
+                    pg_insert(log_table).values(rows)
+                    .on_conflict_do_nothing(index_elements=["event_id", "created_at"])
+                )
+        except Exception as e:
+            logger.error(f"❌ فشل في حفظ الأحداث الفاشلة في السجل: {e}")
+            return False
+        
+        self.dead_lettered += len(rows)
+        logger.warning(f"⚠️ نقل {len(rows)} حدث إلى السجل بحالة failed")
+        return True
+    
+    async def _update_caches(self, events: List[Dict[str, Any]]) -> None:
+        """تحديث عدادات التفاعل ونشاط المستخدمين لدفعة كاملة في خط أنابيب واحد"""
+        if not events or redis_manager.redis is None:
+            return
+        counters = Counter((event["content_id"], event["interaction_type"]) for event in events)
+        activities = defaultdict(list)
+        for event in events:
+            activities[event["user_id"]].append(json.dumps({
+                "timestamp": event.get("timestamp"),
+                "type": "interaction",
+                "content_id": event["content_id"],
+                "interaction_type": event["interaction_type"]
+            }, ensure_ascii=False, default=str))
+        
+        try:
+            async with redis_manager.redis.pipeline(transaction=False) as pipe:
+                for (content_id, interaction_type), count in counters.items():
+                    counter_key = f"interaction_count:{content_id}:{interaction_type}"
+                    pipe.incrby(counter_key, count)
+                    pipe.expire(counter_key, CACHE_CONFIG["interaction_counters"])
+                for user_id, values in activities.items():
+                    activity_key = f"activity:{user_id}"
+                    pipe.lpush(activity_key, *values)
+                    pipe.ltrim(activity_key, 0, 99)
+                    pipe.expire(activity_key, CACHE_CONFIG["user_sessions"])
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"خطأ في تحديث التخزين المؤقت للدفعة: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات المخزن"""
+        return {
+            "backend": self.backend,
+            "backlog": self._backlog,
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "dead_lettered": self.dead_lettered,
+        }
+
+# مثيل مشترك من مخزن الاستقبال
+ingestion_buffer = InteractionIngestionBuffer()
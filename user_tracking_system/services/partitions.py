@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+إدارة أقسام الجداول الزمنية
+User Behavior Tracking System - Time Partition Management
+"""
+
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy import text, Table
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from config import settings
+
+# إعداد السجلات
+logger = logging.getLogger("sabq.tracking.partitions")
+
+# الجداول المقسمة: (عمود التقسيم، مدة الاحتفاظ بالأيام أو None للاحتفاظ الدائم،
+# شرط الصفوف القابلة للحذف أو None لكل الصفوف)
+def partitioned_tables(retention_days: Optional[int] = None) -> Dict[str, Tuple[str, Optional[int], Optional[str]]]:
+    days = retention_days or settings.data_retention_days
+    return {
+        "user_interactions": ("timestamp", None, None),
+        "scroll_events": ("timestamp", days, None),
+        "scroll_aggregates": ("window_start", days, None),
+        "context_data": ("timestamp", days, None),
+        # سجلات المعالجة الناجحة تُحذف بعد نصف المدة؛ الفاشلة (مع بياناتها) تبقى لإعادة معالجتها
+        "event_processing_log": ("created_at", days // 2, "processing_status = 'processed'"),
+    }
+
+# قفل استشاري حتى لا ينفذ أكثر من عامل صيانة الأقسام في نفس الوقت
+PARTITION_LOCK_KEY = 0x5AB0_7A61
+
+class PartitionManager:
+    """
+    مدير أقسام الجداول عالية الحجم (PARTITION BY RANGE على عمود زمني)
+    
+    - ensure_partitions ينشئ الأقسام من بداية مدة الاحتفاظ حتى premake فترات قادمة
+      (شهرية أو يومية) قبل أن تصلها البيانات
+    - drop_expired يفصل (DETACH) الأقسام التي انتهت مدة احتفاظها بالكامل ثم يحذفها،
+      أو يتركها مفصولة للأرشفة عندما يكون الإجراء detach؛ لا توجد عبارات DELETE كبيرة
+    - الجداول ذات شرط حذف (سجل المعالجة) لا يُحذف قسمها إذا احتوى صفوفاً يجب إبقاؤها
+      (الأحداث الفاشلة): تُحذف منه الصفوف القابلة للحذف فقط ويبقى القسم متصلاً
+    - الصفوف خارج الأقسام الموجودة ترفضها قاعدة البيانات (لا يوجد قسم افتراضي)
+    - migrate يحول الجداول المنشأة قبل التقسيم (create_all لا يعدل جدولاً موجوداً)
+    """
+    
+    def __init__(self,
+                 interval: Optional[str] = None,
+                 premake: Optional[int] = None,
+                 retention_action: Optional[str] = None,
+                 retention_days: Optional[int] = None):
+        self.interval = interval or settings.tracking_partition_interval
+        self.premake = settings.tracking_partition_premake if premake is None else premake
+        self.retention_action = retention_action or settings.tracking_partition_retention_action
+        self.tables = partitioned_tables(retention_days)
+    
+    # ===== الفترات =====
+    
+    def period_start(self, moment: datetime) -> datetime:
+        moment = moment.astimezone(timezone.utc)
+        if self.interval == "day":
+            return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    def next_period(self, start: datetime) -> datetime:
+        if self.interval == "day":
+            return start + timedelta(days=1)
+        return (start + timedelta(days=32)).replace(day=1)
+    
+    def partition_name(self, table: str, start: datetime) -> str:
+        return f"{table}_p{start.strftime('%Y%m%d' if self.interval == 'day' else '%Y%m')}"
+    
+    def parse_partition(self, table: str, name: str) -> Optional[Tuple[datetime, datetime]]:
+        """
+        (بداية، نهاية) فترة القسم من اسمه، أو None للأقسام التي لم ينشئها المدير
+        الفترة تُقرأ من طول الاسم لا من الإعداد الحالي، فتبقى الأقسام الشهرية
+        القديمة صحيحة بعد التحويل إلى أقسام يومية
+        """
+        prefix = f"{table}_p"
+        if not name.startswith(prefix):
+            return None
+        suffix = name[len(prefix):]
+        try:
+            if len(suffix) == 8:
+                start = datetime.strptime(suffix, "%Y%m%d").replace(tzinfo=timezone.utc)
+                return start, start + timedelta(days=1)
+            if len(suffix) == 6:
+                start = datetime.strptime(suffix, "%Y%m").replace(tzinfo=timezone.utc)
+                return start, (start + timedelta(days=32)).replace(day=1)
+        except ValueError:
+            pass
+        return None
+    
+    def periods(self, since: datetime, now: datetime) -> List[Tuple[datetime, datetime]]:
+        """الفترات من الفترة التي تحتوي since حتى premake فترات بعد الحالية"""
+        start = self.period_start(since)
+        last = self.period_start(now)
+        for _ in range(self.premake):
+            last = self.next_period(last)
+        
+        result = []
+        while start <= last:
+            end = self.next_period(start)
+            result.append((start, end))
+            start = end
+        return result
+    
+    # ===== الإنشاء والحذف =====
+    
+    @staticmethod
+    async def try_lock(conn: AsyncConnection) -> bool:
+        result = await conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+        return bool(result.scalar())
+    
+    async def existing_partitions(self, conn: AsyncConnection, table: str) -> List[str]:
+        result = await conn.execute(text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :table
+        """), {"table": table})
+        return [row[0] for row in result]
+    
+    @staticmethod
+    async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+        result = await conn.execute(text("""
+            SELECT 1 FROM pg_partitioned_table
+            JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid
+            WHERE pg_class.relname = :table
+        """), {"table": table})
+        return result.scalar() is not None
+    
+    async def ensure_partitions(self, conn: AsyncConnection, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """إنشاء الأقسام الناقصة لكل جدول؛ يعيد أسماء الأقسام المنشأة"""
+        now = now or datetime.now(timezone.utc)
+        created = {}
+        for table, (_, retention, _) in self.tables.items():
+            if not await self.is_partitioned(conn, table):
+                logger.warning(f"⚠️ جدول {table} غير مقسم (أُنشئ قبل التقسيم) - يلزم ترحيله: python migrate_partitions.py")
+                continue
+            
+            existing = await self.existing_partitions(conn, table)
+            # أول تشغيل: الأقسام الماضية بقدر مدة الاحتفاظ؛ بعدها الفترات الحالية والقادمة فقط
+            since = now if existing else now - timedelta(days=retention or settings.data_retention_days)
+            created[table] = await self._create_missing(conn, table, existing, since, now)
+        return created
+    
+    async def _create_missing(self, conn: AsyncConnection, table: str, existing: List[str],
+                              since: datetime, now: datetime) -> List[str]:
+        """إنشاء أقسام الفترات من since حتى premake فترات قادمة غير المغطاة بقسم موجود"""
+        covered = [bounds for bounds in (self.parse_partition(table, name) for name in existing) if bounds]
+        created = []
+        for start, end in self.periods(since, now):
+            if any(start < covered_end and covered_start < end for covered_start, covered_end in covered):
+                continue
+            name = self.partition_name(table, start)
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            created.append(name)
+        
+        if created:
+            logger.info(f"🧱 إنشاء {len(created)} قسم لجدول {table}")
+        return created
+    
+    # ===== ترحيل الجداول غير المقسمة =====
+    
+    async def migrate(self, conn: AsyncConnection, tables: Dict[str, Table],
+                      now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        تحويل الجداول المنشأة قبل التقسيم إلى جداول مقسمة في معاملة واحدة
+        لكل جدول: إعادة تسميته إلى <table>_legacy وإزالة قيوده وفهارسه (أسماؤها
+        تتعارض مع الجدول الجديد)، ثم إنشاء الجدول المقسم من النموذج (المفتاح
+        الأساسي المركب وقيد event_id + created_at)، وأقسام تغطي أقدم صف حتى
+        الفترات القادمة، ونسخ البيانات، ثم حذف الجدول القديم.
+        يعيد عدد الصفوف المنسوخة لكل جدول مُرحّل.
+        """
+        now = now or datetime.now(timezone.utc)
+        migrated = {}
+        for name, (column, _, _) in self.tables.items():
+            if await self.is_partitioned(conn, name) or not await self._table_exists(conn, name):
+                continue
+            legacy = f"{name}_legacy"
+            logger.info(f"🔁 ترحيل جدول {name} إلى جدول مقسم...")
+            
+            await conn.execute(text(f"ALTER TABLE {name} RENAME TO {legacy}"))
+            await self._drop_indexes(conn, legacy)
+            await conn.run_sync(lambda sync_conn: tables[name].create(sync_conn))
+            
+            oldest = (await conn.execute(text(f"SELECT min({column}) FROM {legacy}"))).scalar()
+            since = min(oldest, now) if oldest is not None else now
+            await self._create_missing(conn, name, [], since, now)
+            
+            legacy_columns = set((await conn.execute(text(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = :table"
+            ), {"table": legacy})).scalars().all())
+            columns = [c.name for c in tables[name].columns if c.name in legacy_columns]
+            # مفتاح التقسيم لا يقبل NULL في الجدول الجديد
+            values = [f"COALESCE({c}, now())" if c == column else c for c in columns]
+            result = await conn.execute(text(
+                f"INSERT INTO {name} ({', '.join(columns)}) SELECT {', '.join(values)} FROM {legacy}"
+            ))
+            await conn.execute(text(f"DROP TABLE {legacy}"))
+            
+            migrated[name] = result.rowcount
+            logger.info(f"✅ ترحيل {name}: نسخ {result.rowcount} صف")
+        return migrated
+    
+    @staticmethod
+    async def _table_exists(conn: AsyncConnection, table: str) -> bool:
+        result = await conn.execute(text("SELECT to_regclass(:table)"), {"table": table})
+        return result.scalar() is not None
+    
+    @staticmethod
+    async def _drop_indexes(conn: AsyncConnection, table: str) -> None:
+        """إزالة المفتاح الأساسي والقيود الفريدة والفهارس من الجدول القديم"""
+        constraints = (await conn.execute(text("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = to_regclass(:table) AND contype IN ('p', 'u')
+        """), {"table": table})).scalars().all()
+        for constraint in constraints:
+            await conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"'))
+        
+        indexes = (await conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+        ), {"table": table})).scalars().all()
+        for index in indexes:
+            await conn.execute(text(f'DROP INDEX "{index}"'))
+    
+    async def drop_expired(self, conn: AsyncConnection, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        فصل/حذف الأقسام التي انتهت مدة احتفاظها بالكامل
+        الجداول غير المقسمة (قبل الترحيل) تُنظف بـ DELETE كما في السابق
+        """
+        now = now or datetime.now(timezone.utc)
+        removed = {}
+        for table, (column, retention, expirable) in self.tables.items():
+            if retention is None:
+                continue
+            cutoff = now - timedelta(days=retention)
+            condition = f" AND {expirable}" if expirable else ""
+            
+            if not await self.is_partitioned(conn, table):
+                result = await conn.execute(
+                    text(f"DELETE FROM {table} WHERE {column} < :cutoff{condition}"), {"cutoff": cutoff}
+                )
+                removed[table] = result.rowcount
+                continue
+            
+            removed[table] = []
+            for name in sorted(await self.existing_partitions(conn, table)):
+                bounds = self.parse_partition(table, name)
+                if bounds is None or bounds[1] > cutoff:
+                    continue
+                
+                if expirable and await self._has_retained_rows(conn, name, expirable):
+                    result = await conn.execute(text(f"DELETE FROM {name} WHERE {expirable}"))
+                    logger.warning(f"⚠️ إبقاء القسم {name} لاحتوائه صفوفاً محفوظة؛ حذف {result.rowcount} صف منتهي منه")
+                    continue
+                
+                await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                if self.retention_action == "drop":
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                removed[table].append(name)
+            
+            if removed[table]:
+                action = "حذف" if self.retention_action == "drop" else "فصل"
+                logger.info(f"🗑️ {action} {len(removed[table])} قسم منتهي من جدول {table}")
+        return removed
+    
+    @staticmethod
+    async def _has_retained_rows(conn: AsyncConnection, partition: str, expirable: str) -> bool:
+        result = await conn.execute(text(f"SELECT 1 FROM {partition} WHERE ({expirable}) IS NOT TRUE LIMIT 1"))
+        return result.scalar() is not None
+    
+    async def maintain(self, conn: AsyncConnection, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """إنشاء الأقسام القادمة وحذف المنتهية (عامل واحد فقط في كل مرة)"""
+        if not await self.try_lock(conn):
+            return {"skipped": True}
+        return {
+            "created": await self.ensure_partitions(conn, now),
+            "removed": await self.drop_expired(conn, now),
+        }
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+تجميع أحداث التمرير عند الاستقبال
+User Behavior Tracking System - Scroll Event Aggregator
+"""
+
+import time
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Iterable
+
+from sqlalchemy import update, bindparam, func, literal
+from sqlalchemy.dialects.postgresql import JSONB
+
+from config import settings
+from models.database import ScrollAggregate, ReadingSession
+from models.schemas import ScrollEventRequest
+from services.database import db_manager
+from services.bulk_writer import bulk_writer, build_row
+
+# إعداد السجلات
+logger = logging.getLogger("sabq.tracking.scroll")
+
+class ScrollWindow:
+    """تجميع أحداث جلسة قراءة واحدة خلال نافذة زمنية"""
+    
+    __slots__ = ("reading_session_id", "user_id", "content_id", "window_start", "opened_at",
+                 "events_count", "max_depth", "last_position", "up_count", "down_count",
+                 "speed_sum", "speed_count", "depth_histogram", "dwell_histogram",
+                 "pause_count", "pause_duration_total", "pause_points")
+    
+    def __init__(self, event: ScrollEventRequest, buckets: int):
+        self.reading_session_id = event.reading_session_id
+        self.user_id = event.user_id
+        self.content_id = event.content_id
+        self.window_start = datetime.now(timezone.utc)
+        self.opened_at = time.monotonic()
+        self.events_count = 0
+        self.max_depth = 0.0
+        self.last_position: Optional[float] = None
+        self.up_count = 0
+        self.down_count = 0
+        self.speed_sum = 0.0
+        self.speed_count = 0
+        self.depth_histogram = [0] * buckets
+        self.dwell_histogram = [0] * buckets
+        self.pause_count = 0
+        self.pause_duration_total = 0
+        self.pause_points: List[List[float]] = []
+    
+    def to_row(self, now: datetime) -> Dict[str, Any]:
+        """صف في جدول scroll_aggregates"""
+        return {
+            "reading_session_id": self.reading_session_id,
+            "user_id": self.user_id,
+            "content_id": self.content_id,
+            "window_start": self.window_start,
+            "window_end": now,
+            "events_count": self.events_count,
+            "max_depth": self.max_depth,
+            "last_position": self.last_position,
+            "scroll_up_count": self.up_count,
+            "scroll_down_count": self.down_count,
+            "avg_scroll_speed": self.speed_sum / self.speed_count if self.speed_count else None,
+            "depth_histogram": self.depth_histogram,
+            "dwell_histogram": self.dwell_histogram,
+            "pause_count": self.pause_count,
+            "pause_duration_total": self.pause_duration_total,
+            "pause_points": self.pause_points or None,
+        }
+
+class ScrollAggregator:
+    """
+    مجمع أحداث التمرير لكل جلسة قراءة
+    
+    - كل حدث يُضاف إلى نافذة جلسة القراءة في الذاكرة: مدرج عمق (عدد الأحداث
+      لكل شريحة)، مدرج مكوث (الثواني المقضية في كل شريحة حسب time_since_start
+      بين حدثين متتاليين)، ونقاط التوقف
+    - النوافذ تُكتب كصفوف في scroll_aggregates عند انقضاء مدتها أو عند الإيقاف،
+      مع تحديث ملخص جلسة القراءة (العمق الأقصى، عدد الأحداث، التوقفات، نقاط الاهتمام)
+      بعبارة UPDATE واحدة لكل دفعة
+    - النوافذ قابلة للجمع، فلا مشكلة إذا وزعت أحداث الجلسة على عدة عمليات
+    - الأحداث الخام تُحفظ لنسبة من جلسات القراءة فقط (raw_sample_rate)؛ الاختيار
+      ثابت لكل جلسة فتُحفظ أحداثها كاملة أو لا تُحفظ
+    """
+    
+    def __init__(self,
+                 window_seconds: Optional[int] = None,
+                 buckets: Optional[int] = None,
+                 raw_sample_rate: Optional[float] = None,
+                 session_timeout: Optional[int] = None):
+        self.window_seconds = window_seconds or settings.scroll_aggregation_window
+        self.buckets = buckets or settings.scroll_depth_buckets
+        self.raw_sample_rate = settings.scroll_raw_sample_rate if raw_sample_rate is None else raw_sample_rate
+        self.session_timeout = session_timeout or settings.reading_session_timeout
+        
+        self._windows: Dict[str, ScrollWindow] = {}
+        # آخر (موقع، وقت منذ البداية، وقت الاستقبال) لكل جلسة لحساب المكوث عبر النوافذ
+        self._last_tick: Dict[str, tuple] = {}
+        # نوافذ مغلقة فشلت كتابتها وتنتظر إعادة المحاولة
+        self._closed: List[ScrollWindow] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        
+        self.events = 0
+        self.raw_events = 0
+        self.rows_written = 0
+    
+    # ===== الاستقبال =====
+    
+    def _bucket(self, position: float) -> int:
+        return min(int(position * self.buckets / 100), self.buckets - 1)
+    
+    def is_raw_sampled(self, reading_session_id: str) -> bool:
+        """هل تُحفظ الأحداث الخام لهذه الجلسة (اختيار ثابت بالتجزئة)"""
+        if self.raw_sample_rate <= 0:
+            return False
+        if self.raw_sample_rate >= 1:
+            return True
+        digest = hashlib.blake2b(reading_session_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2 ** 64 < self.raw_sample_rate
+    
+    def add(self, event: ScrollEventRequest) -> bool:
+        """إضافة حدث إلى نافذة جلسته؛ يعيد True إذا كان يجب حفظ الحدث الخام أيضاً"""
+        rsid = event.reading_session_id
+        window = self._windows.get(rsid)
+        if window is None:
+            window = self._windows[rsid] = ScrollWindow(event, self.buckets)
+        
+        position = event.scroll_position
+        bucket = self._bucket(position)
+        window.events_count += 1
+        window.depth_histogram[bucket] += 1
+        window.max_depth = max(window.max_depth, position)
+        window.last_position = position
+        if event.scroll_direction == "up":
+            window.up_count += 1
+        else:
+            window.down_count += 1
+        if event.scroll_speed is not None:
+            window.speed_sum += event.scroll_speed
+            window.speed_count += 1
+        
+        # المكوث: الوقت بين الحدث السابق والحالي يُنسب لموقع الحدث السابق
+        previous = self._last_tick.get(rsid)
+        if previous is not None:
+            elapsed = event.time_since_start - previous[1]
+            if 0 < elapsed <= self.session_timeout:
+                window.dwell_histogram[self._bucket(previous[0])] += elapsed
+        self._last_tick[rsid] = (position, event.time_since_start, time.monotonic())
+        
+        if event.is_pause_point:
+            window.pause_count += 1
+            window.pause_duration_total += event.pause_duration or 0
+            window.pause_points.append([position, event.pause_duration or 0, event.time_since_start])
+        
+        self.events += 1
+        raw = self.is_raw_sampled(rsid)
+        if raw:
+            self.raw_events += 1
+        return raw
+    
+    def add_many(self, events: Iterable[ScrollEventRequest]) -> List[ScrollEventRequest]:
+        """إضافة دفعة أحداث وإرجاع الأحداث التي يجب حفظها خاماً"""
+        return [event for event in events if self.add(event)]
+    
+    # ===== دورة الحياة =====
+    
+    async def start(self) -> None:
+        """بدء عامل الكتابة الدوري"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"📜 بدء مجمع التمرير - نافذة {self.window_seconds} ثانية، "
+                    f"{self.buckets} شريحة، عينة خام {self.raw_sample_rate:.0%}")
+    
+    async def stop(self) -> None:
+        """إيقاف العامل وكتابة كل النوافذ المفتوحة"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush(force=True)
+        logger.info("✅ تم إيقاف مجمع التمرير")
+    
+    async def _flush_loop(self) -> None:
+        interval = max(1, self.window_seconds // 4)
+        while not self._stopping:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ خطأ في كتابة تجميعات التمرير: {e}")
+    
+    # ===== الكتابة =====
+    
+    def _close_windows(self, force: bool) -> List[ScrollWindow]:
+        now = time.monotonic()
+        expired = [rsid for rsid, window in self._windows.items()
+                   if force or now - window.opened_at >= self.window_seconds]
+        closed = [self._windows.pop(rsid) for rsid in expired]
+        
+        # حالة المكوث تبقى حتى انتهاء مهلة جلسة القراءة
+        stale = [rsid for rsid, tick in self._last_tick.items()
+                 if force or now - tick[2] > self.session_timeout]
+        for rsid in stale:
+            del self._last_tick[rsid]
+        return closed
+    
+    async def flush(self, force: bool = False) -> int:
+        """كتابة النوافذ المنتهية (أو كلها مع force) وإرجاع عدد الصفوف"""
+        windows = self._closed + self._close_windows(force)
+        self._closed = []
+        if not windows:
+            return 0
+        
+        try:
+            return await self._write(windows)
+        except BaseException as e:
+            # تبقى النوافذ لإعادة المحاولة (حتى عند الإلغاء أثناء الإيقاف)
+            self._closed = windows
+            if isinstance(e, Exception):
+                logger.error(f"❌ فشل في كتابة {len(windows)} نافذة تمرير: {e}")
+            raise
+    
+    async def _write(self, windows: List[ScrollWindow]) -> int:
+        now = datetime.now(timezone.utc)
+        table = ScrollAggregate.__table__
+        rows = [build_row(table, window.to_row(now), now) for window in windows]
+        
+        async with db_manager.get_session() as session:
+            result = await bulk_writer.insert_checked(session, table, rows)
+            if result.failed:
+                # غالباً جلسة قراءة غير مسجلة - لا يمكن كتابتها في أي محاولة لاحقة
+                rejected = {item["index"] for item in result.failed}
+                logger.warning(f"⚠️ رفض {len(rejected)} نافذة تمرير: {result.failed[0]['errors']}")
+                windows = [window for i, window in enumerate(windows) if i not in rejected]
+            if windows:
+                connection = await session.connection()
+                await connection.execute(self._summary_statement(now), self._session_summaries(windows))
+        
+        self.rows_written += len(windows)
+        return len(windows)
+    
+    @staticmethod
+    def _session_summaries(windows: List[ScrollWindow]) -> List[Dict[str, Any]]:
+        """ملخص كل جلسة قراءة من نوافذها (قد تتكرر الجلسة إذا أعيدت نوافذ فاشلة)"""
+        sessions: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "events": 0, "depth": 0.0, "pauses": 0, "pause_total": 0, "points": []
+        })
+        for window in windows:
+            summary = sessions[window.reading_session_id]
+            summary["events"] += window.events_count
+            summary["depth"] = max(summary["depth"], window.max_depth)
+            summary["pauses"] += window.pause_count
+            summary["pause_total"] += window.pause_duration_total
+            summary["points"].extend(
+                {"position": position, "duration": duration, "time_since_start": at}
+                for position, duration, at in window.pause_points
+            )
+        return [{"rsid": rsid, **summary} for rsid, summary in sessions.items()]
+    
+    @staticmethod
+    def _summary_statement(now: datetime):
+        """تحديث ملخص جلسات القراءة (executemany بعبارة واحدة)"""
+        reading = ReadingSession.__table__
+        return (
+            update(reading)
+            .where(reading.c.reading_session_id == bindparam("rsid"))
+            .values(
+                scroll_events_count=reading.c.scroll_events_count + bindparam("events"),
+                scroll_depth_max=func.greatest(func.coalesce(reading.c.scroll_depth_max, 0), bindparam("depth")),
+                pause_count=reading.c.pause_count + bindparam("pauses"),
+                pause_duration_total=func.coalesce(reading.c.pause_duration_total, 0) + bindparam("pause_total"),
+                attention_points=func.coalesce(reading.c.attention_points, literal([], JSONB))
+                .op("||")(bindparam("points", type_=JSONB)),
+                updated_at=now
+            )
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات المجمع"""
+        return {
+            "open_windows": len(self._windows),
+            "pending_windows": len(self._closed),
+            "events": self.events,
+            "raw_events": self.raw_events,
+            "rows_written": self.rows_written,
+            "compression_ratio": self.events / self.rows_written if self.rows_written else None,
+        }
+
+def bucket_labels(buckets: int) -> List[str]:
+    """تسميات شرائح العمق ("0-5"، "5-10"، ...)"""
+    width = 100 / buckets
+    return [f"{i * width:g}-{(i + 1) * width:g}" for i in range(buckets)]
+
+# مثيل مشترك من مجمع التمرير
+scroll_aggregator = ScrollAggregator()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+اختبارات الكتابة المجمعة ومخزن الاستقبال المؤجل (جلسة وRedis وهميان)
+User Behavior Tracking System - Bulk writer and ingestion buffer tests
+"""
+
+import os
+import sys
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import UserInteraction, EventProcessingLog
+from services import ingestion_buffer as ingestion_module
+from services.bulk_writer import BulkWriter, BulkWriteResult, build_row
+from services.ingestion_buffer import InteractionIngestionBuffer
+
+BAD_CONTENT = "bad-content"
+
+
+class FakeResult:
+    def __init__(self, values=None):
+        self.values = values or []
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return list(self.values)
+
+
+class FakeSession:
+    """
+    جلسة وهمية: ترفض (IntegrityError) أي إدراج يحتوي BAD_CONTENT،
+    وتفشل كل العمليات (ConnectionError) عندما يكون down=True
+    """
+
+    def __init__(self):
+        self.down = False
+        self.inserted = []
+        self.log_rows = []
+        self.statements = 0
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+    async def execute(self, statement, params=None):
+        self.statements += 1
+        if self.down:
+            raise ConnectionError("database unavailable")
+
+        table = getattr(statement, "table", None)
+        if table is not None and table.name == EventProcessingLog.__tablename__:
+            compiled = statement.compile(dialect=postgresql.dialect()).params
+            rows = [value for key, value in compiled.items() if key.startswith("event_id")]
+            self.log_rows.extend(compiled[key] for key in compiled if key.startswith("processing_status"))
+            return FakeResult(rows)
+
+        rows = params or []
+        if any(row.get("content_id") == BAD_CONTENT for row in rows):
+            raise IntegrityError(str(statement), {}, Exception("violates check constraint"))
+        self.inserted.extend(rows)
+        return FakeResult()
+
+
+class FakePipeline:
+    def __init__(self, commands):
+        self.commands = commands
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name,) + args)
+
+    async def execute(self):
+        return []
+
+
+class FakeRedis:
+    def __init__(self):
+        self.commands = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.commands)
+
+
+def interaction(content_id="c1", user_id="u1", **extra):
+    return {
+        "user_id": user_id,
+        "session_id": "s1",
+        "content_id": content_id,
+        "content_type": "article",
+        "interaction_type": "like",
+        "page_url": "https://sabq.org/article",
+        **extra,
+    }
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake_session = FakeSession()
+
+    @asynccontextmanager
+    async def get_session():
+        yield fake_session
+
+    monkeypatch.setattr(ingestion_module.db_manager, "get_session", get_session)
+    return fake_session
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(ingestion_module.redis_manager, "redis", fake_redis)
+    return fake_redis
+
+
+def make_buffer(**options):
+    options.setdefault("max_attempts", 2)
+    return InteractionIngestionBuffer(backend="memory", batch_size=8, flush_interval=1,
+                                      max_backoff=10, **options)
+
+
+# ===== build_row =====
+
+def test_build_row_fills_every_column():
+    table = UserInteraction.__table__
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    row = build_row(table, interaction(timestamp="2026-01-02T03:04:05+00:00"), now)
+
+    assert set(row) == {column.name for column in table.columns}
+    assert isinstance(row["id"], uuid.UUID)
+    assert row["timestamp"] == datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert row["created_at"] == now
+    assert row["is_duplicate"] is False
+    assert row["element_id"] is None
+
+
+def test_build_row_generates_fresh_ids():
+    table = UserInteraction.__table__
+    assert build_row(table, interaction())["id"] != build_row(table, interaction())["id"]
+
+
+# ===== BulkWriter._write_isolating =====
+
+def test_write_isolating_rejects_only_bad_rows():
+    table = UserInteraction.__table__
+    fake_session = FakeSession()
+    rows = [build_row(table, interaction(BAD_CONTENT if i in (2, 5) else f"c{i}")) for i in range(8)]
+    result = BulkWriteResult(len(rows))
+
+    asyncio.run(BulkWriter(chunk_size=8, method="values")._write_isolating(
+        fake_session, table, rows, list(range(10, 18)), result))
+
+    assert result.inserted == 6
+    assert sorted(item["index"] for item in result.failed) == [12, 15]
+    assert all(row["content_id"] != BAD_CONTENT for row in fake_session.inserted)
+
+
+def test_write_isolating_propagates_infrastructure_errors():
+    table = UserInteraction.__table__
+    fake_session = FakeSession()
+    fake_session.down = True
+    result = BulkWriteResult(1)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(BulkWriter(method="values")._write_isolating(
+            fake_session, table, [build_row(table, interaction())], [0], result))
+
+
+# ===== InteractionIngestionBuffer.flush =====
+
+def test_flush_writes_batch_and_updates_caches(session, redis):
+    buffer = make_buffer()
+
+    async def scenario():
+        for i in range(3):
+            await buffer.enqueue(interaction(f"c{i}"))
+        return await buffer.flush()
+
+    assert asyncio.run(scenario()) == 3
+    assert len(session.inserted) == 3
+    assert buffer.stats()["backlog"] == 0
+    assert ("incrby", "interaction_count:c0:like", 1) in redis.commands
+
+
+def test_flush_dead_letters_rejected_event_after_max_attempts(session, redis):
+    buffer = make_buffer(max_attempts=2)
+
+    async def scenario():
+        await buffer.enqueue(interaction("c1"))
+        bad_id = await buffer.enqueue(interaction(BAD_CONTENT))
+        await buffer.enqueue(interaction("c2"))
+
+        assert await buffer.flush() == 2
+        assert buffer._attempts == {bad_id: 1}
+        assert len(buffer._memory) == 1
+
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert buffer.dead_lettered == 1
+    assert "failed" in session.log_rows
+    assert len(buffer._memory) == 0
+    assert not buffer._attempts
+
+
+def test_flush_retries_infrastructure_errors_without_dead_letter(session, redis):
+    buffer = make_buffer(max_attempts=1)
+
+    async def scenario():
+        for i in range(3):
+            await buffer.enqueue(interaction(f"c{i}"))
+
+        session.down = True
+        for _ in range(3):
+            assert await buffer.flush() == 0
+
+        assert buffer.dead_lettered == 0
+        assert not buffer._attempts
+        assert len(buffer._memory) == 3
+        assert buffer._retry_at > 0
+
+        session.down = False
+        return await buffer.flush()
+
+    assert asyncio.run(scenario()) == 3
+    assert buffer._retry_at == 0.0
+    assert len(session.inserted) == 3
+
+
+def test_start_refuses_unpartitioned_event_log(session, monkeypatch):
+    async def not_partitioned(conn, table):
+        return False
+
+    monkeypatch.setattr(ingestion_module.PartitionManager, "is_partitioned", not_partitioned)
+    buffer = make_buffer()
+
+    with pytest.raises(RuntimeError, match="migrate_partitions"):
+        asyncio.run(buffer.start())
+    assert buffer._task is None
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نظام تتبع سلوك المستخدم - سبق الذكية
+اختبار بناء استجابة تحليلات المستخدم من الملخصات اليومية
+User Behavior Tracking System - User analytics response tests
+"""
+
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.schemas import UserBehaviorAnalytics
+from services.behavior_rollups import merge_summaries
+
+DAY = datetime(2026, 10, 15, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # إعداد السجلات في api يكتب إلى logs/ نسبةً إلى مجلد التشغيل
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    import api as api_module
+    return api_module
+
+
+def summary(date, **overrides):
+    row = {
+        "date": date,
+        "total_interactions": 8,
+        "total_sessions": 2,
+        "total_session_duration": 900,
+        "total_reading_time": 400,
+        "articles_read": 2,
+        "articles_completed": 2,
+        "avg_reading_speed": 200.0,
+        "avg_engagement_score": 0.5,
+        "avg_scroll_depth": 75.0,
+        "engagement_patterns": {
+            "by_type": {"like": 3, "view": 5},
+            "by_hour": {"9": 3, "21": 5},
+            "by_content": {"c1": 6, "c2": 2},
+            "by_device": {"mobile": 2},
+            "time_on_page_sum": 30,
+            "time_on_page_count": 3,
+        },
+        "reading_patterns": {
+            "speed_count": 2,
+            "engagement_count": 2,
+            "depth_sessions": 2,
+            "scroll_events": 40,
+            "scroll_by_hour": {"21": 40},
+            "pause_count": 2,
+            "pause_duration_total": 8,
+            "depth_histogram": [10, 3],
+            "dwell_histogram": [100, 20],
+            "pause_hotspots": [0, 2],
+        },
+    }
+    row.update(overrides)
+    return row
+
+
+def build_response(api, summaries):
+    totals = merge_summaries(summaries, buckets=2)
+    interaction_analytics = api.analyze_interactions(totals)
+    reading_analytics = api.analyze_reading(totals)
+    session_analytics = api.analyze_user_sessions(totals)
+    behavioral_insights = api.generate_behavioral_insights(
+        interaction_analytics, reading_analytics, session_analytics
+    )
+    return UserBehaviorAnalytics(
+        user_id="u1",
+        analysis_period={"start": DAY, "end": DAY + timedelta(days=2)},
+        interaction_analytics=interaction_analytics,
+        reading_analytics=reading_analytics,
+        session_analytics=session_analytics,
+        context_analytics=api.analyze_context_data(totals),
+        behavioral_insights=behavioral_insights,
+        recommendations=api.generate_user_recommendations(behavioral_insights),
+    )
+
+
+def test_response_from_merged_summaries(api):
+    response = build_response(api, [summary(DAY), summary(DAY + timedelta(days=1))])
+
+    assert response.interaction_analytics.total_interactions == 16
+    assert response.reading_analytics.completion_rate == 1.0
+    assert api.INSIGHT_HIGH_COMPLETION in response.behavioral_insights
+    assert api.INSIGHT_RECOMMENDATIONS[api.INSIGHT_HIGH_COMPLETION] in response.recommendations
+
+
+def test_response_without_activity(api):
+    response = build_response(api, [])
+
+    assert response.behavioral_insights == [api.INSIGHT_NO_ACTIVITY]
+    assert response.recommendations == [api.INSIGHT_RECOMMENDATIONS[api.INSIGHT_NO_ACTIVITY]]
+
+
+def test_low_completion_and_short_sessions(api):
+    response = build_response(api, [summary(DAY, articles_read=10, articles_completed=1,
+                                            total_session_duration=100, avg_scroll_depth=30.0)])
+
+    assert api.INSIGHT_LOW_COMPLETION in response.behavioral_insights
+    assert api.INSIGHT_SHORT_SESSIONS in response.behavioral_insights
+    assert api.INSIGHT_SHALLOW_SCROLL in response.behavioral_insights
+    assert len(response.recommendations) == 3